@@ -0,0 +1,461 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+import colmap_model
+import decimate
+import fake_tools
+import glb_writer
+import keyframes
+import main as pipeline
+import mesh_cleanup
+import obj_io
+import pointcloud
+import preprocess
+import synthetic_capture
+
+# Offline performance benchmarks of the pipeline, runnable without COLMAP, OpenMVS,
+# Blender or real captures: the pipeline runs end to end on a synthetic turntable video
+# (synthetic_capture.py) with the stand-in tools (fake_tools.py), and micro-benchmarks time
+# the Python-side hot paths on synthetic data. Results are compared against a baseline.
+
+# The pipeline benchmark's runs use the in-process cleanup and GLB writer: with stand-in
+# tools, the Python stages are the only part of the pipeline whose speed is real
+DEFAULT_PIPELINE_OPTIONS = '--cleanup-engine numpy --glb-writer native --filter-points --quiet-commands'
+
+# A metric regresses when it is this much worse than the baseline (as a fraction)...
+DEFAULT_TOLERANCE = 0.25
+# ...and the difference is larger than the noise floor of the measurement: pipeline stages
+# include the start-up of the tools' processes, which varies by a few tenths of a second
+MIN_TIME_DELTA = {'micro': 0.05, 'pipeline': 0.25}
+MIN_MEMORY_DELTA = 8 * 1024 * 1024
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Sizes of the micro-benchmark inputs at --scale 1, about those of a standard-profile job
+MICRO_SIZES = {
+    'sparse_images': 200,
+    'keyframe_frames': 120,
+    'preprocess_frames': 24,
+    'dense_points': 600000,
+    'mesh_faces': 400000,
+}
+
+SUITES = ['all', 'micro', 'pipeline']
+
+# --- Memory measurement ---
+
+def reset_peak_rss():
+    """
+    Resets the process's peak resident set size (Linux 4.0+). Returns False where it cannot
+    be reset, in which case peak_rss keeps reporting the peak since the process started.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes (since the last reset_peak_rss).
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+# --- Micro-benchmarks ---
+#
+# Each setup function builds its input in work_dir and returns {'run': callable timed on its
+# own, 'prepare': optional untimed callable whose result is passed to run (a fresh copy of
+# an input run modifies), 'items': input size, 'unit': what items counts}.
+
+def setup_validate_colmap_output(work_dir, scale):
+    count = max(2, int(MICRO_SIZES['sparse_images'] * scale))
+    model = fake_tools.sparse_model([f'frame_{i:04d}.jpg' for i in range(1, count + 1)], 1920, 1080)
+    colmap_model.write_model(model, os.path.join(work_dir, 'sparse', '0'))
+    return {'run': lambda: pipeline.validate_colmap_output(work_dir), 'items': model.num_points3D, 'unit': 'points'}
+
+def setup_keyframe_scoring(work_dir, scale):
+    count = max(4, int(MICRO_SIZES['keyframe_frames'] * scale))
+    # A few rendered views, repeated: scoring costs the same whatever the frame shows
+    views = [render_gray(2 * np.pi * i / 8, keyframes.ANALYSIS_WIDTH) for i in range(8)]
+    frames = [views[i % len(views)] for i in range(count)]
+
+    def run():
+        sharpness = np.array([keyframes.laplacian_variance(frame) for frame in frames])
+        thumbs = np.stack([keyframes.thumbnail(frame) for frame in frames])
+        keyframes.select_keyframes(sharpness, thumbs, max_frames=count // 2)
+    return {'run': run, 'items': count, 'unit': 'frames'}
+
+def setup_preprocess_frames(work_dir, scale):
+    count = max(2, int(MICRO_SIZES['preprocess_frames'] * scale))
+    input_dir = os.path.join(work_dir, 'frames')
+    os.makedirs(input_dir, exist_ok=True)
+    views = [synthetic_capture.render_frame(2 * np.pi * i / 4, 1920, 1080) for i in range(4)]
+    for index in range(count):
+        Image.fromarray(views[index % len(views)]).save(os.path.join(input_dir, f'frame_{index + 1:04d}.jpg'), quality=95)
+    output_dir = os.path.join(work_dir, 'preprocessed')
+    return {'run': lambda: preprocess.preprocess_frames(input_dir, output_dir, os.path.join(work_dir, 'preprocess.json')),
+            'items': count, 'unit': 'frames'}
+
+def setup_point_filter(work_dir, scale):
+    count = max(pointcloud.MIN_OUTPUT_POINTS * 10, int(MICRO_SIZES['dense_points'] * scale))
+    ply = os.path.join(work_dir, 'scene_dense.ply')
+    fake_tools.write_dense_cloud(ply, count, 60)
+    return {'run': lambda: pointcloud.filter_point_cloud(ply, os.path.join(work_dir, 'filtered.ply'),
+                                                         os.path.join(work_dir, 'point_filter.json'), up=[0.0, 0.0, 1.0]),
+            'items': count, 'unit': 'points'}
+
+def _textured_obj(work_dir, scale):
+    # Shared by the mesh benchmarks: it is written in their common parent directory
+    obj_path = os.path.join(os.path.dirname(work_dir), 'scene_textured_mesh.obj')
+    if not os.path.exists(obj_path):
+        fake_tools.write_textured_mesh(obj_path, {'face_count': max(1000, int(MICRO_SIZES['mesh_faces'] * scale))})
+    return obj_path
+
+def setup_obj_read(work_dir, scale):
+    obj_path = _textured_obj(work_dir, scale)
+    return {'run': lambda: obj_io.read_obj(obj_path), 'items': obj_io.read_obj(obj_path).face_count, 'unit': 'faces'}
+
+def setup_mesh_cleanup(work_dir, scale):
+    mesh = obj_io.read_obj(_textured_obj(work_dir, scale))
+    return {'prepare': mesh.copy, 'run': mesh_cleanup.cleanup_mesh, 'items': mesh.face_count, 'unit': 'faces'}
+
+def setup_decimate(work_dir, scale):
+    mesh = obj_io.read_obj(_textured_obj(work_dir, scale))
+    mesh_cleanup.cleanup_mesh(mesh)
+
+    def prepare():
+        copy = mesh.copy()
+        copy.widen()
+        return copy
+    return {'prepare': prepare, 'run': lambda copy: decimate.decimate(copy, copy.face_count // 4),
+            'items': mesh.face_count, 'unit': 'faces'}
+
+def setup_glb_export(work_dir, scale):
+    obj_path = _textured_obj(work_dir, scale)
+    return {'run': lambda: glb_writer.obj_to_glb(obj_path, os.path.join(work_dir, 'scene.glb')),
+            'items': obj_io.read_obj(obj_path).face_count, 'unit': 'faces'}
+
+MICRO_BENCHMARKS = {
+    'validate_colmap_output': setup_validate_colmap_output,
+    'keyframe_scoring': setup_keyframe_scoring,
+    'preprocess_frames': setup_preprocess_frames,
+    'point_filter': setup_point_filter,
+    'obj_read': setup_obj_read,
+    'mesh_cleanup': setup_mesh_cleanup,
+    'decimate': setup_decimate,
+    'glb_export': setup_glb_export,
+}
+
+def render_gray(angle, width):
+    height = width * 9 // 16
+    return np.asarray(Image.fromarray(synthetic_capture.render_frame(angle, width, height)).convert('L'))
+
+def run_micro_benchmark(name, work_dir, scale=1.0, repeats=3):
+    """
+    Times one micro-benchmark: the best wall time of repeats runs, then the peak memory
+    allocated (Python and NumPy, traced with tracemalloc) during one more run. Memory of
+    worker processes (preprocess_frames) is not included.
+
+    Returns:
+        dict: {'wall_seconds', 'peak_memory_bytes', 'items', 'unit', 'throughput'}
+    """
+    bench_dir = os.path.join(work_dir, name)
+    os.makedirs(bench_dir, exist_ok=True)
+    # Output of the code under test (progress messages) is not part of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        bench = MICRO_BENCHMARKS[name](bench_dir, scale)
+        prepare = bench.get('prepare')
+
+        def call(arguments):
+            started = time.perf_counter()
+            bench['run'](*arguments)
+            return time.perf_counter() - started
+
+        timings = [call([prepare()] if prepare else []) for _ in range(repeats)]
+        arguments = [prepare()] if prepare else []
+        tracemalloc.start()
+        try:
+            call(arguments)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    wall = min(timings)
+    return {'wall_seconds': round(wall, 4), 'peak_memory_bytes': int(peak), 'items': int(bench['items']),
+            'unit': bench['unit'], 'throughput': round(bench['items'] / wall, 1) if wall > 0 else None}
+
+# --- Pipeline benchmark ---
+
+def capture_video(work_dir, size, seconds, fps):
+    """
+    Returns the synthetic capture for these settings, rendering it on first use.
+    """
+    path = os.path.join(work_dir, f'capture-{size}-{seconds:g}s-{fps}fps.mp4')
+    if not os.path.exists(path):
+        print(f"Rendering the synthetic capture ({size}, {seconds:g}s at {fps} fps)...")
+        synthetic_capture.write_video(path, size, seconds, fps)
+    return path
+
+def _pipeline_job(argv, bin_dir, tool_delay, log_path):
+    """
+    Runs one pipeline job in a fresh process (see run_pipeline_benchmark) and returns the
+    peak RSS of this process during each stage that ran.
+    """
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ[fake_tools.DELAY_ENV] = str(tool_delay)
+
+    peaks = {}
+    @contextlib.contextmanager
+    def measure(stage):
+        reset_peak_rss()
+        try:
+            yield
+        finally:
+            peaks[stage] = peak_rss()
+
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        pipeline.run_pipeline(pipeline.parse_args(argv), job_id='benchmark', stage_slot=measure)
+    return peaks
+
+def measure_pipeline_run(work_dir, video_path, options, tool_delay):
+    """
+    Runs the whole pipeline once on a capture with the stand-in tools and reads the
+    per-stage measurements from its trace.
+
+    The job runs in a freshly started process, so its memory peaks are its own. The peak
+    memory of a stage is the larger of the pipeline process's peak during the stage and
+    the peak of the stage's commands.
+
+    Returns:
+        dict: {stage: {'wall_seconds', 'peak_memory_bytes', 'items', 'unit', 'throughput'}},
+            plus 'total' for the whole job.
+    """
+    job_dir = os.path.join(work_dir, 'pipeline')
+    shutil.rmtree(job_dir, ignore_errors=True)
+    bin_dir = fake_tools.install(os.path.join(work_dir, 'bin'))
+    workspace = os.path.join(job_dir, 'workspace')
+    argv = ['--workspace', workspace, '--video_input', video_path, '--output_dir', os.path.join(job_dir, 'output'),
+            '--openmvs', bin_dir] + shlex.split(options)
+
+    log_path = os.path.join(work_dir, 'pipeline.log')
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        try:
+            peaks = pool.apply(_pipeline_job, (argv, bin_dir, tool_delay, log_path))
+        except Exception as e:
+            raise RuntimeError(f"The benchmark pipeline failed ({e}); see {log_path}")
+    total_wall = time.perf_counter() - started
+
+    with open(os.path.join(workspace, 'trace.json'), 'r') as f:
+        trace = json.load(f)
+    images = None
+    quality_report = os.path.join(workspace, 'quality.json')
+    if os.path.exists(quality_report):
+        with open(quality_report, 'r') as f:
+            images = json.load(f)['metrics']['input_images']
+
+    results = {}
+    for stage in trace['stages']:
+        if stage['status'] != 'ran':
+            continue
+        tool_peak = max((command.get('max_rss_bytes', 0) for command in stage['commands']), default=0)
+        entry = {'wall_seconds': stage['wall_seconds'], 'peak_memory_bytes': max(tool_peak, peaks.get(stage['stage'], 0))}
+        # Image stages report images per second; the others only their time
+        if images and stage['commands'] and stage['stage'].split('/')[-1] in ('frames', 'sfm', 'undistort', 'densify'):
+            entry.update(items=images, unit='images',
+                         throughput=round(images / stage['wall_seconds'], 2) if stage['wall_seconds'] > 0 else None)
+        results[stage['stage']] = entry
+    results['total'] = {'wall_seconds': round(total_wall, 3),
+                        'peak_memory_bytes': max(entry['peak_memory_bytes'] for entry in results.values())}
+    return results
+
+def run_pipeline_benchmark(work_dir, video_path, options=DEFAULT_PIPELINE_OPTIONS, tool_delay=0.0, repeats=1):
+    """
+    Runs the pipeline benchmark repeats times (see measure_pipeline_run) and keeps the best
+    time and the lowest memory peak of every stage.
+
+    Returns:
+        dict: As measure_pipeline_run.
+    """
+    results = {}
+    for _ in range(repeats):
+        for stage, entry in measure_pipeline_run(work_dir, video_path, options, tool_delay).items():
+            best = results.setdefault(stage, entry)
+            best['peak_memory_bytes'] = min(best['peak_memory_bytes'], entry['peak_memory_bytes'])
+            if entry['wall_seconds'] < best['wall_seconds']:
+                best.update({key: entry[key] for key in ('wall_seconds', 'throughput') if key in entry})
+    return results
+
+# --- Baseline comparison ---
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with a baseline of the same configuration.
+
+    Returns:
+        list: One dict per metric present in both ('section', 'name', 'metric', 'baseline',
+            'current', 'change', 'regressed'), where change is the relative difference.
+    """
+    rows = []
+    for section in ('micro', 'pipeline'):
+        for name, entry in results.get(section, {}).items():
+            reference = baseline.get(section, {}).get(name)
+            if not reference:
+                continue
+            for metric, noise in (('wall_seconds', MIN_TIME_DELTA[section]), ('peak_memory_bytes', MIN_MEMORY_DELTA)):
+                if not reference.get(metric) or entry.get(metric) is None:
+                    continue
+                change = entry[metric] / reference[metric] - 1.0
+                regressed = change > tolerance and entry[metric] - reference[metric] > noise
+                rows.append({'section': section, 'name': name, 'metric': metric, 'baseline': reference[metric],
+                             'current': entry[metric], 'change': round(change, 4), 'regressed': regressed})
+    return rows
+
+def print_results(results, comparison):
+    changes = {(row['section'], row['name'], row['metric']): row for row in comparison}
+    def change(section, name, metric):
+        row = changes.get((section, name, metric))
+        if row is None:
+            return ''
+        return f"{row['change']:+.0%}" + (' !' if row['regressed'] else '')
+
+    print(f"\n{'benchmark':<34}{'seconds':>10}{'change':>9}{'peak MB':>10}{'change':>9}{'throughput':>18}")
+    for section in ('micro', 'pipeline'):
+        for name, entry in results.get(section, {}).items():
+            throughput = f"{entry['throughput']:,.0f} {entry['unit']}/s" if entry.get('throughput') else ''
+            print(f"{section + '/' + name:<34}{entry['wall_seconds']:>10.3f}{change(section, name, 'wall_seconds'):>9}"
+                  f"{entry['peak_memory_bytes'] / 2 ** 20:>10.1f}{change(section, name, 'peak_memory_bytes'):>9}{throughput:>18}")
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def main():
+    """
+    Command-line entry point:
+
+        python benchmark.py [--suite all|micro|pipeline] [--only name ...] [--scale 1] [--repeats 3]
+                            [--baseline path] [--save-baseline] [--tolerance 0.25] [--output results.json]
+
+    Exits with status 2 if a metric regressed against the baseline. With --baseline, the comparison
+    is required: the run stops with status 1 before benchmarking if that baseline is missing or was
+    recorded with other settings. Without it, benchmark_baseline.json is compared against only if present.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the photogrammetry pipeline offline, with synthetic captures and stand-in tools.")
+    parser.add_argument('--suite', choices=SUITES, default='all', help='Which benchmarks to run (default: all).')
+    parser.add_argument('--only', nargs='+', choices=list(MICRO_BENCHMARKS), help='Run only these micro-benchmarks.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Size of the micro-benchmark inputs relative to a standard job (default: 1).')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per micro-benchmark; the best time is reported (default: 3).')
+    parser.add_argument('--video', help='Capture for the pipeline benchmark (default: a rendered synthetic turntable video).')
+    parser.add_argument('--video-size', default=synthetic_capture.DEFAULT_SIZE, help=f'Frame size of the synthetic capture (default: {synthetic_capture.DEFAULT_SIZE}).')
+    parser.add_argument('--video-seconds', type=float, default=synthetic_capture.DEFAULT_SECONDS, help=f'Length of the synthetic capture (default: {synthetic_capture.DEFAULT_SECONDS}).')
+    parser.add_argument('--video-fps', type=int, default=synthetic_capture.DEFAULT_FPS, help=f'Frame rate of the synthetic capture (default: {synthetic_capture.DEFAULT_FPS}).')
+    parser.add_argument('--pipeline-options', default=DEFAULT_PIPELINE_OPTIONS, help=f'Extra main.py options for the pipeline run (default: "{DEFAULT_PIPELINE_OPTIONS}").')
+    parser.add_argument('--pipeline-repeats', type=int, default=1, help='Pipeline runs; the best time of each stage is reported (default: 1).')
+    parser.add_argument('--tool-delay', type=float, default=0.0, help='Simulated work of the stand-in tools, in seconds per image (default: 0).')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'photogrammetry_benchmark'), help='Directory for inputs and outputs; the rendered capture is reused from here (default: in the system temporary directory).')
+    parser.add_argument('--baseline', help='Baseline results to compare against; a missing baseline or one recorded with other settings is an error (default: benchmark_baseline.json next to this script, compared against only if present).')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline instead of comparing.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help=f'Relative slowdown or memory growth that counts as a regression (default: {DEFAULT_TOLERANCE}).')
+    parser.add_argument('--output', help='Also write the results as JSON to this path.')
+    args = parser.parse_args()
+    if args.repeats < 1 or args.pipeline_repeats < 1:
+        parser.error("--repeats and --pipeline-repeats must be at least 1.")
+    if args.scale <= 0:
+        parser.error("--scale must be positive.")
+
+    config = {'scale': args.scale, 'video': args.video or f'{args.video_size}-{args.video_seconds:g}s-{args.video_fps}fps',
+              'pipeline_options': args.pipeline_options, 'tool_delay': args.tool_delay}
+    # A baseline named with --baseline must be compared against, so the run fails up front
+    # (status 1; 2 means a regression) rather than passing without a comparison
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    baseline = None
+    if not args.save_baseline:
+        if os.path.exists(baseline_path):
+            with open(baseline_path, 'r') as f:
+                baseline = json.load(f)
+        elif args.baseline:
+            print(f"ERROR: No baseline at {args.baseline}; run with --save-baseline to record one.", file=sys.stderr)
+            sys.exit(1)
+        if baseline is not None and baseline.get('config') != config:
+            message = f"The baseline {baseline_path} was recorded with other settings ({baseline.get('config')})"
+            if args.baseline:
+                print(f"ERROR: {message}; record one for these settings with --save-baseline.", file=sys.stderr)
+                sys.exit(1)
+            print(f"Warning: {message}; not comparing.", file=sys.stderr)
+            baseline = None
+    results = {'environment': environment(), 'config': config, 'micro': {}, 'pipeline': {}}
+    os.makedirs(args.work_dir, exist_ok=True)
+    try:
+        if args.suite in ('all', 'micro'):
+            micro_dir = os.path.join(args.work_dir, 'micro')
+            shutil.rmtree(micro_dir, ignore_errors=True)
+            for name in args.only or MICRO_BENCHMARKS:
+                print(f"Running micro-benchmark '{name}'...")
+                results['micro'][name] = run_micro_benchmark(name, micro_dir, scale=args.scale, repeats=args.repeats)
+            shutil.rmtree(micro_dir, ignore_errors=True)
+        if args.suite in ('all', 'pipeline'):
+            video = args.video or capture_video(args.work_dir, args.video_size, args.video_seconds, args.video_fps)
+            print("Running the pipeline with the stand-in tools...")
+            results['pipeline'] = run_pipeline_benchmark(args.work_dir, video, args.pipeline_options, args.tool_delay,
+                                                         repeats=args.pipeline_repeats)
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    comparison = []
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to: {baseline_path}")
+    elif baseline is not None:
+        if baseline.get('environment') != results['environment']:
+            print("Warning: The baseline was recorded on another machine or software versions; "
+                  "differences may not be regressions.", file=sys.stderr)
+        comparison = compare(results, baseline, args.tolerance)
+    elif not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; results not compared (run with --save-baseline to record one).")
+
+    results['comparison'] = comparison
+    print_results(results, comparison)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    regressions = [row for row in comparison if row['regressed']]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:", file=sys.stderr)
+        for row in regressions:
+            print(f"  {row['section']}/{row['name']} {row['metric']}: {row['baseline']} -> {row['current']} "
+                  f"({row['change']:+.0%})", file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import json
+import os
+import subprocess
+import threading
+import time
+
+# Must match obj_to_glb_cleanup.SERVER_REPLY_PREFIX (that module imports bpy, so it cannot be imported here)
+REPLY_PREFIX = '@@obj_to_glb@@ '
+
+class BlenderServerUnavailable(RuntimeError):
+    """
+    Raised when the server process cannot be started or exits before replying; the job
+    itself may be fine, so callers fall back to a one-shot Blender run.
+    """
+
+class BlenderServer:
+    """
+    A persistent `blender --background --python obj_to_glb_cleanup.py -- --serve` process
+    that converts OBJ files to GLB one job at a time.
+
+    Blender's start-up, factory settings, glTF add-on and operator scan are paid once, when
+    the first job arrives; afterwards each job only pays for the conversion itself and a
+    scene reset. Jobs from several threads are serialized. If the process dies it is
+    restarted for the next job.
+    """
+
+    def __init__(self, blender='blender'):
+        """
+        Args:
+            blender (str, optional): Blender executable. Defaults to 'blender' (on PATH).
+        """
+        self.blender = blender
+        self.script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'obj_to_glb_cleanup.py')
+        self.process = None
+        self.lock = threading.RLock()
+        self.jobs_done = 0
+        self.startup_seconds = None
+
+    def _read_reply(self):
+        """
+        Reads the server's output up to its next reply, echoing everything else.
+        """
+        for line in self.process.stdout:
+            if line.startswith(REPLY_PREFIX):
+                return json.loads(line[len(REPLY_PREFIX):])
+            print(line, end='')
+        self.process.wait()
+        self.process = None
+        raise BlenderServerUnavailable("the Blender server exited unexpectedly")
+
+    def _start(self):
+        command = [self.blender, '--background', '--python', self.script, '--', '--serve']
+        started = time.monotonic()
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        except OSError as e:
+            raise BlenderServerUnavailable(f"could not start Blender: {e}")
+        reply = self._read_reply()
+        self.startup_seconds = round(time.monotonic() - started, 3)
+        print(f"Blender server ready (Blender {reply.get('blender_version')}, started in {self.startup_seconds:.1f}s)")
+
+    def convert(self, obj_path, glb_path, skip_cleanup=False, cleanup_mode='operators'):
+        """
+        Converts one OBJ file to GLB in the server process, starting it if needed.
+
+        Args:
+            obj_path (str): Path to the input OBJ file.
+            glb_path (str): Path for the output GLB file.
+            skip_cleanup (bool, optional): The mesh was already cleaned. Defaults to False.
+            cleanup_mode (str, optional): 'operators' or 'bmesh' (see obj_to_glb_cleanup.convert). Defaults to 'operators'.
+
+        Returns:
+            dict: The server's reply: per-step 'steps' (as in the one-shot trace) and 'wall_seconds'.
+
+        Raises:
+            BlenderServerUnavailable: If the server could not be started or died during the job.
+            RuntimeError: If the conversion failed.
+        """
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self.jobs_done += 1
+            job = {
+                'id': self.jobs_done,
+                'input_obj': os.path.abspath(obj_path),
+                'output_glb': os.path.abspath(glb_path),
+                'skip_cleanup': skip_cleanup,
+                'cleanup_mode': cleanup_mode,
+            }
+            try:
+                self.process.stdin.write(json.dumps(job) + '\n')
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self.close()
+                raise BlenderServerUnavailable(f"could not send the job to Blender: {e}")
+            reply = self._read_reply()
+        if not reply['ok']:
+            raise RuntimeError(f"Blender conversion failed: {reply['error']}")
+        return reply
+
+    def close(self, timeout=30):
+        """
+        Stops the server process (closing its stdin ends its job loop), after the job in progress.
+        """
+        with self.lock:
+            process, self.process = self.process, None
+            if process is None:
+                return
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,287 @@
+import glob
+import hashlib
+import json
+import os
+import tarfile
+import time
+
+# Directory (inside the workspace) that holds one manifest per completed stage
+CHECKPOINT_DIR_NAME = 'checkpoints'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_path(path):
+    """
+    Returns a content digest for a file or a directory tree.
+    Directory digests cover every file's relative path and contents, in sorted order.
+    """
+    if os.path.isfile(path):
+        return hash_file(path)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Cannot hash missing path: {path}")
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            rel_path = os.path.relpath(file_path, path).replace(os.sep, '/')
+            digest.update(rel_path.encode('utf-8'))
+            digest.update(hash_file(file_path).encode('ascii'))
+    return digest.hexdigest()
+
+def hash_params(params):
+    """
+    Returns a stable digest of a JSON-serializable parameter dict.
+    """
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+def hash_inputs(paths, hash_fn=hash_path):
+    """
+    Returns {name: digest} for a stage's input files, named by their base names. Inputs that
+    share a base name (e.g. several uploads all called video.mp4) are told apart by their position.
+    """
+    names = [os.path.basename(path) for path in paths]
+    return {(name if names.count(name) == 1 else f'{index}:{name}'): hash_fn(path)
+            for index, (name, path) in enumerate(zip(names, paths))}
+
+def stat_signature(path):
+    """
+    Cheap fingerprint (size and modification time) of a file or directory tree,
+    used to notice outputs that were changed or deleted after their manifest was written.
+    """
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    total_size = 0
+    latest_mtime = 0
+    file_count = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            total_size += st.st_size
+            latest_mtime = max(latest_mtime, st.st_mtime_ns)
+            file_count += 1
+    return [total_size, latest_mtime, file_count]
+
+def extract_archive(tar, target_dir):
+    """
+    Extracts a tar archive, with the 'tar' extraction filter where tarfile has them (Python
+    3.12, and 3.8-3.11 patch releases from 2023). The archives are the pipeline's own.
+    """
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(target_dir, filter='tar')
+    else:
+        tar.extractall(target_dir)
+
+class CheckpointStore:
+    """
+    Records a manifest for every completed pipeline stage and skips stages whose
+    manifest still matches.
+
+    A stage's input digest covers its parameters, the contents of its external input
+    files, and the output digests of the stages it depends on, so a change anywhere
+    upstream invalidates everything downstream of it. Outputs are hashed once when
+    the stage finishes; later runs only check that they still exist unchanged.
+
+    Outputs may be released (deleted, or moved into an archive) once nothing needs them
+    any more (see storage.py). Released outputs do not invalidate their stage; when a
+    stage that reads them has to run again, they are brought back first, from their
+    archives or by re-running the stage that made them.
+    """
+
+    def __init__(self, workspace, stages, resume_from=None, force=()):
+        """
+        Args:
+            workspace (str): Job workspace; manifests are written to <workspace>/checkpoints.
+            stages (list): Stage names in pipeline order.
+            resume_from (str, optional): Re-run this stage and every later one, trusting the
+                manifests of the earlier stages without re-checking their inputs. Defaults to None.
+            force (iterable, optional): Stage names to re-run even if their manifest matches. Defaults to ().
+        """
+        self.checkpoint_dir = os.path.join(workspace, CHECKPOINT_DIR_NAME)
+        self.stages = list(stages)
+        self.force = set(force or ())
+        for stage in self.force | ({resume_from} if resume_from else set()):
+            if stage not in self.stages:
+                raise ValueError(f"Unknown pipeline stage '{stage}'. Valid stages: {', '.join(self.stages)}")
+        self.resume_index = self.stages.index(resume_from) if resume_from else None
+        # Arguments of every stage seen in this run, so a stage can be re-run to recreate released outputs
+        self.calls = {}
+        # Stages whose outputs this run wrote or brought back (the only outputs it may release)
+        self.produced = set()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+    def manifest_path(self, stage):
+        return os.path.join(self.checkpoint_dir, f'{stage}.json')
+
+    def load(self, stage):
+        """
+        Returns the manifest dict for a stage, or None if it has not completed.
+        """
+        path = self.manifest_path(stage)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write(self, stage, manifest):
+        with open(self.manifest_path(stage), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def invalidate(self, stage):
+        """
+        Removes a stage's manifest so it runs again.
+        """
+        path = self.manifest_path(stage)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def input_digest(self, stage, inputs=(), params=None, deps=()):
+        """
+        Computes the digest that identifies one execution of a stage.
+        """
+        dep_digests = {}
+        for dep in deps:
+            manifest = self.load(dep)
+            if manifest is None:
+                raise RuntimeError(f"Stage '{stage}' depends on '{dep}', which has not completed.")
+            dep_digests[dep] = manifest['output_digest']
+        return hash_params({
+            'stage': stage,
+            'params': params or {},
+            'inputs': hash_inputs(list(inputs)),
+            'deps': dep_digests,
+        })
+
+    def _outputs_unchanged(self, manifest):
+        released = manifest.get('released', {})
+        for path, signature in manifest['outputs'].items():
+            if path in released:
+                continue
+            if not os.path.exists(path) or stat_signature(path) != signature:
+                return False
+        return True
+
+    def release(self, stage, path, archive=None):
+        """
+        Records that an output of a completed stage was deleted, or moved into a tar archive.
+        """
+        manifest = self.load(stage)
+        if manifest is None:
+            raise RuntimeError(f"Cannot release an output of stage '{stage}', which has not completed.")
+        manifest.setdefault('released', {})[path] = archive
+        self._write(stage, manifest)
+
+    def restore(self, stage):
+        """
+        Brings back the released outputs of a completed stage: extracts them if all of them
+        were archived, otherwise re-runs the stage (as last called in this run).
+        """
+        manifest = self.load(stage)
+        released = manifest.get('released') if manifest else None
+        if not released:
+            return
+        if all(archive and os.path.exists(archive) for archive in released.values()):
+            for path, archive in released.items():
+                with tarfile.open(archive, 'r:*') as tar:
+                    extract_archive(tar, os.path.dirname(path))
+                os.remove(archive)
+            del manifest['released']
+            self._write(stage, manifest)
+            self.produced.add(stage)
+            print(f"Restored the released outputs of stage '{stage}' from their archives.")
+            return
+        if stage not in self.calls:
+            raise RuntimeError(f"The outputs of stage '{stage}' were deleted and the stage is not part of this run; "
+                               f"re-run it with --force {stage}.")
+        print(f"Re-running stage '{stage}' to recreate its deleted outputs.")
+        call = self.calls[stage]
+        self._execute(stage, call['fn'], call['inputs'], call['params'], call['deps'], call['outputs'])
+
+    def forced(self, stage):
+        """
+        Whether a stage must run in this run whatever its checkpoint says (--force, or at or after --resume-from).
+        """
+        return stage in self.force or (self.resume_index is not None and self.stages.index(stage) >= self.resume_index)
+
+    def run(self, stage, fn, inputs=(), params=None, deps=(), outputs=()):
+        """
+        Runs a stage unless a matching manifest shows it already completed.
+
+        Args:
+            stage (str): Stage name (must be one of the store's stages).
+            fn (callable): Function that performs the stage.
+            inputs (iterable, optional): External input files or directories whose contents feed the stage.
+            params (dict, optional): Parameters that affect the stage's outputs.
+            deps (iterable, optional): Names of upstream stages whose outputs feed this stage.
+            outputs (iterable, optional): Paths or glob patterns of the files the stage produces.
+
+        Returns:
+            bool: True if the stage ran, False if it was skipped.
+        """
+        stage_index = self.stages.index(stage)
+        manifest = self.load(stage)
+        self.calls[stage] = {'fn': fn, 'inputs': inputs, 'params': params, 'deps': deps, 'outputs': outputs}
+
+        if self.resume_index is not None and stage_index < self.resume_index:
+            if manifest is None or not self._outputs_unchanged(manifest):
+                raise RuntimeError(f"Cannot resume: stage '{stage}' has no valid checkpoint in {self.checkpoint_dir}.")
+            print(f"Skipping stage '{stage}' (before --resume-from).")
+            return False
+
+        forced = self.forced(stage)
+        digest = self.input_digest(stage, inputs=inputs, params=params, deps=deps)
+        if (not forced and manifest is not None and manifest['input_digest'] == digest
+                and self._outputs_unchanged(manifest)):
+            print(f"Skipping stage '{stage}': checkpoint matches (completed {manifest['completed_at']}).")
+            return False
+
+        self._execute(stage, fn, inputs, params, deps, outputs)
+        return True
+
+    def _execute(self, stage, fn, inputs, params, deps, outputs):
+        # The stage reads its dependencies' outputs, so released ones must come back first
+        for dep in deps:
+            self.restore(dep)
+        digest = self.input_digest(stage, inputs=inputs, params=params, deps=deps)
+        # Archives of the previous outputs would be stale once the stage runs again
+        for archive in ((self.load(stage) or {}).get('released') or {}).values():
+            if archive and os.path.exists(archive):
+                os.remove(archive)
+        # Remove the old manifest first so an interrupted run is never mistaken for a completed one
+        self.invalidate(stage)
+        started = time.time()
+        fn()
+        elapsed = time.time() - started
+
+        output_paths = []
+        for pattern in outputs:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"Stage '{stage}' did not produce expected output: {pattern}")
+            output_paths.extend(matches)
+
+        output_digest = hash_params({os.path.basename(p): hash_path(p) for p in output_paths})
+        manifest = {
+            'stage': stage,
+            'input_digest': digest,
+            'output_digest': output_digest,
+            'params': params or {},
+            'deps': list(deps),
+            'outputs': {p: stat_signature(p) for p in output_paths},
+            'duration_seconds': round(elapsed, 3),
+            'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        self._write(stage, manifest)
+        self.produced.add(stage)
+        print(f"Checkpoint written for stage '{stage}' ({elapsed:.1f}s).")
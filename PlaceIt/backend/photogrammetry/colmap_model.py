@@ -0,0 +1,660 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# COLMAP camera model id -> (name, number of parameters)
+CAMERA_MODELS = {
+    0: ('SIMPLE_PINHOLE', 3),
+    1: ('PINHOLE', 4),
+    2: ('SIMPLE_RADIAL', 4),
+    3: ('RADIAL', 5),
+    4: ('OPENCV', 8),
+    5: ('OPENCV_FISHEYE', 8),
+    6: ('FULL_OPENCV', 12),
+    7: ('FOV', 5),
+    8: ('SIMPLE_RADIAL_FISHEYE', 4),
+    9: ('RADIAL_FISHEYE', 5),
+    10: ('THIN_PRISM_FISHEYE', 12),
+    11: ('RAD_TAN_THIN_PRISM_FISHEYE', 16),
+}
+CAMERA_MODEL_IDS = {name: model_id for model_id, (name, _) in CAMERA_MODELS.items()}
+MAX_CAMERA_PARAMS = max(n for _, n in CAMERA_MODELS.values())
+
+CAMERA_DTYPE = np.dtype([
+    ('camera_id', '<i4'),
+    ('model_id', '<i4'),
+    ('width', '<u8'),
+    ('height', '<u8'),
+    ('num_params', '<i4'),
+    ('params', '<f8', (MAX_CAMERA_PARAMS,)),
+])
+
+IMAGE_DTYPE = np.dtype([
+    ('image_id', '<i4'),
+    ('qvec', '<f8', (4,)),
+    ('tvec', '<f8', (3,)),
+    ('camera_id', '<i4'),
+    ('num_points2D', '<i8'),
+    ('num_observations', '<i8'),
+])
+
+# On-disk layout of one 2D point in images.bin
+POINT2D_DTYPE = np.dtype([
+    ('xy', '<f8', (2,)),
+    ('point3D_id', '<i8'),
+])
+
+# Mirrors the on-disk head of a points3D.bin record (padded to whole 8-byte words),
+# so records can be gathered straight into this dtype without reshuffling fields.
+POINT3D_DTYPE = np.dtype({
+    'names': ['point3D_id', 'xyz', 'rgb', 'error', 'track_length'],
+    'formats': ['<i8', ('<f8', (3,)), ('u1', (3,)), '<f8', '<i8'],
+    'offsets': [0, 8, 32, 35, 43],
+    'itemsize': 56,
+})
+
+TRACK_DTYPE = np.dtype([
+    ('image_id', '<i4'),
+    ('point2D_idx', '<i4'),
+])
+
+# Size of the fixed-size head of a points3D.bin record; it is followed on disk by
+# track_length (image_id, point2D_idx) pairs
+POINT3D_RECORD_HEAD = 51
+
+# Records are gathered in chunks to bound the memory of the temporary index arrays
+GATHER_CHUNK = 1 << 18
+
+# points3D.bin is walked in segments of about this many records side by side, and each
+# segment's first record is looked for within this many bytes of the segment's start
+SCAN_SEGMENT_RECORDS = 1024
+SCAN_WINDOW = 512
+
+class ColmapModel:
+    """
+    A COLMAP sparse model held in NumPy structured arrays.
+
+    Attributes:
+        cameras (numpy.ndarray): CAMERA_DTYPE array, one row per camera.
+        images (numpy.ndarray): IMAGE_DTYPE array, one row per registered image.
+        image_names (list): Image file names, parallel to images.
+        points2D (numpy.ndarray): POINT2D_DTYPE array of every image's 2D points, concatenated.
+        points2D_offsets (numpy.ndarray): Start of each image's slice of points2D (length images + 1).
+        points3D (numpy.ndarray or None): POINT3D_DTYPE array, one row per 3D point, if read.
+        point_counts (tuple): (3D points, observations), also known when points3D is not read.
+        tracks (numpy.ndarray or None): TRACK_DTYPE array of every track, concatenated, if read.
+        track_offsets (numpy.ndarray or None): Start of each point's slice of tracks (length points3D + 1).
+    """
+
+    def __init__(self, cameras, images, image_names, points2D, points2D_offsets, points3D,
+                 tracks=None, track_offsets=None, point_counts=None):
+        self.cameras = cameras
+        self.images = images
+        self.image_names = image_names
+        self.points2D = points2D
+        self.points2D_offsets = points2D_offsets
+        self.points3D = points3D
+        self.tracks = tracks
+        self.track_offsets = track_offsets
+        if point_counts is None:
+            point_counts = (len(points3D), int(points3D['track_length'].sum()))
+        self.point_counts = point_counts
+
+    @property
+    def num_images(self):
+        return len(self.images)
+
+    @property
+    def num_points3D(self):
+        return self.point_counts[0]
+
+    def camera_centers(self):
+        """
+        Returns the (images, 3) array of camera centers in world coordinates, C = -R^T t.
+        """
+        rotations = qvec_to_rotmat(self.images['qvec'])
+        return -np.einsum('nji,nj->ni', rotations, self.images['tvec'])
+
+    def up_direction(self):
+        """
+        Returns the scene's up direction as a unit vector: the mean of the cameras' up axes
+        (image y points down), or, when the cameras are not held upright consistently, the
+        normal of the plane their centers lie closest to.
+        """
+        up = -qvec_to_rotmat(self.images['qvec'])[:, 1, :].mean(axis=0)
+        if np.linalg.norm(up) < 0.5:
+            centers = self.camera_centers()
+            up = np.linalg.svd(centers - centers.mean(axis=0))[2][-1]
+        return up / np.linalg.norm(up)
+
+    def mean_track_length(self):
+        count, observations = self.point_counts
+        return observations / count if count else 0.0
+
+    def mean_reprojection_error(self):
+        """
+        Mean reprojection error in pixels over the points that have one (COLMAP stores -1 otherwise).
+        """
+        if self.points3D is None:
+            raise ValueError("The reprojection error needs a model read with include_points=True.")
+        errors = self.points3D['error']
+        errors = errors[errors >= 0]
+        return float(errors.mean()) if len(errors) else 0.0
+
+    def select_points3D(self, keep):
+        """
+        Returns a model with only the 3D points where keep is True. The 2D points that
+        observed a removed point are kept, unassigned (point3D_id -1). Needs the tracks.
+
+        Args:
+            keep (numpy.ndarray): (points3D,) boolean mask.
+        """
+        if self.tracks is None:
+            raise ValueError("Selecting 3D points needs a model read with include_tracks=True.")
+        keep = np.asarray(keep, dtype=bool)
+        lengths = self.points3D['track_length']
+        track_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=track_offsets[1:])
+        points2D = self.points2D.copy()
+        removed = np.isin(points2D['point3D_id'], self.points3D['point3D_id'][~keep])
+        points2D['point3D_id'][removed] = -1
+        images = self.images.copy()
+        assigned = np.concatenate([[0], np.cumsum(points2D['point3D_id'] != -1)])
+        images['num_observations'] = assigned[self.points2D_offsets[1:]] - assigned[self.points2D_offsets[:-1]]
+        return ColmapModel(self.cameras, images, self.image_names, points2D, self.points2D_offsets,
+                           self.points3D[keep], self.tracks[np.repeat(keep, lengths)], track_offsets)
+
+    def summary(self):
+        """
+        Returns the headline statistics of the model as a JSON-serializable dict.
+        """
+        return {
+            'num_cameras': int(len(self.cameras)),
+            'num_registered_images': int(self.num_images),
+            'num_points3D': int(self.num_points3D),
+            'num_observations': int(self.point_counts[1]),
+            'mean_track_length': round(self.mean_track_length(), 4),
+            'mean_reprojection_error': round(self.mean_reprojection_error(), 4),
+        }
+
+def qvec_to_rotmat(qvec):
+    """
+    Converts (..., 4) COLMAP quaternions (w, x, y, z) to (..., 3, 3) rotation matrices.
+    """
+    qvec = np.asarray(qvec, dtype=np.float64)
+    qvec = qvec / np.linalg.norm(qvec, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(qvec, -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * y * y - 2 * z * z, 2 * x * y - 2 * w * z, 2 * x * z + 2 * w * y], axis=-1),
+        np.stack([2 * x * y + 2 * w * z, 1 - 2 * x * x - 2 * z * z, 2 * y * z - 2 * w * x], axis=-1),
+        np.stack([2 * x * z - 2 * w * y, 2 * y * z + 2 * w * x, 1 - 2 * x * x - 2 * y * y], axis=-1),
+    ], axis=-2)
+
+def find_model_format(model_dir):
+    """
+    Returns '.bin' or '.txt' depending on which complete COLMAP model is present in model_dir.
+    Binary is preferred, as it is COLMAP's default.
+
+    Raises:
+        FileNotFoundError: If neither a complete binary nor a complete text model is present.
+    """
+    for ext in ('.bin', '.txt'):
+        if all(os.path.exists(os.path.join(model_dir, name + ext)) for name in ('cameras', 'images', 'points3D')):
+            return ext
+    available_files = sorted(os.listdir(model_dir)) if os.path.isdir(model_dir) else []
+    raise FileNotFoundError(
+        f"COLMAP sparse reconstruction files not found in {model_dir}. "
+        f"Expected either binary (.bin) or text (.txt) format. "
+        f"Available files: {available_files}"
+    )
+
+def read_model(model_dir, include_tracks=False, include_points=True):
+    """
+    Reads a COLMAP sparse model (binary or text) into a ColmapModel.
+
+    Args:
+        model_dir (str): Directory containing cameras, images and points3D files (e.g. sparse/0).
+        include_tracks (bool, optional): Also decode every point's track elements. Defaults to False,
+            since counts and statistics only need the track lengths.
+        include_points (bool, optional): Keep the 3D points. With False (and no tracks), points3D
+            is None and only the point and observation counts are known, which a binary model gives
+            from the points3D.bin header and size without reading the records. Defaults to True.
+    """
+    ext = find_model_format(model_dir)
+    point_counts = None
+    if ext == '.bin':
+        cameras = read_cameras_binary(os.path.join(model_dir, 'cameras.bin'))
+        images, names, points2D, offsets = read_images_binary(os.path.join(model_dir, 'images.bin'))
+        points3D_path = os.path.join(model_dir, 'points3D.bin')
+        if include_points or include_tracks:
+            points3D, tracks, track_offsets = read_points3D_binary(points3D_path, include_tracks=include_tracks)
+        else:
+            points3D = tracks = track_offsets = None
+            point_counts = points3D_binary_counts(_map_file(points3D_path))
+    else:
+        cameras = read_cameras_text(os.path.join(model_dir, 'cameras.txt'))
+        images, names, points2D, offsets = read_images_text(os.path.join(model_dir, 'images.txt'))
+        points3D, tracks, track_offsets = read_points3D_text(os.path.join(model_dir, 'points3D.txt'),
+                                                             include_tracks=include_tracks)
+        if not (include_points or include_tracks):
+            point_counts = (len(points3D), int(points3D['track_length'].sum()))
+            points3D = None
+    return ColmapModel(cameras, images, names, points2D, offsets, points3D, tracks, track_offsets, point_counts)
+
+def write_model(model, model_dir, ext='.bin'):
+    """
+    Writes a ColmapModel (read with include_tracks=True) as a binary or text COLMAP model.
+
+    Args:
+        model (ColmapModel): The model.
+        model_dir (str): Directory for the cameras, images and points3D files.
+        ext (str, optional): '.bin' or '.txt'. Defaults to '.bin'.
+    """
+    if model.tracks is None:
+        raise ValueError("Writing a COLMAP model needs its tracks (read it with include_tracks=True).")
+    os.makedirs(model_dir, exist_ok=True)
+    if ext == '.bin':
+        write_cameras_binary(model.cameras, os.path.join(model_dir, 'cameras.bin'))
+        write_images_binary(model, os.path.join(model_dir, 'images.bin'))
+        write_points3D_binary(model, os.path.join(model_dir, 'points3D.bin'))
+    elif ext == '.txt':
+        write_cameras_text(model.cameras, os.path.join(model_dir, 'cameras.txt'))
+        write_images_text(model, os.path.join(model_dir, 'images.txt'))
+        write_points3D_text(model, os.path.join(model_dir, 'points3D.txt'))
+    else:
+        raise ValueError(f"Unknown COLMAP model format '{ext}'. Expected '.bin' or '.txt'.")
+
+# --- Binary format ---
+
+def _map_file(path):
+    """
+    Memory-maps a file read-only. Empty files are returned as empty bytes, which mmap cannot map.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _gather_records(buffer, offsets, record_dtype):
+    """
+    Gathers one fixed-size record at each (arbitrary, unaligned) byte offset.
+
+    record_dtype's itemsize must be a multiple of 8. Each record is fetched as a short
+    run of 8-byte words from the view of the buffer whose alignment matches its offset,
+    which keeps the gather vectorized and touches each record once.
+    """
+    words = record_dtype.itemsize // 8
+    out = np.empty((len(offsets), words), dtype='<u8')
+    views = _word_views(buffer)
+    word_range = np.arange(words)
+    for start in range(0, len(offsets), GATHER_CHUNK):
+        chunk = offsets[start:start + GATHER_CHUNK]
+        residues = chunk % 8
+        for r in range(8):
+            selected = np.flatnonzero(residues == r)
+            if not len(selected):
+                continue
+            index = ((chunk[selected] - r) // 8)[:, None] + word_range
+            # Only a record at the very end of the file can run past the last whole word
+            overrun = index[:, -1] >= len(views[r])
+            np.minimum(index, len(views[r]) - 1, out=index)
+            out[start + selected] = views[r][index]
+            for row in selected[overrun]:
+                tail = bytes(buffer[chunk[row]:]).ljust(8 * words, b'\x00')
+                out[start + row] = np.frombuffer(tail[:8 * words], dtype='<u8')
+    return out.view(record_dtype)[:, 0]
+
+def _word_views(buffer):
+    return [np.frombuffer(buffer, dtype='<u8', offset=r, count=(len(buffer) - r) // 8) for r in range(8)]
+
+def points3D_binary_counts(buffer):
+    """
+    Returns (3D points, observations) of a points3D.bin from its header and size alone:
+    every record is a POINT3D_RECORD_HEAD-byte head plus 8 bytes per track element.
+
+    Raises:
+        ValueError: If the file size does not fit the point count.
+    """
+    count = struct.unpack_from('<Q', buffer, 0)[0] if len(buffer) >= 8 else 0
+    observations, remainder = divmod(len(buffer) - 8 - POINT3D_RECORD_HEAD * count, 8)
+    if len(buffer) < 8 or observations < 0 or remainder:
+        raise ValueError(f"Corrupt COLMAP points3D.bin: {len(buffer)} bytes cannot hold {count} points.")
+    return count, observations
+
+def _next_point3D_records(words, offsets, observations):
+    """
+    Reads the points3D.bin records at the given byte offsets (each at most the file size minus
+    a record head). words holds the 8-byte word at every byte offset of the file.
+
+    Returns:
+        tuple: (plausible, following): whether each offset reads as a record start (a track
+        length from 1 to the file's observation count, a reprojection error that is
+        non-negative or -1) and the offset of the record after it.
+    """
+    errors, lengths = words[offsets + 35].view('<f8'), words[offsets + 43]
+    plausible = ((lengths - np.uint64(1) < np.uint64(observations))
+                 & (((errors >= 0) & (errors < np.inf)) | (errors == -1)))
+    # Lengths past the observation count can only overshoot the file; capping them avoids overflow
+    lengths = np.minimum(lengths, np.uint64(observations + 1)).astype(np.int64)
+    return plausible, offsets + POINT3D_RECORD_HEAD + 8 * lengths
+
+def _point3D_record_offsets(buffer, count, observations):
+    """
+    Finds the byte offset of every record in points3D.bin, walking the file in segments side by side.
+
+    Records are variable-length, so each offset depends on the previous record's track length.
+    The file is cut into segments of about SCAN_SEGMENT_RECORDS records; each segment's first
+    record is guessed as the first position near its start that reads as a record three times
+    in a row, and all segments are walked at once, one record per vectorized step. A segment
+    whose predecessor does not end exactly at its guessed start is walked again from where the
+    predecessor ended, until the segments join up.
+
+    Returns:
+        numpy.ndarray or None: The offsets, or None when the records do not tile the file or a
+            single record spans a whole segment, and for files too small to split, for the caller
+            to scan instead.
+    """
+    size = len(buffer)
+    # One (unaligned) 8-byte word starting at every byte of the file
+    words = np.ndarray(shape=(size - 7,), dtype='<u8', buffer=buffer, strides=(1,))
+    last = size - POINT3D_RECORD_HEAD
+    segments = count // SCAN_SEGMENT_RECORDS
+    if segments < 2:
+        return None
+    window = (8 + (size - 8) * np.arange(1, segments, dtype=np.int64) // segments)[:, None] + np.arange(SCAN_WINDOW)
+    offsets = window.ravel()
+    guessed = np.ones(len(offsets), dtype=bool)
+    for _ in range(3):
+        inside = offsets <= last
+        plausible, offsets = _next_point3D_records(words, np.where(inside, offsets, 8), observations)
+        guessed &= inside & plausible
+    guessed = guessed.reshape(window.shape)
+    found = guessed.any(axis=1)
+    starts = np.concatenate([[8], window[found, guessed[found].argmax(axis=1)]])
+
+    ends = np.append(starts[1:], size)
+    walked = [None] * len(starts)
+    arrived = np.zeros(len(starts), dtype=np.int64)
+    pending = np.arange(len(starts))
+    while True:
+        current, limit = starts[pending], ends[pending]
+        steps, walkers = [], np.arange(len(pending))
+        while len(walkers):
+            steps.append((walkers, current[walkers]))
+            inside = current[walkers] <= last
+            arrived[pending[walkers[~inside]]] = size + 1
+            walkers = walkers[inside]
+            current[walkers] = _next_point3D_records(words, current[walkers], observations)[1]
+            done = current[walkers] >= limit[walkers]
+            arrived[pending[walkers[done]]] = current[walkers[done]]
+            walkers = walkers[~done]
+        walker = np.concatenate([step[0] for step in steps])
+        visited = np.concatenate([step[1] for step in steps])
+        order = np.argsort(walker, kind='stable')
+        bounds = np.searchsorted(walker[order], np.arange(len(pending) + 1))
+        for index, segment in enumerate(pending):
+            walked[segment] = visited[order[bounds[index]:bounds[index + 1]]]
+
+        # The first segment starts at the first record, so every segment up to the first
+        # broken join is right. Each broken join moves the next segment's start to where its
+        # predecessor ended, which is right at least for the first one.
+        broken = np.flatnonzero(arrived[:-1] != starts[1:])
+        if not len(broken):
+            break
+        if arrived[broken[0]] >= ends[broken[0] + 1]:
+            return None
+        broken = broken[arrived[broken] < ends[broken + 1]]
+        starts[broken + 1] = arrived[broken]
+        ends = np.append(starts[1:], size)
+        pending = broken + 1
+
+    offsets = np.concatenate(walked)
+    if arrived[-1] != size or len(offsets) != count:
+        return None
+    return offsets
+
+def read_cameras_binary(path):
+    buffer = _map_file(path)
+    count = struct.unpack_from('<Q', buffer, 0)[0]
+    cameras = np.zeros(count, dtype=CAMERA_DTYPE)
+    offset = 8
+    for i in range(count):
+        camera_id, model_id, width, height = struct.unpack_from('<iiQQ', buffer, offset)
+        num_params = CAMERA_MODELS[model_id][1]
+        offset += 24
+        cameras[i] = (camera_id, model_id, width, height, num_params, np.zeros(MAX_CAMERA_PARAMS))
+        cameras['params'][i, :num_params] = np.frombuffer(buffer, '<f8', num_params, offset)
+        offset += 8 * num_params
+    return cameras
+
+def read_images_binary(path):
+    """
+    Reads images.bin.
+
+    Returns:
+        tuple: (images, names, points2D, points2D_offsets), see ColmapModel.
+    """
+    buffer = _map_file(path)
+    count = struct.unpack_from('<Q', buffer, 0)[0]
+    images = np.zeros(count, dtype=IMAGE_DTYPE)
+    names = []
+    point_blocks = []
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    offset = 8
+    for i in range(count):
+        image_id = struct.unpack_from('<i', buffer, offset)[0]
+        pose = struct.unpack_from('<7d', buffer, offset + 4)
+        camera_id = struct.unpack_from('<i', buffer, offset + 60)[0]
+        name_end = buffer.find(b'\x00', offset + 64)
+        names.append(bytes(buffer[offset + 64:name_end]).decode('utf-8'))
+        num_points2D = struct.unpack_from('<Q', buffer, name_end + 1)[0]
+        offset = name_end + 9
+        points = np.frombuffer(buffer, POINT2D_DTYPE, num_points2D, offset)
+        offset += POINT2D_DTYPE.itemsize * num_points2D
+        point_blocks.append(points)
+        offsets[i + 1] = offsets[i] + num_points2D
+        images[i] = (image_id, pose[:4], pose[4:], camera_id, num_points2D,
+                     int(np.count_nonzero(points['point3D_id'] != -1)))
+    points2D = np.concatenate(point_blocks) if point_blocks else np.zeros(0, dtype=POINT2D_DTYPE)
+    return images, names, points2D, offsets
+
+def read_points3D_binary(path, include_tracks=False):
+    """
+    Reads points3D.bin.
+
+    Returns:
+        tuple: (points3D, tracks, track_offsets); tracks and track_offsets are None
+        unless include_tracks is set.
+
+    Raises:
+        ValueError: If the records do not tile the file.
+    """
+    buffer = _map_file(path)
+    count, observations = points3D_binary_counts(buffer)
+    if count == 0:
+        return np.zeros(0, dtype=POINT3D_DTYPE), (np.zeros(0, dtype=TRACK_DTYPE) if include_tracks else None), \
+            (np.zeros(1, dtype=np.int64) if include_tracks else None)
+
+    offsets = _point3D_record_offsets(buffer, count, observations)
+    if offsets is None:
+        offsets = np.zeros(count, dtype=np.int64)
+        offset = 8
+        for i in range(count):
+            offsets[i] = offset
+            offset += POINT3D_RECORD_HEAD + 8 * struct.unpack_from('<Q', buffer, offset + 43)[0]
+            if offset > len(buffer):
+                break
+        if offset != len(buffer):
+            raise ValueError(f"Corrupt COLMAP points3D.bin: records end at byte {offset}, file has {len(buffer)} bytes.")
+    points3D = _gather_records(buffer, offsets, POINT3D_DTYPE)
+
+    track_lengths = points3D['track_length']
+
+    if not include_tracks:
+        return points3D, None, None
+    track_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(track_lengths, out=track_offsets[1:])
+    element = np.arange(track_offsets[-1], dtype=np.int64) - np.repeat(track_offsets[:-1], track_lengths)
+    positions = np.repeat(offsets + POINT3D_RECORD_HEAD, track_lengths) + 8 * element
+    tracks = _gather_records(buffer, positions, TRACK_DTYPE)
+    return points3D, tracks, track_offsets
+
+def write_cameras_binary(cameras, path):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(cameras)))
+        for camera in cameras:
+            f.write(struct.pack('<iiQQ', camera['camera_id'], camera['model_id'], camera['width'], camera['height']))
+            f.write(camera['params'][:camera['num_params']].astype('<f8').tobytes())
+
+def write_images_binary(model, path):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(model.images)))
+        for i, image in enumerate(model.images):
+            f.write(struct.pack('<i7di', image['image_id'], *image['qvec'], *image['tvec'], image['camera_id']))
+            f.write(model.image_names[i].encode('utf-8') + b'\x00')
+            points = model.points2D[model.points2D_offsets[i]:model.points2D_offsets[i + 1]]
+            f.write(struct.pack('<Q', len(points)))
+            f.write(points.astype(POINT2D_DTYPE).tobytes())
+
+def write_points3D_binary(model, path):
+    """
+    Writes points3D.bin. The variable-length records are assembled in one byte buffer:
+    the fixed-size heads and the track elements are scattered to their offsets vectorized.
+    """
+    points3D = model.points3D
+    lengths = points3D['track_length'].astype(np.int64)
+    heads = np.zeros(len(points3D), dtype=np.dtype({
+        'names': ['point3D_id', 'xyz', 'rgb', 'error', 'track_length'],
+        'formats': ['<u8', ('<f8', (3,)), ('u1', (3,)), '<f8', '<u8'],
+        'offsets': [0, 8, 32, 35, 43],
+        'itemsize': POINT3D_RECORD_HEAD,
+    }))
+    for name in heads.dtype.names:
+        heads[name] = points3D[name]
+    record_offsets = 8 + np.concatenate([[0], np.cumsum(POINT3D_RECORD_HEAD + 8 * lengths)])
+    buffer = np.zeros(int(record_offsets[-1]), dtype=np.uint8)
+    buffer[:8] = np.frombuffer(struct.pack('<Q', len(points3D)), dtype=np.uint8)
+    head_index = record_offsets[:-1, None] + np.arange(POINT3D_RECORD_HEAD)
+    buffer[head_index] = heads.view(np.uint8).reshape(-1, POINT3D_RECORD_HEAD)
+    element = np.arange(int(lengths.sum()), dtype=np.int64) - np.repeat(model.track_offsets[:-1], lengths)
+    track_starts = np.repeat(record_offsets[:-1] + POINT3D_RECORD_HEAD, lengths) + 8 * element
+    buffer[track_starts[:, None] + np.arange(8)] = model.tracks.astype(TRACK_DTYPE).view(np.uint8).reshape(-1, 8)
+    with open(path, 'wb') as f:
+        f.write(buffer.tobytes())
+
+# --- Text format ---
+
+def _data_lines(path):
+    """
+    Returns the lines of a COLMAP text file after the leading '#' comment header.
+    Blank lines are kept: images.txt uses them for images without 2D points.
+    """
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    start = 0
+    while start < len(lines) and lines[start].startswith('#'):
+        start += 1
+    return lines[start:]
+
+def read_cameras_text(path):
+    lines = [line for line in _data_lines(path) if line.strip()]
+    cameras = np.zeros(len(lines), dtype=CAMERA_DTYPE)
+    for i, line in enumerate(lines):
+        values = line.split()
+        model_id = CAMERA_MODEL_IDS[values[1]]
+        params = np.array(values[4:], dtype=np.float64)
+        cameras[i] = (int(values[0]), model_id, int(values[2]), int(values[3]), len(params),
+                      np.zeros(MAX_CAMERA_PARAMS))
+        cameras['params'][i, :len(params)] = params
+    return cameras
+
+def read_images_text(path):
+    """
+    Reads images.txt, which stores every image as two lines: the pose, then its 2D points.
+    """
+    lines = _data_lines(path)
+    # Drop trailing blank lines that are not the points line of an image
+    while len(lines) % 2 == 1 and not lines[-1].strip():
+        lines.pop()
+    if len(lines) % 2 == 1:
+        lines.append('')
+    count = len(lines) // 2
+    images = np.zeros(count, dtype=IMAGE_DTYPE)
+    names = []
+    point_blocks = []
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    for i in range(count):
+        values = lines[2 * i].split()
+        flat = np.array(lines[2 * i + 1].split(), dtype=np.float64).reshape(-1, 3)
+        points = np.zeros(len(flat), dtype=POINT2D_DTYPE)
+        points['xy'] = flat[:, :2]
+        points['point3D_id'] = flat[:, 2].astype(np.int64)
+        point_blocks.append(points)
+        offsets[i + 1] = offsets[i] + len(points)
+        names.append(' '.join(values[9:]))
+        images[i] = (int(values[0]), [float(v) for v in values[1:5]], [float(v) for v in values[5:8]],
+                     int(values[8]), len(points), int(np.count_nonzero(points['point3D_id'] != -1)))
+    points2D = np.concatenate(point_blocks) if point_blocks else np.zeros(0, dtype=POINT2D_DTYPE)
+    return images, names, points2D, offsets
+
+def read_points3D_text(path, include_tracks=False):
+    lines = [line for line in _data_lines(path) if line.strip()]
+    count = len(lines)
+    points3D = np.zeros(count, dtype=POINT3D_DTYPE)
+    heads = np.zeros((count, 8), dtype=np.float64)
+    track_blocks = []
+    for i, line in enumerate(lines):
+        values = line.split()
+        heads[i] = values[:8]
+        points3D['track_length'][i] = (len(values) - 8) // 2
+        if include_tracks:
+            track_blocks.append(np.array(values[8:], dtype=np.int32))
+    points3D['point3D_id'] = heads[:, 0].astype(np.int64)
+    points3D['xyz'] = heads[:, 1:4]
+    points3D['rgb'] = heads[:, 4:7].astype(np.uint8)
+    points3D['error'] = heads[:, 7]
+    if not include_tracks:
+        return points3D, None, None
+    flat = np.concatenate(track_blocks) if track_blocks else np.zeros(0, dtype=np.int32)
+    tracks = np.empty(len(flat) // 2, dtype=TRACK_DTYPE)
+    tracks['image_id'] = flat[0::2]
+    tracks['point2D_idx'] = flat[1::2]
+    track_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(points3D['track_length'], out=track_offsets[1:])
+    return points3D, tracks, track_offsets
+
+def write_cameras_text(cameras, path):
+    with open(path, 'w') as f:
+        f.write('# Camera list with one line of data per camera:\n')
+        f.write('#   CAMERA_ID, MODEL, WIDTH, HEIGHT, PARAMS[]\n')
+        f.write(f'# Number of cameras: {len(cameras)}\n')
+        for camera in cameras:
+            params = ' '.join(repr(float(v)) for v in camera['params'][:camera['num_params']])
+            f.write(f"{camera['camera_id']} {CAMERA_MODELS[int(camera['model_id'])][0]} {camera['width']} {camera['height']} {params}\n")
+
+def write_images_text(model, path):
+    with open(path, 'w') as f:
+        f.write('# Image list with two lines of data per image:\n')
+        f.write('#   IMAGE_ID, QW, QX, QY, QZ, TX, TY, TZ, CAMERA_ID, NAME\n')
+        f.write('#   POINTS2D[] as (X, Y, POINT3D_ID)\n')
+        f.write(f'# Number of images: {len(model.images)}\n')
+        for i, image in enumerate(model.images):
+            pose = ' '.join(repr(float(v)) for v in list(image['qvec']) + list(image['tvec']))
+            f.write(f"{image['image_id']} {pose} {image['camera_id']} {model.image_names[i]}\n")
+            points = model.points2D[model.points2D_offsets[i]:model.points2D_offsets[i + 1]]
+            f.write(' '.join(f"{x!r} {y!r} {point3D_id}" for (x, y), point3D_id
+                             in zip(points['xy'].tolist(), points['point3D_id'].tolist())) + '\n')
+
+def write_points3D_text(model, path):
+    with open(path, 'w') as f:
+        f.write('# 3D point list with one line of data per point:\n')
+        f.write('#   POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)\n')
+        f.write(f'# Number of points: {len(model.points3D)}\n')
+        for i, point in enumerate(model.points3D):
+            track = model.tracks[model.track_offsets[i]:model.track_offsets[i + 1]]
+            xyz = ' '.join(repr(float(v)) for v in point['xyz'])
+            rgb = ' '.join(str(int(v)) for v in point['rgb'])
+            pairs = ' '.join(f'{image_id} {index}' for image_id, index in zip(track['image_id'].tolist(), track['point2D_idx'].tolist()))
+            f.write(f"{point['point3D_id']} {xyz} {rgb} {float(point['error'])!r} {pairs}\n")
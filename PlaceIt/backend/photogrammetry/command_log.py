@@ -0,0 +1,309 @@
+import argparse
+import collections
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Each command's output goes to a log file of at most this many bytes; past it only the
+# last lines are kept (in memory) and appended when the command ends
+DEFAULT_LOG_MAX_BYTES = 20 * 1024 * 1024
+# Number of last output lines kept in memory, shown when a command fails
+DEFAULT_TAIL_LINES = 50
+# Longer lines (or output without any line break) are split at this many characters
+MAX_LINE_CHARS = 4096
+# A progress event is written when the percentage moved by at least this much, or when
+# this many seconds passed since the command's previous event
+PROGRESS_MIN_STEP = 5.0
+PROGRESS_MIN_INTERVAL = 5.0
+
+# Executables whose progress lines are parsed, by tool
+OPENMVS_TOOLS = ('InterfaceCOLMAP', 'DensifyPointCloud', 'ReconstructMesh', 'RefineMesh', 'TextureMesh')
+
+# COLMAP (glog lines): "Processed file [12/240]", "Matching image [12/240]",
+# "Matching block [2/4, 1/4]", "Undistorting image [12/240]"
+COLMAP_COUNTER = re.compile(r'(Processed file|Matching image|Undistorting image) \[(\d+)/(\d+)\]')
+COLMAP_BLOCK = re.compile(r'Matching block \[(\d+)/(\d+), (\d+)/(\d+)\]')
+# "Registering image #12 (34)": the mapper's 34th registered image; the total is not printed
+COLMAP_REGISTER = re.compile(r'Registering image #\d+ \((\d+)\)')
+# OpenMVS: "Estimated depth-maps 40 (16.67%, 1m4s, ETA 5m20s)..."
+OPENMVS_PROGRESS = re.compile(r'([A-Za-z][\w -]*?) \d+ \((\d+(?:\.\d+)?)%, ([\dhms.]+)(?:, ETA ([\dhms.]+))?\)')
+# ffmpeg: "  Duration: 00:01:05.20, start: ..." and "frame=  120 ... time=00:00:04.00 ... speed=2.01x"
+FFMPEG_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+FFMPEG_PROGRESS = re.compile(r'time=(\d+):(\d+):(\d+(?:\.\d+)?).*?speed=\s*(\d+(?:\.\d+)?)x')
+# Blender: the step timer of obj_to_glb_cleanup.py and the glTF exporter's last line
+BLENDER_STEP = re.compile(r"Step '(\w+)' took")
+BLENDER_EXPORTED = re.compile(r'Finished glTF 2\.0 export')
+
+def parse_duration(text):
+    """
+    Parses an OpenMVS duration such as '1h2m', '5m20s' or '42s' into seconds.
+    """
+    seconds = 0.0
+    for value, unit in re.findall(r'(\d+(?:\.\d+)?)([hms])', text):
+        seconds += float(value) * {'h': 3600, 'm': 60, 's': 1}[unit]
+    return seconds
+
+def tool_name(command):
+    """
+    Names the tool a command runs ('ffmpeg', 'colmap', 'blender' or the OpenMVS executable).
+    """
+    name = os.path.splitext(os.path.basename(command[0]))[0]
+    return name.lower() if name.lower() in ('ffmpeg', 'colmap', 'blender') else name
+
+class ProgressParser:
+    """
+    Turns a tool's known progress lines into {'percent', 'eta_seconds', 'message'} updates.
+    Stateful per command: ffmpeg's percentage needs the duration printed before it.
+    """
+
+    def __init__(self, command):
+        self.tool = tool_name(command)
+        self.duration = None
+        if self.tool == 'ffmpeg' and '-t' in command:
+            # A segment of the video (see extract_frames): its length, not the video's, is the total
+            self.duration = float(command[command.index('-t') + 1])
+
+    def parse(self, line):
+        """
+        Returns the progress update a line carries, or None.
+        """
+        if self.tool == 'colmap':
+            match = COLMAP_COUNTER.search(line)
+            if match:
+                done, total = int(match.group(2)), int(match.group(3))
+                return {'percent': 100.0 * done / total, 'message': f'{match.group(1)} {done}/{total}'}
+            match = COLMAP_BLOCK.search(line)
+            if match:
+                i, rows, j, cols = (int(value) for value in match.groups())
+                return {'percent': 100.0 * ((i - 1) * cols + j) / (rows * cols), 'message': f'Matching block {i}/{rows}, {j}/{cols}'}
+            match = COLMAP_REGISTER.search(line)
+            if match:
+                return {'message': f'Registered {match.group(1)} images'}
+        elif self.tool in OPENMVS_TOOLS:
+            match = OPENMVS_PROGRESS.search(line)
+            if match:
+                update = {'percent': float(match.group(2)), 'message': match.group(1).strip()}
+                if match.group(4):
+                    update['eta_seconds'] = parse_duration(match.group(4))
+                return update
+        elif self.tool == 'ffmpeg':
+            match = FFMPEG_DURATION.search(line)
+            if match and self.duration is None:
+                hours, minutes, seconds = match.groups()
+                self.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                return None
+            match = FFMPEG_PROGRESS.search(line)
+            if match and self.duration:
+                hours, minutes, seconds, speed = match.groups()
+                position = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                update = {'percent': min(100.0, 100.0 * position / self.duration), 'message': f'Decoded {position:.1f}s'}
+                if float(speed) > 0:
+                    update['eta_seconds'] = max(0.0, self.duration - position) / float(speed)
+                return update
+        elif self.tool == 'blender':
+            match = BLENDER_STEP.search(line)
+            if match:
+                return {'message': f'Finished step {match.group(1)}'}
+            if BLENDER_EXPORTED.search(line):
+                return {'percent': 100.0, 'message': 'Exported GLB'}
+        return None
+
+class ProgressLog:
+    """
+    Appends a job's progress events to a JSON-lines file, one flushed line per event, so a
+    status updater can follow the job by reading only this file.
+    """
+
+    def __init__(self, path, job_id):
+        self.path = path
+        self.job_id = job_id
+        self.lock = threading.Lock()
+
+    def event(self, event, **fields):
+        record = {'time': round(time.time(), 3), 'job_id': self.job_id, 'event': event, **fields}
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+class CommandLog:
+    """
+    Receives a command's merged stdout and stderr as it is produced: splits it into lines
+    (on '\\n' or '\\r', as ffmpeg and OpenMVS redraw their progress in place), echoes them,
+    writes them to a size-capped log file, keeps the last ones in memory and turns known
+    progress lines into progress events. Memory use is bounded whatever the tool prints.
+    """
+
+    def __init__(self, command, log_path=None, progress=None, stage=None, max_bytes=DEFAULT_LOG_MAX_BYTES,
+                 tail_lines=DEFAULT_TAIL_LINES, echo=True):
+        """
+        Args:
+            command (list): The command whose output this is.
+            log_path (str, optional): The log file. Defaults to None (no file).
+            progress (ProgressLog, optional): Where progress events go. Defaults to None (not parsed).
+            stage (str, optional): Pipeline stage recorded in the progress events.
+            max_bytes (int, optional): See DEFAULT_LOG_MAX_BYTES.
+            tail_lines (int, optional): See DEFAULT_TAIL_LINES.
+            echo (bool, optional): Also print the output. Defaults to True.
+        """
+        self.command = command
+        self.log_path = log_path
+        self.progress = progress
+        self.stage = stage
+        self.max_bytes = max_bytes
+        self.echo = echo
+        self.parser = ProgressParser(command) if progress is not None else None
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.pending = b''
+        self.lines = 0
+        self.bytes_written = 0
+        self.truncated = False
+        self.last_event = None
+        self.lock = threading.Lock()
+        self.file = open(log_path, 'w') if log_path else None
+        if self.file:
+            self.file.write(f"$ {' '.join(command)}\n")
+        if self.progress:
+            self.progress.event('command_started', stage=self.stage, tool=tool_name(command), log=log_path)
+
+    def feed(self, chunk):
+        """
+        Takes the next chunk of output (bytes); safe to call from the thread reading the pipe.
+        """
+        with self.lock:
+            data = self.pending + chunk
+            start = 0
+            for match in re.finditer(rb'\r\n|\r|\n', data):
+                self._line(data[start:match.start()].decode(errors='replace'), match.group().decode())
+                start = match.end()
+            self.pending = data[start:]
+            while len(self.pending) > MAX_LINE_CHARS:
+                self._line(self.pending[:MAX_LINE_CHARS].decode(errors='replace'), '\n')
+                self.pending = self.pending[MAX_LINE_CHARS:]
+
+    def _line(self, line, end):
+        if self.echo:
+            sys.stdout.write(line + end)
+        if not line.strip():
+            return
+        self.lines += 1
+        self.tail.append(line)
+        if self.file and not self.truncated:
+            size = len(line.encode()) + 1
+            if self.bytes_written + size > self.max_bytes:
+                self.truncated = True
+                self.file.write(f"[... log truncated at {self.max_bytes} bytes; the last lines follow at the end ...]\n")
+            else:
+                self.file.write(line + '\n')
+                self.bytes_written += size
+        if self.parser:
+            update = self.parser.parse(line)
+            if update:
+                self._progress(update)
+
+    def _progress(self, update):
+        now = time.monotonic()
+        if self.last_event is not None and 'percent' in update:
+            last_time, last_percent = self.last_event
+            if (last_percent is not None and abs(update['percent'] - last_percent) < PROGRESS_MIN_STEP
+                    and update['percent'] < 100.0 and now - last_time < PROGRESS_MIN_INTERVAL):
+                return
+        self.last_event = (now, update.get('percent'))
+        fields = {key: round(value, 2) if isinstance(value, float) else value for key, value in update.items()}
+        self.progress.event('progress', stage=self.stage, tool=self.parser.tool, **fields)
+
+    def tail_text(self):
+        """
+        Returns the last lines of output, one per line.
+        """
+        with self.lock:
+            return '\n'.join(self.tail)
+
+    def close(self, returncode=None):
+        """
+        Flushes a last unterminated line, completes the log file and records the end of the command.
+        """
+        with self.lock:
+            if self.pending:
+                self._line(self.pending.decode(errors='replace'), '\n')
+                self.pending = b''
+            if self.file:
+                if self.truncated:
+                    self.file.write('\n'.join(self.tail) + '\n')
+                if returncode is not None:
+                    self.file.write(f"[exit code {returncode}]\n")
+                self.file.close()
+                self.file = None
+        if self.progress:
+            self.progress.event('command_finished', stage=self.stage, tool=tool_name(self.command), returncode=returncode,
+                                lines=self.lines, log_truncated=self.truncated)
+
+class JobLogs:
+    """
+    The command logs and the progress events of one pipeline job: every command gets its
+    own numbered log file in log_dir, and all events go to log_dir/progress.jsonl.
+    """
+
+    def __init__(self, log_dir, job_id, max_bytes=DEFAULT_LOG_MAX_BYTES, tail_lines=DEFAULT_TAIL_LINES, echo=True):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.tail_lines = tail_lines
+        self.echo = echo
+        self.progress = ProgressLog(os.path.join(log_dir, 'progress.jsonl'), job_id)
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    def open_command(self, command, stage=None):
+        """
+        Returns the CommandLog for the next command of the job.
+        """
+        with self.lock:
+            self.commands += 1
+            number = self.commands
+        name = f"{number:03d}-{stage or 'command'}-{tool_name(command)}.log"
+        return CommandLog(command, log_path=os.path.join(self.log_dir, name), progress=self.progress, stage=stage,
+                          max_bytes=self.max_bytes, tail_lines=self.tail_lines, echo=self.echo)
+
+def read_progress(path):
+    """
+    Reads a job's progress events and summarizes where it stands.
+
+    Returns:
+        dict: {'stage', 'tool', 'percent', 'eta_seconds', 'message', 'time'} of the latest
+            events (None where unknown), or {} if the job has no events yet.
+    """
+    try:
+        with open(path, 'r') as f:
+            events = [json.loads(line) for line in f if line.endswith('\n')]
+    except FileNotFoundError:
+        return {}
+    status = {}
+    for event in events:
+        if event['event'] in ('stage_started', 'command_started'):
+            status = {'stage': event.get('stage'), 'tool': event.get('tool'), 'percent': None, 'eta_seconds': None, 'message': None}
+        elif event['event'] == 'progress':
+            status.update({key: event.get(key) for key in ('percent', 'eta_seconds', 'message')})
+            status['tool'] = event.get('tool')
+        status['time'] = event['time']
+    return status
+
+def main():
+    """
+    Command-line entry point: python command_log.py workspace/logs/progress.jsonl [--follow]
+    """
+    parser = argparse.ArgumentParser(description="Show where a pipeline job stands from its progress events.")
+    parser.add_argument('progress_file', help='The job\'s progress.jsonl (in its log directory).')
+    parser.add_argument('--follow', action='store_true', help='Keep printing the status every 2 seconds.')
+    args = parser.parse_args()
+
+    while True:
+        print(json.dumps(read_progress(args.progress_file)))
+        if not args.follow:
+            break
+        time.sleep(2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import mesh_cleanup
+import obj_io
+
+# Default level-of-detail chain, as fractions of the cleaned mesh's triangles
+DEFAULT_LOD_RATIOS = [1.0, 0.25, 0.05]
+# Weight of the constraint planes that hold UV seams and open borders in place,
+# relative to the planes of the surface itself
+SEAM_WEIGHT = 100.0
+# A collapse may not tilt any of the faces around it by more than about 80 degrees
+MIN_NORMAL_COS = 0.2
+# Share of the cheapest candidate collapses considered in one pass; smaller is closer
+# to a strictly greedy (one edge at a time) order, larger needs fewer passes
+PASS_FRACTION = 0.5
+MAX_PASSES = 200
+# Selection rounds per pass when picking collapses that do not touch each other
+INDEPENDENT_SET_ROUNDS = 4
+COST_BLOCK_ROWS = 500000
+
+# Directed edges of a triangle, as (from corner, to corner)
+_EDGE_FROM = [0, 1, 2, 1, 2, 0]
+_EDGE_TO = [1, 2, 0, 0, 1, 2]
+
+def _first_of_runs(*columns):
+    """
+    For rows sorted by the given columns, a mask of the rows that start a run of equal values.
+    """
+    first = np.zeros(len(columns[0]), dtype=bool)
+    first[:1] = True
+    for column in columns:
+        first[1:] |= column[1:] != column[:-1]
+    return first
+
+def _plane_quadrics(normals, points, weights):
+    """
+    Quadrics of the planes through points with the given unit normals, scaled by weights,
+    as the 10 distinct coefficients of each symmetric 4x4 matrix.
+    """
+    d = -np.einsum('ij,ij->i', normals, points)
+    a, b, c = normals.T
+    return np.stack([a * a, a * b, a * c, a * d, b * b, b * c, b * d, c * c, c * d, d * d], axis=1) * weights[:, None]
+
+def _quadric_error(quadrics, points):
+    """
+    Sum of squared distances to the planes of each quadric, at the given points.
+    """
+    q = quadrics.T
+    x, y, z = points.T
+    return (q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z + 2 * q[3] * x
+            + q[4] * y * y + 2 * q[5] * y * z + 2 * q[6] * y
+            + q[7] * z * z + 2 * q[8] * z + q[9])
+
+def _face_normals(positions, faces):
+    p0 = positions[faces[:, 0]]
+    return np.cross(positions[faces[:, 1]] - p0, positions[faces[:, 2]] - p0)
+
+def _edge_table(mesh):
+    """
+    Directed edge records of a mesh: one per ordered pair of corners of every face, sorted
+    by edge, so an edge's records are the faces that contain both of its vertices.
+
+    Returns:
+        dict: Record arrays ('a', 'b', 'ua', 'ub', 'face', 'group') and per-edge arrays
+        ('edge_keys', 'edge_a', 'edge_b', 'faces_on_edge', 'uv_sides', 'covered').
+        For edges with two faces, uv_sides is the number of distinct (UV at a, UV at b)
+        pairs (2 on a UV seam) and covered the number of distinct UVs at a; for other
+        edges both equal the number of faces.
+    """
+    faces = mesh.faces
+    face_uvs = mesh.face_uvs if mesh.face_uvs is not None else np.zeros_like(faces)
+    vertex_count = mesh.vertex_count
+    keys = (faces[:, _EDGE_FROM] * vertex_count + faces[:, _EDGE_TO]).ravel()
+    order = np.argsort(keys)
+    keys = keys[order]
+    face = order // len(_EDGE_FROM)
+    corner_from = np.tile(_EDGE_FROM, len(faces))[order]
+    corner_to = np.tile(_EDGE_TO, len(faces))[order]
+    del order
+    table = {
+        'a': keys // vertex_count, 'b': keys % vertex_count,
+        'ua': face_uvs[face, corner_from], 'ub': face_uvs[face, corner_to], 'face': face,
+    }
+
+    first = _first_of_runs(keys)
+    starts = np.flatnonzero(first)
+    faces_on_edge = np.diff(np.append(starts, len(keys)))
+    table['edge_keys'] = keys[starts]
+    table['edge_a'] = table['a'][starts]
+    table['edge_b'] = table['b'][starts]
+    table['group'] = np.cumsum(first) - 1
+    table['faces_on_edge'] = faces_on_edge
+
+    # Compare the two records of each two-face edge
+    uv_sides = faces_on_edge.copy()
+    covered = faces_on_edge.copy()
+    pairs = np.flatnonzero(faces_on_edge == 2)
+    first_record, second_record = starts[pairs], starts[pairs] + 1
+    same_ua = table['ua'][first_record] == table['ua'][second_record]
+    same_ub = table['ub'][first_record] == table['ub'][second_record]
+    uv_sides[pairs] = np.where(same_ua & same_ub, 1, 2)
+    covered[pairs] = np.where(same_ua, 1, 2)
+    table['uv_sides'] = uv_sides
+    table['covered'] = covered
+    return table
+
+def vertex_quadrics(mesh, table, seam_weight=SEAM_WEIGHT):
+    """
+    Initial error quadric of every vertex: the area-weighted planes of its faces, plus
+    constraint planes perpendicular to the faces along UV seams and open borders.
+
+    Returns:
+        numpy.ndarray: (V, 10) quadric coefficients.
+    """
+    positions = mesh.positions
+    faces = mesh.faces
+    normals = _face_normals(positions, faces)
+    double_areas = np.linalg.norm(normals, axis=1)
+    unit_normals = normals / np.maximum(double_areas, 1e-300)[:, None]
+    face_quadrics = _plane_quadrics(unit_normals, positions[faces[:, 0]], double_areas / 2)
+
+    quadrics = np.zeros((mesh.vertex_count, 10))
+    for corner in range(3):
+        for column in range(10):
+            quadrics[:, column] += np.bincount(faces[:, corner], face_quadrics[:, column], mesh.vertex_count)
+
+    # Constraint planes for each (undirected) seam or border edge, one per adjacent face
+    group = table['group']
+    constrained = ((table['faces_on_edge'] == 1) | (table['uv_sides'] > 1))[group] & (table['a'] < table['b'])
+    a = table['a'][constrained]
+    b = table['b'][constrained]
+    edges = positions[b] - positions[a]
+    planes = np.cross(edges, unit_normals[table['face'][constrained]])
+    lengths = np.linalg.norm(planes, axis=1)
+    keep = lengths > 0
+    planes = planes[keep] / lengths[keep, None]
+    a, b, edges = a[keep], b[keep], edges[keep]
+    constraint_quadrics = _plane_quadrics(planes, positions[a], seam_weight * np.einsum('ij,ij->i', edges, edges))
+    for ends in (a, b):
+        for column in range(10):
+            quadrics[:, column] += np.bincount(ends, constraint_quadrics[:, column], mesh.vertex_count)
+    return quadrics
+
+def _collapse_costs(quadrics, positions, sources, targets):
+    """
+    Error of moving each source vertex onto its target, in blocks to bound the temporary memory.
+    """
+    costs = np.empty(len(sources))
+    for start in range(0, len(sources), COST_BLOCK_ROWS):
+        s = sources[start:start + COST_BLOCK_ROWS]
+        t = targets[start:start + COST_BLOCK_ROWS]
+        costs[start:start + COST_BLOCK_ROWS] = _quadric_error(quadrics[s] + quadrics[t], positions[t])
+    return costs
+
+def _collapse_pass(mesh, quadrics, target_faces):
+    """
+    Collapses one batch of edges: every vertex proposes its cheapest valid collapse onto a
+    neighbour, and a set of cheap proposals whose 1-rings do not touch is applied at once.
+
+    Collapses are half-edge collapses (the vertex moves onto its neighbour), so the
+    surviving vertices keep their positions and UVs and the texture mapping stays valid.
+
+    Returns:
+        int: Number of collapsed vertices.
+    """
+    positions = mesh.positions
+    faces = mesh.faces
+    vertex_count = mesh.vertex_count
+    uv_count = max(len(mesh.uvs), 1)
+    table = _edge_table(mesh)
+    edge_a, edge_b = table['edge_a'], table['edge_b']
+
+    # Border and non-manifold vertices stay put; so does the silhouette of open surfaces
+    irregular = table['faces_on_edge'] != 2
+    locked = np.zeros(vertex_count, dtype=bool)
+    locked[edge_a[irregular]] = True
+    locked[edge_b[irregular]] = True
+
+    # Every UV of the moving vertex must be carried over to a UV of the target by a face of
+    # the collapsed edge; otherwise a texture chart would be torn
+    face_uvs = mesh.face_uvs if mesh.face_uvs is not None else np.zeros_like(faces)
+    wedge_keys = np.sort(faces.ravel() * uv_count + face_uvs.ravel())
+    wedges = np.bincount(wedge_keys[_first_of_runs(wedge_keys)] // uv_count, minlength=vertex_count)
+    del wedge_keys
+    # (with two faces, a UV of a maps to two different UVs of b only if the edge is torn)
+    consistent = table['covered'] == table['uv_sides']
+    valid = ~irregular & ~locked[edge_a] & (table['covered'] == wedges[edge_a]) & consistent
+    sources, targets = edge_a[valid], edge_b[valid]
+    costs = _collapse_costs(quadrics, positions, sources, targets)
+
+    # Cheapest valid target per vertex (the edges are sorted by source vertex)
+    if len(sources) == 0:
+        return 0
+    starts = np.flatnonzero(_first_of_runs(sources))
+    lowest_cost = np.minimum.reduceat(costs, starts)
+    cheapest = np.flatnonzero(costs == np.repeat(lowest_cost, np.diff(np.append(starts, len(costs)))))
+    best = cheapest[_first_of_runs(sources[cheapest])]
+    sources, targets, costs = sources[best], targets[best], costs[best]
+    target_of = np.full(vertex_count, -1, dtype=np.int64)
+    target_of[sources] = targets
+
+    # Link condition: the two vertices may only share the neighbours opposite the collapsed
+    # edge, or the collapse would pinch the surface into non-manifold edges
+    outgoing = target_of[edge_a] >= 0
+    ring_a, ring_x = edge_a[outgoing], edge_b[outgoing]
+    probes = target_of[ring_a] * vertex_count + ring_x
+    slots = np.minimum(np.searchsorted(table['edge_keys'], probes), len(table['edge_keys']) - 1)
+    shared = (table['edge_keys'][slots] == probes) & (ring_x != target_of[ring_a])
+    rejected = np.bincount(ring_a[shared], minlength=vertex_count) != 2
+
+    # No face around the moving vertex may flip or fold over
+    face_normals = _face_normals(positions, faces)
+    for corner in range(3):
+        moving = faces[:, corner]
+        target = target_of[moving]
+        affected = np.flatnonzero((target >= 0) & (faces != target[:, None]).all(axis=1))
+        moved = faces[affected]
+        moved_positions = positions[moved]
+        moved_positions[:, corner] = positions[target[affected]]
+        new_normals = np.cross(moved_positions[:, 1] - moved_positions[:, 0], moved_positions[:, 2] - moved_positions[:, 0])
+        old_normals = face_normals[affected]
+        folds = (np.einsum('ij,ij->i', old_normals, new_normals)
+                 <= MIN_NORMAL_COS * np.linalg.norm(old_normals, axis=1) * np.linalg.norm(new_normals, axis=1))
+        rejected[moving[affected[folds]]] = True
+
+    keep = ~rejected[sources]
+    sources, targets, costs = sources[keep], targets[keep], costs[keep]
+    if len(sources) == 0:
+        return 0
+
+    # Only the cheapest share of the proposals is considered, so a pass behaves like a
+    # slice of the greedy order rather than collapsing arbitrary edges
+    needed = (mesh.face_count - target_faces + 1) // 2
+    limit = max(1, min(needed, int(np.ceil(len(sources) * PASS_FRACTION))))
+    if limit < len(sources):
+        cheapest = np.argpartition(costs, limit - 1)[:limit]
+        sources, targets, costs = sources[cheapest], targets[cheapest], costs[cheapest]
+
+    # Independent set: a collapse goes ahead only if it is the cheapest proposal touching
+    # every vertex of its closed 1-ring, so no two applied collapses share a face. Equal
+    # costs (common on flat areas) are ordered randomly; ordering them by index would let
+    # only a few local minima through. Later rounds fill the gaps left by the earlier ones.
+    tie_breaks = np.random.default_rng(len(sources)).random(len(sources))
+    rank = np.empty(len(sources), dtype=np.int64)
+    rank[np.lexsort((tie_breaks, costs))] = np.arange(len(sources))
+    proposal_of = np.full(vertex_count, -1, dtype=np.int64)
+    proposal_of[sources] = np.arange(len(sources))
+    ring = proposal_of[edge_a] >= 0
+    ring_owner = np.concatenate([np.arange(len(sources)), proposal_of[edge_a[ring]]])
+    ring_vertex = np.concatenate([sources, edge_b[ring]])
+    del ring
+
+    accepted = np.zeros(len(sources), dtype=bool)
+    active = np.ones(len(sources), dtype=bool)
+    taken = np.zeros(vertex_count, dtype=bool)
+    for _ in range(INDEPENDENT_SET_ROUNDS):
+        live = active[ring_owner]
+        owners, vertices = ring_owner[live], ring_vertex[live]
+        lowest = np.full(vertex_count, len(sources), dtype=np.int64)
+        np.minimum.at(lowest, vertices, rank[owners])
+        winners = active.copy()
+        winners[owners[lowest[vertices] != rank[owners]]] = False
+        accepted |= winners
+        taken[ring_vertex[winners[ring_owner]]] = True
+        active[ring_owner[taken[ring_vertex]]] = False
+        if not active.any():
+            break
+    sources, targets = sources[accepted], targets[accepted]
+
+    collapse_to = np.full(vertex_count, -1, dtype=np.int64)
+    collapse_to[sources] = targets
+    corners = collapse_to[faces] >= 0
+    if mesh.face_uvs is not None:
+        # Map each UV of a moving vertex to the target's UV on the same side of the edge
+        records = collapse_to[table['a']] == table['b']
+        map_keys, first = np.unique(table['a'][records] * uv_count + table['ua'][records], return_index=True)
+        map_values = table['ub'][records][first]
+        mesh.face_uvs[corners] = map_values[np.searchsorted(map_keys, faces[corners] * uv_count + mesh.face_uvs[corners])]
+    faces[corners] = collapse_to[faces[corners]]
+    quadrics[targets] += quadrics[sources]
+
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    mesh.select_faces(~degenerate)
+    return len(sources)
+
+def decimate(mesh, target_faces, seam_weight=SEAM_WEIGHT):
+    """
+    Reduces a mesh to about target_faces triangles with quadric error metrics (in place).
+
+    Vertices are collapsed onto neighbours in batches, cheapest first. The error quadrics
+    include constraint planes along UV seams and open borders, so seams and the outline
+    keep their shape; collapses that would tear a texture chart, make the surface
+    non-manifold or flip a face are skipped. Decimation stops early if no edge can be
+    collapsed any more.
+
+    Args:
+        mesh (obj_io.Mesh): The mesh to decimate.
+        target_faces (int): Triangle count to reduce the mesh to.
+        seam_weight (float, optional): Weight of the seam and border constraints. Defaults to SEAM_WEIGHT.
+    """
+    print(f"Decimating mesh from {mesh.face_count} to {target_faces} faces...")
+    mesh.widen()
+    quadrics = vertex_quadrics(mesh, _edge_table(mesh), seam_weight)
+    passes = 0
+    while mesh.face_count > target_faces and passes < MAX_PASSES:
+        passes += 1
+        if _collapse_pass(mesh, quadrics, target_faces) == 0:
+            print(f"Warning: No more edges can be collapsed; stopping at {mesh.face_count} faces.")
+            break
+    mesh.remove_unused()
+    mesh.compact()
+    print(f"Decimated to {mesh.face_count} faces in {passes} passes.")
+
+def build_lod_chain(mesh, ratios=DEFAULT_LOD_RATIOS, steps=None):
+    """
+    Builds a level-of-detail chain: one mesh per ratio of the input's triangle count,
+    each decimated from the previous (finer) level.
+
+    Args:
+        mesh (obj_io.Mesh): The full-resolution mesh; returned as is for a ratio of 1.
+        ratios (list, optional): Triangle ratios, finest first. Defaults to DEFAULT_LOD_RATIOS.
+        steps (list, optional): Receives per-level timings for the job trace. Defaults to None.
+
+    Returns:
+        list: One obj_io.Mesh per ratio.
+    """
+    steps = [] if steps is None else steps
+    print(f"\n--- Building LOD chain ({', '.join(f'{ratio:g}' for ratio in ratios)}) ---")
+    full_faces = mesh.face_count
+    levels = []
+    current = mesh
+    for level, ratio in enumerate(ratios):
+        target_faces = max(int(round(full_faces * ratio)), 1)
+        if current.face_count > target_faces:
+            current = current.copy()
+            mesh_cleanup.run_step(steps, f'decimate_lod{level}', lambda: decimate(current, target_faces), current)
+        levels.append(current)
+    return levels
+
+def main():
+    """
+    Command-line entry point: python decimate.py input.obj output.obj --ratio 0.25 [--trace path]
+    """
+    parser = argparse.ArgumentParser(description="Decimate an OBJ mesh with quadric error metrics, keeping UV seams.")
+    parser.add_argument('input_obj', help='OBJ file to decimate.')
+    parser.add_argument('output_obj', help='Path for the decimated OBJ file.')
+    parser.add_argument('--ratio', type=float, required=True, help='Fraction of the triangles to keep (e.g. 0.25).')
+    parser.add_argument('--trace', help='Write per-step timings as JSON to this path.')
+    args = parser.parse_args()
+    if not 0 < args.ratio <= 1:
+        parser.error('--ratio must be in (0, 1]')
+
+    try:
+        mesh = obj_io.read_obj(args.input_obj)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    steps = []
+    target_faces = max(int(round(mesh.face_count * args.ratio)), 1)
+    mesh_cleanup.run_step(steps, 'decimate', lambda: decimate(mesh, target_faces), mesh)
+    mesh_cleanup.run_step(steps, 'write_obj', lambda: obj_io.write_obj(mesh, args.output_obj), mesh)
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump({'steps': steps}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+import colmap_model
+
+# File (in the OpenMVS working directory) recording which views the depth maps there were
+# estimated for, so a later DensifyPointCloud run can tell which of them still apply
+MANIFEST_NAME = 'depth_maps.json'
+
+# DensifyPointCloud writes one depth map per scene image, named after the image's index in the
+# scene, and loads the ones already present instead of estimating them again
+DEPTH_MAP_FILE = re.compile(r'^depth(\d+)\.dmap$')
+
+# Fixed-size head of a raw OpenMVS depth map: the 'DR' magic, the content flags, padding, the
+# image and depth-map sizes and the depth range. The image file name (uint16 length + bytes),
+# the neighbour view IDs (uint32 count + uint32 IDs) and the camera (K, R, C as doubles) follow.
+DMAP_HEADER = struct.Struct('<2sBBIIIIff')
+DMAP_MAGIC = b'DR'
+
+# How far a view's camera may have moved since its depth map was estimated for the depth map to
+# still be used. Registering new frames ends with a global bundle adjustment that nudges every
+# pose a little; a view that moved more than this is estimated again.
+MAX_ROTATION_CHANGE_DEGREES = 0.1
+# Fraction of the cameras' spread (median distance of the centers from their centroid)
+MAX_CENTER_CHANGE = 0.002
+# Relative change of the focal length and principal point (as fractions of the image size)
+MAX_INTRINSICS_CHANGE = 0.002
+
+def read_depth_map_header(path):
+    """
+    Reads the header of a raw OpenMVS depth map (.dmap), without its depth data.
+
+    Returns:
+        dict: {'image_name', 'image_size', 'depth_size', 'ids', 'K', 'R', 'C'}; K is the
+            camera matrix at the depth map's resolution, R and C the world-to-camera rotation
+            and the camera center.
+
+    Raises:
+        ValueError: If the file is not a raw depth map or is truncated.
+    """
+    with open(path, 'rb') as f:
+        def read(size):
+            data = f.read(size)
+            if len(data) != size:
+                raise ValueError(f"Truncated depth map: {path}")
+            return data
+        magic, _, _, image_width, image_height, depth_width, depth_height, _, _ = DMAP_HEADER.unpack(read(DMAP_HEADER.size))
+        if magic != DMAP_MAGIC:
+            raise ValueError(f"Not an OpenMVS depth map: {path}")
+        name_length, = struct.unpack('<H', read(2))
+        image_name = read(name_length).decode('utf-8', errors='replace')
+        id_count, = struct.unpack('<I', read(4))
+        ids = list(struct.unpack(f'<{id_count}I', read(4 * id_count)))
+        camera = np.frombuffer(read(8 * 21), dtype='<f8')
+    return {
+        'image_name': image_name,
+        'image_size': (image_width, image_height),
+        'depth_size': (depth_width, depth_height),
+        'ids': ids,
+        'K': camera[:9].reshape(3, 3),
+        'R': camera[9:18].reshape(3, 3),
+        'C': camera[18:],
+    }
+
+def scene_views(model_dir):
+    """
+    Lists the views of the OpenMVS scene InterfaceColmap makes from an undistorted COLMAP
+    model, in scene order (by COLMAP image ID).
+
+    Returns:
+        list: One dict per view: {'image_id', 'name', 'image_size', 'intrinsics', 'R', 'C'}, with
+            the intrinsics normalized by the image size (fx/w, fy/h, cx/w, cy/h), or None for a
+            camera model with distortion.
+    """
+    model = colmap_model.read_model(model_dir, include_points=False)
+    cameras = {int(camera['camera_id']): camera for camera in model.cameras}
+    rotations = colmap_model.qvec_to_rotmat(model.images['qvec'])
+    centers = model.camera_centers()
+    views = []
+    for index in np.argsort(model.images['image_id'], kind='stable'):
+        image = model.images[index]
+        camera = cameras[int(image['camera_id'])]
+        width, height = int(camera['width']), int(camera['height'])
+        model_name = colmap_model.CAMERA_MODELS[int(camera['model_id'])][0]
+        params = camera['params']
+        if model_name == 'SIMPLE_PINHOLE':
+            intrinsics = np.array([params[0] / width, params[0] / height, params[1] / width, params[2] / height])
+        elif model_name == 'PINHOLE':
+            intrinsics = np.array([params[0] / width, params[1] / height, params[2] / width, params[3] / height])
+        else:
+            intrinsics = None
+        views.append({
+            'image_id': int(image['image_id']),
+            'name': model.image_names[index],
+            'image_size': (width, height),
+            'intrinsics': intrinsics,
+            'R': rotations[index],
+            'C': centers[index],
+        })
+    return views
+
+def camera_unchanged(header, view, spread):
+    """
+    Whether the camera a depth map was estimated with (its header) matches a view's current
+    camera within the MAX_* tolerances. spread is the scale the center tolerance applies to.
+    """
+    if view['intrinsics'] is None or tuple(header['image_size']) != tuple(view['image_size']):
+        return False
+    # OpenMVS puts pixel centers at integer coordinates, COLMAP at +0.5. The depth map's size is
+    # the scaled image size rounded to whole pixels, which the comparison allows for.
+    (depth_width, depth_height), K = header['depth_size'], header['K']
+    sizes = np.array([depth_width, depth_height, depth_width, depth_height], dtype=np.float64)
+    intrinsics = np.array([K[0, 0], K[1, 1], K[0, 2] + 0.5, K[1, 2] + 0.5]) / sizes
+    tolerance = np.abs(view['intrinsics']) * (MAX_INTRINSICS_CHANGE + 0.5 / sizes)
+    if np.any(np.abs(intrinsics - view['intrinsics']) > tolerance):
+        return False
+    cosine = np.clip((np.trace(header['R'] @ view['R'].T) - 1) / 2, -1.0, 1.0)
+    if np.degrees(np.arccos(cosine)) > MAX_ROTATION_CHANGE_DEGREES:
+        return False
+    return np.linalg.norm(header['C'] - view['C']) <= MAX_CENTER_CHANGE * spread
+
+def prune_depth_maps(mvs_dir, model_dir, resolution_level=None):
+    """
+    Deletes the depth maps in an OpenMVS working directory that DensifyPointCloud must not
+    load for the scene of model_dir, then records the scene's views in the manifest.
+
+    A depth map is kept only if it was estimated at the same resolution level, its image is
+    at the same index of the scene as before (the scene's views up to it are the same, as
+    when frames registered later are appended after them) and its camera has not moved
+    beyond the MAX_* tolerances. DensifyPointCloud then only estimates the depth maps of the
+    new and moved views.
+
+    Args:
+        mvs_dir (str): OpenMVS working directory holding the depth*.dmap files.
+        model_dir (str): Undistorted COLMAP model the scene is made from (<undistorted>/sparse).
+        resolution_level (int, optional): DensifyPointCloud's --resolution-level (None for its default).
+
+    Returns:
+        dict: {'views', 'reused', 'deleted'} counts.
+    """
+    views = scene_views(model_dir)
+    manifest_path = os.path.join(mvs_dir, MANIFEST_NAME)
+    previous = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('resolution_level') == resolution_level:
+            previous = manifest['views']
+
+    unchanged = 0
+    for (image_id, name), view in zip(previous, views):
+        if image_id != view['image_id'] or name != view['name']:
+            break
+        unchanged += 1
+    # Views are matched to depth maps by the image file name in the header
+    by_name = {os.path.basename(view['name']): (index, view) for index, view in enumerate(views[:unchanged])}
+    centers = np.array([view['C'] for view in views]).reshape(-1, 3)
+    spread = float(np.median(np.linalg.norm(centers - centers.mean(axis=0), axis=1))) if len(views) else 0.0
+
+    reused = deleted = 0
+    for file_name in sorted(os.listdir(mvs_dir)) if os.path.isdir(mvs_dir) else []:
+        match = DEPTH_MAP_FILE.match(file_name)
+        if not match:
+            continue
+        path = os.path.join(mvs_dir, file_name)
+        try:
+            header = read_depth_map_header(path)
+        except (OSError, ValueError, struct.error):
+            header = None
+        found = by_name.get(os.path.basename(header['image_name'].replace('\\', '/'))) if header else None
+        if (found and int(match.group(1)) in (found[0], found[1]['image_id'])
+                and camera_unchanged(header, found[1], spread)):
+            reused += 1
+        else:
+            os.remove(path)
+            deleted += 1
+
+    os.makedirs(mvs_dir, exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump({'resolution_level': resolution_level,
+                   'views': [[view['image_id'], view['name']] for view in views]}, f, indent=2)
+    if reused or deleted:
+        print(f"Depth maps: reusing {reused} of {len(views)} views, deleted {deleted} stale depth map(s).")
+    return {'views': len(views), 'reused': reused, 'deleted': deleted}
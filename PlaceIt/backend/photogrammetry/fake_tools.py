@@ -0,0 +1,833 @@
+import argparse
+import json
+import os
+import sqlite3
+import stat
+import struct
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import colmap_model
+import depth_maps
+import glb_writer
+import obj_io
+import synthetic_capture
+
+# Deterministic stand-ins for the external tools of the pipeline, for benchmarking and
+# testing without COLMAP, OpenMVS or Blender installed. Each one takes the arguments
+# main.py passes to the real tool, prints the real tool's progress lines and writes the
+# files the next stage reads, with realistic formats and sizes, built from the scene of
+# synthetic_capture.py. `python fake_tools.py install <dir>` puts them in a directory
+# that can stand in for both PATH (colmap, blender) and --openmvs.
+TOOLS = ['colmap', 'InterfaceColmap', 'DensifyPointCloud', 'ReconstructMesh', 'RefineMesh', 'TextureMesh', 'blender']
+
+# Simulated work of each tool, in seconds per image (or per mesh chunk), so the benchmark
+# can model slow tools; 0 measures only the Python side and the file I/O
+DELAY_ENV = 'FAKE_TOOLS_DELAY'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Sizes of the outputs, scaled like the real tools' outputs:
+#   SIFT features per image per megapixel (COLMAP keeps at most 8192 by default)
+FEATURES_PER_MEGAPIXEL = 4000
+MAX_FEATURES = 8192
+#   matches stored per matched image pair
+MATCHES_PER_PAIR = 800
+#   sparse points triangulated per registered image
+SPARSE_POINTS_PER_IMAGE = 150
+#   dense points fused per pixel of the (downscaled) depth maps
+DENSE_POINTS_PER_PIXEL = 0.05
+#   mesh faces per dense point (Delaunay meshing gives about 2)
+MESH_FACES_PER_POINT = 2.0
+#   texels of the texture atlas per mesh face
+TEXELS_PER_FACE = 16
+MAX_TEXTURE_SIZE = 8192
+
+# The texture atlas holds one chart per grid of the stand-in mesh, in a square of
+# ATLAS_SLOTS x ATLAS_SLOTS slots with this margin (as a fraction of a slot) around each
+ATLAS_SLOTS = 3
+ATLAS_MARGIN = 0.02
+
+# Share of the mesh faces on the floor when the cloud was not filtered, and number of
+# small floating fragments and of holes the stand-in mesh has, for the cleanup to remove
+FLOOR_FACE_FRACTION = 0.3
+MESH_FRAGMENTS = 40
+MESH_HOLES = 12
+
+# Reprojection noise of the sparse observations, in pixels
+OBSERVATION_NOISE = 0.5
+
+# First line of the stand-in .mvs scenes: the tools read the scene description from it,
+# and a payload of the real format's size follows
+MVS_MAGIC = b'FAKEMVS '
+
+def tool_delay():
+    try:
+        return float(os.environ.get(DELAY_ENV, 0))
+    except ValueError:
+        return 0.0
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f'{minutes}m{seconds}s' if minutes else f'{seconds}s'
+
+def report_progress(label, total, started, line_format=None):
+    """
+    Simulates per-item work (see DELAY_ENV) and prints a progress line per item, in the
+    real tool's format: COLMAP's '<label> [i/N]' or OpenMVS's '<label> i (p%, elapsed, ETA t)'.
+    """
+    delay = tool_delay()
+    for done in range(1, total + 1):
+        if delay:
+            time.sleep(delay)
+        if line_format == 'colmap':
+            print(f"I0000 00:00:00.000000 fake_tools.py] {label} [{done}/{total}]", flush=True)
+        else:
+            elapsed = time.monotonic() - started
+            eta = elapsed / done * (total - done)
+            print(f"00:00:00 [App     ] {label} {done} ({100.0 * done / total:.2f}%, {format_duration(elapsed)}, "
+                  f"ETA {format_duration(eta)})...", flush=True)
+
+def payload(size, seed=0):
+    """
+    Returns size bytes of incompressible filler (a repeated random block), standing in for
+    the binary data of the real outputs so archiving and copying costs are realistic.
+    """
+    block = np.random.default_rng(seed).integers(0, 256, size=1 << 20, dtype=np.uint8).tobytes()
+    repeats, rest = divmod(int(size), len(block))
+    return block * repeats + block[:rest]
+
+def list_images(image_dir):
+    return sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def parse_options(args):
+    """
+    Parses COLMAP-style '--name value' arguments into a dict.
+    """
+    options = {}
+    for index in range(0, len(args) - 1, 2):
+        if not args[index].startswith('--'):
+            raise ValueError(f"Unexpected argument '{args[index]}'")
+        options[args[index][2:]] = args[index + 1]
+    return options
+
+# --- MVS scenes ---
+
+def write_scene(path, description, payload_size):
+    with open(path, 'wb') as f:
+        f.write(MVS_MAGIC + json.dumps(description).encode('utf-8') + b'\n')
+        f.write(payload(payload_size, seed=len(path)))
+
+def read_scene(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Scene file not found: {path}")
+    with open(path, 'rb') as f:
+        line = f.readline()
+    if not line.startswith(MVS_MAGIC):
+        raise ValueError(f"Not a scene written by the stand-in tools: {path}")
+    return json.loads(line[len(MVS_MAGIC):])
+
+def companion_ply(path):
+    return os.path.splitext(path)[0] + '.ply'
+
+# --- COLMAP ---
+
+def rotmat_to_qvec(rotation):
+    """
+    Converts a rotation matrix to a COLMAP quaternion (w, x, y, z) with w >= 0.
+    """
+    r = rotation
+    k = np.array([
+        [r[0, 0] - r[1, 1] - r[2, 2], 0, 0, 0],
+        [r[0, 1] + r[1, 0], r[1, 1] - r[0, 0] - r[2, 2], 0, 0],
+        [r[0, 2] + r[2, 0], r[1, 2] + r[2, 1], r[2, 2] - r[0, 0] - r[1, 1], 0],
+        [r[2, 1] - r[1, 2], r[0, 2] - r[2, 0], r[1, 0] - r[0, 1], r[0, 0] + r[1, 1] + r[2, 2]],
+    ]) / 3.0
+    values, vectors = np.linalg.eigh(k)
+    qvec = vectors[[3, 0, 1, 2], np.argmax(values)]
+    return qvec if qvec[0] >= 0 else -qvec
+
+def sparse_model(image_names, width, height, seed=0):
+    """
+    Builds the sparse model COLMAP would reconstruct from frames of the synthetic capture,
+    taken as evenly spaced around the orbit by one camera (see orbit_model).
+    """
+    count = len(image_names)
+    return orbit_model([{'image_id': index + 1, 'name': name, 'camera_id': 1, 'width': width, 'height': height,
+                         'angle': 2 * np.pi * index / count} for index, name in enumerate(image_names)], seed=seed)
+
+def orbit_model(views, seed=0):
+    """
+    Builds a sparse model of the synthetic capture from cameras on its orbit: every sampled
+    scene point is observed (with pixel noise) by the cameras that see its front side.
+
+    Args:
+        views (list): One dict per registered image: {'image_id', 'name', 'camera_id', 'width',
+            'height', 'angle'} (the camera's azimuth on the orbit, in radians).
+
+    Returns:
+        colmap_model.ColmapModel: The model, with tracks.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(views)
+    points, normals, colors = synthetic_capture.sample_surface(SPARSE_POINTS_PER_IMAGE * count, seed=seed, floor_fraction=0.5)
+
+    images = np.zeros(count, dtype=colmap_model.IMAGE_DTYPE)
+    observations = []
+    for index, view in enumerate(views):
+        width, height = view['width'], view['height']
+        focal, cx, cy = synthetic_capture.camera_intrinsics(width, height)
+        rotation, translation = synthetic_capture.camera_pose(view['angle'])
+        camera_points = points @ rotation.T + translation
+        center = -rotation.T @ translation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xy = camera_points[:, :2] / camera_points[:, 2:] * focal + [cx, cy]
+        visible = ((camera_points[:, 2] > 0) & (xy[:, 0] >= 0) & (xy[:, 0] < width) & (xy[:, 1] >= 0) & (xy[:, 1] < height)
+                   & (np.einsum('ij,ij->i', normals, center - points) > 0))
+        observed = np.flatnonzero(visible)
+        observations.append((observed, xy[observed] + rng.normal(0, OBSERVATION_NOISE, size=(len(observed), 2))))
+        images[index] = (view['image_id'], rotmat_to_qvec(rotation), translation, view['camera_id'], 0, 0)
+
+    # Points seen by fewer than two images are not triangulated
+    track_lengths = np.bincount(np.concatenate([observed for observed, _ in observations]), minlength=len(points))
+    kept = track_lengths >= 2
+    point_ids = np.cumsum(kept)
+
+    points2D, offsets, track_rows = [], [0], []
+    for index, (observed, xy) in enumerate(observations):
+        # Features without a 3D point (unmatched or filtered) make up about half of each image's keypoints
+        unmatched = rng.uniform([0, 0], [views[index]['width'], views[index]['height']], size=(len(observed), 2))
+        image_points = np.zeros(2 * len(observed), dtype=colmap_model.POINT2D_DTYPE)
+        image_points['xy'] = np.concatenate([xy, unmatched])
+        image_points['point3D_id'] = np.concatenate([np.where(kept[observed], point_ids[observed], -1),
+                                                     np.full(len(observed), -1)])
+        matched = np.flatnonzero(image_points['point3D_id'] >= 0)
+        track_rows.append(np.stack([image_points['point3D_id'][matched], np.full(len(matched), views[index]['image_id']), matched], axis=1))
+        images['num_points2D'][index] = len(image_points)
+        images['num_observations'][index] = len(matched)
+        points2D.append(image_points)
+        offsets.append(offsets[-1] + len(image_points))
+
+    track_rows = np.concatenate(track_rows)
+    track_rows = track_rows[np.argsort(track_rows[:, 0], kind='stable')]
+    tracks = np.zeros(len(track_rows), dtype=colmap_model.TRACK_DTYPE)
+    tracks['image_id'] = track_rows[:, 1]
+    tracks['point2D_idx'] = track_rows[:, 2]
+
+    points3D = np.zeros(int(kept.sum()), dtype=colmap_model.POINT3D_DTYPE)
+    points3D['point3D_id'] = np.arange(1, len(points3D) + 1)
+    points3D['xyz'] = points[kept]
+    points3D['rgb'] = colors[kept]
+    points3D['track_length'] = track_lengths[kept]
+    points3D['error'] = np.abs(rng.normal(OBSERVATION_NOISE, 0.15, size=len(points3D)))
+    track_offsets = np.concatenate([[0], np.cumsum(points3D['track_length'])])
+
+    camera_ids = sorted({view['camera_id'] for view in views})
+    cameras = np.zeros(len(camera_ids), dtype=colmap_model.CAMERA_DTYPE)
+    for row, camera_id in enumerate(camera_ids):
+        view = next(view for view in views if view['camera_id'] == camera_id)
+        focal, cx, cy = synthetic_capture.camera_intrinsics(view['width'], view['height'])
+        cameras[row]['camera_id'] = camera_id
+        cameras[row]['model_id'] = colmap_model.CAMERA_MODEL_IDS['SIMPLE_RADIAL']
+        cameras[row]['width'], cameras[row]['height'] = view['width'], view['height']
+        cameras[row]['num_params'] = 4
+        cameras[row]['params'][:4] = [focal, cx, cy, 0.0]
+    return colmap_model.ColmapModel(cameras, images, [view['name'] for view in views], np.concatenate(points2D), np.array(offsets),
+                                    points3D, tracks, track_offsets)
+
+def database_images(database_path):
+    """
+    Returns the images of a database in image ID order, as {'image_id', 'name', 'camera_id', 'width', 'height'} dicts.
+    """
+    with sqlite3.connect(database_path) as db:
+        rows = db.execute('SELECT image_id, name, images.camera_id, width, height FROM images '
+                          'JOIN cameras ON images.camera_id = cameras.camera_id ORDER BY image_id').fetchall()
+    return [dict(zip(('image_id', 'name', 'camera_id', 'width', 'height'), row)) for row in rows]
+
+def read_image_list(path):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def colmap_feature_extractor(options):
+    image_dir = options['image_path']
+    names = list_images(image_dir)
+    if 'image_list_path' in options:
+        listed = read_image_list(options['image_list_path'])
+        missing = sorted(set(listed) - set(names))
+        if missing:
+            raise FileNotFoundError(f"Listed images not found in {image_dir}: {', '.join(missing[:5])}")
+        names = listed
+    if not names:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+    rng = np.random.default_rng(0)
+    with sqlite3.connect(options['database_path']) as db:
+        db.execute('CREATE TABLE IF NOT EXISTS cameras (camera_id INTEGER PRIMARY KEY, width INTEGER, height INTEGER)')
+        db.execute('CREATE TABLE IF NOT EXISTS images (image_id INTEGER PRIMARY KEY, name TEXT UNIQUE, camera_id INTEGER)')
+        db.execute('CREATE TABLE IF NOT EXISTS keypoints (image_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB)')
+        db.execute('CREATE TABLE IF NOT EXISTS descriptors (image_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB)')
+        # Like COLMAP, images already in the database are skipped, and the new ones get the next
+        # image IDs and (with one camera per run) a new camera
+        existing = {name for name, in db.execute('SELECT name FROM images')}
+        names = [name for name in names if name not in existing]
+        next_image_id = (db.execute('SELECT MAX(image_id) FROM images').fetchone()[0] or 0) + 1
+        camera_id = None
+        for number, name in enumerate(names, 1):
+            with Image.open(os.path.join(image_dir, name)) as image:
+                width, height = image.size
+                image.convert('L').load()
+            if camera_id is None:
+                camera_id = (db.execute('SELECT MAX(camera_id) FROM cameras').fetchone()[0] or 0) + 1
+                db.execute('INSERT INTO cameras VALUES (?, ?, ?)', (camera_id, width, height))
+            image_id = next_image_id + number - 1
+            features = min(MAX_FEATURES, int(FEATURES_PER_MEGAPIXEL * width * height / 1e6))
+            db.execute('INSERT INTO images VALUES (?, ?, ?)', (image_id, name, camera_id))
+            db.execute('INSERT OR REPLACE INTO keypoints VALUES (?, ?, 6, ?)',
+                       (image_id, features, rng.random((features, 6), dtype=np.float32).tobytes()))
+            db.execute('INSERT OR REPLACE INTO descriptors VALUES (?, ?, 128, ?)',
+                       (image_id, features, payload(features * 128, seed=image_id)))
+            print(f"I0000 00:00:00.000000 fake_tools.py] Processed file [{number}/{len(names)}]", flush=True)
+            if tool_delay():
+                time.sleep(tool_delay())
+
+def colmap_matcher(kind, options):
+    images = database_images(options['database_path'])
+    ids = [image['image_id'] for image in images]
+    count = len(ids)
+    if kind == 'sequential_matcher':
+        overlap = int(options.get('SequentialMatching.overlap', 10))
+        pairs = [(ids[i], ids[j]) for i in range(count) for j in range(i + 1, min(count, i + 1 + overlap))]
+    elif kind == 'matches_importer':
+        by_name = {image['name']: image['image_id'] for image in images}
+        with open(options['match_list_path'], 'r') as f:
+            pairs = [tuple(by_name[name] for name in line.split()) for line in f if line.strip()]
+    elif kind == 'vocab_tree_matcher':
+        queries = set(read_image_list(options['VocabTreeMatching.match_list_path'])) if 'VocabTreeMatching.match_list_path' in options else None
+        pairs = [(image['image_id'], other) for image in images if queries is None or image['name'] in queries
+                 for other in ids if other != image['image_id']]
+    else:
+        pairs = [(ids[i], ids[j]) for i in range(count) for j in range(i + 1, count)]
+    with sqlite3.connect(options['database_path']) as db:
+        db.execute('CREATE TABLE IF NOT EXISTS matches (pair_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB)')
+        db.execute('CREATE TABLE IF NOT EXISTS two_view_geometries (pair_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB)')
+        for first, second in pairs:
+            first, second = min(first, second), max(first, second)
+            pair_id = first * 2147483647 + second
+            data = payload(MATCHES_PER_PAIR * 8, seed=pair_id % 997)
+            db.execute('INSERT OR REPLACE INTO matches VALUES (?, ?, 2, ?)', (pair_id, MATCHES_PER_PAIR, data))
+            db.execute('INSERT OR REPLACE INTO two_view_geometries VALUES (?, ?, 2, ?)', (pair_id, MATCHES_PER_PAIR, data))
+    if kind == 'exhaustive_matcher':
+        blocks = max(1, -(-count // 50))
+        for row in range(1, blocks + 1):
+            for col in range(1, blocks + 1):
+                print(f"I0000 00:00:00.000000 fake_tools.py] Matching block [{row}/{blocks}, {col}/{blocks}]", flush=True)
+    else:
+        report_progress('Matching image', len({first for first, _ in pairs}), time.monotonic(), line_format='colmap')
+
+def print_registered(image_ids):
+    delay = tool_delay()
+    for number, image_id in enumerate(image_ids, 1):
+        if delay:
+            time.sleep(delay)
+        print(f"I0000 00:00:00.000000 fake_tools.py] Registering image #{image_id} ({number})", flush=True)
+
+def colmap_mapper(options):
+    images = database_images(options['database_path'])
+    if len(images) < 2:
+        raise ValueError("No good initial image pair found.")
+    count = len(images)
+    model = orbit_model([dict(image, angle=2 * np.pi * index / count) for index, image in enumerate(images)])
+    print_registered(model.images['image_id'])
+    colmap_model.write_model(model, os.path.join(options['output_path'], '0'))
+
+def colmap_image_registrator(options):
+    """
+    Registers the database images missing from the input model. The model's images keep
+    their poses; the new ones are spread over the orbit between them.
+    """
+    model = colmap_model.read_model(options['input_path'], include_points=False)
+    centers = model.camera_centers()
+    angles = dict(zip(model.image_names, np.arctan2(centers[:, 1], centers[:, 0])))
+    images = database_images(options['database_path'])
+    new = [image for image in images if image['name'] not in angles]
+    if not new:
+        raise ValueError("No new images to register.")
+    views = [dict(image, angle=angles[image['name']]) for image in images if image['name'] in angles]
+    views += [dict(image, angle=2 * np.pi * (index + 0.5) / len(new)) for index, image in enumerate(new)]
+    print_registered([image['image_id'] for image in new])
+    colmap_model.write_model(orbit_model(sorted(views, key=lambda view: view['image_id'])), options['output_path'])
+
+def colmap_bundle_adjuster(options):
+    model = colmap_model.read_model(options['input_path'], include_tracks=True)
+    for iteration in range(1, 6):
+        print(f"I0000 00:00:00.000000 fake_tools.py] Bundle adjustment iteration {iteration}: "
+              f"{model.num_images} images, {model.num_points3D} points", flush=True)
+    colmap_model.write_model(model, options['output_path'])
+
+def colmap_image_undistorter(options):
+    model = colmap_model.read_model(options['input_path'], include_tracks=True)
+    output_dir = options['output_path']
+    max_size = int(options.get('max_image_size', 0)) or None
+    os.makedirs(os.path.join(output_dir, 'images'), exist_ok=True)
+    for name in ('depth_maps', 'normal_maps', 'consistency_graphs'):
+        os.makedirs(os.path.join(output_dir, 'stereo', name), exist_ok=True)
+
+    cameras = model.cameras
+    sizes = {int(camera['camera_id']): (int(camera['width']), int(camera['height'])) for camera in cameras}
+    scales = {camera_id: min(1.0, max_size / max(size)) if max_size else 1.0 for camera_id, size in sizes.items()}
+    for index, name in enumerate(model.image_names):
+        camera_id = int(model.images['camera_id'][index])
+        (width, height), scale = sizes[camera_id], scales[camera_id]
+        with Image.open(os.path.join(options['image_path'], name)) as image:
+            image = image.convert('RGB')
+            if scale < 1.0:
+                image = image.resize((round(width * scale), round(height * scale)), Image.BILINEAR)
+            image.save(os.path.join(output_dir, 'images', name), quality=95)
+        model.points2D['xy'][model.points2D_offsets[index]:model.points2D_offsets[index + 1]] *= scale
+        print(f"I0000 00:00:00.000000 fake_tools.py] Undistorting image [{index + 1}/{model.num_images}]", flush=True)
+        if tool_delay():
+            time.sleep(tool_delay())
+
+    # The undistorted model uses PINHOLE cameras at the size of the undistorted images
+    for camera in cameras:
+        (width, height), scale = sizes[int(camera['camera_id'])], scales[int(camera['camera_id'])]
+        focal, cx, cy = camera['params'][:3] * scale
+        camera['model_id'] = colmap_model.CAMERA_MODEL_IDS['PINHOLE']
+        camera['width'], camera['height'] = round(width * scale), round(height * scale)
+        camera['num_params'] = 4
+        camera['params'][:4] = [focal, focal, cx, cy]
+    colmap_model.write_model(model, os.path.join(output_dir, 'sparse'))
+    with open(os.path.join(output_dir, 'stereo', 'patch-match.cfg'), 'w') as f:
+        f.writelines(f'{name}\n__auto__, 20\n' for name in model.image_names)
+    with open(os.path.join(output_dir, 'stereo', 'fusion.cfg'), 'w') as f:
+        f.writelines(f'{name}\n' for name in model.image_names)
+
+def run_colmap(args):
+    if not args:
+        raise ValueError("Usage: colmap <command> [options]")
+    command, options = args[0], parse_options(args[1:])
+    if command == 'feature_extractor':
+        colmap_feature_extractor(options)
+    elif command in ('sequential_matcher', 'exhaustive_matcher', 'vocab_tree_matcher', 'matches_importer'):
+        colmap_matcher(command, options)
+    elif command == 'mapper':
+        colmap_mapper(options)
+    elif command == 'image_registrator':
+        colmap_image_registrator(options)
+    elif command == 'bundle_adjuster':
+        colmap_bundle_adjuster(options)
+    elif command == 'image_undistorter':
+        colmap_image_undistorter(options)
+    else:
+        raise ValueError(f"Unknown COLMAP command '{command}'")
+
+# --- OpenMVS ---
+
+def write_point_cloud(path, points, normals, colors, views, weights):
+    """
+    Writes a binary PLY cloud laid out like OpenMVS's, with per-point view lists
+    (views and weights are lists of (N, k) arrays, one per view count k).
+    """
+    header = ('ply\nformat binary_little_endian 1.0\n'
+              f'element vertex {len(points)}\n'
+              'property float x\nproperty float y\nproperty float z\n'
+              'property float nx\nproperty float ny\nproperty float nz\n'
+              'property uchar red\nproperty uchar green\nproperty uchar blue\n'
+              'property list uchar uint view_indices\nproperty list uchar float view_weights\n'
+              'end_header\n')
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        start = 0
+        for group_views, group_weights in zip(views, weights):
+            count, k = group_views.shape
+            rows = slice(start, start + count)
+            records = np.zeros(count, dtype=[('xyz', '<f4', 3), ('normal', '<f4', 3), ('rgb', 'u1', 3),
+                                             ('view_count', 'u1'), ('views', '<u4', k),
+                                             ('weight_count', 'u1'), ('weights', '<f4', k)])
+            records['xyz'], records['normal'], records['rgb'] = points[rows], normals[rows], colors[rows]
+            records['view_count'] = records['weight_count'] = k
+            records['views'], records['weights'] = group_views, group_weights
+            f.write(records.tobytes())
+            start += count
+
+def write_dense_cloud(path, count, image_count, seed=1):
+    """
+    Writes the dense cloud DensifyPointCloud would fuse from the synthetic capture: count
+    points on the box and the floor, each with the views of the image_count orbit cameras
+    nearest to it (two to five per point).
+    """
+    points, normals, colors = synthetic_capture.sample_surface(count, seed=seed, floor_fraction=0.45)
+    azimuth = np.arctan2(points[:, 1], points[:, 0]) % (2 * np.pi)
+    nearest = np.round(azimuth / (2 * np.pi) * image_count).astype(np.int64)
+    views, weights = [], []
+    for k, group in enumerate(np.array_split(np.arange(count), 4), 2):
+        views.append((nearest[group, None] + np.arange(k) - k // 2) % image_count)
+        weights.append(np.full((len(group), k), 1.0 / k, dtype=np.float32))
+    write_point_cloud(path, points, normals, colors, views, weights)
+
+def ply_vertex_count(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'element vertex'):
+                return int(line.split()[2])
+            if line.startswith(b'end_header'):
+                break
+    raise ValueError(f"PLY file has no vertex element: {path}")
+
+def interface_colmap(args):
+    parser = argparse.ArgumentParser(prog='InterfaceColmap')
+    parser.add_argument('-i', dest='input', required=True)
+    parser.add_argument('-o', dest='output', required=True)
+    parser.add_argument('-w', dest='working_folder')
+    options = parser.parse_args(args)
+    model = colmap_model.read_model(os.path.join(options.input, 'sparse'), include_points=False)
+    cameras = {int(camera['camera_id']): camera for camera in model.cameras}
+    rotations = colmap_model.qvec_to_rotmat(model.images['qvec'])
+    centers = model.camera_centers()
+    # Like InterfaceColmap, the scene's images are in image ID order, with OpenMVS cameras
+    # (pixel centers at integer coordinates)
+    views = []
+    for index in np.argsort(model.images['image_id'], kind='stable'):
+        camera = cameras[int(model.images['camera_id'][index])]
+        fx, fy, cx, cy = camera['params'][:4]
+        views.append({
+            'name': model.image_names[index],
+            'width': int(camera['width']),
+            'height': int(camera['height']),
+            'K': [[fx, 0.0, cx - 0.5], [0.0, fy, cy - 0.5], [0.0, 0.0, 1.0]],
+            'R': rotations[index].tolist(),
+            'C': centers[index].tolist(),
+        })
+    description = {
+        'image_dir': os.path.join(options.input, 'images'),
+        'images': [view['name'] for view in views],
+        'views': views,
+        'width': views[0]['width'],
+        'height': views[0]['height'],
+        'sparse_points': model.num_points3D,
+    }
+    # Per image: camera, pose and file name; per sparse point: position and view list
+    write_scene(options.output, description, 256 * model.num_images + 40 * model.num_points3D)
+    print(f"00:00:00 [App     ] Scene saved ({model.num_images} images, {model.num_points3D} points): {options.output}", flush=True)
+
+def write_depth_map(path, view, index, count, resolution_level):
+    """
+    Writes a raw OpenMVS depth map for a scene view: the header (image and depth-map sizes,
+    image name, neighbour views and the camera at the depth map's resolution) followed by
+    depth, normal and confidence per pixel, as float32.
+    """
+    # Like OpenMVS, the camera is scaled exactly and the depth-map size rounded to whole pixels
+    scale = 0.5 ** resolution_level
+    width, height = round(view['width'] * scale), round(view['height'] * scale)
+    K = np.array(view['K'])
+    K[:2, :2] *= scale
+    K[:2, 2] = (K[:2, 2] + 0.5) * scale - 0.5
+    neighbours = [(index + offset) % count for offset in (0, 1, -1, 2, -2)]
+    name = os.path.join('images', view['name']).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(depth_maps.DMAP_HEADER.pack(depth_maps.DMAP_MAGIC, 7, 0, view['width'], view['height'], width, height, 0.5, 6.0))
+        f.write(struct.pack('<H', len(name)) + name)
+        f.write(struct.pack(f'<I{len(neighbours)}I', len(neighbours), *neighbours))
+        f.write(np.concatenate([K.ravel(), np.ravel(view['R']), view['C']]).astype('<f8').tobytes())
+        f.write(payload(width * height * 20, seed=index))
+
+def densify_point_cloud(args):
+    parser = argparse.ArgumentParser(prog='DensifyPointCloud')
+    parser.add_argument('scene')
+    parser.add_argument('-w', dest='working_folder', required=True)
+    parser.add_argument('--resolution-level', type=int, default=1)
+    options = parser.parse_args(args)
+    scene = read_scene(options.scene)
+    count = len(scene['images'])
+    width, height = scene['width'] >> options.resolution_level, scene['height'] >> options.resolution_level
+
+    # Like DensifyPointCloud, depth maps already in the working folder are loaded, not estimated
+    paths = [os.path.join(options.working_folder, f'depth{index:04d}.dmap') for index in range(count)]
+    estimated = [index for index, path in enumerate(paths) if not os.path.exists(path)]
+    if len(estimated) < count:
+        print(f"00:00:00 [App     ] Loaded {count - len(estimated)} existing depth-maps", flush=True)
+    started = time.monotonic()
+    delay = tool_delay()
+    for done, index in enumerate(estimated, 1):
+        if delay:
+            time.sleep(delay)
+        write_depth_map(paths[index], scene['views'][index], index, count, options.resolution_level)
+        elapsed = time.monotonic() - started
+        print(f"00:00:00 [App     ] Estimated depth-maps {done} ({100.0 * done / len(estimated):.2f}%, "
+              f"{format_duration(elapsed)}, ETA {format_duration(elapsed / done * (len(estimated) - done))})...", flush=True)
+
+    total = max(1000, int(DENSE_POINTS_PER_PIXEL * count * width * height))
+    write_dense_cloud(companion_ply(os.path.join(options.working_folder, 'scene_dense.mvs')), total, count)
+    write_scene(os.path.join(options.working_folder, 'scene_dense.mvs'), dict(scene, dense_points=total), 16 * total)
+    print(f"00:00:00 [App     ] Densifying point-cloud completed: {total} points", flush=True)
+
+def scene_mesh(face_count, floor=True, seed=0):
+    """
+    Builds the mesh ReconstructMesh would produce from the synthetic scene: the box's five
+    visible faces as separate grids (their border vertices are duplicated, for the cleanup's
+    merge step), optionally a floor patch, small floating fragments and a few holes.
+
+    Each grid is a chart of the texture atlas, laid out in ATLAS_SLOTS x ATLAS_SLOTS slots.
+
+    Returns:
+        tuple: (positions (V, 3) float64, faces (F, 3) int64, uvs (V, 2) float64, charts) where
+            charts lists (slot, origin, u_axis, v_axis) of each grid, for painting the texture.
+    """
+    rng = np.random.default_rng(seed)
+    positions, faces, uvs, charts = [], [], [], []
+    base = 0
+
+    def add_grid(origin, u_axis, v_axis, cols, rows):
+        nonlocal base
+        slot = len(charts)
+        grid_u, grid_v = np.meshgrid(np.linspace(0, 1, cols + 1), np.linspace(0, 1, rows + 1))
+        grid_u, grid_v = grid_u.reshape(-1, 1), grid_v.reshape(-1, 1)
+        index = np.arange((rows + 1) * (cols + 1)).reshape(rows + 1, cols + 1) + base
+        a, b, c, d = index[:-1, :-1], index[:-1, 1:], index[1:, 1:], index[1:, :-1]
+        faces.append(np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3), np.stack([a, c, d], -1).reshape(-1, 3)]))
+        positions.append(origin + grid_u * u_axis + grid_v * v_axis)
+        corner = np.array([slot % ATLAS_SLOTS, slot // ATLAS_SLOTS])
+        uvs.append((corner + ATLAS_MARGIN + np.hstack([grid_u, grid_v]) * (1 - 2 * ATLAS_MARGIN)) / ATLAS_SLOTS)
+        charts.append((slot, origin, u_axis, v_axis))
+        base += len(grid_u)
+
+    floor_faces = int(face_count * FLOOR_FACE_FRACTION) if floor else 0
+    lower = synthetic_capture.BOX_CENTER - synthetic_capture.BOX_HALF_SIZE
+    size = synthetic_capture.BOX_HALF_SIZE * 2
+    area = 2 * (size[0] * size[2] + size[1] * size[2]) + size[0] * size[1]
+    spacing = np.sqrt(2 * area / max(face_count - floor_faces, 12))
+    ex, ey, ez = np.eye(3) * size
+    # (origin, u, v) per face, with u x v pointing outwards: -X, +X, -Y, +Y, +Z
+    for origin, u_axis, v_axis in [(lower, ez, ey), (lower + ex, ey, ez), (lower, ex, ez), (lower + ey, ez, ex), (lower + ez, ex, ey)]:
+        add_grid(origin, u_axis, v_axis, max(1, round(np.linalg.norm(u_axis) / spacing)),
+                 max(1, round(np.linalg.norm(v_axis) / spacing)))
+    if floor_faces:
+        # A square patch around the box, smaller than the box mesh so the cleanup drops it
+        side = max(1, int(np.sqrt(floor_faces / 2)))
+        extent = synthetic_capture.FLOOR_RADIUS * 0.6
+        add_grid(np.array([-extent, -extent, -0.005]), np.array([2 * extent, 0, 0]), np.array([0, 2 * extent, 0]), side, side)
+    fragment_uv = (np.array([ATLAS_SLOTS - 1, ATLAS_SLOTS - 1]) + 0.5) / ATLAS_SLOTS
+    for _ in range(MESH_FRAGMENTS):
+        center = rng.uniform([-2.0, -2.0, 0.2], [2.0, 2.0, 1.5])
+        positions.append(center + rng.normal(0, 0.01, size=(3, 3)))
+        faces.append(np.arange(3).reshape(1, 3) + base)
+        uvs.append(np.tile(fragment_uv, (3, 1)))
+        base += 3
+
+    positions = np.concatenate(positions)
+    faces = np.concatenate(faces)
+    # Surface roughness, a function of the position so duplicated border vertices still coincide
+    positions += (synthetic_capture._hash(np.round(positions * 1e4))[:, None] - 0.5) * 0.002 * [1, 1, 0.5]
+    holes = rng.choice(len(faces) - MESH_FRAGMENTS, size=min(MESH_HOLES, len(faces) // 100), replace=False)
+    return positions, np.delete(faces, holes, axis=0), np.concatenate(uvs), charts
+
+def paint_atlas(charts, size):
+    """
+    Paints the texture atlas of scene_mesh's charts with the scene's colors, as TextureMesh
+    projects the frames onto the mesh. Shading is not baked in and texels outside the charts stay black.
+
+    Returns:
+        numpy.ndarray: (size, size, 3) uint8 image, row 0 at the top (v = 1).
+    """
+    # Colors are computed at a quarter of the resolution and upscaled, with per-texel noise on top
+    slot_size = max(4, size // ATLAS_SLOTS // 4)
+    atlas = np.zeros((slot_size * ATLAS_SLOTS, slot_size * ATLAS_SLOTS, 3), dtype=np.uint8)
+    grid = (np.arange(slot_size) + 0.5) / slot_size
+    grid_u, grid_v = np.meshgrid(grid, grid)
+    for slot, origin, u_axis, v_axis in charts:
+        points = origin + grid_u.reshape(-1, 1) * u_axis + grid_v.reshape(-1, 1) * v_axis
+        normal = np.cross(u_axis, v_axis)
+        normals = np.tile(normal / np.linalg.norm(normal), (len(points), 1))
+        colors = synthetic_capture.surface_color(points, normals).reshape(slot_size, slot_size, 3)
+        row = ATLAS_SLOTS - 1 - slot // ATLAS_SLOTS
+        col = slot % ATLAS_SLOTS
+        atlas[row * slot_size:(row + 1) * slot_size, col * slot_size:(col + 1) * slot_size] = colors[::-1].round()
+    texture = np.asarray(Image.fromarray(atlas).resize((size, size), Image.NEAREST), dtype=np.int16)
+    texture += np.random.default_rng(0).integers(-12, 13, size=texture.shape, dtype=np.int16)
+    return np.clip(texture, 0, 255).astype(np.uint8)
+
+def write_mesh_ply(path, positions, faces):
+    header = ('ply\nformat binary_little_endian 1.0\n'
+              f'element vertex {len(positions)}\nproperty float x\nproperty float y\nproperty float z\n'
+              f'element face {len(faces)}\nproperty list uchar uint vertex_indices\nend_header\n')
+    records = np.zeros(len(faces), dtype=[('count', 'u1'), ('indices', '<u4', 3)])
+    records['count'] = 3
+    records['indices'] = faces
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(positions.astype('<f4').tobytes())
+        f.write(records.tobytes())
+
+def write_mesh_scene(path, scene, spec):
+    positions, faces, _, _ = scene_mesh(**spec)
+    write_mesh_ply(companion_ply(path), positions, faces)
+    write_scene(path, dict(scene, mesh=spec), 256 * len(scene['images']) + 12 * len(positions) + 12 * len(faces))
+    return len(positions), len(faces)
+
+def reconstruct_mesh(args):
+    parser = argparse.ArgumentParser(prog='ReconstructMesh')
+    parser.add_argument('scene')
+    parser.add_argument('-w', dest='working_folder', required=True)
+    parser.add_argument('--decimate', type=float, default=1.0)
+    parser.add_argument('--pointcloud-file')
+    options = parser.parse_args(args)
+    scene = read_scene(options.scene)
+    points = ply_vertex_count(options.pointcloud_file) if options.pointcloud_file else scene['dense_points']
+    spec = {'face_count': int(points * MESH_FACES_PER_POINT * options.decimate), 'floor': not options.pointcloud_file}
+    report_progress('Delaunay tetrahedralization', 4, time.monotonic())
+    vertices, faces = write_mesh_scene(os.path.join(options.working_folder, 'scene_dense_mesh.mvs'), scene, spec)
+    print(f"00:00:00 [App     ] Mesh reconstruction completed: {vertices} vertices, {faces} faces", flush=True)
+
+def refine_mesh(args):
+    parser = argparse.ArgumentParser(prog='RefineMesh')
+    parser.add_argument('scene')
+    parser.add_argument('-w', dest='working_folder', required=True)
+    options = parser.parse_args(args)
+    scene = read_scene(options.scene)
+    report_progress('Refined mesh', 4, time.monotonic())
+    output = os.path.splitext(options.scene)[0] + '_refine.mvs'
+    vertices, faces = write_mesh_scene(output, scene, scene['mesh'])
+    print(f"00:00:00 [App     ] Mesh refinement completed: {vertices} vertices, {faces} faces", flush=True)
+
+def write_textured_mesh(obj_path, spec, resolution_level=0):
+    """
+    Writes the textured mesh TextureMesh exports: the OBJ of scene_mesh(**spec) with its
+    MTL and its texture atlas (a JPEG), named like OpenMVS's.
+
+    Returns:
+        tuple: (face count, texture size)
+    """
+    positions, faces, uvs, charts = scene_mesh(**spec)
+    size = min(MAX_TEXTURE_SIZE >> resolution_level,
+               1 << int(np.ceil(np.log2(max(np.sqrt(len(faces) * TEXELS_PER_FACE), 256)))))
+    base = os.path.splitext(obj_path)[0]
+    texture_name = os.path.basename(base) + '_material_00_map_Kd.jpg'
+    Image.fromarray(paint_atlas(charts, size)).save(os.path.join(os.path.dirname(base), texture_name), quality=90)
+    with open(base + '.mtl', 'w') as f:
+        f.write(f'newmtl material_00\nKa 1.000000 1.000000 1.000000\nKd 1.000000 1.000000 1.000000\n'
+                f'Ks 0.000000 0.000000 0.000000\nd 1.000000\nillum 1\nmap_Kd {texture_name}\n')
+    mesh = obj_io.Mesh(positions, faces, uvs=uvs, face_uvs=faces, material_names=['material_00'],
+                       mtllib=os.path.basename(base) + '.mtl')
+    obj_io.write_obj(mesh, obj_path)
+    return len(faces), size
+
+def texture_mesh(args):
+    parser = argparse.ArgumentParser(prog='TextureMesh')
+    parser.add_argument('scene')
+    parser.add_argument('--working-folder', required=True)
+    parser.add_argument('--output-file', required=True)
+    parser.add_argument('--export-type', default='ply')
+    parser.add_argument('--resolution-level', type=int, default=0)
+    options = parser.parse_args(args)
+    if options.export_type != 'obj':
+        raise ValueError(f"The stand-in TextureMesh only exports OBJ, not '{options.export_type}'")
+    scene = read_scene(options.scene)
+    report_progress('Assigned views', 4, time.monotonic())
+    faces, size = write_textured_mesh(options.output_file, scene['mesh'], options.resolution_level)
+    print(f"00:00:00 [App     ] Mesh texturing completed: {faces} faces, {size}x{size} texture", flush=True)
+
+# --- Blender ---
+
+def blender_convert(input_obj, output_glb, skip_cleanup):
+    """
+    Converts with the native GLB writer in place of Blender's import, cleanup and export,
+    printing the step lines obj_to_glb_cleanup.py prints.
+    """
+    steps = glb_writer.obj_to_glb(input_obj, output_glb, cleanup=not skip_cleanup)
+    for step in steps:
+        print(f"Step '{step['step'].replace('/', '_')}' took {step['wall_seconds']:.2f}s", flush=True)
+    print("Finished glTF 2.0 export", flush=True)
+    return steps
+
+def blender(args):
+    script_args = args[args.index('--') + 1:] if '--' in args else []
+    parser = argparse.ArgumentParser(prog='blender')
+    parser.add_argument('input_obj', nargs='?')
+    parser.add_argument('output_glb', nargs='?')
+    parser.add_argument('--trace')
+    parser.add_argument('--skip-cleanup', action='store_true')
+    parser.add_argument('--cleanup-mode', default='operators')
+    parser.add_argument('--serve', action='store_true')
+    options = parser.parse_args(script_args)
+
+    if options.serve:
+        # Same protocol as obj_to_glb_cleanup.serve (see blender_server.py)
+        reply_prefix = '@@obj_to_glb@@ '
+        print(reply_prefix + json.dumps({'ready': True, 'blender_version': 'stand-in', 'startup_seconds': 0.0}), flush=True)
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            started = time.monotonic()
+            reply = {'ok': True, 'error': None, 'steps': []}
+            try:
+                job = json.loads(line)
+                reply['id'] = job.get('id')
+                reply['steps'] = blender_convert(job['input_obj'], job['output_glb'], job.get('skip_cleanup', False))
+            except Exception as e:
+                reply.update(ok=False, error=str(e))
+            reply['wall_seconds'] = round(time.monotonic() - started, 3)
+            print(reply_prefix + json.dumps(reply), flush=True)
+        return
+
+    if not options.input_obj or not options.output_glb:
+        raise ValueError(f"Expected arguments (input_obj_path, output_glb_path [--trace path]), got: {script_args}")
+    steps = blender_convert(options.input_obj, options.output_glb, options.skip_cleanup)
+    if options.trace:
+        with open(options.trace, 'w') as f:
+            json.dump({'steps': steps}, f, indent=2)
+
+# --- Installation ---
+
+def install(bin_dir):
+    """
+    Writes a launcher per stand-in tool into bin_dir.
+
+    Returns:
+        str: The absolute path of bin_dir.
+    """
+    bin_dir = os.path.abspath(bin_dir)
+    os.makedirs(bin_dir, exist_ok=True)
+    script = os.path.abspath(__file__)
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" {tool} "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+TOOL_FUNCTIONS = {
+    'colmap': run_colmap,
+    'InterfaceColmap': interface_colmap,
+    'DensifyPointCloud': densify_point_cloud,
+    'ReconstructMesh': reconstruct_mesh,
+    'RefineMesh': refine_mesh,
+    'TextureMesh': texture_mesh,
+    'blender': blender,
+}
+
+def main():
+    """
+    Command-line entry point:
+
+        python fake_tools.py install <bin dir>
+        python fake_tools.py <tool> [tool arguments...]   (what the launchers run)
+    """
+    if len(sys.argv) >= 2 and sys.argv[1] in TOOL_FUNCTIONS:
+        try:
+            TOOL_FUNCTIONS[sys.argv[1]](sys.argv[2:])
+        except (FileNotFoundError, ValueError, KeyError, OSError) as e:
+            print(f"ERROR: {sys.argv[1]}: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser(description="Deterministic stand-ins for COLMAP, OpenMVS and Blender.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    install_parser = subparsers.add_parser('install', help=f"Write launchers for {', '.join(TOOLS)} into a directory.")
+    install_parser.add_argument('bin_dir', help='Directory to put on PATH and pass as --openmvs.')
+    args = parser.parse_args()
+    print(f"Stand-in tools installed in {install(args.bin_dir)}")
+
+if __name__ == '__main__':
+    main()
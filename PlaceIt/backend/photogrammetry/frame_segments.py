@@ -0,0 +1,199 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Segments per worker process: a few more segments than processes evens out
+# segments that decode at different speeds (e.g. around scene changes)
+SEGMENTS_PER_WORKER = 2
+
+# Shortest segment worth its own FFmpeg process, in seconds of video
+MIN_SEGMENT_SECONDS = 5.0
+
+# ffprobe only reads the container header; a probe taking longer than this is stuck
+PROBE_TIMEOUT_SECONDS = 60
+
+# Synthetic clips generated by the benchmark when no videos are given
+BENCHMARK_RESOLUTIONS = {'1080p': '1920x1080', '4k': '3840x2160'}
+BENCHMARK_CLIP_SECONDS = 30
+
+def probe_duration(video_path, run=None):
+    """
+    Returns the duration of a video in seconds, as reported by ffprobe.
+
+    Args:
+        video_path (str): Full path to the video file.
+        run (callable, optional): Runs a command (list) like main.run_command with capture_output=True
+            and returns its subprocess.CompletedProcess, raising if it fails or exceeds
+            PROBE_TIMEOUT_SECONDS. Defaults to subprocess.run.
+
+    Raises:
+        ValueError: If ffprobe reports no duration.
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        video_path
+    ]
+    if run is None:
+        run = lambda command: subprocess.run(command, capture_output=True, text=True, check=True,
+                                             timeout=PROBE_TIMEOUT_SECONDS)
+    output = run(command).stdout.strip()
+    try:
+        return float(output)
+    except ValueError:
+        raise ValueError(f"Could not read the duration of {video_path} (ffprobe returned {output!r}).")
+
+def plan_segments(duration, fps, workers):
+    """
+    Splits a video into time segments for parallel frame extraction.
+
+    Segment boundaries fall on multiples of the sampling interval (1/fps), so every
+    segment samples the same time grid a single pass over the whole video would.
+
+    Args:
+        duration (float): Video duration in seconds.
+        fps (float): Extraction rate in frames per second.
+        workers (int): Number of FFmpeg processes that will run at once.
+
+    Returns:
+        list: (start_seconds, frame_count) per segment, in order; the last segment's
+            frame_count is None (it runs to the end of the video).
+    """
+    total_frames = max(1, int(duration * fps))
+    min_frames = max(1, int(MIN_SEGMENT_SECONDS * fps))
+    count = max(1, min(workers * SEGMENTS_PER_WORKER, total_frames // min_frames))
+    frames_per_segment = -(-total_frames // count)
+    segments = []
+    for first_frame in range(0, total_frames, frames_per_segment):
+        segments.append((first_frame / fps, frames_per_segment))
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+def segment_command(video_path, output_pattern, start, frame_count, fps, threads):
+    """
+    FFmpeg command extracting one segment's frames.
+
+    -ss before -i seeks to the keyframe preceding start and then decodes up to start
+    exactly, so segments neither overlap nor miss frames; -frames:v caps the segment
+    at its planned frame count.
+    """
+    command = ['ffmpeg', '-v', 'error', '-threads', str(threads)]
+    if start > 0:
+        command += ['-ss', f'{start:.6f}']
+    command += ['-i', video_path]
+    if frame_count is not None:
+        command += ['-t', f'{frame_count / fps:.6f}', '-frames:v', str(frame_count)]
+    command += ['-vf', f'fps={fps}', '-threads', str(threads), output_pattern]
+    return command
+
+def merge_segment_frames(segment_dirs, output_images_dir, name_pattern='frame_%04d.jpg'):
+    """
+    Moves the frames of each segment directory, in segment order, into output_images_dir
+    with one gap-free numbering starting at 1.
+
+    Returns:
+        int: Number of frames moved.
+    """
+    number = 0
+    for segment_dir in segment_dirs:
+        for frame in sorted(glob.glob(os.path.join(segment_dir, '*.jpg'))):
+            number += 1
+            os.replace(frame, os.path.join(output_images_dir, name_pattern % number))
+    return number
+
+def generate_clip(path, resolution, seconds=BENCHMARK_CLIP_SECONDS, rate=30):
+    """
+    Writes a synthetic H.264 test clip (FFmpeg's testsrc2 pattern) for benchmarking.
+    """
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={rate}',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-g', str(rate * 2),
+        path
+    ]
+    subprocess.run(command, check=True)
+
+def benchmark(videos, fps, workers, repeats=1):
+    """
+    Times the single-process and the segmented frame extraction on each video.
+
+    Returns:
+        list: One dict per video and mode with the frame count and the best wall time.
+    """
+    # Imported here: main imports this module
+    import main
+
+    results = []
+    for video in videos:
+        for mode, mode_workers in (('single', 1), ('segmented', workers)):
+            best = None
+            frame_count = 0
+            for _ in range(repeats):
+                output_dir = tempfile.mkdtemp(prefix='frames_benchmark_')
+                try:
+                    started = time.monotonic()
+                    main.extract_frames(video, output_dir, fps, workers=mode_workers)
+                    elapsed = time.monotonic() - started
+                    frame_count = len(glob.glob(os.path.join(output_dir, 'frame_*.jpg')))
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({'video': os.path.basename(video), 'mode': mode, 'workers': mode_workers,
+                            'frames': frame_count, 'wall_seconds': round(best, 3)})
+    return results
+
+def main():
+    """
+    Command-line entry point:
+
+        python frame_segments.py benchmark [video ...] [--fps 2] [--workers N] [--repeats 3] [--report path]
+
+    Without videos, synthetic 1080p and 4K clips are generated in a temporary directory.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark segmented, parallel frame extraction against a single FFmpeg process.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('benchmark', help='Compare single-process and segmented extraction.')
+    bench_parser.add_argument('videos', nargs='*', help='Videos to extract from (default: generated 1080p and 4K clips).')
+    bench_parser.add_argument('--fps', type=float, default=2, help='Extraction rate (default: 2).')
+    bench_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel FFmpeg processes (default: number of CPUs).')
+    bench_parser.add_argument('--repeats', type=int, default=1, help='Runs per video and mode; the best time is reported (default: 1).')
+    bench_parser.add_argument('--report', help='Write the results as JSON to this path.')
+    args = parser.parse_args()
+
+    clip_dir = None
+    videos = args.videos
+    if not videos:
+        clip_dir = tempfile.mkdtemp(prefix='frames_benchmark_clips_')
+        videos = []
+        for name, resolution in BENCHMARK_RESOLUTIONS.items():
+            path = os.path.join(clip_dir, f'{name}.mp4')
+            print(f"Generating {BENCHMARK_CLIP_SECONDS}s {name} test clip...")
+            generate_clip(path, resolution)
+            videos.append(path)
+    try:
+        results = benchmark(videos, args.fps, args.workers, repeats=args.repeats)
+    except (FileNotFoundError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if clip_dir:
+            shutil.rmtree(clip_dir, ignore_errors=True)
+
+    print(f"\n{'video':<24} {'mode':<10} {'workers':>7} {'frames':>7} {'seconds':>9}")
+    for result in results:
+        print(f"{result['video']:<24} {result['mode']:<10} {result['workers']:>7} {result['frames']:>7} {result['wall_seconds']:>9.2f}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
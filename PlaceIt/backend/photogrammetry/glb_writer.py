@@ -0,0 +1,659 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import decimate
+import mesh_cleanup
+import meshopt
+import obj_io
+
+GLB_MAGIC = 0x46546C67  # 'glTF'
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A  # 'JSON'
+CHUNK_BIN = 0x004E4942  # 'BIN\0'
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+COMPONENT_TYPES = {
+    np.dtype(np.int8): 5120,
+    np.dtype(np.uint8): 5121,
+    np.dtype(np.int16): 5122,
+    np.dtype(np.uint16): 5123,
+    np.dtype(np.uint32): 5125,
+    np.dtype(np.float32): 5126,
+}
+ACCESSOR_TYPES = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4'}
+
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.webp': 'image/webp',
+}
+
+# Sampler used for all textures: trilinear filtering, repeat wrapping
+LINEAR_MIPMAP_LINEAR = 9987
+LINEAR = 9729
+REPEAT = 10497
+
+def _padding(length, alignment=4):
+    return (alignment - length % alignment) % alignment
+
+class GlbBuilder:
+    """
+    Assembles a glTF 2.0 document and its binary buffer and writes them as a single GLB file.
+
+    Binary data (vertex arrays, images) is only referenced until write() streams it to
+    disk, so building a file does not need a second in-memory copy of the buffer.
+    """
+
+    def __init__(self, generator='PlaceIt photogrammetry pipeline'):
+        self.document = {
+            'asset': {'version': '2.0', 'generator': generator},
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+        }
+        self._blobs = []
+        self._byte_length = 0
+        self._images = {}
+        self._materials = {}
+        # Node transform (translation, scale) that dequantizes each quantized mesh's positions
+        self.mesh_transforms = {}
+
+    def _append(self, key, item):
+        items = self.document.setdefault(key, [])
+        items.append(item)
+        return len(items) - 1
+
+    def use_extension(self, name, required=False):
+        """
+        Declares an extension as used (and optionally required) by the file.
+        """
+        used = self.document.setdefault('extensionsUsed', [])
+        if name not in used:
+            used.append(name)
+        if required:
+            required_list = self.document.setdefault('extensionsRequired', [])
+            if name not in required_list:
+                required_list.append(name)
+
+    def add_buffer_view(self, data, target=None, byte_stride=None):
+        """
+        Adds binary data (bytes or a contiguous NumPy array) as a 4-byte aligned buffer view.
+
+        Returns:
+            int: The buffer view index.
+        """
+        blob = memoryview(np.ascontiguousarray(data) if isinstance(data, np.ndarray) else data).cast('B')
+        self._byte_length += _padding(self._byte_length)
+        view = {'buffer': 0, 'byteOffset': self._byte_length, 'byteLength': blob.nbytes}
+        if target is not None:
+            view['target'] = target
+        if byte_stride is not None:
+            view['byteStride'] = byte_stride
+        self._blobs.append((self._byte_length, blob))
+        self._byte_length += blob.nbytes
+        return self._append('bufferViews', view)
+
+    def view_nbytes(self, view):
+        return self.document['bufferViews'][view]['byteLength']
+
+    def add_accessor(self, array, target=None, normalized=False, bounds=False, buffer_view=None, byte_offset=0, count=None):
+        """
+        Adds an accessor for a (count,) or (count, components) array.
+
+        Args:
+            array (numpy.ndarray): The data; its dtype gives the component type.
+            target (int, optional): Buffer view target (ARRAY_BUFFER or ELEMENT_ARRAY_BUFFER). Defaults to None.
+            normalized (bool, optional): Integer components are normalized to [0, 1] or [-1, 1]. Defaults to False.
+            bounds (bool, optional): Record the per-component min and max (required for POSITION). Defaults to False.
+            buffer_view (int, optional): Existing buffer view holding the data. Defaults to a new view of array.
+            byte_offset (int, optional): Offset of the data within buffer_view. Defaults to 0.
+            count (int, optional): Element count when array is only a template for buffer_view. Defaults to len(array).
+
+        Returns:
+            int: The accessor index.
+        """
+        components = 1 if array.ndim == 1 else array.shape[1]
+        if buffer_view is None:
+            buffer_view = self.add_buffer_view(array, target=target)
+        accessor = {
+            'bufferView': buffer_view,
+            'componentType': COMPONENT_TYPES[array.dtype],
+            'count': int(len(array) if count is None else count),
+            'type': ACCESSOR_TYPES[components],
+        }
+        if byte_offset:
+            accessor['byteOffset'] = int(byte_offset)
+        if normalized:
+            accessor['normalized'] = True
+        if bounds and len(array):
+            values = array.reshape(len(array), components)
+            cast = float if array.dtype.kind == 'f' else int
+            accessor['min'] = [cast(v) for v in values.min(axis=0)]
+            accessor['max'] = [cast(v) for v in values.max(axis=0)]
+        return self._append('accessors', accessor)
+
+    def add_image(self, path):
+        """
+        Embeds an image file in the buffer (once per path) and returns its image index.
+
+        Raises:
+            FileNotFoundError: If the image does not exist.
+            ValueError: If the image format cannot be stored in a glTF file.
+        """
+        path = os.path.abspath(path)
+        if path in self._images:
+            return self._images[path]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Texture image not found: {path}")
+        mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(path)[1].lower())
+        if mime_type is None:
+            raise ValueError(f"Unsupported texture format for GLB: {path}")
+        with open(path, 'rb') as f:
+            view = self.add_buffer_view(f.read())
+        image = self._append('images', {'bufferView': view, 'mimeType': mime_type, 'name': os.path.basename(path)})
+        self._images[path] = image
+        return image
+
+    def add_texture(self, image):
+        """
+        Adds a texture that samples an image with the default sampler; returns the texture index.
+        WebP images are referenced through EXT_texture_webp, as core glTF only allows PNG and JPEG.
+        """
+        if 'samplers' not in self.document:
+            self._append('samplers', {'magFilter': LINEAR, 'minFilter': LINEAR_MIPMAP_LINEAR, 'wrapS': REPEAT, 'wrapT': REPEAT})
+        texture = {'sampler': 0}
+        if self.document['images'][image]['mimeType'] == 'image/webp':
+            self.use_extension('EXT_texture_webp', required=True)
+            texture['extensions'] = {'EXT_texture_webp': {'source': image}}
+        else:
+            texture['source'] = image
+        return self._append('textures', texture)
+
+    def add_material(self, name, texture=None, base_color=None):
+        """
+        Adds a non-metallic, fully rough PBR material, as photogrammetry textures already contain
+        the lighting. Returns the material index.
+        """
+        pbr = {'metallicFactor': 0.0, 'roughnessFactor': 1.0}
+        if texture is not None:
+            pbr['baseColorTexture'] = {'index': texture}
+        if base_color is not None:
+            pbr['baseColorFactor'] = [float(c) for c in base_color]
+        return self._append('materials', {'name': name, 'pbrMetallicRoughness': pbr})
+
+    def add_obj_material(self, name, material):
+        """
+        Adds an MTL material (as read by obj_io.read_mtl) once per name, with its diffuse map
+        as the base color texture, and returns its material index.
+        """
+        if name not in self._materials:
+            texture = None
+            if material['map_Kd']:
+                texture = self.add_texture(self.add_image(material['map_Kd']))
+            base_color = None if texture is not None else material['Kd'] + [material['d']]
+            self._materials[name] = self.add_material(name, texture=texture, base_color=base_color)
+        return self._materials[name]
+
+    def add_mesh(self, name, primitives):
+        """
+        Adds a mesh from a list of primitive dicts ({'attributes': {...}, 'indices': ..., 'material': ...}).
+        """
+        return self._append('meshes', {'name': name, 'primitives': primitives})
+
+    def add_node(self, name, mesh=None, extensions=None, root=True):
+        """
+        Adds a node (optionally showing a mesh); root nodes are added to the default scene.
+        """
+        node = {'name': name}
+        if mesh is not None:
+            node['mesh'] = mesh
+            node.update(self.mesh_transforms.get(mesh, {}))
+        if extensions:
+            node['extensions'] = extensions
+        index = self._append('nodes', node)
+        if root:
+            self.document['scenes'][0]['nodes'].append(index)
+        return index
+
+    def write(self, glb_path):
+        """
+        Writes the GLB file: header, JSON chunk, then the binary chunk streamed view by view.
+        """
+        self._byte_length += _padding(self._byte_length)
+        if self._byte_length:
+            self.document['buffers'] = [{'byteLength': self._byte_length}]
+        json_bytes = json.dumps(self.document, separators=(',', ':')).encode('utf-8')
+        json_bytes += b' ' * _padding(len(json_bytes))
+        total = 12 + 8 + len(json_bytes) + (8 + self._byte_length if self._byte_length else 0)
+
+        os.makedirs(os.path.dirname(os.path.abspath(glb_path)), exist_ok=True)
+        with open(glb_path, 'wb') as f:
+            f.write(struct.pack('<III', GLB_MAGIC, GLB_VERSION, total))
+            f.write(struct.pack('<II', len(json_bytes), CHUNK_JSON))
+            f.write(json_bytes)
+            if self._byte_length:
+                f.write(struct.pack('<II', self._byte_length, CHUNK_BIN))
+                written = 0
+                for offset, blob in self._blobs:
+                    f.write(b'\0' * (offset - written))
+                    f.write(blob)
+                    written = offset + blob.nbytes
+                f.write(b'\0' * (self._byte_length - written))
+        return total
+
+COMPONENT_DTYPES = {component_type: dtype for dtype, component_type in COMPONENT_TYPES.items()}
+ACCESSOR_COMPONENTS = {accessor_type: components for components, accessor_type in ACCESSOR_TYPES.items()}
+
+def read_glb(glb_path):
+    """
+    Reads a GLB file.
+
+    Returns:
+        tuple: (glTF document as a dict, binary chunk as bytes; empty if the file has none)
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file is not a glTF 2.0 binary.
+    """
+    if not os.path.exists(glb_path):
+        raise FileNotFoundError(f"GLB file not found: {glb_path}")
+    with open(glb_path, 'rb') as f:
+        data = f.read()
+    if len(data) < 12:
+        raise ValueError(f"Not a GLB file: {glb_path}")
+    magic, version, length = struct.unpack_from('<III', data)
+    if magic != GLB_MAGIC or version != GLB_VERSION:
+        raise ValueError(f"Not a glTF 2.0 binary file: {glb_path}")
+    document, binary = None, b''
+    offset = 12
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            document = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+    if document is None:
+        raise ValueError(f"GLB file has no JSON chunk: {glb_path}")
+    return document, binary
+
+def read_accessor(document, binary, index):
+    """
+    Reads an accessor of a GLB read with read_glb as a (count, components) array.
+    Normalized integer components are converted to floats.
+    """
+    accessor = document['accessors'][index]
+    view = document['bufferViews'][accessor['bufferView']]
+    dtype = COMPONENT_DTYPES[accessor['componentType']]
+    components = ACCESSOR_COMPONENTS[accessor['type']]
+    stride = view.get('byteStride', dtype.itemsize * components)
+    values = np.ndarray((accessor['count'], components), dtype=dtype, buffer=binary,
+                        offset=view.get('byteOffset', 0) + accessor.get('byteOffset', 0),
+                        strides=(stride, dtype.itemsize))
+    if accessor.get('normalized'):
+        limit = np.iinfo(dtype).max
+        return np.maximum(values.astype(np.float32) / limit, -1.0)
+    return values.copy()
+
+def rewrite_glb(document, binary, glb_path, replaced_views=None):
+    """
+    Writes a GLB read with read_glb back out, with new data for some buffer views.
+
+    Args:
+        document (dict): The glTF document (may have been edited).
+        binary (bytes): The original binary chunk.
+        glb_path (str): Output path.
+        replaced_views (dict, optional): {buffer view index: new bytes}. Defaults to None.
+
+    Returns:
+        int: Size of the written file in bytes.
+    """
+    replaced_views = replaced_views or {}
+    builder = GlbBuilder()
+    builder.document = {key: value for key, value in document.items() if key not in ('buffers', 'bufferViews')}
+    binary = memoryview(binary)
+    for index, view in enumerate(document.get('bufferViews', [])):
+        data = replaced_views.get(index)
+        if data is None:
+            start = view.get('byteOffset', 0)
+            data = binary[start:start + view['byteLength']]
+        new_index = builder.add_buffer_view(data, target=view.get('target'), byte_stride=view.get('byteStride'))
+        if 'name' in view:
+            builder.document['bufferViews'][new_index]['name'] = view['name']
+    return builder.write(glb_path)
+
+def deindex(mesh):
+    """
+    Turns a mesh with separate position and UV indices into single-indexed vertex arrays,
+    as glTF requires: every distinct (position, UV) pair used by a face corner becomes one vertex.
+
+    Returns:
+        tuple: (position index per vertex, UV index per vertex or None, (F, 3) uint32 vertex indices)
+    """
+    # One int64 key per corner; sorting the keys groups equal (position, UV) pairs
+    uv_count = max(len(mesh.uvs), 1)
+    keys = mesh.faces.astype(np.int64).ravel()
+    if mesh.face_uvs is not None:
+        keys *= uv_count
+        keys += mesh.face_uvs.ravel()
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    is_new = np.empty(len(keys), dtype=bool)
+    is_new[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=is_new[1:])
+    unique_keys = keys[is_new]
+    del keys
+    indices = np.empty(len(order), dtype=np.uint32)
+    indices[order] = np.cumsum(is_new, dtype=np.uint32) - 1
+    del order, is_new
+    if mesh.face_uvs is None:
+        return unique_keys, None, indices.reshape(-1, 3)
+    return unique_keys // uv_count, unique_keys % uv_count, indices.reshape(-1, 3)
+
+NORMAL_BLOCK_FACES = 500000
+
+def vertex_normals(positions, faces):
+    """
+    Area-weighted smooth normals per position, so vertices split at UV seams keep one normal.
+    Faces are processed in blocks to bound the temporary memory.
+    """
+    normals = np.zeros((len(positions), 3), dtype=np.float32)
+    for start in range(0, len(faces), NORMAL_BLOCK_FACES):
+        block = faces[start:start + NORMAL_BLOCK_FACES]
+        p0 = positions[block[:, 0]]
+        face_normals = np.cross(positions[block[:, 1]] - p0, positions[block[:, 2]] - p0)
+        del p0
+        for axis in range(3):
+            for corner in range(3):
+                normals[:, axis] += np.bincount(block[:, corner], face_normals[:, axis], len(positions))
+    lengths = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    normals[lengths == 0] = (0.0, 0.0, 1.0)
+    lengths[lengths == 0] = 1.0
+    normals /= lengths[:, None]
+    return normals
+
+# OpenMVS/COLMAP scenes are y-down; rotating 180 degrees about X makes them y-up for glTF
+# (the same rotation the Blender cleanup script applies).
+UPRIGHT_AXES = np.array([1.0, -1.0, -1.0], dtype=np.float32)
+
+def _quantized_accessor(builder, values, padded_components, normalized):
+    """
+    Adds a quantized vertex attribute, padding each element to a multiple of 4 bytes as glTF
+    requires for vertex buffers. Returns the accessor index.
+    """
+    padded = np.zeros((len(values), padded_components), dtype=values.dtype)
+    padded[:, :values.shape[1]] = values
+    view = builder.add_buffer_view(padded, target=ARRAY_BUFFER, byte_stride=padded.strides[0])
+    return builder.add_accessor(padded[:, :values.shape[1]], buffer_view=view, normalized=normalized, bounds=True)
+
+def add_mesh(builder, mesh, materials=None, name='mesh', upright=True, optimize=True, quantize=False, report=None):
+    """
+    Adds a Mesh to a GlbBuilder as one glTF mesh with a primitive per material.
+
+    Args:
+        builder (GlbBuilder): The file being built.
+        mesh (obj_io.Mesh): The mesh to add.
+        materials (dict, optional): MTL materials from obj_io.read_mtl, keyed by name. Defaults to None.
+        name (str, optional): Mesh name. Defaults to 'mesh'.
+        upright (bool, optional): Rotate 180 degrees about X (y-down to y-up). Defaults to True.
+        optimize (bool, optional): Reorder triangles for the vertex cache and vertices for fetch
+            locality (see meshopt.py). Defaults to True.
+        quantize (bool, optional): Store positions as uint16, normals as int8 and UVs as uint16 with
+            KHR_mesh_quantization; nodes showing the mesh carry the dequantization transform. Defaults to False.
+        report (list, optional): Receives a dict with the buffer sizes and estimated ACMR before
+            (float32, original order) and after. Defaults to None.
+
+    Returns:
+        int: The glTF mesh index.
+    """
+    position_index, uv_index, indices = deindex(mesh)
+    face_materials = mesh.face_materials
+    acmr_before = meshopt.estimate_acmr(indices)
+    if optimize:
+        order = meshopt.optimize_triangle_order(indices, mesh.positions[position_index])
+        indices = indices[order]
+        face_materials = face_materials[order]
+        del order
+    # One index buffer, sorted by material (keeping the cache order within each material)
+    if len(face_materials) and (face_materials[1:] < face_materials[:-1]).any():
+        order = np.argsort(face_materials, kind='stable')
+        indices = indices[order]
+        face_materials = face_materials[order]
+        del order
+    if optimize:
+        indices, used = meshopt.optimize_vertex_fetch(indices)
+        position_index = position_index[used]
+        if uv_index is not None:
+            uv_index = uv_index[used]
+        del used
+
+    positions = mesh.positions[position_index].astype(np.float32)
+    normals = vertex_normals(mesh.positions, mesh.faces)[position_index]
+    if upright:
+        positions *= UPRIGHT_AXES
+        normals *= UPRIGHT_AXES
+    uvs = None
+    if uv_index is not None:
+        # OBJ texture coordinates start at the bottom of the image, glTF's at the top
+        uvs = mesh.uvs[uv_index].astype(np.float32)
+        uvs[:, 1] = 1.0 - uvs[:, 1]
+    float_bytes = positions.nbytes + normals.nbytes + (uvs.nbytes if uvs is not None else 0)
+
+    if quantize:
+        builder.use_extension('KHR_mesh_quantization', required=True)
+        quantized = meshopt.quantize_positions(positions)
+        attributes = {
+            'POSITION': _quantized_accessor(builder, quantized['values'], 4, normalized=False),
+            'NORMAL': _quantized_accessor(builder, meshopt.quantize_normals(normals), 4, normalized=True),
+        }
+        builder.mesh_transforms[len(builder.document.get('meshes', []))] = quantized['transform']
+        if uvs is not None:
+            quantized_uvs = meshopt.quantize_uvs(uvs)
+            if quantized_uvs is None:
+                attributes['TEXCOORD_0'] = builder.add_accessor(uvs, target=ARRAY_BUFFER)
+            else:
+                attributes['TEXCOORD_0'] = builder.add_accessor(quantized_uvs, target=ARRAY_BUFFER, normalized=True)
+    else:
+        attributes = {
+            'POSITION': builder.add_accessor(positions, target=ARRAY_BUFFER, bounds=True),
+            'NORMAL': builder.add_accessor(normals, target=ARRAY_BUFFER),
+        }
+        if uvs is not None:
+            attributes['TEXCOORD_0'] = builder.add_accessor(uvs, target=ARRAY_BUFFER)
+    vertex_bytes = sum(builder.view_nbytes(builder.document['accessors'][accessor]['bufferView'])
+                       for accessor in attributes.values())
+    del positions, normals, uvs
+
+    small_indices = len(position_index) < 0xFFFF
+    float_index_bytes = indices.size * (2 if small_indices else 4)
+    if small_indices:
+        indices = indices.astype(np.uint16)
+    else:
+        indices = indices.astype(np.uint32, copy=False)
+    index_view = builder.add_buffer_view(indices, target=ELEMENT_ARRAY_BUFFER)
+
+    primitives = []
+    starts = np.flatnonzero(np.r_[True, face_materials[1:] != face_materials[:-1]])
+    ends = np.r_[starts[1:], len(face_materials)]
+    for start, end in zip(starts, ends):
+        primitive = {
+            'attributes': attributes,
+            'indices': builder.add_accessor(indices[start:end].ravel(), buffer_view=index_view,
+                                            byte_offset=int(start) * 3 * indices.itemsize),
+        }
+        material_name = mesh.material_names[face_materials[start]] if mesh.material_names else None
+        if material_name is not None and materials is not None:
+            material = materials.get(material_name, {'Kd': [1.0, 1.0, 1.0], 'd': 1.0, 'map_Kd': None})
+            primitive['material'] = builder.add_obj_material(material_name, material)
+        primitives.append(primitive)
+
+    stats = {
+        'mesh': name,
+        'vertices': len(position_index),
+        'triangles': len(indices),
+        'bytes_before': float_bytes + float_index_bytes,
+        'bytes_after': vertex_bytes + indices.nbytes,
+        'acmr_before': round(acmr_before, 3),
+        'acmr_after': round(meshopt.estimate_acmr(indices), 3),
+    }
+    print(f"Mesh '{name}': buffers {stats['bytes_before'] / 2 ** 20:.1f} MB -> {stats['bytes_after'] / 2 ** 20:.1f} MB, "
+          f"estimated ACMR {stats['acmr_before']:.2f} -> {stats['acmr_after']:.2f}")
+    if report is not None:
+        report.append(stats)
+    return builder.add_mesh(name, primitives)
+
+def write_mesh_glb(mesh, glb_path, materials=None, upright=True, optimize=True, quantize=False, report=None):
+    """
+    Writes a Mesh (with its MTL materials and textures embedded) as a single GLB file.
+    optimize, quantize and report are passed to add_mesh.
+
+    Returns:
+        int: Size of the written file in bytes.
+    """
+    builder = GlbBuilder()
+    builder.add_node('model', mesh=add_mesh(builder, mesh, materials=materials, upright=upright,
+                                            optimize=optimize, quantize=quantize, report=report))
+    return builder.write(glb_path)
+
+LOD_FORMATS = ['separate', 'msft_lod']
+
+def lod_glb_paths(glb_path, level_count):
+    """
+    Paths of separately written levels of detail: the finest at glb_path, level N at <name>_lod<N>.glb.
+    """
+    stem, extension = os.path.splitext(glb_path)
+    return [glb_path] + [f'{stem}_lod{level}{extension}' for level in range(1, level_count)]
+
+def write_lod_glbs(levels, glb_path, materials=None, lod_format='msft_lod', upright=True,
+                   optimize=True, quantize=False, report=None):
+    """
+    Writes a level-of-detail chain, finest first.
+
+    Args:
+        levels (list): One obj_io.Mesh per level, finest first.
+        glb_path (str): Path of the finest level's GLB (or of the single GLB for 'msft_lod').
+        materials (dict, optional): MTL materials from obj_io.read_mtl. Defaults to None.
+        lod_format (str, optional): 'separate' to write one GLB per level (see lod_glb_paths), or
+            'msft_lod' to write one GLB whose model node lists the coarser levels through the
+            MSFT_lod extension (viewers without it show the finest level). Defaults to 'msft_lod'.
+        upright (bool, optional): Rotate 180 degrees about X (y-down to y-up). Defaults to True.
+        optimize (bool, optional): Reorder for the vertex cache (see add_mesh). Defaults to True.
+        quantize (bool, optional): Use KHR_mesh_quantization (see add_mesh). Defaults to False.
+        report (list, optional): Receives add_mesh's buffer statistics for each level. Defaults to None.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    if lod_format == 'separate':
+        paths = lod_glb_paths(glb_path, len(levels))
+        for mesh, path in zip(levels, paths):
+            write_mesh_glb(mesh, path, materials=materials, upright=upright,
+                           optimize=optimize, quantize=quantize, report=report)
+        return paths
+    if lod_format != 'msft_lod':
+        raise ValueError(f"Unknown LOD format '{lod_format}'. Expected one of {', '.join(LOD_FORMATS)}.")
+
+    builder = GlbBuilder()
+    builder.use_extension('MSFT_lod')
+    coarser_nodes = []
+    for level, mesh in enumerate(levels[1:], start=1):
+        lod_mesh = add_mesh(builder, mesh, materials=materials, name=f'mesh_lod{level}', upright=upright,
+                            optimize=optimize, quantize=quantize, report=report)
+        coarser_nodes.append(builder.add_node(f'model_lod{level}', mesh=lod_mesh, root=False))
+    finest_mesh = add_mesh(builder, levels[0], materials=materials, upright=upright,
+                           optimize=optimize, quantize=quantize, report=report)
+    builder.add_node('model', mesh=finest_mesh, extensions={'MSFT_lod': {'ids': coarser_nodes}} if coarser_nodes else None)
+    builder.write(glb_path)
+    return [glb_path]
+
+def load_materials(obj_path, mesh):
+    """
+    Reads the material library an OBJ references (looked up next to the OBJ), or returns None if it has none.
+    """
+    if not mesh.mtllib:
+        return None
+    mtl_path = os.path.join(os.path.dirname(os.path.abspath(obj_path)), mesh.mtllib)
+    if not os.path.exists(mtl_path):
+        print(f"Warning: Material library not found, exporting without textures: {mtl_path}")
+        return None
+    return obj_io.read_mtl(mtl_path)
+
+def obj_to_glb(obj_path, glb_path, cleanup=True, merge_distance=mesh_cleanup.MERGE_DISTANCE,
+               max_hole_sides=mesh_cleanup.MAX_HOLE_SIDES, lod_ratios=None, lod_format='msft_lod',
+               optimize=True, quantize=False):
+    """
+    Converts an OBJ (with its MTL and textures) to a GLB without Blender, optionally
+    running the NumPy mesh cleanup in between and adding decimated levels of detail.
+
+    Args:
+        obj_path (str): Path to the OBJ file.
+        glb_path (str): Path for the GLB file.
+        cleanup (bool, optional): Clean the mesh with mesh_cleanup.cleanup_mesh first. Defaults to True.
+        merge_distance (float, optional): Vertex merge distance for the cleanup. Defaults to mesh_cleanup.MERGE_DISTANCE.
+        max_hole_sides (int, optional): Largest hole to fill during the cleanup. Defaults to mesh_cleanup.MAX_HOLE_SIDES.
+        lod_ratios (list, optional): Triangle ratios of the levels of detail, finest first
+            (e.g. [1.0, 0.25, 0.05]). Defaults to None (a single, full-resolution level).
+        lod_format (str, optional): How the levels are written (see write_lod_glbs). Defaults to 'msft_lod'.
+        optimize (bool, optional): Reorder triangles and vertices for the GPU vertex cache. Defaults to True.
+        quantize (bool, optional): Write quantized attributes with KHR_mesh_quantization. Defaults to False.
+
+    Returns:
+        list: Per-step timings (import, cleanup steps, decimation, write_glb) for the job trace;
+            the write_glb step lists each mesh's buffer sizes and estimated ACMR under 'meshes'.
+    """
+    steps = []
+    started = time.monotonic()
+    mesh = obj_io.read_obj(obj_path)
+    materials = load_materials(obj_path, mesh)
+    steps.append({'step': 'import', 'wall_seconds': round(time.monotonic() - started, 3),
+                  'vertices_after': mesh.vertex_count, 'faces_after': mesh.face_count})
+    if cleanup:
+        mesh_cleanup.cleanup_mesh(mesh, merge_distance=merge_distance, max_hole_sides=max_hole_sides, steps=steps)
+    levels = decimate.build_lod_chain(mesh, lod_ratios, steps=steps) if lod_ratios else [mesh]
+    report = []
+    mesh_cleanup.run_step(steps, 'write_glb',
+                          lambda: write_lod_glbs(levels, glb_path, materials=materials, lod_format=lod_format,
+                                                 optimize=optimize, quantize=quantize, report=report), levels[0])
+    steps[-1]['meshes'] = report
+    return steps
+
+def main():
+    """
+    Command-line entry point:
+
+        python glb_writer.py input.obj output.glb [--no-cleanup] [--lod-ratios 1 0.25 0.05 [--lod-format msft_lod]] [--no-optimize] [--quantize] [--trace path]
+    """
+    parser = argparse.ArgumentParser(description="Convert an OBJ mesh with its materials to GLB without Blender.")
+    parser.add_argument('input_obj', help='OBJ file to convert.')
+    parser.add_argument('output_glb', help='Path for the GLB file.')
+    parser.add_argument('--no-cleanup', action='store_true', help='Write the mesh as read, without the NumPy cleanup.')
+    parser.add_argument('--lod-ratios', type=float, nargs='+', help='Also write decimated levels of detail with these triangle ratios, finest first (e.g. 1 0.25 0.05).')
+    parser.add_argument('--lod-format', choices=LOD_FORMATS, default='msft_lod', help='One GLB using MSFT_lod, or one GLB per level (default: msft_lod).')
+    parser.add_argument('--no-optimize', action='store_true', help='Keep the triangle and vertex order instead of reordering for the vertex cache.')
+    parser.add_argument('--quantize', action='store_true', help='Store positions, normals and UVs as 16/8-bit integers (KHR_mesh_quantization).')
+    parser.add_argument('--trace', help='Write per-step timings as JSON to this path.')
+    args = parser.parse_args()
+
+    try:
+        steps = obj_to_glb(args.input_obj, args.output_glb, cleanup=not args.no_cleanup,
+                           lod_ratios=args.lod_ratios, lod_format=args.lod_format,
+                           optimize=not args.no_optimize, quantize=args.quantize)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump({'steps': steps}, f, indent=2)
+    print(f"GLB written to: {args.output_glb}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+import contextvars
+import json
+import os
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+# Width (in pixels) the frames are scaled down to before they are scored.
+# Sharpness and view change are relative measures, so full resolution is not needed.
+ANALYSIS_WIDTH = 640
+
+# Side length of the thumbnails used to measure how much the view changed.
+THUMBNAIL_WIDTH = 32
+
+# Number of frames compared with the last kept frame at once when looking for the next
+# frame whose view changed enough
+CHANGE_BLOCK = 16
+
+def read_pgm_frames(stream):
+    """
+    Yields the frames of a stream of binary PGM images (FFmpeg's image2pipe output with
+    -vcodec pgm) as (height, width) uint8 arrays, reading each size from its header.
+    """
+    while True:
+        magic = stream.readline()
+        if not magic:
+            break
+        if magic.strip() != b'P5':
+            raise ValueError(f"Unexpected frame header from FFmpeg: {magic!r}")
+        width, height = (int(v) for v in stream.readline().split())
+        stream.readline()  # maxval, always 255 for format=gray
+        data = stream.read(width * height)
+        if len(data) != width * height:
+            raise ValueError("Truncated frame received from FFmpeg.")
+        yield np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+
+def iter_gray_frames(video_path, sample_fps, analysis_width=ANALYSIS_WIDTH, run=None):
+    """
+    Decodes a video with FFmpeg and yields grayscale frames.
+
+    FFmpeg writes one binary PGM image per sampled frame into a named pipe, which is read
+    while it runs, so the frame size is read from each header and rotated phone videos need
+    no special casing. Where there are no named pipes (Windows), the frames are written to a
+    temporary file first. FFmpeg runs through run, so the caller's timeouts, cancellation and
+    command logging apply to it.
+
+    Args:
+        video_path (str): Full path to the input video file.
+        sample_fps (float): Rate at which candidate frames are sampled from the video.
+        analysis_width (int, optional): Maximum width of the yielded frames. Defaults to ANALYSIS_WIDTH.
+        run (callable, optional): Runs a command (list) to completion like main.run_command, raising
+            if it fails; it is called in a thread of its own, in a copy of the caller's context.
+            Defaults to subprocess.run with check=True.
+
+    Yields:
+        numpy.ndarray: A (height, width) uint8 array for each sampled frame.
+    """
+    run = run or (lambda command: subprocess.run(command, check=True))
+    with tempfile.TemporaryDirectory(prefix='keyframes_') as temp_dir:
+        frames_path = os.path.join(temp_dir, 'frames.pgm')
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-i', video_path,
+            '-vf', f'fps={sample_fps},scale=min({analysis_width}\\,iw):-2,format=gray',
+            '-f', 'image2pipe',
+            '-vcodec', 'pgm',
+            '-y', frames_path
+        ]
+        if not hasattr(os, 'mkfifo'):
+            run(command)
+            with open(frames_path, 'rb') as stream:
+                yield from read_pgm_frames(stream)
+            return
+
+        os.mkfifo(frames_path)
+        # The read end is opened first (without blocking: no writer yet), then a write end is
+        # held until FFmpeg has exited, so the stream ends only once FFmpeg is done, even if it
+        # fails before opening the pipe. Closing the read end early stops FFmpeg (broken pipe).
+        read_fd = os.open(frames_path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(read_fd, True)
+        hold_fd = os.open(frames_path, os.O_WRONLY)
+        errors = []
+        def decode():
+            try:
+                run(command)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                os.close(hold_fd)
+        decoder = threading.Thread(target=contextvars.copy_context().run, args=(decode,), daemon=True)
+        decoder.start()
+        try:
+            with os.fdopen(read_fd, 'rb') as stream:
+                try:
+                    yield from read_pgm_frames(stream)
+                except ValueError:
+                    # A killed FFmpeg (timeout, cancellation) leaves a truncated frame: report why
+                    decoder.join()
+                    if errors:
+                        raise errors[0]
+                    raise
+        finally:
+            decoder.join()
+        if errors:
+            raise errors[0]
+
+def laplacian_variance(gray):
+    """
+    Sharpness score of a grayscale frame: the variance of its 4-neighbour Laplacian.
+    Blurry frames have weak edges and therefore a low variance.
+    """
+    g = gray.astype(np.float32)
+    lap = g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+def thumbnail(gray, width=THUMBNAIL_WIDTH):
+    """
+    Block-averages a grayscale frame down to a small, brightness-normalized thumbnail
+    used to compare views.
+    """
+    h, w = gray.shape
+    block = max(1, w // width)
+    rows, cols = h // block, w // block
+    g = gray[:rows * block, :cols * block].astype(np.float32)
+    thumb = g.reshape(rows, block, cols, block).mean(axis=(1, 3))
+    # Normalize exposure so auto-exposure changes do not look like view changes
+    return thumb / max(float(thumb.mean()), 1.0)
+
+def score_video(video_path, sample_fps, run=None):
+    """
+    Samples candidate frames from a video and scores each for sharpness.
+
+    Args:
+        video_path (str): Full path to the input video file.
+        sample_fps (float): Rate at which candidate frames are sampled.
+        run (callable, optional): Runs the FFmpeg command, see iter_gray_frames. Defaults to None.
+
+    Returns:
+        tuple: (sharpness, thumbnails) where sharpness is a float array with one score
+        per sampled frame and thumbnails is a (frames, rows, cols) float32 array.
+    """
+    sharpness = []
+    thumbs = []
+    for gray in iter_gray_frames(video_path, sample_fps, run=run):
+        sharpness.append(laplacian_variance(gray))
+        thumbs.append(thumbnail(gray))
+    if not thumbs:
+        raise ValueError(f"No frames could be decoded from video: {video_path}")
+    return np.asarray(sharpness, dtype=np.float64), np.stack(thumbs)
+
+def select_keyframes(sharpness, thumbs, max_frames, min_sharpness_ratio=0.5, min_change=0.02):
+    """
+    Chooses a well-spread set of sharp, distinct frames.
+
+    Frames are dropped in three passes: frames whose sharpness is below
+    min_sharpness_ratio times the median are 'blurry'; frames that differ from the
+    last kept frame by less than min_change are 'duplicate'; and if more than
+    max_frames remain, the timeline is split into max_frames equal bins and only the
+    sharpest frame of each bin is kept, the rest being dropped for 'budget'.
+
+    Args:
+        sharpness (numpy.ndarray): Sharpness score per sampled frame.
+        thumbs (numpy.ndarray): Normalized thumbnail per sampled frame.
+        max_frames (int): Maximum number of frames to keep.
+        min_sharpness_ratio (float, optional): Blur threshold relative to the median sharpness. Defaults to 0.5.
+        min_change (float, optional): Minimum mean thumbnail difference to the last kept frame. Defaults to 0.02.
+
+    Returns:
+        list: One dict per sampled frame with its index, scores, whether it was kept and why.
+    """
+    count = len(sharpness)
+    median = float(np.median(sharpness))
+    reasons = np.full(count, 'kept', dtype=object)
+    reasons[sharpness < min_sharpness_ratio * median] = 'blurry'
+
+    # View change against the last kept frame. The frames after a kept frame are compared
+    # with it a block at a time; the first that changed enough is kept next, the ones before
+    # it are duplicates of it, and the comparison continues from the newly kept frame.
+    change = np.zeros(count)
+    candidates = np.flatnonzero(reasons == 'kept')
+    if len(candidates):
+        change[candidates[0]] = 1.0
+    last_kept, position = (candidates[0], 1) if len(candidates) else (None, 0)
+    while position < len(candidates):
+        block = candidates[position:position + CHANGE_BLOCK]
+        change[block] = np.abs(thumbs[block] - thumbs[last_kept]).mean(axis=(1, 2))
+        moved = np.flatnonzero(change[block] >= min_change)
+        if len(moved):
+            reasons[block[:moved[0]]] = 'duplicate'
+            last_kept = block[moved[0]]
+            position += moved[0] + 1
+        else:
+            reasons[block] = 'duplicate'
+            position += len(block)
+
+    candidates = np.flatnonzero(reasons == 'kept')
+    if len(candidates) > max_frames:
+        # Spread the budget evenly over the sampled timeline, keeping the sharpest
+        # candidate of each bin, then top up empty bins with the sharpest leftovers.
+        bins = np.minimum((candidates * max_frames) // count, max_frames - 1)
+        order = np.lexsort((-sharpness[candidates], bins))
+        first_in_bin = np.ones(len(order), dtype=bool)
+        first_in_bin[1:] = bins[order][1:] != bins[order][:-1]
+        chosen = set(candidates[order][first_in_bin].tolist())
+        leftovers = [i for i in candidates[np.argsort(-sharpness[candidates])] if i not in chosen]
+        chosen.update(leftovers[:max_frames - len(chosen)])
+        for i in candidates:
+            if i not in chosen:
+                reasons[i] = 'budget'
+
+    return [
+        {
+            'index': int(i),
+            'sharpness': round(float(sharpness[i]), 3),
+            'change': round(float(change[i]), 5),
+            'kept': reasons[i] == 'kept',
+            'reason': reasons[i],
+        }
+        for i in range(count)
+    ]
+
+def write_keyframe_report(report_path, decisions, params):
+    """
+    Writes the per-frame keep/drop decisions and the selection parameters as JSON.
+    """
+    kept = sum(1 for d in decisions if d['kept'])
+    report = {
+        'params': params,
+        'sampled_frames': len(decisions),
+        'kept_frames': kept,
+        'dropped': {
+            reason: sum(1 for d in decisions if d['reason'] == reason)
+            for reason in ('blurry', 'duplicate', 'budget')
+        },
+        'frames': decisions,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -3,8 +3,143 @@ import os
 import argparse
 import sys
 import shutil
+import glob
+import struct
+import json
+import time
+import concurrent.futures
+import contextvars
+import types
 
-def run_command(command, cwd=None, check=True, capture_output=False, text=True, timeout=None):
+import blender_server
+import colmap_model
+import command_log
+import depth_maps
+import frame_segments
+import glb_writer
+import keyframes
+import mesh_cleanup
+import pointcloud
+import preprocess
+import quality
+import result_cache
+import roi
+import storage
+import telemetry
+import textures
+from checkpoints import CheckpointStore
+
+# Stages of the reconstruction after SfM, run once per phase (see --two-phase)
+RECONSTRUCTION_STAGES = [
+    'undistort',
+    'interface',
+    'densify',
+    'filter_points',
+    'reconstruct_mesh',
+    'refine_mesh',
+    'texture_mesh',
+    'glb',
+]
+
+# Stage-name prefix of the preview phase of a two-phase run, and the file (in the output
+# directory) its GLB is published as
+PREVIEW_STAGE_PREFIX = 'preview_'
+PREVIEW_GLB_NAME = 'scene_textured_mesh_preview.glb'
+
+# Pipeline stages in execution order; each one writes a checkpoint manifest when it completes.
+# append_frames and register only run with --append-video.
+PIPELINE_STAGES = (
+    ['frames', 'preprocess', 'sfm', 'append_frames', 'register', 'quality']
+    + [PREVIEW_STAGE_PREFIX + stage for stage in RECONSTRUCTION_STAGES]
+    + RECONSTRUCTION_STAGES
+    + ['textures']
+)
+
+# Concurrency class of each stage. A worker running several jobs caps how many stages
+# of each class run at once, so e.g. one job's frame extraction and SfM can overlap
+# with another job's OpenMVS densification without oversubscribing the machine.
+STAGE_CLASSES = {
+    'frames': 'frames',
+    'preprocess': 'frames',
+    'sfm': 'sfm',
+    'append_frames': 'frames',
+    'register': 'sfm',
+    'quality': 'sfm',
+    'undistort': 'sfm',
+    'interface': 'mvs',
+    'densify': 'mvs',
+    'filter_points': 'mvs',
+    'reconstruct_mesh': 'mvs',
+    'refine_mesh': 'mvs',
+    'texture_mesh': 'mvs',
+    'glb': 'blender',
+    'textures': 'textures',
+}
+STAGE_CLASSES.update({PREVIEW_STAGE_PREFIX + stage: STAGE_CLASSES[stage] for stage in RECONSTRUCTION_STAGES})
+
+# Reconstruction quality/speed profiles. None keeps the tool's own default, so 'standard'
+# runs the same commands as before profiles existed.
+#   max_image_size: longest image side after undistortion (COLMAP --max_image_size)
+#   densify_resolution_level: DensifyPointCloud halves the images this many times
+#   mesh_decimate: fraction of the reconstructed surface's faces ReconstructMesh keeps
+#   refine: whether RefineMesh runs (TextureMesh textures the unrefined mesh otherwise)
+#   texture_resolution_level: TextureMesh halves the images this many times
+PROFILES = {
+    'preview': {
+        'max_image_size': 1600,
+        'densify_resolution_level': 3,
+        'mesh_decimate': 0.25,
+        'refine': False,
+        'texture_resolution_level': 1,
+    },
+    'standard': {
+        'max_image_size': None,
+        'densify_resolution_level': None,
+        'mesh_decimate': None,
+        'refine': True,
+        'texture_resolution_level': None,
+    },
+    'high': {
+        'max_image_size': None,
+        'densify_resolution_level': 0,
+        'mesh_decimate': None,
+        'refine': True,
+        'texture_resolution_level': 0,
+    },
+}
+
+# Stages whose results the result cache (--cache-dir) keeps besides the final GLB: the frames
+# and the SfM model (with appended footage registered into it), which every profile and option
+# downstream of SfM can start from
+CACHED_STAGES = ['frames', 'preprocess', 'sfm', 'append_frames', 'register']
+
+# Options that do not change the reconstruction, left out of the result cache key: this job's
+# paths (the video is keyed by its contents), parallelism, limits, logging and the cache
+# itself. The OpenMVS directory stays in the key, standing in for the tools' version.
+CACHE_NEUTRAL_OPTIONS = {
+    'workspace', 'video_input', 'append_video', 'output_dir', 'sfm_vocab_tree', 'keep_depth_maps',
+    'frame_workers', 'preprocess_workers', 'sfm_threads', 'sfm_cpu', 'texture_workers',
+    'resume_from', 'force', 'stage_timeouts', 'intermediates', 'disk_quota', 'scratch_dir',
+    'log_dir', 'log_max_bytes', 'log_tail_lines', 'quiet_commands', 'trace_dir',
+    'cache_dir', 'cache_max_size',
+}
+
+# Sibling scripts the pipeline runs in another process instead of importing; their code is part
+# of the result cache key together with the modules the pipeline imports (see pipeline_sources)
+PIPELINE_SCRIPTS = ['obj_to_glb_cleanup.py']
+
+# Per-job execution context. Context variables are private to each thread and asyncio task
+# (and copied into the threads a stage starts), so concurrent jobs never see each other's:
+#   COMMAND_RUNNER: runs a command like telemetry.run_monitored (None: run_monitored itself);
+#       the asyncio API (pipeline_api.py) installs one that runs commands on its event loop
+#   STAGE_DEADLINE: time.monotonic() by which the running stage must finish (None: no limit)
+#   COMMAND_LOGS: called with a command, returns the command_log.CommandLog its output streams
+#       into (None: a CommandLog that only echoes it and keeps its last lines)
+COMMAND_RUNNER = contextvars.ContextVar('COMMAND_RUNNER', default=None)
+STAGE_DEADLINE = contextvars.ContextVar('STAGE_DEADLINE', default=None)
+COMMAND_LOGS = contextvars.ContextVar('COMMAND_LOGS', default=None)
+
+def run_command(command, cwd=None, check=True, capture_output=False, text=True, timeout=None, trace=None):
     """
     Helper function to execute shell commands.
 
@@ -12,25 +147,47 @@ def run_command(command, cwd=None, check=True, capture_output=False, text=True,
         command (list): A list of strings representing the command and its arguments.
         cwd (str, optional): The current working directory for the command. Defaults to None.
         check (bool, optional): If True, raise a CalledProcessError if the command returns a non-zero exit code. Defaults to True.
-        capture_output (bool, optional): If True, capture stdout and stderr. Defaults to False.
+        capture_output (bool, optional): If True, capture stdout and stderr whole. Otherwise they are
+            streamed line by line into the job's command log (see COMMAND_LOGS). Defaults to False.
         text (bool, optional): If True, stdout and stderr are returned as strings. Defaults to True.
-        timeout (int, optional): If set, the command will be killed if it doesn't complete within this many seconds. Defaults to None.
+        timeout (int, optional): If set, the command will be killed if it doesn't complete within this many seconds.
+            The running stage's timeout (see --stage-timeout) also applies. Defaults to None.
+        trace (telemetry.JobTrace, optional): If set, the command's wall time, CPU time, peak RSS and I/O are recorded in it. Defaults to None.
 
     Raises:
         subprocess.CalledProcessError: If check is True and the command returns a non-zero exit code.
+        subprocess.TimeoutExpired: If the command was killed for exceeding its (or its stage's) time limit.
         FileNotFoundError: If the command executable is not found.
         Exception: For any other unexpected errors during command execution.
     """
     print(f"Executing command: {' '.join(command)}")
+    deadline = STAGE_DEADLINE.get()
+    if deadline is not None:
+        remaining = max(0.0, deadline - time.monotonic())
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    runner = COMMAND_RUNNER.get() or telemetry.run_monitored
+    output = None
+    if not capture_output:
+        open_log = COMMAND_LOGS.get()
+        output = open_log(command) if open_log else command_log.CommandLog(command)
+    result = None
     try:
-        result = subprocess.run(
-            command,
-            cwd=cwd,
-            check=check,
-            capture_output=capture_output,
-            text=text,
-            timeout=timeout
-        )
+        try:
+            result, usage = runner(
+                command,
+                cwd=cwd,
+                capture_output=capture_output,
+                text=text,
+                timeout=timeout,
+                on_output=output.feed if output else None
+            )
+        finally:
+            if output is not None:
+                output.close(result.returncode if result else None)
+        if trace is not None:
+            trace.record_command(command, result.returncode, usage)
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, result.stdout, result.stderr)
         if capture_output:
             print(f"STDOUT:\n{result.stdout}")
             if result.stderr:
@@ -38,11 +195,18 @@ def run_command(command, cwd=None, check=True, capture_output=False, text=True,
         return result
     except subprocess.CalledProcessError as e:
         print(f"Command failed with exit code {e.returncode}: {e.cmd}", file=sys.stderr)
+        if output is not None:
+            print_output_tail(output)
         if e.stdout:
             print(f"STDOUT:\n{e.stdout}", file=sys.stderr)
         if e.stderr:
             print(f"STDERR:\n{e.stderr}", file=sys.stderr)
         raise # Re-raise to be caught by the main try-except block
+    except subprocess.TimeoutExpired as e:
+        print(f"Command timed out after {e.timeout:.1f}s and was killed: {command[0]}", file=sys.stderr)
+        if output is not None:
+            print_output_tail(output)
+        raise
     except FileNotFoundError:
         print(f"Error: Command '{command[0]}' not found. Make sure it's in your system's PATH or specify its full path.", file=sys.stderr)
         raise
@@ -50,138 +214,248 @@ def run_command(command, cwd=None, check=True, capture_output=False, text=True,
         print(f"An unexpected error occurred while running command: {e}", file=sys.stderr)
         raise
 
-def extract_frames(video_path, output_images_dir, fps):
+def print_output_tail(output):
+    """
+    Points to a failed command's log file and prints the last lines it wrote.
+    """
+    if output.log_path:
+        print(f"Full log: {output.log_path}", file=sys.stderr)
+    if not output.echo: # Otherwise already printed as it was written
+        print(f"Last {len(output.tail)} lines of output:\n{output.tail_text()}", file=sys.stderr)
+
+def extract_frames(video_path, output_images_dir, fps, workers=None, trace=None):
     """
     Extracts frames from a video using FFmpeg.
 
+    With more than one worker, the video is split into time segments (see frame_segments.py)
+    that are decoded by parallel FFmpeg processes; their frames are then renumbered into one
+    gap-free sequence, the same names a single process would write.
+
     Args:
         video_path (str): Full path to the input video file.
         output_images_dir (str): Directory where extracted image frames will be saved.
         fps (int): Frames per second to extract.
+        workers (int, optional): Number of FFmpeg processes to run at once. Defaults to the number of CPUs.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
     """
     print(f"\n--- Part 1: Frame Extraction (FFmpeg) ---")
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video input file not found: {video_path}")
 
     os.makedirs(output_images_dir, exist_ok=True)
+    # Remove frames from a previous run so a shorter video does not leave stale frames behind
+    for stale in glob.glob(os.path.join(output_images_dir, 'frame_*.jpg')):
+        os.remove(stale)
+
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    segments = []
+    if workers > 1:
+        # Without a duration the video is extracted in a single pass, as without segments
+        try:
+            duration = frame_segments.probe_duration(video_path, run=lambda command: run_command(
+                command, capture_output=True, timeout=frame_segments.PROBE_TIMEOUT_SECONDS, trace=trace))
+            segments = frame_segments.plan_segments(duration, fps, workers)
+        except (OSError, ValueError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"Warning: Could not probe the video's duration ({e}); extracting frames in a single pass.")
+    if len(segments) <= 1:
+        command = [
+            'ffmpeg',
+            '-i', video_path,
+            '-vf', f'fps={fps}',
+            os.path.join(output_images_dir, 'frame_%04d.jpg')
+        ]
+        run_command(command, trace=trace)
+        print(f"Frames extracted to: {output_images_dir}")
+        return
 
+    # Each segment writes to its own directory (kept outside output_images_dir, whose contents are checkpointed)
+    segment_root = os.path.join(os.path.dirname(os.path.abspath(output_images_dir)), 'frame_segments')
+    if os.path.exists(segment_root):
+        shutil.rmtree(segment_root)
+    segment_dirs = [os.path.join(segment_root, f'{index:03d}') for index in range(len(segments))]
+    threads = max(1, cpus // workers)
+    commands = []
+    for segment_dir, (start, frame_count) in zip(segment_dirs, segments):
+        os.makedirs(segment_dir)
+        commands.append(frame_segments.segment_command(video_path, os.path.join(segment_dir, 'frame_%06d.jpg'),
+                                                       start, frame_count, fps, threads))
+    print(f"Extracting {len(segments)} segments with {workers} parallel FFmpeg processes...")
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each segment runs in the calling stage's context (its command runner and deadline)
+            for future in [pool.submit(contextvars.copy_context().run, run_command, command, trace=trace) for command in commands]:
+                future.result()
+        frame_count = frame_segments.merge_segment_frames(segment_dirs, output_images_dir)
+    finally:
+        shutil.rmtree(segment_root, ignore_errors=True)
+    print(f"{frame_count} frames extracted to: {output_images_dir}")
+
+def extract_keyframes(video_path, output_images_dir, report_path, max_frames=60, sample_fps=4,
+                      min_sharpness_ratio=0.5, min_change=0.02, trace=None):
+    """
+    Extracts a budgeted set of sharp, well-spread keyframes from a video.
+
+    Candidate frames are sampled at sample_fps and scored for sharpness and view change
+    (see keyframes.py); FFmpeg then decodes the video a second time and writes only the
+    selected frames to output_images_dir.
+
+    Args:
+        video_path (str): Full path to the input video file.
+        output_images_dir (str): Directory where the selected frames will be saved.
+        report_path (str): Path of the JSON report recording why each frame was kept or dropped.
+        max_frames (int, optional): Maximum number of frames to keep. Defaults to 60.
+        sample_fps (float, optional): Rate at which candidate frames are sampled. Defaults to 4.
+        min_sharpness_ratio (float, optional): Frames below this fraction of the median sharpness are dropped as blurry. Defaults to 0.5.
+        min_change (float, optional): Frames that differ less than this from the last kept frame are dropped as duplicates. Defaults to 0.02.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
+    """
+    print(f"\n--- Part 1: Keyframe Selection (FFmpeg) ---")
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video input file not found: {video_path}")
+
+    os.makedirs(output_images_dir, exist_ok=True)
+    # Remove frames from a previous run so they are not mixed into this selection
+    for stale in glob.glob(os.path.join(output_images_dir, 'frame_*.jpg')):
+        os.remove(stale)
+
+    sharpness, thumbs = keyframes.score_video(video_path, sample_fps, run=lambda command: run_command(command, trace=trace))
+    decisions = keyframes.select_keyframes(sharpness, thumbs, max_frames,
+                                           min_sharpness_ratio=min_sharpness_ratio,
+                                           min_change=min_change)
+    report = keyframes.write_keyframe_report(report_path, decisions, {
+        'max_frames': max_frames,
+        'sample_fps': sample_fps,
+        'min_sharpness_ratio': min_sharpness_ratio,
+        'min_change': min_change,
+    })
+    print(f"Keyframe selection: kept {report['kept_frames']} of {report['sampled_frames']} sampled frames "
+          f"(dropped: {report['dropped']})")
+
+    kept = [d['index'] for d in decisions if d['kept']]
+    if len(kept) < 2:
+        raise ValueError(f"Keyframe selection kept only {len(kept)} frame(s); need at least 2 for reconstruction. "
+                         f"See {report_path} for per-frame scores.")
+
+    # Frame numbers after the fps filter match the indices scored above
+    select_expr = '+'.join(f'eq(n\\,{i})' for i in kept)
     command = [
         'ffmpeg',
         '-i', video_path,
-        '-vf', f'fps={fps}',
+        '-vf', f'fps={sample_fps},select={select_expr}',
+        '-vsync', 'vfr',
+        '-q:v', '2',
         os.path.join(output_images_dir, 'frame_%04d.jpg')
     ]
-    run_command(command)
-    print(f"Frames extracted to: {output_images_dir}")
+    run_command(command, trace=trace)
+    print(f"Keyframes extracted to: {output_images_dir}")
+
+# Name prefix of the frames of the Nth appended video (see --append-video): append1_frame_0001.jpg, ...
+APPEND_FRAME_PREFIX = 'append'
+
+def link_frames(source_dir, target_dir, prefix=''):
+    """
+    Adds the .jpg frames of source_dir to target_dir under prefixed names, as hard links (so
+    they take no extra space) or as copies where the filesystem does not support links.
 
-def validate_colmap_output(workspace_path, min_points=100):
+    Returns:
+        list: The names of the added frames.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    names = []
+    for path in sorted(glob.glob(os.path.join(source_dir, '*.jpg'))):
+        name = prefix + os.path.basename(path)
+        target = os.path.join(target_dir, name)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+        names.append(name)
+    return names
+
+def validate_colmap_output(workspace_path, min_points=100, min_images=2):
     """
     Validate that COLMAP produced a reasonable sparse reconstruction.
-    Handles both binary (.bin) and text (.txt) formats.
-    
+    Handles both binary (.bin) and text (.txt) formats by parsing the model itself.
+
     Args:
         workspace_path (str): COLMAP workspace path
         min_points (int): Minimum number of 3D points expected
+        min_images (int): Minimum number of registered images expected
+
+    Returns:
+        dict: Model statistics (registered images, 3D points, mean track length, mean reprojection error).
     """
     sparse_dir = os.path.join(workspace_path, 'sparse', '0')
-    
-    # Check for binary files first (COLMAP default), then text files
-    points3d_bin = os.path.join(sparse_dir, 'points3D.bin')
-    points3d_txt = os.path.join(sparse_dir, 'points3D.txt')
-    images_bin = os.path.join(sparse_dir, 'images.bin')
-    images_txt = os.path.join(sparse_dir, 'images.txt')
-    cameras_bin = os.path.join(sparse_dir, 'cameras.bin')
-    cameras_txt = os.path.join(sparse_dir, 'cameras.txt')
-    
-    # Determine which format is available
-    use_binary = False
-    if os.path.exists(points3d_bin) and os.path.exists(images_bin) and os.path.exists(cameras_bin):
-        use_binary = True
-        print("Found COLMAP binary format files")
-    elif os.path.exists(points3d_txt) and os.path.exists(images_txt) and os.path.exists(cameras_txt):
-        use_binary = False
-        print("Found COLMAP text format files")
-    else:
-        # List what files are actually present for debugging
-        available_files = []
-        for file in os.listdir(sparse_dir) if os.path.exists(sparse_dir) else []:
-            available_files.append(file)
-        
-        raise FileNotFoundError(
-            f"COLMAP sparse reconstruction files not found in {sparse_dir}. "
-            f"Expected either binary (.bin) or text (.txt) format. "
-            f"Available files: {available_files}"
-        )
-    
-    if use_binary:
-        # For binary files, we need to use COLMAP's model_converter to get readable info
-        # or we can just check if the files exist and have reasonable size
-        points3d_file = points3d_bin
-        images_file = images_bin
-        
-        # Basic validation: check file sizes (binary files should not be empty)
-        points_size = os.path.getsize(points3d_file)
-        images_size = os.path.getsize(images_file)
-        
-        if points_size < 100:  # Very small file suggests no/few points
-            raise ValueError(f"COLMAP points3D.bin file is too small ({points_size} bytes), "
-                           f"suggesting insufficient 3D points for reconstruction.")
-        
-        if images_size < 50:  # Very small file suggests no/few images
-            raise ValueError(f"COLMAP images.bin file is too small ({images_size} bytes), "
-                           f"suggesting insufficient registered images.")
-        
-        print(f"COLMAP validation (binary): points3D.bin ({points_size} bytes), "
-              f"images.bin ({images_size} bytes)")
-        print("Binary format detected - files appear to contain data")
-        
-    else:
-        # Original text-based validation
-        points3d_file = points3d_txt
-        images_file = images_txt
-        
-        # Count 3D points (skip header lines starting with #)
-        point_count = 0
-        try:
-            with open(points3d_file, 'r') as f:
-                for line in f:
-                    if not line.startswith('#') and line.strip():
-                        point_count += 1
-        except Exception as e:
-            raise ValueError(f"Error reading COLMAP points3D.txt: {e}")
-        
-        # Count registered images
-        image_count = 0
-        try:
-            with open(images_file, 'r') as f:
-                for line in f:
-                    if not line.startswith('#') and line.strip():
-                        image_count += 1
-        except Exception as e:
-            raise ValueError(f"Error reading COLMAP images.txt: {e}")
-        
-        print(f"COLMAP validation (text): {point_count} 3D points, {image_count} registered images")
-        
-        if point_count < min_points:
-            raise ValueError(f"COLMAP produced too few 3D points: {point_count} < {min_points}. "
-                            f"Scene reconstruction quality is insufficient.")
-        
-        if image_count < 2:
-            raise ValueError(f"COLMAP registered too few images: {image_count} < 2. "
-                            f"Need at least 2 images for reconstruction.")
-    
+    model_format = colmap_model.find_model_format(sparse_dir)
+    print(f"Found COLMAP {'binary' if model_format == '.bin' else 'text'} format files")
+
+    try:
+        model = colmap_model.read_model(sparse_dir)
+    except (ValueError, KeyError, IndexError, struct.error) as e:
+        raise ValueError(f"Error reading COLMAP sparse model in {sparse_dir}: {e}")
+    stats = model.summary()
+
+    print(f"COLMAP validation: {stats['num_points3D']} 3D points, "
+          f"{stats['num_registered_images']} registered images, "
+          f"mean track length {stats['mean_track_length']:.2f}, "
+          f"mean reprojection error {stats['mean_reprojection_error']:.3f} px")
+
+    if stats['num_points3D'] < min_points:
+        raise ValueError(f"COLMAP produced too few 3D points: {stats['num_points3D']} < {min_points}. "
+                         f"Scene reconstruction quality is insufficient.")
+
+    if stats['num_registered_images'] < min_images:
+        raise ValueError(f"COLMAP registered too few images: {stats['num_registered_images']} < {min_images}. "
+                         f"Need at least {min_images} images for reconstruction.")
+
     print("COLMAP validation passed!")
+    return stats
+
+# Feature matching strategies for SfM. Frames come from one continuous video (named in
+# capture order), so each frame only needs matching against its next few neighbours.
+SFM_MATCHERS = ['sequential', 'exhaustive']
+# Number of following frames each frame is matched against by the sequential matcher
+SEQUENTIAL_OVERLAP = 10
 
-def run_colmap_sfm(workspace_path, image_path, undistorted_output_path):
+def run_colmap_step(name, command, steps, trace=None):
     """
-    Performs Structure-from-Motion (SfM) using COLMAP.
+    Runs one COLMAP command and appends its wall time to steps.
+    """
+    print(f"Running COLMAP {name}...")
+    started = time.monotonic()
+    run_command(command, trace=trace)
+    step = {'step': name, 'wall_seconds': round(time.monotonic() - started, 3)}
+    steps.append(step)
+    print(f"COLMAP {name} completed in {step['wall_seconds']:.1f}s.")
+
+def run_colmap_sfm(workspace_path, image_path, matcher='sequential', overlap=SEQUENTIAL_OVERLAP, vocab_tree_path=None,
+                   num_threads=-1, max_image_size=None, use_gpu=True, trace=None):
+    """
+    Performs Structure-from-Motion (SfM) using COLMAP and validates the sparse model.
+
+    Runs feature_extractor, the matcher and mapper as separate commands instead of
+    automatic_reconstructor, so the matching can follow the video's frame order.
 
     Args:
         workspace_path (str): The root workspace for COLMAP, where databases, sparse models are stored.
         image_path (str): Path to the directory containing input images for COLMAP.
-        undistorted_output_path (str): Path where undistorted images and dense reconstruction will be saved.
+        matcher (str, optional): 'sequential' to match each frame with its next `overlap` frames (linear
+            in the number of frames), or 'exhaustive' to match every pair. Defaults to 'sequential'.
+        overlap (int, optional): Frames matched ahead of each frame by the sequential matcher. Defaults to SEQUENTIAL_OVERLAP.
+        vocab_tree_path (str, optional): COLMAP vocabulary tree; when given, the sequential matcher also
+            detects loop closures (the camera returning to an earlier view). Defaults to None.
+        num_threads (int, optional): Threads for each COLMAP step (-1 for all cores). Defaults to -1.
+        max_image_size (int, optional): Longest image side used for SIFT extraction. Defaults to None (COLMAP's default).
+        use_gpu (bool, optional): Use the GPU for SIFT extraction and matching. Defaults to True.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run
+            and the timing of each step. Defaults to None.
     """
     print(f"\n--- Part 2: Structure-from-Motion (COLMAP) ---")
+    if matcher not in SFM_MATCHERS:
+        raise ValueError(f"Unknown SfM matcher '{matcher}'. Expected one of {', '.join(SFM_MATCHERS)}.")
+    if vocab_tree_path and not os.path.exists(vocab_tree_path):
+        raise FileNotFoundError(f"COLMAP vocabulary tree not found: {vocab_tree_path}")
 
     # Force clean COLMAP workspace
     colmap_db = os.path.join(workspace_path, 'database.db')
@@ -194,141 +468,369 @@ def run_colmap_sfm(workspace_path, image_path, undistorted_output_path):
         shutil.rmtree(sparse_dir)
         print(f"Removed existing COLMAP sparse directory: {sparse_dir}")
 
-    # Ensure necessary COLMAP output directories exist
-    # COLMAP creates 'sparse' and 'database.db' directly in workspace_path
-    # 'sparse/0' subdirectory is created by automatic_reconstructor
-    os.makedirs(os.path.join(workspace_path, 'sparse'), exist_ok=True)
-    os.makedirs(undistorted_output_path, exist_ok=True)
+    # The mapper writes one numbered model per reconstructed component into 'sparse'
+    os.makedirs(sparse_dir, exist_ok=True)
 
-    # COLMAP automatic_reconstructor
-    print("Running COLMAP automatic_reconstructor...")
-    command_reconstruct = [
-        'colmap', 'automatic_reconstructor',
-        '--workspace_path', workspace_path,
+    gpu_flag = '1' if use_gpu else '0'
+    threads = str(num_threads)
+    steps = []
+
+    command_extract = [
+        'colmap', 'feature_extractor',
+        '--database_path', colmap_db,
         '--image_path', image_path,
-        '--single_camera', 'true' # Assuming single camera setup
+        '--ImageReader.single_camera', '1',  # Assuming single camera setup
+        '--SiftExtraction.num_threads', threads,
+        '--SiftExtraction.use_gpu', gpu_flag,
     ]
-    run_command(command_reconstruct)
-    print("COLMAP automatic_reconstructor completed.")
+    if max_image_size:
+        command_extract += ['--SiftExtraction.max_image_size', str(max_image_size)]
+    run_colmap_step('feature_extractor', command_extract, steps, trace=trace)
+
+    if matcher == 'sequential':
+        command_match = [
+            'colmap', 'sequential_matcher',
+            '--database_path', colmap_db,
+            '--SequentialMatching.overlap', str(overlap),
+        ]
+        if vocab_tree_path:
+            command_match += ['--SequentialMatching.loop_detection', '1',
+                              '--SequentialMatching.vocab_tree_path', vocab_tree_path]
+    else:
+        command_match = ['colmap', 'exhaustive_matcher', '--database_path', colmap_db]
+    command_match += ['--SiftMatching.num_threads', threads, '--SiftMatching.use_gpu', gpu_flag]
+    run_colmap_step(f'{matcher}_matcher', command_match, steps, trace=trace)
+
+    command_map = [
+        'colmap', 'mapper',
+        '--database_path', colmap_db,
+        '--image_path', image_path,
+        '--output_path', sparse_dir,
+        '--Mapper.num_threads', threads,
+    ]
+    run_colmap_step('mapper', command_map, steps, trace=trace)
+    if trace is not None:
+        trace.record_steps(steps)
 
-    # COLMAP image_undistorter
-    print("Running COLMAP image_undistorter...")
     colmap_sparse_input = os.path.join(workspace_path, 'sparse', '0')
     if not os.path.exists(colmap_sparse_input):
         raise FileNotFoundError(f"COLMAP sparse model (sparse/0) not found at {colmap_sparse_input}. SfM might have failed.")
 
+    validate_colmap_output(workspace_path)
+    print("COLMAP SfM completed and validated.")
+
+def write_append_pairs(pairs_path, new_images, model_images, overlap=SEQUENTIAL_OVERLAP):
+    """
+    Writes the image pairs matched for appended frames when there is no vocabulary tree to
+    pick them: each new frame with its next `overlap` new frames (in capture order) and
+    with every frame of the existing model. One 'name1 name2' pair per line, as COLMAP's
+    matches_importer reads them.
+
+    Returns:
+        int: The number of pairs.
+    """
+    pairs = []
+    for index, name in enumerate(new_images):
+        pairs += [(name, other) for other in new_images[index + 1:index + 1 + overlap]]
+        pairs += [(name, other) for other in model_images]
+    with open(pairs_path, 'w') as f:
+        f.writelines(f"{first} {second}\n" for first, second in pairs)
+    return len(pairs)
+
+def run_colmap_register(base_workspace_path, workspace_path, image_path, new_images, overlap=SEQUENTIAL_OVERLAP,
+                        vocab_tree_path=None, num_threads=-1, max_image_size=None, use_gpu=True, trace=None):
+    """
+    Registers new frames into the sparse model of an earlier SfM run, instead of rebuilding it.
+
+    Works on a copy of the earlier run's database: features are extracted for the new frames
+    only and matched against each other and the frames already in the database, then
+    image_registrator adds the new frames to the existing model and bundle_adjuster refines it.
+    The earlier database and model are left untouched.
+
+    Args:
+        base_workspace_path (str): COLMAP workspace of the earlier run (database.db and sparse/0).
+        workspace_path (str): COLMAP workspace for the extended database and model (emptied first).
+        image_path (str): Directory holding the earlier frames and the new ones.
+        new_images (list): Names (in image_path, in capture order) of the frames to register.
+        overlap (int, optional): New frames matched ahead of each new frame without a vocabulary tree. Defaults to SEQUENTIAL_OVERLAP.
+        vocab_tree_path (str, optional): COLMAP vocabulary tree; when given, each new frame is matched with the
+            frames the tree finds most similar instead of every frame of the model. Defaults to None.
+        num_threads (int, optional): Threads for each COLMAP step (-1 for all cores). Defaults to -1.
+        max_image_size (int, optional): Longest image side used for SIFT extraction. Defaults to None (COLMAP's default).
+        use_gpu (bool, optional): Use the GPU for SIFT extraction and matching. Defaults to True.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run
+            and the timing of each step. Defaults to None.
+
+    Raises:
+        FileNotFoundError: If the earlier database or model is missing.
+        RuntimeError: If none of the new frames could be registered.
+    """
+    print(f"\n--- Part 2c: Incremental Registration (COLMAP) ---")
+    base_db = os.path.join(base_workspace_path, 'database.db')
+    base_model = os.path.join(base_workspace_path, 'sparse', '0')
+    for path in (base_db, base_model):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Incremental registration needs the SfM result of the earlier run, but {path} is missing.")
+    if vocab_tree_path and not os.path.exists(vocab_tree_path):
+        raise FileNotFoundError(f"COLMAP vocabulary tree not found: {vocab_tree_path}")
+    if not new_images:
+        raise ValueError(f"No new frames to register in {image_path}.")
+
+    if os.path.exists(workspace_path):
+        shutil.rmtree(workspace_path)
+    model_dir = os.path.join(workspace_path, 'sparse', '0')
+    os.makedirs(model_dir)
+    colmap_db = os.path.join(workspace_path, 'database.db')
+    shutil.copyfile(base_db, colmap_db)
+    image_list = os.path.join(workspace_path, 'new_images.txt')
+    with open(image_list, 'w') as f:
+        f.writelines(name + '\n' for name in new_images)
+
+    gpu_flag = '1' if use_gpu else '0'
+    threads = str(num_threads)
+    steps = []
+
+    # The new frames get a camera of their own: the footage may come from another device
+    command_extract = [
+        'colmap', 'feature_extractor',
+        '--database_path', colmap_db,
+        '--image_path', image_path,
+        '--image_list_path', image_list,
+        '--ImageReader.single_camera', '1',
+        '--SiftExtraction.num_threads', threads,
+        '--SiftExtraction.use_gpu', gpu_flag,
+    ]
+    if max_image_size:
+        command_extract += ['--SiftExtraction.max_image_size', str(max_image_size)]
+    run_colmap_step('feature_extractor', command_extract, steps, trace=trace)
+
+    if vocab_tree_path:
+        matcher = 'vocab_tree_matcher'
+        command_match = [
+            'colmap', matcher,
+            '--database_path', colmap_db,
+            '--VocabTreeMatching.vocab_tree_path', vocab_tree_path,
+            '--VocabTreeMatching.match_list_path', image_list,
+        ]
+    else:
+        matcher = 'matches_importer'
+        pairs_path = os.path.join(workspace_path, 'pairs.txt')
+        base_names = colmap_model.read_model(base_model, include_points=False).image_names
+        pair_count = write_append_pairs(pairs_path, new_images, base_names, overlap)
+        print(f"Matching {len(new_images)} new frames in {pair_count} pairs.")
+        command_match = [
+            'colmap', matcher,
+            '--database_path', colmap_db,
+            '--match_list_path', pairs_path,
+            '--match_type', 'pairs',
+        ]
+    command_match += ['--SiftMatching.num_threads', threads, '--SiftMatching.use_gpu', gpu_flag]
+    run_colmap_step(matcher, command_match, steps, trace=trace)
+
+    command_register = [
+        'colmap', 'image_registrator',
+        '--database_path', colmap_db,
+        '--input_path', base_model,
+        '--output_path', model_dir,
+        '--Mapper.num_threads', threads,
+    ]
+    run_colmap_step('image_registrator', command_register, steps, trace=trace)
+
+    command_adjust = [
+        'colmap', 'bundle_adjuster',
+        '--input_path', model_dir,
+        '--output_path', model_dir,
+    ]
+    run_colmap_step('bundle_adjuster', command_adjust, steps, trace=trace)
+    if trace is not None:
+        trace.record_steps(steps)
+
+    validate_colmap_output(workspace_path)
+    registered = set(colmap_model.read_model(model_dir, include_points=False).image_names) & set(new_images)
+    if not registered:
+        raise RuntimeError(f"None of the {len(new_images)} new frames could be registered into the existing model; "
+                           f"the appended footage may not overlap the earlier capture.")
+    print(f"COLMAP registration completed: {len(registered)} of {len(new_images)} new frames registered.")
+
+def run_colmap_undistort(workspace_path, image_path, undistorted_output_path, max_image_size=None, trace=None):
+    """
+    Undistorts the registered images with COLMAP so OpenMVS can consume them.
+
+    Args:
+        workspace_path (str): The root workspace for COLMAP, containing the sparse model in sparse/0.
+        image_path (str): Path to the directory containing the input images.
+        undistorted_output_path (str): Path where undistorted images and the undistorted model will be saved.
+        max_image_size (int, optional): Downscale the undistorted images to this longest side. Defaults to None (full size).
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
+    """
+    print(f"\n--- Part 2b: Image Undistortion (COLMAP) ---")
+    colmap_sparse_input = os.path.join(workspace_path, 'sparse', '0')
+    if not os.path.exists(colmap_sparse_input):
+        raise FileNotFoundError(f"COLMAP sparse model (sparse/0) not found at {colmap_sparse_input}. SfM might have failed.")
+
+    # Start from an empty directory so images from an older model are not left behind
+    if os.path.exists(undistorted_output_path):
+        shutil.rmtree(undistorted_output_path)
+    os.makedirs(undistorted_output_path, exist_ok=True)
+
+    print("Running COLMAP image_undistorter...")
     command_undistort = [
         'colmap', 'image_undistorter',
         '--image_path', image_path,
         '--input_path', colmap_sparse_input,
         '--output_path', undistorted_output_path
     ]
-    run_command(command_undistort)
-
-    validate_colmap_output(workspace_path)
-    
-    print("COLMAP SfM completed and validated.")
+    if max_image_size:
+        command_undistort += ['--max_image_size', str(max_image_size)]
+    run_command(command_undistort, trace=trace)
     print("COLMAP image_undistorter completed.")
 
-def run_openmvs_reconstruction(openmvs_bin_path, colmap_undistorted_output_path, mvs_output_dir):
+def openmvs_scene_files(mvs_output_dir):
     """
-    Performs 3D mesh reconstruction using OpenMVS tools.
+    Returns the absolute paths of the files the OpenMVS steps read and write in mvs_output_dir.
+    """
+    mvs_output_dir = os.path.abspath(mvs_output_dir)
+    return {
+        'scene': os.path.join(mvs_output_dir, 'scene.mvs'),
+        'dense': os.path.join(mvs_output_dir, 'scene_dense.mvs'),
+        'dense_ply': os.path.join(mvs_output_dir, 'scene_dense.ply'),
+        'filtered_ply': os.path.join(mvs_output_dir, 'scene_dense_filtered.ply'),
+        'filter_report': os.path.join(mvs_output_dir, 'point_filter.json'),
+        'mesh': os.path.join(mvs_output_dir, 'scene_dense_mesh.mvs'),
+        'refined': os.path.join(mvs_output_dir, 'scene_dense_mesh_refine.mvs'),
+        'textured_obj': os.path.join(mvs_output_dir, 'scene_textured_mesh.obj'),
+    }
+
+def run_openmvs_tool(openmvs_bin_path, command, trace=None):
+    """
+    Runs a single OpenMVS executable from the OpenMVS bin directory.
+
+    The executable is invoked by its full path and only the child process runs in the
+    bin directory, so the worker's own working directory is never changed and several
+    jobs can run OpenMVS tools at the same time.
 
     Args:
         openmvs_bin_path (str): Path to the directory containing OpenMVS executable files.
-        colmap_undistorted_output_path (str): Path to the output directory from COLMAP's image_undistorter.
-        mvs_output_dir (str): Directory for OpenMVS intermediate and final OBJ output.
+        command (list): The executable name (without a path) followed by its arguments.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
     """
-    print(f"\n--- Part 3: 3D Mesh Reconstruction (OpenMVS) ---")
+    openmvs_bin_path = os.path.abspath(openmvs_bin_path)
+    executable = os.path.join(openmvs_bin_path, command[0])
+    run_command([executable] + command[1:], cwd=openmvs_bin_path, trace=trace)
 
-    # Ensure OpenMVS output directory exists
+def run_interface_colmap(openmvs_bin_path, colmap_undistorted_output_path, mvs_output_dir, trace=None):
+    """
+    InterfaceColmap: Convert COLMAP output to MVS format.
+    """
+    print("Running InterfaceColmap...")
     os.makedirs(mvs_output_dir, exist_ok=True)
+    colmap_undistorted_output_path = os.path.abspath(colmap_undistorted_output_path)
+    command_interface = [
+        'InterfaceColmap',
+        '-i', colmap_undistorted_output_path,
+        '-o', openmvs_scene_files(mvs_output_dir)['scene'],
+        '-w', colmap_undistorted_output_path
+    ]
+    run_openmvs_tool(openmvs_bin_path, command_interface, trace=trace)
+    print("InterfaceColmap completed.")
 
-    # Store current working directory to restore later
-    original_cwd = os.getcwd()
-    
-    try:
-        # Change to OpenMVS bin directory
-        print(f"Changing working directory to: {openmvs_bin_path}")
-        os.chdir(openmvs_bin_path)
-
-        # Define executable names (without full paths since we're in the bin directory)
-        interface_colmap = 'InterfaceColmap'
-        densify_point_cloud = 'DensifyPointCloud'
-        reconstruct_mesh = 'ReconstructMesh'
-        refine_mesh = 'RefineMesh'
-        texture_mesh = 'TextureMesh'
-
-        # Define MVS scene file paths (use absolute paths)
-        mvs_scene_file = os.path.abspath(os.path.join(mvs_output_dir, 'scene.mvs'))
-        densified_scene_file = os.path.abspath(os.path.join(mvs_output_dir, 'scene_dense.mvs'))
-        reconstructed_mesh_file = os.path.abspath(os.path.join(mvs_output_dir, 'scene_dense_mesh.mvs'))
-        refined_mesh_file = os.path.abspath(os.path.join(mvs_output_dir, 'scene_dense_mesh_refine.mvs'))
-        textured_obj_file = os.path.abspath(os.path.join(mvs_output_dir, 'scene_textured_mesh.obj'))
-
-        # Convert relative paths to absolute paths
-        colmap_undistorted_output_path = os.path.abspath(colmap_undistorted_output_path)
-        mvs_output_dir = os.path.abspath(mvs_output_dir)
-
-        # 1. InterfaceColmap: Convert COLMAP output to MVS format
-        print("Running InterfaceColmap...")
-        command_interface = [
-            interface_colmap,
-            '-i', colmap_undistorted_output_path,
-            '-o', mvs_scene_file,
-            '-w', colmap_undistorted_output_path
-        ]
-        run_command(command_interface, cwd=openmvs_bin_path)
-        print("InterfaceColmap completed.")
-
-        # 2. DensifyPointCloud: Generate a dense point cloud
-        print("Running DensifyPointCloud...")
-        command_densify = [
-            densify_point_cloud,
-            mvs_scene_file,
-            '-w', mvs_output_dir
-        ]
-        run_command(command_densify, cwd=openmvs_bin_path)
-        print("DensifyPointCloud completed.")
-
-        # 3. ReconstructMesh: Create a mesh from the dense point cloud
-        print("Running ReconstructMesh...")
-        command_reconstruct_mesh = [
-            reconstruct_mesh,
-            densified_scene_file,
-            '-w', mvs_output_dir
-        ]
-        run_command(command_reconstruct_mesh, cwd=openmvs_bin_path)
-        print("ReconstructMesh completed.")
-
-        # 4. RefineMesh: Refine the reconstructed mesh
-        print("Running RefineMesh...")
-        command_refine_mesh = [
-            refine_mesh,
-            reconstructed_mesh_file,
-            '-w', mvs_output_dir
-        ]
-        run_command(command_refine_mesh, cwd=openmvs_bin_path)
-        print("RefineMesh completed.")
-
-        # 5. TextureMesh: Apply textures to the refined mesh and export as OBJ
-        print("Running TextureMesh...")
-        command_texture = [
-            texture_mesh,
-            refined_mesh_file,
-            '--working-folder', mvs_output_dir,
-            '--output-file', textured_obj_file,
-            '--export-type', 'obj'
-        ]
-        run_command(command_texture, cwd=openmvs_bin_path)
-        print(f"TextureMesh completed, OBJ file generated at: {textured_obj_file}")
+def run_densify_point_cloud(openmvs_bin_path, mvs_output_dir, resolution_level=None, trace=None):
+    """
+    DensifyPointCloud: Generate a dense point cloud (from images halved resolution_level times, if given).
+    """
+    print("Running DensifyPointCloud...")
+    command_densify = [
+        'DensifyPointCloud',
+        openmvs_scene_files(mvs_output_dir)['scene'],
+        '-w', os.path.abspath(mvs_output_dir)
+    ]
+    if resolution_level is not None:
+        command_densify += ['--resolution-level', str(resolution_level)]
+    run_openmvs_tool(openmvs_bin_path, command_densify, trace=trace)
+    print("DensifyPointCloud completed.")
 
-    finally:
-        # Always restore the original working directory
-        print(f"Restoring working directory to: {original_cwd}")
-        os.chdir(original_cwd)
+def run_filter_points(mvs_output_dir, up=None, trace=None):
+    """
+    Removes the floor and floating outliers from the dense point cloud (see pointcloud.py),
+    writing the cloud ReconstructMesh meshes instead of the one in the dense scene.
+    """
+    files = openmvs_scene_files(mvs_output_dir)
+    report = pointcloud.filter_point_cloud(files['dense_ply'], files['filtered_ply'], files['filter_report'], up=up)
+    if trace is not None:
+        trace.record_steps([dict(step, step=f"filter_points/{step['step']}") for step in report['steps']])
+
+def run_reconstruct_mesh(openmvs_bin_path, mvs_output_dir, decimate=None, pointcloud_file=None, trace=None):
+    """
+    ReconstructMesh: Create a mesh from the dense point cloud (keeping a decimate fraction of its faces, if given),
+    or from pointcloud_file (a filtered PLY cloud with views) in its place.
+    """
+    print("Running ReconstructMesh...")
+    command_reconstruct_mesh = [
+        'ReconstructMesh',
+        openmvs_scene_files(mvs_output_dir)['dense'],
+        '-w', os.path.abspath(mvs_output_dir)
+    ]
+    if decimate is not None:
+        command_reconstruct_mesh += ['--decimate', str(decimate)]
+    if pointcloud_file is not None:
+        command_reconstruct_mesh += ['--pointcloud-file', os.path.abspath(pointcloud_file)]
+    run_openmvs_tool(openmvs_bin_path, command_reconstruct_mesh, trace=trace)
+    print("ReconstructMesh completed.")
 
-def convert_obj_to_glb(obj_path, glb_path):
+def run_refine_mesh(openmvs_bin_path, mvs_output_dir, trace=None):
+    """
+    RefineMesh: Refine the reconstructed mesh.
+    """
+    print("Running RefineMesh...")
+    command_refine_mesh = [
+        'RefineMesh',
+        openmvs_scene_files(mvs_output_dir)['mesh'],
+        '-w', os.path.abspath(mvs_output_dir)
+    ]
+    run_openmvs_tool(openmvs_bin_path, command_refine_mesh, trace=trace)
+    print("RefineMesh completed.")
+
+def run_texture_mesh(openmvs_bin_path, mvs_output_dir, refined=True, resolution_level=None, trace=None):
+    """
+    TextureMesh: Apply textures to the refined mesh (or the unrefined one if refined is False) and export as OBJ.
+    """
+    print("Running TextureMesh...")
+    files = openmvs_scene_files(mvs_output_dir)
+    command_texture = [
+        'TextureMesh',
+        files['refined'] if refined else files['mesh'],
+        '--working-folder', os.path.abspath(mvs_output_dir),
+        '--output-file', files['textured_obj'],
+        '--export-type', 'obj'
+    ]
+    if resolution_level is not None:
+        command_texture += ['--resolution-level', str(resolution_level)]
+    run_openmvs_tool(openmvs_bin_path, command_texture, trace=trace)
+    print(f"TextureMesh completed, OBJ file generated at: {files['textured_obj']}")
+
+def run_openmvs_reconstruction(openmvs_bin_path, colmap_undistorted_output_path, mvs_output_dir, profile='standard', trace=None):
+    """
+    Performs 3D mesh reconstruction using OpenMVS tools.
+
+    Args:
+        openmvs_bin_path (str): Path to the directory containing OpenMVS executable files.
+        colmap_undistorted_output_path (str): Path to the output directory from COLMAP's image_undistorter.
+        mvs_output_dir (str): Directory for OpenMVS intermediate and final OBJ output.
+        profile (str, optional): Name of the quality/speed profile (see PROFILES). Defaults to 'standard'.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
+    """
+    print(f"\n--- Part 3: 3D Mesh Reconstruction (OpenMVS, {profile} profile) ---")
+    settings = PROFILES[profile]
+    run_interface_colmap(openmvs_bin_path, colmap_undistorted_output_path, mvs_output_dir, trace=trace)
+    run_densify_point_cloud(openmvs_bin_path, mvs_output_dir, resolution_level=settings['densify_resolution_level'], trace=trace)
+    run_reconstruct_mesh(openmvs_bin_path, mvs_output_dir, decimate=settings['mesh_decimate'], trace=trace)
+    if settings['refine']:
+        run_refine_mesh(openmvs_bin_path, mvs_output_dir, trace=trace)
+    run_texture_mesh(openmvs_bin_path, mvs_output_dir, refined=settings['refine'],
+                     resolution_level=settings['texture_resolution_level'], trace=trace)
+
+def convert_obj_to_glb(obj_path, glb_path, cleanup_engine='blender', writer='blender', lod_ratios=None,
+                       lod_format='msft_lod', quantize=False, blender=None, trace=None):
     """
     Converts an OBJ file to a GLB file.
     Assumes obj_to_glb_cleanup.py is located in the same directory as this script.
@@ -336,11 +838,65 @@ def convert_obj_to_glb(obj_path, glb_path):
     Args:
         obj_path (str): Full path to the input OBJ file.
         glb_path (str): Full path for the output GLB file.
+        cleanup_engine (str, optional): 'blender' to clean the mesh inside Blender with edit-mode operators,
+            'bmesh' to clean it inside Blender on a single BMesh, or 'numpy' to clean it in-process with
+            mesh_cleanup.py first and use Blender only for the export. Defaults to 'blender'.
+        writer (str, optional): 'blender' to export the GLB with Blender, or 'native' to write it in-process
+            with glb_writer.py (requires the 'numpy' cleanup engine). Defaults to 'blender'.
+        lod_ratios (list, optional): Triangle ratios of decimated levels of detail to write, finest first
+            (native writer only). Defaults to None (full resolution only).
+        lod_format (str, optional): One 'msft_lod' GLB or 'separate' GLBs per level. Defaults to 'msft_lod'.
+        quantize (bool, optional): Write 16/8-bit vertex attributes with KHR_mesh_quantization
+            (native writer only). Defaults to False.
+        blender (blender_server.BlenderServer, optional): Persistent Blender process to run the
+            conversion in. Defaults to None, or when it is unavailable, a one-shot Blender run.
+        trace (telemetry.JobTrace, optional): Trace that receives the resource usage of the commands run. Defaults to None.
     """
     print(f"\n--- Part 4: OBJ to GLB Conversion ---")
     if not os.path.exists(obj_path):
         raise FileNotFoundError(f"OBJ input file not found for GLB conversion: {obj_path}")
 
+    if writer == 'native':
+        if cleanup_engine != 'numpy':
+            raise ValueError("The native GLB writer requires the 'numpy' cleanup engine.")
+        # Read, clean and write in one process: no intermediate OBJ and no Blender start-up
+        steps = glb_writer.obj_to_glb(obj_path, glb_path, lod_ratios=lod_ratios, lod_format=lod_format, quantize=quantize)
+        if trace is not None:
+            trace.record_steps([dict(step, step=f"native/{step['step']}") for step in steps])
+        print(f"OBJ converted to GLB: {glb_path}")
+        return
+    elif writer != 'blender':
+        raise ValueError(f"Unknown GLB writer '{writer}'. Expected 'blender' or 'native'.")
+    if lod_ratios:
+        raise ValueError("Levels of detail are only written by the native GLB writer.")
+    if quantize:
+        raise ValueError("Quantized meshes are only written by the native GLB writer.")
+
+    skip_blender_cleanup = []
+    cleanup_mode = 'bmesh' if cleanup_engine == 'bmesh' else 'operators'
+    if cleanup_engine == 'numpy':
+        # Written next to the original so the OBJ's material library and textures still resolve
+        cleaned_obj_path = os.path.splitext(obj_path)[0] + '_cleaned.obj'
+        steps = mesh_cleanup.cleanup_obj(obj_path, cleaned_obj_path)
+        if trace is not None:
+            trace.record_steps([dict(step, step=f"numpy/{step['step']}") for step in steps])
+        obj_path = cleaned_obj_path
+        skip_blender_cleanup = ['--skip-cleanup']
+    elif cleanup_engine not in ('blender', 'bmesh'):
+        raise ValueError(f"Unknown cleanup engine '{cleanup_engine}'. Expected 'numpy', 'bmesh' or 'blender'.")
+
+    if blender is not None:
+        try:
+            result = blender.convert(obj_path, glb_path, skip_cleanup=bool(skip_blender_cleanup),
+                                     cleanup_mode=cleanup_mode)
+        except blender_server.BlenderServerUnavailable as e:
+            print(f"Warning: Blender server unavailable ({e}); falling back to a one-shot Blender run.", file=sys.stderr)
+        else:
+            if trace is not None:
+                trace.record_steps(result['steps'] + [{'step': 'blender_server/job', 'wall_seconds': result['wall_seconds']}])
+            print(f"OBJ converted to GLB: {glb_path}")
+            return
+
     # Determine the path to obj_to_glb_cleanup.py, assuming it's a sibling script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     obj_to_glb_script = os.path.join(script_dir, 'obj_to_glb_cleanup.py')
@@ -348,28 +904,289 @@ def convert_obj_to_glb(obj_path, glb_path):
     if not os.path.exists(obj_to_glb_script):
         raise FileNotFoundError(f"OBJ to GLB conversion script not found: {obj_to_glb_script}. Please ensure '{obj_to_glb_script}' exists.")
 
+    # The cleanup script writes per-step timings and mesh sizes here; they are merged into the job trace
+    cleanup_trace_file = os.path.splitext(glb_path)[0] + '_cleanup_trace.json'
     command = [
         'blender',
         '--background',
         '--python', obj_to_glb_script,
         '--',  # everything after this is passed to your script
         obj_path,
-        glb_path
-    ]
-    run_command(command)
+        glb_path,
+        '--trace', cleanup_trace_file,
+        '--cleanup-mode', cleanup_mode
+    ] + skip_blender_cleanup
+    try:
+        run_command(command, trace=trace)
+    finally:
+        if os.path.exists(cleanup_trace_file):
+            if trace is not None:
+                with open(cleanup_trace_file, 'r') as f:
+                    trace.record_steps(json.load(f).get('steps', []))
+            os.remove(cleanup_trace_file)
     print(f"OBJ converted to GLB: {glb_path}")
 
-def main():
+def optimize_glb_textures(glb_files, report_path, image_format, quality, max_sizes, strip_unused=True,
+                          workers=None, trace=None):
     """
-    Main function to parse arguments and orchestrate the photogrammetry pipeline.
+    Downscales and re-encodes the textures of the exported GLB files and writes a per-texture size report.
+
+    Args:
+        glb_files (list): (exported GLB, optimized GLB) pairs, one per level of detail, finest first.
+        report_path (str): Path for the JSON report (sizes and bytes before and after, per texture).
+        image_format (str): 'jpeg', 'webp' or 'png'.
+        quality (int): JPEG/WebP quality (1-100).
+        max_sizes (list): Maximum texture width/height per level of detail.
+        strip_unused (bool, optional): Blank texture regions no triangle uses. Defaults to True.
+        workers (int, optional): Number of encoding processes. Defaults to the number of CPUs.
+        trace (telemetry.JobTrace, optional): Trace that receives per-texture timings and sizes. Defaults to None.
+    """
+    print(f"\n--- Part 5: Texture Optimization ---")
+    report = textures.optimize_textures(glb_files, image_format=image_format, quality=quality, max_sizes=max_sizes,
+                                        strip_unused=strip_unused, workers=workers)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    if trace is not None:
+        trace.record_steps([{'step': f"encode/{entry['file']}/{entry['image']}", 'wall_seconds': entry['wall_seconds'],
+                             'bytes_before': entry['bytes_before'], 'bytes_after': entry['bytes_after']}
+                            for entry in report])
+    saved = sum(entry['bytes_before'] - entry['bytes_after'] for entry in report)
+    print(f"Texture optimization saved {saved / 2 ** 20:.1f} MB. Report written to: {report_path}")
+
+def pipeline_sources():
+    """
+    Returns the source files of the pipeline's own code: this module, the sibling modules it
+    imports (directly or through each other) and PIPELINE_SCRIPTS. The tools next to it that the
+    pipeline never loads (benchmark.py, fake_tools.py, worker.py, ...) are left out, so editing
+    them does not invalidate the result cache.
+
+    Returns:
+        list: Sorted absolute paths of the pipeline's .py files.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = set()
+    pending = [sys.modules[__name__]]
+    while pending:
+        module = pending.pop()
+        path = os.path.abspath(getattr(module, '__file__', None) or '')
+        if os.path.dirname(path) != script_dir or path in sources:
+            continue
+        sources.add(path)
+        for value in vars(module).values():
+            # `from checkpoints import CheckpointStore` binds a class, found through its module
+            if not isinstance(value, types.ModuleType):
+                value = sys.modules.get(getattr(value, '__module__', None) or '')
+            if value is not None:
+                pending.append(value)
+    sources.update(os.path.join(script_dir, name) for name in PIPELINE_SCRIPTS)
+    return sorted(sources)
+
+def job_log_dir(args, job_id):
+    """
+    Returns the directory of a job's command logs and progress events (progress.jsonl).
+    """
+    return args.log_dir or os.path.join(args.workspace, 'logs', job_id)
+
+def save_trace(trace, workspace, trace_dir, status, error=None):
+    """
+    Writes the job trace to <workspace>/trace.json and, if trace_dir is set, copies it there.
+    Failing to write the trace never fails the job.
+    """
+    try:
+        trace_file = os.path.join(workspace, 'trace.json')
+        trace.save(trace_file, status, error=error)
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+            shutil.copyfile(trace_file, os.path.join(trace_dir, f"{trace.job['job_id']}.json"))
+        print(f"Job trace written to: {trace_file}")
+    except OSError as e:
+        print(f"Warning: Could not write job trace: {e}", file=sys.stderr)
+
+def build_arg_parser():
+    """
+    Returns the argument parser for a pipeline run (shared by the CLI and the worker's job files).
     """
     parser = argparse.ArgumentParser(description="Run photogrammetry pipeline (FFmpeg, COLMAP, OpenMVS, OBJ to GLB).")
     parser.add_argument('--workspace', required=True, help='Root directory for all photogrammetry work (e.g., /path/to/photogrammetry/furniture_id).')
     parser.add_argument('--video_input', required=True, help='Full path to the input video file (e.g., /path/to/photogrammetry/furniture_id/video/video.mp4).')
+    parser.add_argument('--append-video', action='append', default=[], help='More footage of the same object, added to the earlier run in this workspace: only its frames have features extracted and are matched and registered into the existing SfM model, and only the depth maps of new or moved views are estimated (see --keep-depth-maps; may be repeated).')
     parser.add_argument('--output_dir', required=True, help='Output directory for the final GLB file and OpenMVS intermediate files (e.g., /path/to/photogrammetry/furniture_id/output).')
     parser.add_argument('--openmvs', required=True, help='Path to the OpenMVS bin directory (e.g., C:\\OpenMVS\\bin).')
-    args = parser.parse_args()
+    parser.add_argument('--frame-selection', choices=['keyframes', 'fixed'], default='keyframes', help='Keep a budget of sharp, distinct keyframes, or every frame at a fixed rate (default: keyframes).')
+    parser.add_argument('--fps', type=float, default=2, help='Extraction rate when --frame-selection=fixed (default: 2).')
+    parser.add_argument('--frame-workers', type=int, help='Parallel FFmpeg processes for --frame-selection=fixed, each decoding a time segment (default: number of CPUs).')
+    parser.add_argument('--max-frames', type=int, default=60, help='Maximum number of keyframes to keep (default: 60).')
+    parser.add_argument('--sample-fps', type=float, default=4, help='Rate at which candidate keyframes are sampled and scored (default: 4).')
+    parser.add_argument('--min-sharpness-ratio', type=float, default=0.5, help='Drop candidates whose sharpness is below this fraction of the median (default: 0.5).')
+    parser.add_argument('--min-view-change', type=float, default=0.02, help='Drop candidates that differ less than this from the last kept frame (default: 0.02).')
+    parser.add_argument('--preprocess', action='store_true', help='Downscale, exposure-normalize and filter the frames (in parallel) before SfM.')
+    parser.add_argument('--preprocess-max-dimension', type=int, default=preprocess.DEFAULT_MAX_DIMENSION, help=f'Longest side of the preprocessed frames (default: {preprocess.DEFAULT_MAX_DIMENSION}).')
+    parser.add_argument('--preprocess-quality', type=int, default=preprocess.DEFAULT_QUALITY, help=f'JPEG quality of the preprocessed frames (default: {preprocess.DEFAULT_QUALITY}).')
+    parser.add_argument('--keep-exposure', action='store_true', help='Do not normalize the exposure of the preprocessed frames.')
+    parser.add_argument('--preprocess-workers', type=int, help='Number of preprocessing processes (default: number of CPUs).')
+    parser.add_argument('--sfm-matcher', choices=SFM_MATCHERS, default='sequential', help='Match each frame with its next few frames (linear cost, for continuous video) or every pair (default: sequential).')
+    parser.add_argument('--sfm-overlap', type=int, default=SEQUENTIAL_OVERLAP, help=f'Frames matched ahead of each frame by the sequential matcher (default: {SEQUENTIAL_OVERLAP}).')
+    parser.add_argument('--sfm-vocab-tree', help='COLMAP vocabulary tree file; enables loop detection in the sequential matcher.')
+    parser.add_argument('--sfm-threads', type=int, default=-1, help='Threads for each COLMAP SfM step (default: -1, all cores).')
+    parser.add_argument('--sfm-max-image-size', type=int, help="Longest image side used for SIFT feature extraction (default: COLMAP's own).")
+    parser.add_argument('--sfm-cpu', action='store_true', help='Run SIFT extraction and matching on the CPU (no GPU required).')
+    parser.add_argument('--quality-gate', choices=quality.GATE_MODES, default='reject', help='After SfM, stop captures that fail the quality checks (reject), only report them (warn), or skip the checks (default: reject).')
+    parser.add_argument('--min-registered-ratio', type=float, default=quality.DEFAULT_THRESHOLDS['min_registered_ratio'], help=f"Fraction of the frames SfM must register (default: {quality.DEFAULT_THRESHOLDS['min_registered_ratio']}).")
+    parser.add_argument('--min-coverage', type=float, default=quality.DEFAULT_THRESHOLDS['min_coverage_degrees'], help=f"Degrees of the orbit around the object the cameras must span (default: {quality.DEFAULT_THRESHOLDS['min_coverage_degrees']}).")
+    parser.add_argument('--min-track-length', type=float, default=quality.DEFAULT_THRESHOLDS['min_median_track_length'], help=f"Median number of frames that must observe each sparse point (default: {quality.DEFAULT_THRESHOLDS['min_median_track_length']}).")
+    parser.add_argument('--max-reprojection-error', type=float, default=quality.DEFAULT_THRESHOLDS['max_mean_reprojection_error'], help=f"Largest mean reprojection error of the sparse model, in pixels (default: {quality.DEFAULT_THRESHOLDS['max_mean_reprojection_error']}).")
+    parser.add_argument('--resume-from', choices=PIPELINE_STAGES, help='Re-run this stage and all later ones, reusing the checkpoints of earlier stages.')
+    parser.add_argument('--force', choices=PIPELINE_STAGES, action='append', default=[], help='Re-run this stage even if its checkpoint matches (may be repeated).')
+    parser.add_argument('--crop-to-object', action='store_true', help='Estimate the bounding box of the object the cameras orbit and drop the sparse points outside it before OpenMVS, so the background is not densified.')
+    parser.add_argument('--filter-points', action='store_true', help='Remove the floor plane and statistical outliers from the dense point cloud before ReconstructMesh.')
+    parser.add_argument('--profile', choices=list(PROFILES), default='standard', help='Reconstruction quality/speed profile: image size, densification resolution, mesh decimation and whether RefineMesh runs (default: standard).')
+    parser.add_argument('--two-phase', action='store_true', help=f'First publish a quick preview model ({PREVIEW_GLB_NAME} in the output directory), then run the chosen profile from the same SfM result.')
+    parser.add_argument('--cleanup-engine', choices=['blender', 'bmesh', 'numpy'], default='blender', help='Clean the mesh inside Blender with edit-mode operators, inside Blender on a single BMesh, or in-process with NumPy before a Blender export-only pass (default: blender).')
+    parser.add_argument('--glb-writer', choices=['blender', 'native'], default='blender', help='Export the GLB with Blender, or write it directly with glb_writer.py (requires --cleanup-engine numpy; default: blender).')
+    parser.add_argument('--lod-ratios', type=float, nargs='+', help='Also write decimated levels of detail with these triangle ratios, finest first, e.g. 1 0.25 0.05 (requires --glb-writer native).')
+    parser.add_argument('--lod-format', choices=glb_writer.LOD_FORMATS, default='msft_lod', help='Write a single GLB using MSFT_lod, or one GLB per level (<name>_lod<N>.glb; the backend only publishes the first) (default: msft_lod).')
+    parser.add_argument('--quantize-mesh', action='store_true', help='Store positions, normals and UVs as 16/8-bit integers with KHR_mesh_quantization (requires --glb-writer native).')
+    parser.add_argument('--texture-format', choices=['keep'] + list(textures.TEXTURE_FORMATS), default='keep', help='Re-encode the GLB textures in this format after export (default: keep them as exported).')
+    parser.add_argument('--texture-quality', type=int, default=textures.DEFAULT_QUALITY, help=f'JPEG/WebP quality for re-encoded textures (default: {textures.DEFAULT_QUALITY}).')
+    parser.add_argument('--texture-max-sizes', type=int, nargs='+', default=textures.DEFAULT_MAX_SIZES, help='Maximum texture width/height per level of detail, finest first (default: ' + ' '.join(map(str, textures.DEFAULT_MAX_SIZES)) + ').')
+    parser.add_argument('--keep-unused-texels', action='store_true', help='Do not blank the texture regions that no triangle uses.')
+    parser.add_argument('--texture-workers', type=int, help='Number of processes encoding textures in parallel (default: number of CPUs).')
+    parser.add_argument('--stage-timeout', dest='stage_timeouts', action='append', default=[], type=parse_stage_timeout, metavar='STAGE=SECONDS', help='Kill the commands of a stage that runs longer than this, failing the job (may be repeated).')
+    parser.add_argument('--intermediates', choices=storage.INTERMEDIATE_MODES, default='delete', help='What happens to an intermediate (frames, undistorted images, OpenMVS scenes, depth maps, textured OBJ) once the last stage reading it has finished: delete it, compress it into <workspace>/archive, or keep it for debugging (default: delete). Resumed runs bring back what they need.')
+    parser.add_argument('--keep-depth-maps', action='store_true', help='Keep the OpenMVS depth maps after densification, so a later --append-video run reuses those of the views that did not change.')
+    parser.add_argument('--disk-quota', type=storage.parse_size, help='Fail the job when its workspace, output and scratch directories hold more than this, e.g. 20G (checked between stages).')
+    parser.add_argument('--scratch-dir', help='Fast scratch directory (e.g. a tmpfs) for the undistorted images, the hottest intermediate.')
+    parser.add_argument('--cache-dir', help='Result cache shared between jobs: a video reconstructed before with the same options gets its stored GLB back, otherwise the stored frames and SfM model are reused when they match.')
+    parser.add_argument('--cache-max-size', type=storage.parse_size, default=result_cache.DEFAULT_MAX_SIZE, help=f'Size cap of the result cache; the least recently used results are evicted past it (default: {result_cache.DEFAULT_MAX_SIZE}).')
+    parser.add_argument('--log-dir', help='Directory for the command logs and progress events (default: <workspace>/logs/<job id>).')
+    parser.add_argument('--log-max-bytes', type=int, default=command_log.DEFAULT_LOG_MAX_BYTES, help=f'Size cap of each command\'s log file; past it only the last lines are kept (default: {command_log.DEFAULT_LOG_MAX_BYTES}).')
+    parser.add_argument('--log-tail-lines', type=int, default=command_log.DEFAULT_TAIL_LINES, help=f'Last lines of output kept in memory per command and shown when it fails (default: {command_log.DEFAULT_TAIL_LINES}).')
+    parser.add_argument('--quiet-commands', action='store_true', help='Only write the output of external tools to the command logs, not to stdout.')
+    parser.add_argument('--trace-dir', help='Also copy the job trace (trace.json in the workspace) into this directory, for aggregation with telemetry.py summarize.')
+    return parser
+
+def parse_stage_timeout(value):
+    """
+    Parses a --stage-timeout STAGE=SECONDS value into (stage, seconds).
+    """
+    stage, _, seconds = value.partition('=')
+    try:
+        return stage, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected STAGE=SECONDS, got '{value}'")
+
+def parse_args(argv=None):
+    """
+    Parses pipeline arguments and rejects invalid combinations of options (exits like argparse on error).
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        validate_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def make_config(workspace, video_input, output_dir, openmvs, **options):
+    """
+    Builds the configuration of one pipeline run for library use (see pipeline_api.py):
+    the command-line defaults, overridden by options named like the command-line flags
+    (with underscores), e.g. make_config(..., profile='high', stage_timeouts={'densify': 3600}).
+
+    Returns:
+        argparse.Namespace: The validated configuration, as parse_args would return it.
+
+    Raises:
+        ValueError: If an option is unknown or the options are invalid together.
+    """
+    args = build_arg_parser().parse_args(['--workspace', workspace, '--video_input', video_input,
+                                          '--output_dir', output_dir, '--openmvs', openmvs])
+    unknown = sorted(set(options) - set(vars(args)))
+    if unknown:
+        raise ValueError(f"Unknown pipeline option(s): {', '.join(unknown)}")
+    vars(args).update(options)
+    validate_args(args)
+    return args
+
+def validate_args(args):
+    """
+    Rejects invalid combinations of options, and turns the stage timeouts into a dict.
+
+    Raises:
+        ValueError: Describing the first invalid option.
+    """
+    def error(message):
+        raise ValueError(message)
+    # Checked before the run starts: the inputs' digests (checkpoints, result cache) are
+    # computed before frame extraction would report a missing video
+    for video_path in [args.video_input] + list(args.append_video):
+        if not os.path.exists(video_path):
+            error(f"Video input file not found: {video_path}")
+    if args.frame_workers is not None and args.frame_workers < 1:
+        error("--frame-workers must be at least 1")
+    if args.preprocess_max_dimension < 1:
+        error("--preprocess-max-dimension must be positive")
+    if not 1 <= args.preprocess_quality <= 100:
+        error("--preprocess-quality must be between 1 and 100")
+    if args.sfm_overlap < 1:
+        error("--sfm-overlap must be at least 1")
+    if args.sfm_vocab_tree and args.sfm_matcher != 'sequential':
+        error("--sfm-vocab-tree (loop detection) requires --sfm-matcher sequential")
+    if not 0 <= args.min_registered_ratio <= 1:
+        error("--min-registered-ratio must be between 0 and 1")
+    if not 0 <= args.min_coverage <= 360:
+        error("--min-coverage must be between 0 and 360")
+    if args.two_phase and args.profile == 'preview':
+        error("--two-phase needs a --profile other than preview")
+    if args.glb_writer == 'native' and args.cleanup_engine != 'numpy':
+        error("--glb-writer native requires --cleanup-engine numpy")
+    if args.lod_ratios:
+        if args.glb_writer != 'native':
+            error("--lod-ratios requires --glb-writer native")
+        if any(not 0 < ratio <= 1 for ratio in args.lod_ratios) or args.lod_ratios != sorted(args.lod_ratios, reverse=True):
+            error("--lod-ratios must be in (0, 1] and in decreasing order")
+    if args.quantize_mesh and args.glb_writer != 'native':
+        error("--quantize-mesh requires --glb-writer native")
+    if not 1 <= args.texture_quality <= 100:
+        error("--texture-quality must be between 1 and 100")
+    if any(size < 1 for size in args.texture_max_sizes):
+        error("--texture-max-sizes must be positive")
+    if args.disk_quota is not None and args.disk_quota < 1:
+        error("--disk-quota must be positive")
+    if args.cache_max_size < 1:
+        error("--cache-max-size must be positive")
+    if args.log_max_bytes < 1 or args.log_tail_lines < 1:
+        error("--log-max-bytes and --log-tail-lines must be positive")
+    args.stage_timeouts = dict(args.stage_timeouts or {})
+    for stage, seconds in args.stage_timeouts.items():
+        if stage not in PIPELINE_STAGES:
+            error(f"--stage-timeout: unknown stage '{stage}' (expected one of {', '.join(PIPELINE_STAGES)})")
+        if seconds <= 0:
+            error(f"--stage-timeout for {stage} must be positive")
+
+def run_pipeline(args, job_id=None, stage_slot=None, blender=None):
+    """
+    Runs the full photogrammetry pipeline for one job.
+
+    The pipeline keeps all of its state in its arguments, its trace and its workspace
+    (no working-directory changes or other process-wide state), so a worker can run
+    several of these calls concurrently in threads.
+
+    Args:
+        args (argparse.Namespace): Parsed pipeline arguments (see build_arg_parser).
+        job_id (str, optional): Identifier used for the job trace. Defaults to the workspace name and a timestamp.
+        stage_slot (callable, optional): Called with a stage name, returns a context manager that
+            is held while that stage runs. Used by the worker to cap concurrent stages per
+            class. Defaults to None (no limit).
+        blender (blender_server.BlenderServer, optional): Persistent Blender process for the GLB
+            export, shared between the jobs of a worker. Defaults to None (one Blender run per export).
+
+    Returns:
+        str: Path to the final GLB file.
 
+    Raises:
+        Exception: Whatever the failing stage raised; the job trace is saved either way.
+    """
     # Assign parsed arguments to variables
     workspace = args.workspace
     video_path = args.video_input
@@ -378,39 +1195,389 @@ def main():
 
     # Define internal directory paths relative to the workspace
     images_dir = os.path.join(workspace, 'images')
-    colmap_undistorted_dir = os.path.join(workspace, 'undistorted_output')
+    # The undistorted images are re-read by every OpenMVS step, so they go to the scratch directory if there is one
+    scratch_dir = storage.job_scratch_dir(args.scratch_dir, workspace) if args.scratch_dir else None
+    colmap_undistorted_dir = os.path.join(scratch_dir or workspace, 'undistorted_output')
 
-    # Create all necessary directories if they don't exist
-    os.makedirs(images_dir, exist_ok=True)
-    os.makedirs(colmap_undistorted_dir, exist_ok=True)
+    # The stages create their own directories when they run: an empty frames or undistorted
+    # directory made in advance would stand in for outputs released by an earlier run
     os.makedirs(final_glb_output_dir, exist_ok=True) # This is also the MVS intermediate output directory
 
+    if job_id is None:
+        job_id = f"{os.path.basename(os.path.normpath(workspace))}-{time.strftime('%Y%m%d-%H%M%S')}"
+    trace = telemetry.JobTrace(job_id, workspace=os.path.abspath(workspace), video=os.path.abspath(video_path))
+    job_logs = command_log.JobLogs(job_log_dir(args, job_id), job_id, max_bytes=args.log_max_bytes,
+                                   tail_lines=args.log_tail_lines, echo=not args.quiet_commands)
+
     try:
         print(f"Starting photogrammetry pipeline in workspace: {workspace}")
         print(f"Video input: {video_path}")
         print(f"OpenMVS bin path: {openmvs_bin_path}")
         print(f"Final GLB and MVS output directory: {final_glb_output_dir}")
 
+        checkpoints = CheckpointStore(workspace, PIPELINE_STAGES, resume_from=args.resume_from, force=args.force)
+        storage_manager = storage.StorageManager(checkpoints, [workspace, final_glb_output_dir, scratch_dir],
+                                                 mode=args.intermediates, quota_bytes=args.disk_quota,
+                                                 archive_dir=os.path.join(workspace, storage.ARCHIVE_DIR_NAME))
+        cache = result_cache.ResultCache(args.cache_dir, max_bytes=args.cache_max_size) if args.cache_dir else None
+        # Cache keys of the cached stages seen so far, which the keys of the stages reading them chain
+        stage_keys = {}
+        job_started = time.monotonic()
+
+        def cached(stage, fn, record, inputs=(), params=None, deps=(), outputs=()):
+            # Wraps a stage so it restores its outputs from the result cache when an earlier job
+            # stored them, and otherwise runs and stores them
+            key = stage_keys[stage] = cache.key(stage, inputs=inputs, params=params,
+                                                deps={dep: stage_keys[dep] for dep in deps})
+            def run_cached():
+                if checkpoints.forced(stage):
+                    record['cache'] = 'forced'
+                elif cache.restore(key, workspace, stage):
+                    record['cache'] = 'hit'
+                    return
+                else:
+                    record['cache'] = 'miss'
+                started = time.monotonic()
+                fn()
+                cache.store(key, workspace, [path for pattern in outputs for path in sorted(glob.glob(pattern))],
+                            stage, duration_seconds=time.monotonic() - started)
+            return run_cached
+
+        def run_stage(stage, fn, **kwargs):
+            # Runs one checkpointed stage inside its trace record, holding its stage-class slot
+            # only while the stage actually executes (not while its checkpoint is checked)
+            with trace.stage(stage) as record:
+                if cache is not None and stage in CACHED_STAGES:
+                    fn = cached(stage, fn, record, **kwargs)
+                def run_timed():
+                    storage_manager.check_quota(f"before stage '{stage}'")
+                    # The stage's timeout counts from when it starts running, not from its slot wait
+                    timeout = args.stage_timeouts.get(stage)
+                    token = STAGE_DEADLINE.set(time.monotonic() + timeout if timeout else None)
+                    logs_token = COMMAND_LOGS.set(lambda command: job_logs.open_command(command, stage))
+                    job_logs.progress.event('stage_started', stage=stage)
+                    status = 'failed'
+                    try:
+                        fn()
+                        status = 'succeeded'
+                    finally:
+                        job_logs.progress.event('stage_finished', stage=stage, status=status)
+                        COMMAND_LOGS.reset(logs_token)
+                        STAGE_DEADLINE.reset(token)
+                def run_in_slot():
+                    if stage_slot is None:
+                        run_timed()
+                        return
+                    waiting_since = time.monotonic()
+                    with stage_slot(stage):
+                        record['slot_wait_seconds'] = round(time.monotonic() - waiting_since, 3)
+                        run_timed()
+                if not checkpoints.run(stage, run_in_slot, **kwargs):
+                    record['status'] = 'skipped'
+                record['disk_usage_bytes'] = storage_manager.stage_finished(stage)
+
+        final_glb_file = os.path.join(final_glb_output_dir, 'scene_textured_mesh.glb')
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+
+        # Part 0: a video reconstructed before with the same options (and the same pipeline
+        # code) gets its stored result back
+        if cache is not None:
+            result_key = cache.key('result',
+                                   inputs=[video_path] + args.append_video + ([args.sfm_vocab_tree] if args.sfm_vocab_tree else [])
+                                          + pipeline_sources(),
+                                   params={name: value for name, value in vars(args).items() if name not in CACHE_NEUTRAL_OPTIONS})
+            # --force and --resume-from ask for stages to run again, so they bypass the stored result
+            if not (args.force or args.resume_from):
+                with trace.stage('result_cache') as record:
+                    record['cache'] = 'hit' if cache.restore(result_key, final_glb_output_dir, 'result') else 'miss'
+                if record['cache'] == 'hit':
+                    print("\nPhotogrammetry pipeline completed from the result cache.")
+                    save_trace(trace, workspace, args.trace_dir, 'succeeded')
+                    return final_glb_file
+
         # Execute Part 1: Frame Extraction
-        extract_frames(video_path, images_dir, fps=2)
+        if args.frame_selection == 'keyframes':
+            frame_params = {
+                'selection': 'keyframes',
+                'max_frames': args.max_frames,
+                'sample_fps': args.sample_fps,
+                'min_sharpness_ratio': args.min_sharpness_ratio,
+                'min_change': args.min_view_change,
+            }
+            extract = lambda video, output_dir, report_path: extract_keyframes(video, output_dir, report_path,
+                                                                               max_frames=args.max_frames, sample_fps=args.sample_fps,
+                                                                               min_sharpness_ratio=args.min_sharpness_ratio,
+                                                                               min_change=args.min_view_change, trace=trace)
+        else:
+            frame_params = {'selection': 'fixed', 'fps': args.fps}
+            extract = lambda video, output_dir, report_path: extract_frames(video, output_dir, fps=args.fps,
+                                                                            workers=args.frame_workers, trace=trace)
+        run_stage('frames', lambda: extract(video_path, images_dir, os.path.join(workspace, 'keyframes.json')),
+                  inputs=[video_path], params=frame_params, outputs=[images_dir])
+
+        # Stages that read the frames and the sparse model SfM (or the registration of appended footage) ends with
+        undistort_stages = ['undistort'] + ([PREVIEW_STAGE_PREFIX + 'undistort'] if args.two_phase else [])
+        model_readers = (['quality'] if args.quality_gate != 'off' else []) + undistort_stages
+        frame_readers = ['sfm'] + (['append_frames'] if args.append_video else model_readers)
+
+        # Execute Part 1b: Frame Preprocessing (optional); SfM then reads the processed frames
+        sfm_images_dir = images_dir
+        sfm_images_stage = 'frames'
+        preprocess_params = {'max_dimension': args.preprocess_max_dimension, 'quality': args.preprocess_quality,
+                             'normalize_exposure': not args.keep_exposure}
+        prepare = lambda input_dir, output_dir, report_path: preprocess.preprocess_frames(input_dir, output_dir, report_path,
+                                                                                          max_dimension=args.preprocess_max_dimension,
+                                                                                          quality=args.preprocess_quality,
+                                                                                          normalize_exposure=not args.keep_exposure,
+                                                                                          workers=args.preprocess_workers)
+        if args.preprocess:
+            sfm_images_dir = os.path.join(workspace, 'images_preprocessed')
+            sfm_images_stage = 'preprocess'
+            run_stage('preprocess', lambda: prepare(images_dir, sfm_images_dir, os.path.join(workspace, 'preprocess.json')),
+                      inputs=[os.path.join(script_dir, 'preprocess.py')], params=preprocess_params,
+                      deps=['frames'], outputs=[sfm_images_dir, os.path.join(workspace, 'preprocess.json')])
+            storage_manager.track('frames', [images_dir], ['preprocess'])
+        storage_manager.track(sfm_images_stage, [sfm_images_dir], frame_readers)
 
         # Execute Part 2: Structure-from-Motion (SfM) with COLMAP
-        run_colmap_sfm(workspace, images_dir, colmap_undistorted_dir)
+        sfm_params = {
+            'single_camera': True,
+            'matcher': args.sfm_matcher,
+            'overlap': args.sfm_overlap,
+            'loop_detection': bool(args.sfm_vocab_tree),
+            'max_image_size': args.sfm_max_image_size,
+        }
+        run_stage('sfm', lambda: run_colmap_sfm(workspace, sfm_images_dir, matcher=args.sfm_matcher, overlap=args.sfm_overlap,
+                                                vocab_tree_path=args.sfm_vocab_tree, num_threads=args.sfm_threads,
+                                                max_image_size=args.sfm_max_image_size, use_gpu=not args.sfm_cpu,
+                                                trace=trace),
+                  inputs=[args.sfm_vocab_tree] if args.sfm_vocab_tree else [], params=sfm_params, deps=[sfm_images_stage],
+                  outputs=[os.path.join(workspace, 'database.db'), os.path.join(workspace, 'sparse')])
 
-        # Execute Part 3: 3D Mesh Reconstruction with OpenMVS
-        # The MVS output directory is the same as the final GLB output directory
-        run_openmvs_reconstruction(openmvs_bin_path, colmap_undistorted_dir, final_glb_output_dir)
+        # The workspace holding the sparse model the later stages read, and the frames it was made from
+        model_workspace, model_stage = workspace, 'sfm'
+        model_images_dir, model_images_stage = sfm_images_dir, sfm_images_stage
+        if args.append_video:
+            # Execute Part 1c: Frames of the appended footage (selected and preprocessed like the
+            # first video's), added next to the frames SfM already used
+            combined_images_dir = os.path.join(workspace, 'images_combined')
+            def append_frames():
+                print(f"\n--- Part 1c: Appended Footage ---")
+                if os.path.exists(combined_images_dir):
+                    shutil.rmtree(combined_images_dir)
+                link_frames(sfm_images_dir, combined_images_dir)
+                append_scratch_dir = os.path.join(workspace, 'append_scratch')
+                try:
+                    for number, video in enumerate(args.append_video, start=1):
+                        shutil.rmtree(append_scratch_dir, ignore_errors=True)
+                        frames_dir = os.path.join(append_scratch_dir, 'images')
+                        extract(video, frames_dir, os.path.join(workspace, f'keyframes_{APPEND_FRAME_PREFIX}{number}.json'))
+                        if args.preprocess:
+                            prepare(frames_dir, os.path.join(append_scratch_dir, 'images_preprocessed'),
+                                    os.path.join(workspace, f'preprocess_{APPEND_FRAME_PREFIX}{number}.json'))
+                            frames_dir = os.path.join(append_scratch_dir, 'images_preprocessed')
+                        added = link_frames(frames_dir, combined_images_dir, prefix=f'{APPEND_FRAME_PREFIX}{number}_')
+                        print(f"Added {len(added)} frames from {video}")
+                finally:
+                    shutil.rmtree(append_scratch_dir, ignore_errors=True)
+            run_stage('append_frames', append_frames,
+                      inputs=args.append_video + ([os.path.join(script_dir, 'preprocess.py')] if args.preprocess else []),
+                      params={'frames': frame_params, 'preprocess': preprocess_params if args.preprocess else None},
+                      deps=[sfm_images_stage], outputs=[combined_images_dir])
+            storage_manager.track('append_frames', [combined_images_dir], ['register'] + model_readers)
 
-        # Execute Part 4: OBJ to GLB Conversion
-        obj_file_to_convert = os.path.join(final_glb_output_dir, 'scene_textured_mesh.obj')
-        final_glb_file = os.path.join(final_glb_output_dir, 'scene_textured_mesh.glb')
-        convert_obj_to_glb(obj_file_to_convert, final_glb_file)
+            # Execute Part 2c: Register the appended frames into the SfM model
+            append_workspace = os.path.join(workspace, 'append')
+            new_images = lambda: sorted(name for name in os.listdir(combined_images_dir) if name.startswith(APPEND_FRAME_PREFIX))
+            run_stage('register', lambda: run_colmap_register(workspace, append_workspace, combined_images_dir, new_images(),
+                                                              overlap=args.sfm_overlap, vocab_tree_path=args.sfm_vocab_tree,
+                                                              num_threads=args.sfm_threads, max_image_size=args.sfm_max_image_size,
+                                                              use_gpu=not args.sfm_cpu, trace=trace),
+                      inputs=[args.sfm_vocab_tree] if args.sfm_vocab_tree else [],
+                      params={'overlap': args.sfm_overlap, 'vocab_tree': bool(args.sfm_vocab_tree),
+                              'max_image_size': args.sfm_max_image_size},
+                      deps=['sfm', 'append_frames'],
+                      outputs=[os.path.join(append_workspace, 'database.db'), os.path.join(append_workspace, 'sparse')])
+            model_workspace, model_stage = append_workspace, 'register'
+            model_images_dir, model_images_stage = combined_images_dir, 'append_frames'
+
+        # Execute Part 2a: Quality gate, so a capture that cannot give a usable model is stopped
+        # before the OpenMVS chain spends its time on it
+        if args.quality_gate != 'off':
+            thresholds = {
+                'min_registered_ratio': args.min_registered_ratio,
+                'min_coverage_degrees': args.min_coverage,
+                'min_median_track_length': args.min_track_length,
+                'max_mean_reprojection_error': args.max_reprojection_error,
+            }
+            quality_report = os.path.join(workspace, 'quality.json')
+            run_stage('quality', lambda: quality.check_capture(os.path.join(model_workspace, 'sparse', '0'), model_images_dir, quality_report,
+                                                               mode=args.quality_gate, thresholds=thresholds),
+                      inputs=[os.path.join(script_dir, 'quality.py')],
+                      params={'mode': args.quality_gate, 'thresholds': thresholds},
+                      deps=[model_stage, model_images_stage], outputs=[quality_report])
+
+        def reconstruct(profile, stage_prefix, undistorted_dir, mvs_dir, glb_file, lod_ratios=None):
+            # Parts 2b-4 for one phase: undistortion, OpenMVS and the GLB export, with the phase's
+            # stage names, profile and directories. Returns the paths the glb stage wrote.
+            settings = PROFILES[profile]
+            files = openmvs_scene_files(mvs_dir)
+            stage = lambda name: stage_prefix + name
+
+            # Which stages read each intermediate, so it is released after the last of them
+            # (the undistorted images are read by every OpenMVS step that looks at the photos, which
+            # therefore all depend on the undistort stage, so it restores them when they run again)
+            image_readers = ['interface', 'densify', 'texture_mesh'] + (['refine_mesh'] if settings['refine'] else [])
+            cloud_readers = ['reconstruct_mesh'] + (['filter_points'] if args.filter_points else [])
+            mesh_readers = ['refine_mesh'] if settings['refine'] else ['texture_mesh']
+            companion_ply = lambda scene: os.path.splitext(scene)[0] + '.ply'
+            storage_manager.track(stage('undistort'), [undistorted_dir],
+                                  [stage(name) for name in image_readers + (['filter_points'] if args.filter_points else [])])
+            storage_manager.track(stage('interface'), [files['scene']], [stage('densify')])
+            storage_manager.track(stage('densify'), [files['dense'], files['dense_ply']], [stage(name) for name in cloud_readers])
+            if not args.keep_depth_maps:
+                storage_manager.track(stage('densify'), [os.path.join(mvs_dir, '*.dmap')], [])
+            if args.filter_points:
+                storage_manager.track(stage('filter_points'), [files['filtered_ply']], [stage('reconstruct_mesh')])
+            storage_manager.track(stage('reconstruct_mesh'), [files['mesh'], companion_ply(files['mesh'])],
+                                  [stage(name) for name in mesh_readers])
+            if settings['refine']:
+                storage_manager.track(stage('refine_mesh'), [files['refined'], companion_ply(files['refined'])],
+                                      [stage('texture_mesh')])
+            textured_base = os.path.splitext(files['textured_obj'])[0]
+            storage_manager.track(stage('texture_mesh'), [files['textured_obj'], textured_base + '.mtl', textured_base + '*_map_Kd.*'],
+                                  [stage('glb')])
 
+            def undistort():
+                run_colmap_undistort(model_workspace, model_images_dir, undistorted_dir,
+                                     max_image_size=settings['max_image_size'], trace=trace)
+                if args.crop_to_object:
+                    # Drop the background's sparse points so OpenMVS densifies and meshes only the object
+                    started = time.monotonic()
+                    roi.crop_model_to_roi(os.path.join(undistorted_dir, 'sparse'), os.path.join(undistorted_dir, 'roi.json'))
+                    trace.record_steps([{'step': 'crop_to_object', 'wall_seconds': round(time.monotonic() - started, 3)}])
+            run_stage(stage('undistort'), undistort,
+                      inputs=[os.path.join(script_dir, name) for name in ('roi.py', 'colmap_model.py')] if args.crop_to_object else [],
+                      params={'max_image_size': settings['max_image_size'], 'crop_to_object': args.crop_to_object},
+                      deps=[model_stage, model_images_stage], outputs=[undistorted_dir])
+
+            # Execute Part 3: 3D Mesh Reconstruction with OpenMVS
+            print(f"\n--- Part 3: 3D Mesh Reconstruction (OpenMVS, {profile} profile) ---")
+            run_stage(stage('interface'), lambda: run_interface_colmap(openmvs_bin_path, undistorted_dir, mvs_dir, trace=trace),
+                      deps=[stage('undistort')], outputs=[files['scene']])
+            def densify():
+                # Depth maps a previous run left (see --keep-depth-maps) are loaded instead of estimated
+                # again, so drop those of views that are new or moved; only their depth is estimated
+                started = time.monotonic()
+                reuse = depth_maps.prune_depth_maps(mvs_dir, os.path.join(undistorted_dir, 'sparse'),
+                                                    resolution_level=settings['densify_resolution_level'])
+                trace.record_steps([dict(reuse, step='prune_depth_maps', wall_seconds=round(time.monotonic() - started, 3))])
+                run_densify_point_cloud(openmvs_bin_path, mvs_dir, resolution_level=settings['densify_resolution_level'], trace=trace)
+            run_stage(stage('densify'), densify,
+                      params={'resolution_level': settings['densify_resolution_level']},
+                      deps=[stage('undistort'), stage('interface')], outputs=[files['dense']])
+            meshed_from = stage('densify')
+            if args.filter_points:
+                # Part 3a: drop the floor and floating noise before meshing; the scene's up
+                # direction (from the cameras) tells the floor from the object's sides
+                up = lambda: colmap_model.read_model(os.path.join(undistorted_dir, 'sparse'),
+                                                     include_points=False).up_direction().tolist()
+                run_stage(stage('filter_points'), lambda: run_filter_points(mvs_dir, up=up(), trace=trace),
+                          inputs=[os.path.join(script_dir, name) for name in ('pointcloud.py', 'mesh_cleanup.py')],
+                          deps=[stage('undistort'), stage('densify')], outputs=[files['filtered_ply'], files['filter_report']])
+                meshed_from = stage('filter_points')
+            run_stage(stage('reconstruct_mesh'), lambda: run_reconstruct_mesh(openmvs_bin_path, mvs_dir,
+                                                                              decimate=settings['mesh_decimate'],
+                                                                              pointcloud_file=files['filtered_ply'] if args.filter_points else None,
+                                                                              trace=trace),
+                      params={'decimate': settings['mesh_decimate'], 'filter_points': args.filter_points},
+                      deps=[meshed_from], outputs=[files['mesh']])
+            textured_from = stage('reconstruct_mesh')
+            if settings['refine']:
+                run_stage(stage('refine_mesh'), lambda: run_refine_mesh(openmvs_bin_path, mvs_dir, trace=trace),
+                          deps=[stage('undistort'), stage('reconstruct_mesh')], outputs=[files['refined']])
+                textured_from = stage('refine_mesh')
+            run_stage(stage('texture_mesh'), lambda: run_texture_mesh(openmvs_bin_path, mvs_dir, refined=settings['refine'],
+                                                                      resolution_level=settings['texture_resolution_level'], trace=trace),
+                      params={'refined': settings['refine'], 'resolution_level': settings['texture_resolution_level']},
+                      deps=[stage('undistort'), textured_from],
+                      outputs=[files['textured_obj'],
+                               os.path.splitext(files['textured_obj'])[0] + '.mtl',
+                               os.path.splitext(files['textured_obj'])[0] + '*_map_Kd.*'])
+
+            # Execute Part 4: OBJ to GLB Conversion
+            level_count = len(lod_ratios) if lod_ratios and args.lod_format == 'separate' else 1
+            glb_outputs = glb_writer.lod_glb_paths(glb_file, level_count)
+            run_stage(stage('glb'), lambda: convert_obj_to_glb(files['textured_obj'], glb_file,
+                                                               cleanup_engine=args.cleanup_engine, writer=args.glb_writer,
+                                                               lod_ratios=lod_ratios, lod_format=args.lod_format,
+                                                               quantize=args.quantize_mesh, blender=blender, trace=trace),
+                      inputs=[os.path.join(script_dir, name) for name in ('obj_to_glb_cleanup.py', 'mesh_cleanup.py', 'obj_io.py', 'glb_writer.py', 'decimate.py', 'meshopt.py')],
+                      params={'cleanup_engine': args.cleanup_engine, 'glb_writer': args.glb_writer,
+                              'lod_ratios': lod_ratios, 'lod_format': args.lod_format,
+                              'quantize_mesh': args.quantize_mesh},
+                      deps=[stage('texture_mesh')], outputs=glb_outputs)
+            return glb_outputs
+
+        if args.two_phase:
+            # Preview phase: a fast, low-resolution model from the same SfM result, published at
+            # preview_glb_file (atomically, so a watcher never sees a partial file) before the full run
+            preview_glb_file = os.path.join(final_glb_output_dir, PREVIEW_GLB_NAME)
+            preview_dir = os.path.join(final_glb_output_dir, 'preview')
+            built_preview = reconstruct('preview', PREVIEW_STAGE_PREFIX, os.path.join(scratch_dir or workspace, 'undistorted_output_preview'),
+                                        preview_dir, os.path.join(preview_dir, 'scene_textured_mesh.glb'))[0]
+            shutil.copyfile(built_preview, preview_glb_file + '.tmp')
+            os.replace(preview_glb_file + '.tmp', preview_glb_file)
+            print(f"Preview GLB ready: {preview_glb_file}")
+
+        # When the textures are re-encoded afterwards, the export goes to an intermediate file
+        # so each stage keeps its own outputs
+        reencode_textures = args.texture_format != 'keep'
+        exported_glb_file = os.path.join(final_glb_output_dir, 'scene_textured_mesh_exported.glb') if reencode_textures else final_glb_file
+        glb_outputs = reconstruct(args.profile, '', colmap_undistorted_dir, final_glb_output_dir, exported_glb_file,
+                                  lod_ratios=args.lod_ratios)
+        if reencode_textures:
+            storage_manager.track('glb', glb_outputs, ['textures'])
+
+        # Execute Part 5: Texture Optimization
+        if reencode_textures:
+            glb_files = list(zip(glb_outputs, glb_writer.lod_glb_paths(final_glb_file, len(glb_outputs))))
+            run_stage('textures', lambda: optimize_glb_textures(glb_files, os.path.join(final_glb_output_dir, 'texture_report.json'),
+                                                                args.texture_format, args.texture_quality, args.texture_max_sizes,
+                                                                strip_unused=not args.keep_unused_texels,
+                                                                workers=args.texture_workers, trace=trace),
+                      inputs=[os.path.join(script_dir, name) for name in ('textures.py', 'glb_writer.py')],
+                      params={'format': args.texture_format, 'quality': args.texture_quality,
+                              'max_sizes': args.texture_max_sizes, 'strip_unused': not args.keep_unused_texels},
+                      deps=['glb'], outputs=[final for _, final in glb_files])
+
+        if cache is not None:
+            result_files = [final for _, final in glb_files] if reencode_textures else glb_outputs
+            cache.store(result_key, final_glb_output_dir, result_files + ([preview_glb_file] if args.two_phase else []),
+                        'result', duration_seconds=time.monotonic() - job_started)
+
+        if scratch_dir and os.path.isdir(scratch_dir) and not os.listdir(scratch_dir):
+            os.rmdir(scratch_dir)
         print("\nPhotogrammetry pipeline completed successfully.")
+        save_trace(trace, workspace, args.trace_dir, 'succeeded')
+        return final_glb_file
 
     except Exception as e:
         print(f"\n!!! An error occurred during the photogrammetry pipeline: {e}", file=sys.stderr)
+        save_trace(trace, workspace, args.trace_dir, 'failed', error=str(e))
+        raise
+
+def main():
+    """
+    Main function to parse arguments and orchestrate the photogrammetry pipeline.
+    """
+    # The synchronous runner (not pipeline_api's event loop): its commands are reaped here,
+    # so the trace gets their CPU time, peak RSS and I/O, not only their wall time
+    args = parse_args()
+    try:
+        run_pipeline(args)
+    except (Exception, KeyboardInterrupt):
         sys.exit(1) # Exit with a non-zero status code to indicate failure
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,425 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import obj_io
+
+# Same defaults as the Blender cleanup in obj_to_glb_cleanup.py
+MERGE_DISTANCE = 0.0001
+MAX_HOLE_SIDES = 32
+
+# Half of the 26 neighbouring grid cells plus the cell itself: every pair of
+# neighbouring cells is visited exactly once.
+_NEIGHBOUR_OFFSETS = np.array(
+    [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) >= (0, 0, 0)],
+    dtype=np.int64
+)
+
+def _ragged_arange(starts, counts):
+    """
+    Concatenation of arange(start, start + count) for each pair, without a Python loop.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(np.asarray(starts, dtype=np.int64), counts) + np.arange(total) - offsets
+
+def connected_labels(count, a, b):
+    """
+    Labels the connected components of a graph given as edge arrays a-b (vectorized union-find).
+    Every node's label is the smallest node index in its component.
+
+    Args:
+        count (int): Number of nodes.
+        a (numpy.ndarray): First node of each edge.
+        b (numpy.ndarray): Second node of each edge.
+
+    Returns:
+        numpy.ndarray: (count,) int64 component label per node.
+    """
+    labels = np.arange(count, dtype=np.int64)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while True:
+        ra, rb = labels[a], labels[b]
+        differ = ra != rb
+        if not differ.any():
+            return labels
+        # Hook the larger root of every edge onto the smaller one, then compress paths fully
+        np.minimum.at(labels, np.maximum(ra[differ], rb[differ]), np.minimum(ra[differ], rb[differ]))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        a, b = a[differ], b[differ]
+
+def _grid_keys(positions, cell_size):
+    """
+    Returns (keys, strides): an int64 key per point for the grid cell it falls in, and the
+    key stride of each axis, so the key of a neighbouring cell is key + offset @ strides.
+    The cell size is doubled until every key (with a one-cell margin) fits in an int64.
+    """
+    while True:
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        cells -= cells.min(axis=0) - 1
+        extent = cells.max(axis=0) + 2
+        if float(extent[0]) * float(extent[1]) * float(extent[2]) < 2.0 ** 62:
+            strides = np.array([extent[1] * extent[2], extent[2], 1], dtype=np.int64)
+            return cells @ strides, strides
+        cell_size *= 2
+
+def merge_by_distance(mesh, distance=MERGE_DISTANCE):
+    """
+    Merges vertices closer than distance to each other (like Blender's remove_doubles),
+    then drops the faces that collapsed. UV indices are untouched, so seams are kept.
+
+    Vertices are hashed into a grid with cells of the merge distance: two vertices can
+    only be within the distance if their cells are the same or adjacent, so candidate
+    pairs are only formed between vertices of neighbouring cells.
+    """
+    print(f"Merging vertices by distance ({distance})...")
+    positions = mesh.positions
+    if len(positions) == 0:
+        return
+    keys, strides = _grid_keys(positions, distance)
+    order = np.argsort(keys, kind='stable')
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    # Cell of every vertex, in the sorted vertex order
+    vertex_cell = np.repeat(np.arange(len(cell_keys)), counts)
+
+    pair_a, pair_b = [], []
+    for offset in _NEIGHBOUR_OFFSETS:
+        # The queries stay sorted, so the lookups are a cheap merge-like search
+        neighbour_keys = cell_keys + offset @ strides
+        slot = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+        found = cell_keys[slot] == neighbour_keys
+        has_neighbour = found[vertex_cell]
+        sources = order[has_neighbour]
+        slot = slot[vertex_cell[has_neighbour]]
+        a = np.repeat(sources, counts[slot])
+        b = order[_ragged_arange(starts[slot], counts[slot])]
+        if not offset.any():
+            # Within a cell, take each pair once
+            keep = a < b
+            a, b = a[keep], b[keep]
+        delta = positions[a] - positions[b]
+        close = np.einsum('ij,ij->i', delta, delta) <= distance * distance
+        pair_a.append(a[close])
+        pair_b.append(b[close])
+
+    labels = connected_labels(len(positions), np.concatenate(pair_a), np.concatenate(pair_b))
+    representatives, remap = np.unique(labels, return_inverse=True)
+    merged = len(positions) - len(representatives)
+    mesh.positions = positions[representatives]
+    mesh.faces = remap[mesh.faces]
+
+    # Drop faces that collapsed to an edge or a point, and faces duplicated by the merge
+    faces = mesh.faces
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    mesh.select_faces(valid)
+    corners = np.sort(mesh.faces, axis=1)
+    order = np.lexsort(corners.T[::-1])
+    duplicate = np.zeros(len(corners), dtype=bool)
+    duplicate[order[1:]] = (corners[order][1:] == corners[order][:-1]).all(axis=1)
+    mesh.select_faces(~duplicate)
+    mesh.remove_unused()
+    print(f"Merged {merged} vertices.")
+
+def _face_adjacency(faces):
+    """
+    Returns (face_a, face_b, same_direction) for every pair of faces sharing an edge.
+    same_direction is True where both faces traverse the shared edge the same way,
+    i.e. where their orientations disagree. Non-manifold edges link their faces in a chain.
+    """
+    corners = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    edge_faces = np.repeat(np.arange(len(faces), dtype=np.int64), 3)
+    forward = corners[:, 0] < corners[:, 1]
+    lo = np.minimum(corners[:, 0], corners[:, 1])
+    hi = np.maximum(corners[:, 0], corners[:, 1])
+    keys = lo * (int(faces.max()) + 1) + hi
+    order = np.argsort(keys, kind='stable')
+    shared = np.flatnonzero(keys[order][1:] == keys[order][:-1])
+    first, second = order[shared], order[shared + 1]
+    return edge_faces[first], edge_faces[second], forward[first] == forward[second]
+
+def recalculate_normals(mesh):
+    """
+    Makes face winding consistent and outward-facing (like Blender's normals_make_consistent).
+
+    Each connected patch is walked breadth-first over the face graph from one seed face,
+    flipping neighbours whose winding disagrees across the shared edge. Each patch is
+    then flipped as a whole if its signed volume is negative, i.e. if it faces inward.
+    """
+    print("Recalculating normals...")
+    face_count = mesh.face_count
+    if face_count == 0:
+        return
+    face_a, face_b, disagree = _face_adjacency(mesh.faces)
+
+    # CSR adjacency in both directions
+    src = np.concatenate([face_a, face_b])
+    dst = np.concatenate([face_b, face_a])
+    rel = np.concatenate([disagree, disagree]).astype(np.int8)
+    order = np.argsort(src, kind='stable')
+    dst, rel = dst[order], rel[order]
+    counts = np.bincount(src, minlength=face_count)
+    starts = np.cumsum(counts) - counts
+
+    # Breadth-first walk of all patches at once, one level per iteration
+    patches = connected_labels(face_count, face_a, face_b)
+    flip = np.full(face_count, -1, dtype=np.int8)
+    frontier = np.unique(patches)
+    flip[frontier] = 0
+    while len(frontier):
+        edge_index = _ragged_arange(starts[frontier], counts[frontier])
+        parents = np.repeat(frontier, counts[frontier])
+        neighbours = dst[edge_index]
+        unvisited = flip[neighbours] == -1
+        neighbours = neighbours[unvisited]
+        neighbour_flip = flip[parents[unvisited]] ^ rel[edge_index[unvisited]]
+        frontier, first = np.unique(neighbours, return_index=True)
+        flip[frontier] = neighbour_flip[first]
+    flipped = flip == 1
+
+    # Outward orientation: signed volume of each patch about its own centroid
+    faces = mesh.faces.copy()
+    faces[flipped] = faces[flipped][:, [0, 2, 1]]
+    patch_ids, patch_of_face = np.unique(patches, return_inverse=True)
+    face_centres = mesh.positions[faces].mean(axis=1)
+    weights = np.bincount(patch_of_face, minlength=len(patch_ids))
+    centroid = np.stack([np.bincount(patch_of_face, face_centres[:, k], len(patch_ids)) for k in range(3)], axis=1)
+    centroid /= weights[:, None]
+    p = mesh.positions[faces] - centroid[patch_of_face][:, None, :]
+    volume = np.bincount(patch_of_face, np.einsum('ij,ij->i', p[:, 0], np.cross(p[:, 1], p[:, 2])), len(patch_ids))
+    flipped ^= volume[patch_of_face] < 0
+
+    mesh.faces[flipped] = mesh.faces[flipped][:, [0, 2, 1]]
+    if mesh.face_uvs is not None:
+        mesh.face_uvs[flipped] = mesh.face_uvs[flipped][:, [0, 2, 1]]
+    print(f"Flipped {int(flipped.sum())} of {face_count} faces in {len(patch_ids)} patches.")
+
+def isolate_largest_component(mesh):
+    """
+    Keeps only the connected component with the most vertices (like separating by loose
+    parts in Blender and keeping the largest). Connectivity is through shared vertices.
+    """
+    print("Isolating largest mesh component...")
+    faces = mesh.faces
+    labels = connected_labels(mesh.vertex_count,
+                              np.concatenate([faces[:, 0], faces[:, 1]]),
+                              np.concatenate([faces[:, 1], faces[:, 2]]))
+    used = np.zeros(mesh.vertex_count, dtype=bool)
+    used[faces.ravel()] = True
+    sizes = np.bincount(labels[used], minlength=mesh.vertex_count)
+    component_count = int(np.count_nonzero(sizes))
+    if component_count <= 1:
+        print("No separate mesh components found.")
+        return
+    largest = int(np.argmax(sizes))
+    mesh.select_faces(labels[faces[:, 0]] == largest)
+    mesh.remove_unused()
+    print(f"Kept the largest of {component_count} components ({sizes[largest]} vertices).")
+
+def _triangulate_polygon(points):
+    """
+    Ear-clips a simple polygon given as (n, 3) points, returning (n - 2, 3) indices into points
+    with the polygon's winding. Falls back to a fan if the polygon is too irregular to clip.
+    """
+    n = len(points)
+    # Newell normal, then project onto the polygon's best-fit plane
+    normal = np.zeros(3)
+    for i in range(n):
+        current, following = points[i], points[(i + 1) % n]
+        normal += np.cross(current, following)
+    if not normal.any():
+        return np.array([(0, i, i + 1) for i in range(1, n - 1)])
+    normal /= np.linalg.norm(normal)
+    axis_u = np.cross(normal, [1.0, 0.0, 0.0] if abs(normal[0]) < 0.9 else [0.0, 1.0, 0.0])
+    axis_u /= np.linalg.norm(axis_u)
+    axis_v = np.cross(normal, axis_u)
+    flat = np.stack([points @ axis_u, points @ axis_v], axis=1)
+
+    def cross2(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    remaining = list(range(n))
+    triangles = []
+    while len(remaining) > 3:
+        for k in range(len(remaining)):
+            i, j, l = remaining[k - 1], remaining[k], remaining[(k + 1) % len(remaining)]
+            if cross2(flat[i], flat[j], flat[l]) <= 0:
+                continue  # Reflex corner
+            if any(cross2(flat[i], flat[j], flat[m]) >= 0 and cross2(flat[j], flat[l], flat[m]) >= 0
+                   and cross2(flat[l], flat[i], flat[m]) >= 0
+                   for m in remaining if m not in (i, j, l)):
+                continue  # Another vertex lies inside the ear
+            triangles.append((i, j, l))
+            remaining.pop(k)
+            break
+        else:
+            return np.array([(0, i, i + 1) for i in range(1, n - 1)])
+    triangles.append(tuple(remaining))
+    return np.array(triangles)
+
+def fill_holes(mesh, max_sides=MAX_HOLE_SIDES):
+    """
+    Fills boundary loops with at most max_sides edges (like Blender's fill_holes).
+    New faces take their UVs and material from the faces around the hole.
+    """
+    print(f"Attempting to fill holes (max_sides={max_sides})...")
+    faces = mesh.faces
+    corners = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    corner_faces = np.repeat(np.arange(len(faces), dtype=np.int64), 3)
+    corner_slot = np.tile([0, 1, 2], len(faces))
+    lo = np.minimum(corners[:, 0], corners[:, 1])
+    hi = np.maximum(corners[:, 0], corners[:, 1])
+    keys = lo * mesh.vertex_count + hi
+    _, inverse, uses = np.unique(keys, return_inverse=True, return_counts=True)
+    boundary = np.flatnonzero(uses[inverse] == 1)
+    if len(boundary) == 0:
+        print("No boundary edges (potential holes) found.")
+        return
+    print(f"Found {len(boundary)} boundary edges.")
+
+    # Walk boundary loops; vertices with several outgoing boundary edges are ambiguous and end the walk
+    starts_at = {}
+    ambiguous = set()
+    for edge in boundary:
+        u = int(corners[edge, 0])
+        if u in starts_at:
+            ambiguous.add(u)
+        starts_at[u] = edge
+    visited = set()
+    new_faces, new_uvs, new_materials = [], [], []
+    filled = 0
+    for edge in boundary:
+        if edge in visited:
+            continue
+        loop = []
+        current = edge
+        closed = False
+        while current not in visited:
+            visited.add(current)
+            loop.append(current)
+            v = int(corners[current, 1])
+            if v in ambiguous or v not in starts_at:
+                break
+            current = starts_at[v]
+            if current == edge:
+                closed = True
+                break
+        if not closed or len(loop) < 3 or len(loop) > max_sides:
+            continue
+
+        # The hole is bounded by the reverse of the surrounding faces' edges
+        loop = loop[::-1]
+        loop_vertices = corners[loop, 1]
+        loop_faces = corner_faces[loop]
+        for a, b, c in _triangulate_polygon(mesh.positions[loop_vertices]):
+            new_faces.append(loop_vertices[[a, b, c]])
+            if mesh.face_uvs is not None:
+                # Each vertex takes the UV of its corner in the neighbouring face
+                slots = (corner_slot[loop] + 1) % 3
+                new_uvs.append(mesh.face_uvs[loop_faces[[a, b, c]], slots[[a, b, c]]])
+            new_materials.append(mesh.face_materials[loop_faces[0]])
+        filled += 1
+
+    if new_faces:
+        mesh.faces = np.concatenate([mesh.faces, np.array(new_faces, dtype=np.int64)])
+        if mesh.face_uvs is not None:
+            mesh.face_uvs = np.concatenate([mesh.face_uvs, np.array(new_uvs, dtype=np.int64)])
+        mesh.face_materials = np.concatenate([mesh.face_materials, np.array(new_materials, dtype=np.int64)])
+    print(f"Filled {filled} holes with {len(new_faces)} faces.")
+
+def run_step(steps, name, fn, mesh):
+    """
+    Runs one cleanup step and records its duration and the mesh size before and after,
+    in the same form as the Blender cleanup script's trace.
+    """
+    step = {'step': name, 'vertices_before': mesh.vertex_count, 'faces_before': mesh.face_count}
+    started = time.monotonic()
+    fn()
+    step['wall_seconds'] = round(time.monotonic() - started, 3)
+    step['vertices_after'] = mesh.vertex_count
+    step['faces_after'] = mesh.face_count
+    steps.append(step)
+    print(f"Step '{name}' took {step['wall_seconds']:.2f}s "
+          f"(vertices {step['vertices_before']} -> {step['vertices_after']}, faces {step['faces_before']} -> {step['faces_after']})")
+
+def cleanup_mesh(mesh, merge_distance=MERGE_DISTANCE, max_hole_sides=MAX_HOLE_SIDES, steps=None):
+    """
+    Runs the same cleanup as the Blender path, in the same order, on a Mesh (in place):
+    merge by distance, recalculate normals, isolate the largest component, fill holes.
+    The steps work in float64/int64; the mesh is returned to compact dtypes afterwards.
+
+    Args:
+        mesh (obj_io.Mesh): The mesh to clean.
+        merge_distance (float, optional): Vertex merge distance. Defaults to MERGE_DISTANCE.
+        max_hole_sides (int, optional): Largest hole (in edges) to fill. Defaults to MAX_HOLE_SIDES.
+        steps (list, optional): If given, per-step timings are appended to it.
+
+    Returns:
+        list: The per-step timings.
+    """
+    steps = [] if steps is None else steps
+    print("\n--- Starting Automated Mesh Cleanup (NumPy) ---")
+    mesh.widen()
+    run_step(steps, 'merge_by_distance', lambda: merge_by_distance(mesh, merge_distance), mesh)
+    run_step(steps, 'recalculate_normals', lambda: recalculate_normals(mesh), mesh)
+    run_step(steps, 'isolate_largest_mesh', lambda: isolate_largest_component(mesh), mesh)
+    run_step(steps, 'fill_holes', lambda: fill_holes(mesh, max_hole_sides), mesh)
+    mesh.compact()
+    print("--- Mesh Cleanup Complete ---")
+    return steps
+
+def cleanup_obj(input_obj, output_obj, merge_distance=MERGE_DISTANCE, max_hole_sides=MAX_HOLE_SIDES):
+    """
+    Reads an OBJ, cleans it and writes the result next to the same material library.
+
+    Args:
+        input_obj (str): Path to the OBJ file to clean.
+        output_obj (str): Path for the cleaned OBJ file.
+        merge_distance (float, optional): Vertex merge distance. Defaults to MERGE_DISTANCE.
+        max_hole_sides (int, optional): Largest hole (in edges) to fill. Defaults to MAX_HOLE_SIDES.
+
+    Returns:
+        list: Per-step timings (read, cleanup steps, write) for the job trace.
+    """
+    steps = []
+    started = time.monotonic()
+    mesh = obj_io.read_obj(input_obj)
+    steps.append({'step': 'import', 'wall_seconds': round(time.monotonic() - started, 3),
+                  'vertices_after': mesh.vertex_count, 'faces_after': mesh.face_count})
+    cleanup_mesh(mesh, merge_distance=merge_distance, max_hole_sides=max_hole_sides, steps=steps)
+    run_step(steps, 'write_obj', lambda: obj_io.write_obj(mesh, output_obj), mesh)
+    return steps
+
+def main():
+    """
+    Command-line entry point: python mesh_cleanup.py input.obj output.obj [--trace path]
+    """
+    parser = argparse.ArgumentParser(description="Clean an OBJ mesh without Blender (merge, normals, largest component, holes).")
+    parser.add_argument('input_obj', help='OBJ file to clean.')
+    parser.add_argument('output_obj', help='Path for the cleaned OBJ file.')
+    parser.add_argument('--merge-distance', type=float, default=MERGE_DISTANCE, help=f'Vertex merge distance (default: {MERGE_DISTANCE}).')
+    parser.add_argument('--max-hole-sides', type=int, default=MAX_HOLE_SIDES, help=f'Largest hole to fill, in edges (default: {MAX_HOLE_SIDES}).')
+    parser.add_argument('--trace', help='Write per-step timings as JSON to this path.')
+    args = parser.parse_args()
+
+    try:
+        steps = cleanup_obj(args.input_obj, args.output_obj, args.merge_distance, args.max_hole_sides)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump({'steps': steps}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import collections
+
+import numpy as np
+
+# FIFO post-transform cache size assumed for ACMR estimates (mobile GPUs keep a few dozen vertices)
+VERTEX_CACHE_SIZE = 32
+# ACMR is simulated on this many triangles, taken as a few windows spread over the index buffer
+ACMR_SAMPLE_TRIANGLES = 100000
+ACMR_SAMPLE_WINDOWS = 4
+# Bits per axis of the Morton codes used to order triangles
+MORTON_BITS = 21
+
+def _spread_bits(values):
+    """
+    Spreads the low 21 bits of each value so there are two zero bits between consecutive bits.
+    """
+    x = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF), (8, 0x100F00F00F00F00F),
+                        (4, 0x10C30C30C30C30C3), (2, 0x1249249249249249)):
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+def morton_codes(points):
+    """
+    Morton (Z-order) codes of 3D points, quantized to MORTON_BITS per axis over their bounding box.
+    """
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    cells = ((points - lo) / extent * ((1 << MORTON_BITS) - 1)).astype(np.uint64)
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1)) | (_spread_bits(cells[:, 2]) << np.uint64(2))
+
+def optimize_triangle_order(triangles, positions):
+    """
+    Orders triangles along a Morton curve through their centroids, so triangles that share
+    vertices are drawn close together and hit the post-transform vertex cache.
+
+    Args:
+        triangles (numpy.ndarray): (F, 3) vertex indices.
+        positions (numpy.ndarray): (V, 3) vertex positions.
+
+    Returns:
+        numpy.ndarray: The new order, as indices into triangles.
+    """
+    centroids = positions[triangles[:, 0]].astype(np.float64)
+    centroids += positions[triangles[:, 1]]
+    centroids += positions[triangles[:, 2]]
+    return np.argsort(morton_codes(centroids), kind='stable')
+
+def optimize_vertex_fetch(triangles):
+    """
+    Renumbers vertices in the order the triangles first use them, so vertex fetches walk
+    through the vertex buffers sequentially.
+
+    Returns:
+        tuple: (renumbered triangles, original index of each new vertex)
+    """
+    used, first_use = np.unique(triangles.ravel(), return_index=True)
+    used = used[np.argsort(first_use)]
+    remap = np.empty(int(used.max()) + 1 if len(used) else 0, dtype=triangles.dtype)
+    remap[used] = np.arange(len(used), dtype=triangles.dtype)
+    return remap[triangles], used
+
+def estimate_acmr(triangles, cache_size=VERTEX_CACHE_SIZE, sample=ACMR_SAMPLE_TRIANGLES):
+    """
+    Estimates the average cache miss ratio (vertex shader runs per triangle; 3 with no reuse,
+    around 0.5-0.7 for well-ordered meshes) by simulating a FIFO vertex cache.
+
+    Args:
+        triangles (numpy.ndarray): (F, 3) vertex indices in draw order.
+        cache_size (int, optional): Cache entries. Defaults to VERTEX_CACHE_SIZE.
+        sample (int, optional): Number of triangles simulated. Defaults to ACMR_SAMPLE_TRIANGLES.
+
+    Returns:
+        float: The estimated ACMR.
+    """
+    if len(triangles) == 0:
+        return 0.0
+    window = max(1, min(len(triangles), sample) // ACMR_SAMPLE_WINDOWS)
+    starts = np.unique(np.linspace(0, len(triangles) - window, ACMR_SAMPLE_WINDOWS).astype(np.int64))
+    misses = 0
+    simulated = 0
+    for start in starts:
+        cache = collections.deque()
+        cached = set()
+        for vertex in triangles[start:start + window].ravel().tolist():
+            if vertex in cached:
+                continue
+            misses += 1
+            cache.append(vertex)
+            cached.add(vertex)
+            if len(cache) > cache_size:
+                cached.discard(cache.popleft())
+        simulated += len(triangles[start:start + window])
+    return misses / simulated
+
+def quantize_positions(positions):
+    """
+    Quantizes positions to uint16 over their bounding box with one scale for all axes (so the
+    dequantizing node transform stays uniform and normals need no correction).
+
+    Args:
+        positions (numpy.ndarray): (V, 3) float positions.
+
+    Returns:
+        dict: {'values': (V, 3) uint16 array, 'transform': glTF node 'translation' and 'scale'}
+    """
+    lo = positions.min(axis=0).astype(np.float64)
+    step = max(float((positions.max(axis=0) - lo).max()), 1e-12) / 65535.0
+    values = np.rint((positions - lo) / step)
+    np.clip(values, 0, 65535, out=values)
+    return {
+        'values': values.astype(np.uint16),
+        'transform': {'translation': lo.tolist(), 'scale': [step, step, step]},
+    }
+
+def quantize_normals(normals):
+    """
+    Quantizes unit normals to normalized int8.
+    """
+    return np.clip(np.rint(normals * 127.0), -127, 127).astype(np.int8)
+
+def quantize_uvs(uvs):
+    """
+    Quantizes texture coordinates to normalized uint16, or returns None when some fall outside
+    [0, 1] (tiled textures would need a texture transform, so they stay float).
+    """
+    if len(uvs) and (uvs.min() < 0.0 or uvs.max() > 1.0):
+        return None
+    return np.rint(uvs * 65535.0).astype(np.uint16)
@@ -0,0 +1,396 @@
+import os
+import re
+import warnings
+
+import numpy as np
+
+# Size of the text chunks the OBJ reader parses at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Rows written per formatting call by write_obj
+WRITE_BLOCK_ROWS = 100000
+
+class Mesh:
+    """
+    Triangle mesh held in NumPy arrays, in the layout OpenMVS writes OBJ files:
+    positions and UVs are indexed separately by each face corner.
+
+    read_obj returns compact arrays (float32 positions and UVs, uint32 indices);
+    widen() converts them to float64/int64 for processing and compact() back.
+
+    Attributes:
+        positions (numpy.ndarray): (V, 3) vertex positions.
+        uvs (numpy.ndarray): (T, 2) texture coordinates (may be empty).
+        faces (numpy.ndarray): (F, 3) position index per face corner.
+        face_uvs (numpy.ndarray): (F, 3) UV index per face corner, or None if the mesh has no UVs.
+        face_materials (numpy.ndarray): (F,) index into material_names per face.
+        material_names (list): Material names from the OBJ's usemtl lines.
+        mtllib (str): Name of the material library the OBJ references, or None.
+    """
+
+    def __init__(self, positions, faces, uvs=None, face_uvs=None, face_materials=None, material_names=None, mtllib=None):
+        self.positions = np.asarray(positions).reshape(-1, 3)
+        self.faces = np.asarray(faces).reshape(-1, 3)
+        self.uvs = np.zeros((0, 2), dtype=self.positions.dtype) if uvs is None else np.asarray(uvs).reshape(-1, 2)
+        self.face_uvs = None if face_uvs is None else np.asarray(face_uvs).reshape(-1, 3)
+        if face_materials is None:
+            face_materials = np.zeros(len(self.faces), dtype=np.int32)
+        self.face_materials = np.asarray(face_materials)
+        self.material_names = list(material_names or [])
+        self.mtllib = mtllib
+
+    @property
+    def vertex_count(self):
+        return len(self.positions)
+
+    @property
+    def face_count(self):
+        return len(self.faces)
+
+    def copy(self):
+        """
+        Returns an independent copy of the mesh.
+        """
+        return Mesh(self.positions.copy(), self.faces.copy(), uvs=self.uvs.copy(),
+                    face_uvs=None if self.face_uvs is None else self.face_uvs.copy(),
+                    face_materials=self.face_materials.copy(), material_names=self.material_names, mtllib=self.mtllib)
+
+    def widen(self):
+        """
+        Converts the arrays to float64 and int64 for processing (in place).
+        """
+        self.positions = self.positions.astype(np.float64, copy=False)
+        self.uvs = self.uvs.astype(np.float64, copy=False)
+        self.faces = self.faces.astype(np.int64, copy=False)
+        if self.face_uvs is not None:
+            self.face_uvs = self.face_uvs.astype(np.int64, copy=False)
+        self.face_materials = self.face_materials.astype(np.int64, copy=False)
+
+    def compact(self):
+        """
+        Converts the arrays to float32 and uint32, the component types written to GLB (in place).
+        """
+        self.positions = self.positions.astype(np.float32, copy=False)
+        self.uvs = self.uvs.astype(np.float32, copy=False)
+        self.faces = self.faces.astype(np.uint32, copy=False)
+        if self.face_uvs is not None:
+            self.face_uvs = self.face_uvs.astype(np.uint32, copy=False)
+        self.face_materials = self.face_materials.astype(np.int32, copy=False)
+
+    def select_faces(self, keep):
+        """
+        Keeps only the faces selected by a boolean mask or index array (in place).
+        """
+        self.faces = self.faces[keep]
+        if self.face_uvs is not None:
+            self.face_uvs = self.face_uvs[keep]
+        self.face_materials = self.face_materials[keep]
+
+    def remove_unused(self):
+        """
+        Drops positions and UVs that no face references and re-indexes the faces (in place).
+        """
+        used, self.faces = np.unique(self.faces, return_inverse=True)
+        self.faces = self.faces.reshape(-1, 3)
+        self.positions = self.positions[used]
+        if self.face_uvs is not None:
+            used_uvs, self.face_uvs = np.unique(self.face_uvs, return_inverse=True)
+            self.face_uvs = self.face_uvs.reshape(-1, 3)
+            self.uvs = self.uvs[used_uvs]
+
+class _GrowableArray:
+    """
+    Preallocated 2D array that is filled block by block and grows only if the
+    initial row estimate was too small (e.g. polygons split into several triangles).
+    """
+
+    def __init__(self, rows, columns, dtype):
+        self.data = np.empty((rows, columns), dtype=dtype)
+        self.size = 0
+
+    def extend(self, block):
+        end = self.size + len(block)
+        if end > len(self.data):
+            grown = np.empty((max(end, 2 * len(self.data)), self.data.shape[1]), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = block
+        self.size = end
+
+    def result(self):
+        return self.data[:self.size]
+
+_RECORD_PREFIXES = {'v': b'\nv ', 'vt': b'\nvt ', 'f': b'\nf '}
+
+def _count_records(obj_path):
+    """
+    First pass over an OBJ: counts its 'v', 'vt' and 'f' lines without decoding the text,
+    so the second pass can parse straight into arrays of the final size.
+    """
+    counts = dict.fromkeys(_RECORD_PREFIXES, 0)
+    carry = b'\n'
+    with open(obj_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            block = carry + chunk
+            for kind, prefix in _RECORD_PREFIXES.items():
+                # Matches lying entirely in the carried bytes were counted with the previous chunk
+                counts[kind] += block.count(prefix) - carry.count(prefix)
+            carry = block[-3:]
+    return counts
+
+def _iter_chunks(obj_path):
+    """
+    Yields the OBJ's text in chunks of whole lines.
+    """
+    remainder = ''
+    with open(obj_path, 'r') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            cut = chunk.rfind('\n') + 1
+            if cut == 0:
+                remainder = chunk
+                continue
+            remainder = chunk[cut:]
+            yield chunk[:cut]
+    if remainder.strip():
+        yield remainder + '\n'
+
+# A run of consecutive lines of one record type ends at the first line of another type
+_RUN_ENDS = {
+    'v': re.compile(r'\n(?!v )'),
+    'vt': re.compile(r'\n(?!vt )'),
+    'f': re.compile(r'\n(?!f )'),
+}
+
+def _parse_numbers(text, dtype):
+    with warnings.catch_warnings():
+        # fromstring warns (rather than raising) when it stops at a token it cannot parse;
+        # callers detect that from the number of values returned
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return np.fromstring(text, dtype=dtype, sep=' ')
+
+def _parse_vector_run(run, prefix, columns):
+    """
+    Parses a run of 'v' or 'vt' lines into a (lines, columns) float32 array, dropping
+    extra components (w, vertex colours) beyond the first columns.
+    """
+    lines = run.count('\n') + 1
+    values = _parse_numbers(run.replace(prefix, ' '), np.float32)
+    if len(values) % lines == 0 and len(values) // lines >= columns:
+        return values.reshape(lines, -1)[:, :columns]
+    # Rows of different lengths: parse line by line
+    rows = [line.split()[1:columns + 1] for line in run.split('\n')]
+    return np.array(rows, dtype=np.float32).reshape(-1, columns)
+
+def _absolute_face_line(line, vertex_count, uv_count):
+    """
+    Rewrites the relative (negative) indices of an 'f' line as absolute ones.
+    """
+    tokens = []
+    for token in line.split()[1:]:
+        parts = token.split('/')
+        counts = (vertex_count, uv_count, 0)
+        parts = [str(counts[i] + 1 + int(p)) if p.startswith('-') else p for i, p in enumerate(parts)]
+        tokens.append('/'.join(parts))
+    return 'f ' + ' '.join(tokens)
+
+def _parse_face_run(run, vertex_count, uv_count):
+    """
+    Parses a run of 'f' lines into (positions, uvs) zero-based corner index arrays,
+    triangulating polygons as fans.
+
+    Runs that are all triangles with the same index layout (v, v/vt, v/vt/vn or v//vn)
+    and no relative indices are parsed in one vectorized pass; anything else falls back
+    to a per-line parse.
+
+    Raises:
+        ValueError: If some corners of the run reference texture coordinates and others do not.
+    """
+    lines = run.count('\n') + 1
+    first = run.split(None, 2)[1]
+    if '//' in first:
+        per_corner, has_uv = 2, False
+        uniform = run.count('//') == 3 * lines
+    else:
+        per_corner = first.count('/') + 1
+        has_uv = per_corner >= 2
+        uniform = run.count('/') == 3 * lines * first.count('/')
+    if uniform and '-' not in run:
+        values = _parse_numbers(run.replace('f', ' ').replace('/', ' '), np.uint32)
+        if len(values) == 3 * lines * per_corner:
+            corners = values.reshape(-1, 3, per_corner) - 1
+            return corners[:, :, 0], (corners[:, :, 1] if has_uv else None)
+
+    face_positions = []
+    face_uvs = []
+    for line in run.split('\n'):
+        if '-' in line:
+            line = _absolute_face_line(line, vertex_count, uv_count)
+        corners = []
+        for token in line.split()[1:]:
+            parts = token.split('/')
+            vt = int(parts[1]) - 1 if len(parts) > 1 and parts[1] else None
+            corners.append((int(parts[0]) - 1, vt))
+        for i in range(1, len(corners) - 1):
+            tri = (corners[0], corners[i], corners[i + 1])
+            face_positions.append([c[0] for c in tri])
+            face_uvs.append([c[1] for c in tri])
+    face_positions = np.array(face_positions, dtype=np.uint32).reshape(-1, 3)
+    with_uvs = {c is not None for tri in face_uvs for c in tri}
+    if len(with_uvs) > 1:
+        raise ValueError("OBJ face corners mix references with and without texture coordinates.")
+    if True in with_uvs:
+        return face_positions, np.array(face_uvs, dtype=np.uint32).reshape(-1, 3)
+    return face_positions, None
+
+def read_obj(obj_path):
+    """
+    Reads an OBJ file (positions, UVs, faces and their materials) into a Mesh.
+    Normals are not read; they are recomputed when needed.
+
+    The file is read twice: a byte-level pass counts the records, then the text is parsed
+    chunk by chunk straight into float32 and uint32 arrays of the final size. Runs of
+    same-type lines are parsed by NumPy in one call, so peak memory stays close to the
+    size of the resulting arrays plus one chunk.
+
+    Args:
+        obj_path (str): Path to the OBJ file.
+
+    Returns:
+        Mesh: The mesh, with polygons triangulated, in compact dtypes.
+
+    Raises:
+        FileNotFoundError: If the OBJ file does not exist.
+        ValueError: If the file has no faces, mixes faces with and without UVs, or has out-of-range indices.
+    """
+    if not os.path.exists(obj_path):
+        raise FileNotFoundError(f"OBJ file not found: {obj_path}")
+
+    counts = _count_records(obj_path)
+    positions = _GrowableArray(counts['v'], 3, np.float32)
+    uvs = _GrowableArray(counts['vt'], 2, np.float32)
+    faces = _GrowableArray(counts['f'], 3, np.uint32)
+    face_uvs = _GrowableArray(counts['f'], 3, np.uint32)
+    face_materials = _GrowableArray(counts['f'], 1, np.int32)
+    material_names = []
+    material = 0
+    mtllib = None
+    has_uvs = set()
+
+    for chunk in _iter_chunks(obj_path):
+        position = 0
+        end_of_chunk = len(chunk)
+        while position < end_of_chunk:
+            if chunk.startswith(('v ', 'vt ', 'f '), position):
+                kind = 'vt' if chunk[position + 1] == 't' else chunk[position]
+                match = _RUN_ENDS[kind].search(chunk, position)
+                run_end = match.start() if match else end_of_chunk
+                run = chunk[position:run_end]
+                if kind == 'v':
+                    positions.extend(_parse_vector_run(run, 'v', 3))
+                elif kind == 'vt':
+                    uvs.extend(_parse_vector_run(run, 'vt', 2))
+                else:
+                    run_faces, run_uvs = _parse_face_run(run, positions.size, uvs.size)
+                    faces.extend(run_faces)
+                    if run_uvs is not None:
+                        face_uvs.extend(run_uvs)
+                    has_uvs.add(run_uvs is not None)
+                    face_materials.extend(np.full((len(run_faces), 1), material, dtype=np.int32))
+                position = run_end + 1
+                continue
+
+            line_end = chunk.find('\n', position)
+            line_end = end_of_chunk if line_end == -1 else line_end
+            line = chunk[position:line_end].strip()
+            if line.startswith('usemtl'):
+                name = line.split(None, 1)[1].strip()
+                if name not in material_names:
+                    material_names.append(name)
+                material = material_names.index(name)
+            elif line.startswith('mtllib'):
+                mtllib = line.split(None, 1)[1].strip()
+            position = line_end + 1
+
+    if faces.size == 0:
+        raise ValueError(f"OBJ file contains no faces: {obj_path}")
+    if len(has_uvs) > 1:
+        raise ValueError(f"OBJ file mixes faces with and without texture coordinates: {obj_path}")
+    mesh = Mesh(
+        positions.result(),
+        faces.result(),
+        uvs=uvs.result(),
+        face_uvs=face_uvs.result() if True in has_uvs else None,
+        face_materials=face_materials.result().ravel(),
+        material_names=material_names,
+        mtllib=mtllib,
+    )
+    if int(mesh.faces.max()) >= mesh.vertex_count or (mesh.face_uvs is not None and int(mesh.face_uvs.max()) >= len(mesh.uvs)):
+        raise ValueError(f"OBJ file has face indices out of range: {obj_path}")
+    return mesh
+
+def read_mtl(mtl_path):
+    """
+    Reads the materials of an MTL file.
+
+    Returns:
+        dict: {material name: {'Kd': [r, g, b], 'd': alpha, 'map_Kd': absolute texture path or None}}
+    """
+    materials = {}
+    current = None
+    with open(mtl_path, 'r') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) < 2:
+                continue
+            key, value = parts
+            if key == 'newmtl':
+                current = materials.setdefault(value.strip(), {'Kd': [1.0, 1.0, 1.0], 'd': 1.0, 'map_Kd': None})
+            elif current is None:
+                continue
+            elif key == 'Kd':
+                current['Kd'] = [float(v) for v in value.split()[:3]]
+            elif key == 'd':
+                current['d'] = float(value)
+            elif key == 'map_Kd':
+                # Options such as -s or -o may precede the file name, which is the last token
+                texture = value.split()[-1]
+                current['map_Kd'] = os.path.join(os.path.dirname(os.path.abspath(mtl_path)), texture)
+    return materials
+
+def write_obj(mesh, obj_path):
+    """
+    Writes a Mesh as an OBJ file that references the same material library.
+
+    Args:
+        mesh (Mesh): The mesh to write.
+        obj_path (str): Output path. The material library is expected next to it.
+    """
+    def write_rows(f, row_format, rows):
+        for start in range(0, len(rows), WRITE_BLOCK_ROWS):
+            block = rows[start:start + WRITE_BLOCK_ROWS]
+            f.write((row_format * len(block)) % tuple(block.ravel().tolist()))
+
+    with open(obj_path, 'w') as f:
+        if mesh.mtllib:
+            f.write(f'mtllib {mesh.mtllib}\n')
+        write_rows(f, 'v %.6f %.6f %.6f\n', mesh.positions)
+        if mesh.face_uvs is not None:
+            write_rows(f, 'vt %.6f %.6f\n', mesh.uvs)
+
+        order = np.argsort(mesh.face_materials, kind='stable')
+        faces = mesh.faces[order].astype(np.int64) + 1
+        face_uvs = mesh.face_uvs[order].astype(np.int64) + 1 if mesh.face_uvs is not None else None
+        materials = mesh.face_materials[order]
+        starts = np.flatnonzero(np.r_[True, materials[1:] != materials[:-1]]) if len(materials) else []
+        ends = list(starts[1:]) + [len(materials)]
+        for start, end in zip(starts, ends):
+            if mesh.material_names:
+                f.write(f'usemtl {mesh.material_names[materials[start]]}\n')
+            if face_uvs is not None:
+                write_rows(f, 'f %d/%d %d/%d %d/%d\n', np.stack([faces[start:end], face_uvs[start:end]], axis=2).reshape(-1, 6))
+            else:
+                write_rows(f, 'f %d %d %d\n', faces[start:end])
@@ -0,0 +1,114 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+
+import main as pipeline
+import telemetry
+
+class JobCancelled(RuntimeError):
+    """
+    Raised inside a cancelled job to stop it at its next command; the job trace records
+    the job as failed with this error.
+    """
+
+class _EventLoopRunner:
+    """
+    Command runner (see main.COMMAND_RUNNER) for one job: runs the job's commands as asyncio
+    subprocesses on the event loop that awaits the job, so cancelling the job kills them.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.running = set()
+        self.cancelled = False
+
+    def __call__(self, command, cwd=None, capture_output=False, text=True, timeout=None, on_output=None):
+        with self.lock:
+            if self.cancelled:
+                raise JobCancelled("The job was cancelled.")
+            future = asyncio.run_coroutine_threadsafe(
+                telemetry.run_monitored_async(command, cwd=cwd, capture_output=capture_output, text=text, timeout=timeout,
+                                              on_output=on_output),
+                self.loop)
+            self.running.add(future)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise JobCancelled("The job was cancelled.")
+        finally:
+            with self.lock:
+                self.running.discard(future)
+
+    def cancel(self):
+        """
+        Kills the running commands and makes every later command of the job fail.
+        """
+        with self.lock:
+            self.cancelled = True
+            running = list(self.running)
+        for future in running:
+            future.cancel()
+
+class PhotogrammetryPipeline:
+    """
+    One photogrammetry job, run from asyncio.
+
+    The job's stages run through main.run_pipeline (checkpoints, quality gate, trace) in a
+    thread of their own, while every external command (ffmpeg, COLMAP, OpenMVS, Blender)
+    runs as an asyncio subprocess on the caller's event loop. Jobs share no process-wide
+    state, so one event loop can drive many of them:
+
+        config = main.make_config('ws', 'chair.mp4', 'out', '/opt/openmvs', stage_timeouts={'densify': 3600})
+        glb = await PhotogrammetryPipeline(config).run()
+        results = await asyncio.gather(*(PhotogrammetryPipeline(c).run() for c in configs))
+
+    Cancelling the task awaiting run() kills the job's running command, stops it before the
+    next one and saves its trace; a stage that is only running Python code (e.g. point
+    filtering) finishes its current step first.
+    """
+
+    def __init__(self, config, job_id=None, stage_slot=None, blender=None):
+        """
+        Args:
+            config (argparse.Namespace): The job's configuration (main.make_config or main.parse_args).
+            job_id (str, optional): Identifier used for the job trace. Defaults to the workspace name and a timestamp.
+            stage_slot (callable, optional): See main.run_pipeline.
+            blender (blender_server.BlenderServer, optional): See main.run_pipeline.
+        """
+        self.config = config
+        self.job_id = job_id
+        self.stage_slot = stage_slot
+        self.blender = blender
+
+    async def run(self):
+        """
+        Runs the job to completion.
+
+        Returns:
+            str: Path to the final GLB file.
+
+        Raises:
+            asyncio.CancelledError: If the awaiting task was cancelled (after the job has stopped).
+            Exception: Whatever the failing stage raised (see main.run_pipeline).
+        """
+        loop = asyncio.get_running_loop()
+        runner = _EventLoopRunner(loop)
+        context = contextvars.copy_context()
+        context.run(pipeline.COMMAND_RUNNER.set, runner)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-job')
+        job = loop.run_in_executor(executor, context.run, pipeline.run_pipeline,
+                                   self.config, self.job_id, self.stage_slot, self.blender)
+        try:
+            # Shielded: cancelling the caller must not abandon the thread before the job unwinds
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            runner.cancel()
+            try:
+                await job
+            except Exception:
+                pass
+            raise
+        finally:
+            executor.shutdown(wait=False)
@@ -0,0 +1,387 @@
+import argparse
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+import mesh_cleanup
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+# Points gathered per chunk when reading properties (bounds the temporary index arrays)
+GATHER_CHUNK = 1 << 20
+
+# Ground plane RANSAC: candidate planes drawn, points they are scored on, and the inlier
+# distance as a fraction of the cloud's robust diagonal
+RANSAC_ITERATIONS = 512
+RANSAC_SAMPLE = 200000
+RANSAC_CANDIDATE_CHUNK = 32
+GROUND_DISTANCE_FRACTION = 0.005
+# The floor must hold at least this fraction of the points, and at least this fraction of
+# the points off the plane must be on one side of it (the object stands on the floor; a
+# table top with legs below it is not a floor)
+MIN_GROUND_FRACTION = 0.05
+MIN_ONE_SIDED_FRACTION = 0.9
+# Largest angle (degrees) between the floor normal and the cameras' up direction, when known
+MAX_GROUND_TILT = 30.0
+
+# Statistical outlier removal on a voxel grid: cells are sized to hold about this many
+# points on average, a point's density is the number of points in its 3x3x3 block of
+# cells, and points whose density is std_ratio standard deviations below the mean (or
+# under MIN_NEIGHBOURS) are dropped
+TARGET_CELL_POINTS = 8
+OUTLIER_STD_RATIO = 2.0
+MIN_NEIGHBOURS = 4
+
+# Fewest points a filtered cloud may keep (anything less cannot be meshed into an object)
+MIN_OUTPUT_POINTS = 1000
+
+_BLOCK_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)], dtype=np.int64)
+
+# --- PLY ---
+
+def read_ply(path):
+    """
+    Reads the vertex element of a binary little-endian PLY point cloud (as written by
+    OpenMVS DensifyPointCloud), keeping every record's raw bytes so the cloud can be
+    written back filtered with all of its properties, including per-point view lists.
+
+    Returns:
+        dict: 'header' (text), 'properties' (list of dicts), 'data' (uint8 array of the
+            vertex records), 'starts' and 'lengths' (byte span of each record) and
+            'xyz' ((N, 3) float64 positions).
+
+    Raises:
+        ValueError: If the file is not a binary little-endian PLY with only a vertex element.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    header_end = raw.find(b'end_header\n')
+    if not raw.startswith(b'ply') or header_end < 0:
+        raise ValueError(f"Not a PLY file: {path}")
+    header = raw[:header_end + len(b'end_header\n')].decode('ascii')
+    data = np.frombuffer(raw, dtype=np.uint8, offset=len(header))
+
+    if 'format binary_little_endian' not in header:
+        raise ValueError(f"Only binary little-endian PLY files are supported: {path}")
+    count = None
+    properties = []
+    element = None
+    for line in header.splitlines():
+        words = line.split()
+        if words[:1] == ['element']:
+            element = words[1]
+            if element == 'vertex':
+                count = int(words[2])
+            elif int(words[2]) != 0:
+                raise ValueError(f"PLY element '{element}' is not supported in a point cloud: {path}")
+        elif words[:1] == ['property'] and element == 'vertex':
+            if words[1] == 'list':
+                properties.append({'name': words[4], 'count': np.dtype('<' + PLY_TYPES[words[2]]),
+                                   'item': np.dtype('<' + PLY_TYPES[words[3]])})
+            else:
+                properties.append({'name': words[2], 'type': np.dtype('<' + PLY_TYPES[words[1]])})
+    if count is None:
+        raise ValueError(f"PLY file has no vertex element: {path}")
+
+    starts, lengths = _record_spans(raw, len(header), count, properties)
+    columns = _gather_properties(data, starts, properties, ('x', 'y', 'z'))
+    if len(columns) != 3:
+        raise ValueError(f"PLY vertices have no x, y, z properties: {path}")
+    xyz = np.stack([columns['x'], columns['y'], columns['z']], axis=1).astype(np.float64)
+    return {'header': header, 'properties': properties, 'data': data, 'starts': starts, 'lengths': lengths, 'xyz': xyz}
+
+def _record_spans(raw, base, count, properties):
+    """
+    Returns the byte offset and length of every vertex record. Without list properties all
+    records have the same size; with them each record's size depends on its list counts,
+    so the offsets are found in one sequential pass that reads only the counts.
+    """
+    data_size = len(raw) - base
+    if not any('count' in prop for prop in properties):
+        size = sum(prop['type'].itemsize for prop in properties)
+        if count * size > data_size:
+            raise ValueError(f"Corrupt PLY: {count} vertex records of {size} bytes need more than the {data_size} data bytes.")
+        return np.arange(count, dtype=np.int64) * size, np.full(count, size, dtype=np.int64)
+
+    # (fixed bytes before the list, count size, item size) per list, then the trailing fixed bytes
+    lists = []
+    fixed = 0
+    for prop in properties:
+        if 'count' in prop:
+            lists.append((fixed, prop['count'].itemsize, prop['item'].itemsize))
+            fixed = 0
+        else:
+            fixed += prop['type'].itemsize
+    trailing = fixed
+    starts = [0] * count
+    offset = base
+    try:
+        for i in range(count):
+            starts[i] = offset
+            for before, count_size, item_size in lists:
+                offset += before
+                n = raw[offset] if count_size == 1 else int.from_bytes(raw[offset:offset + count_size], 'little')
+                offset += count_size + n * item_size
+            offset += trailing
+    except IndexError:
+        offset = len(raw) + 1
+    if offset > len(raw):
+        raise ValueError(f"Corrupt PLY: the {count} vertex records run past the end of the file ({data_size} data bytes).")
+    starts = np.array(starts, dtype=np.int64) - base
+    return starts, np.diff(np.append(starts, offset - base))
+
+def _gather(data, positions, dtype):
+    """
+    Reads one value of dtype at each byte position.
+    """
+    out = np.empty(len(positions), dtype=dtype)
+    byte_range = np.arange(dtype.itemsize)
+    for start in range(0, len(positions), GATHER_CHUNK):
+        chunk = positions[start:start + GATHER_CHUNK]
+        out[start:start + len(chunk)] = data[chunk[:, None] + byte_range].view(dtype)[:, 0]
+    return out
+
+def _gather_properties(data, starts, properties, names):
+    """
+    Reads the named scalar properties of every record, walking the properties in order
+    (list lengths shift the positions of the properties after them).
+    """
+    columns = {}
+    positions = starts.copy()
+    for prop in properties:
+        if all(name in columns for name in names):
+            break
+        if 'count' in prop:
+            counts = _gather(data, positions, prop['count']).astype(np.int64)
+            positions = positions + prop['count'].itemsize + counts * prop['item'].itemsize
+        else:
+            if prop['name'] in names:
+                columns[prop['name']] = _gather(data, positions, prop['type'])
+            positions = positions + prop['type'].itemsize
+    return columns
+
+def write_ply(cloud, keep, path):
+    """
+    Writes the records of cloud (see read_ply) where keep is True, byte for byte.
+    """
+    index = mesh_cleanup._ragged_arange(cloud['starts'][keep], cloud['lengths'][keep])
+    header = re.sub(r'element vertex \d+', f'element vertex {int(np.count_nonzero(keep))}', cloud['header'], count=1)
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(cloud['data'][index].tobytes())
+
+# --- Filters ---
+
+def robust_diagonal(xyz):
+    """
+    Diagonal of the 1st-99th percentile box of the points (ignores far-flung noise).
+    """
+    lo, hi = np.percentile(xyz, [1, 99], axis=0)
+    return float(np.linalg.norm(hi - lo))
+
+def find_ground_plane(xyz, up=None, distance=None, iterations=RANSAC_ITERATIONS, sample=RANSAC_SAMPLE, seed=0):
+    """
+    Finds the floor under the object with RANSAC, vectorized over batches of candidate planes.
+
+    Candidates are planes through three random points, scored on a random sample of the
+    cloud. A candidate only counts as a floor if nearly all points off it lie on one side
+    (above it, when the up direction is known) and it is within MAX_GROUND_TILT of up.
+    The best candidate is refined with a least-squares fit to its inliers.
+
+    Args:
+        xyz (numpy.ndarray): (N, 3) points.
+        up (numpy.ndarray, optional): Unit up direction (e.g. from the cameras).
+        distance (float, optional): Inlier distance. Defaults to GROUND_DISTANCE_FRACTION of the robust diagonal.
+        iterations (int, optional): Candidate planes. Defaults to RANSAC_ITERATIONS.
+        sample (int, optional): Points each candidate is scored on. Defaults to RANSAC_SAMPLE.
+        seed (int, optional): Random seed, for reproducible runs. Defaults to 0.
+
+    Returns:
+        dict or None: {'normal' (pointing to the object's side), 'offset', 'distance', 'inlier_fraction'},
+            or None when no floor-like plane is found.
+    """
+    rng = np.random.default_rng(seed)
+    if len(xyz) < 3:
+        return None
+    if distance is None:
+        distance = GROUND_DISTANCE_FRACTION * robust_diagonal(xyz)
+    points = xyz[rng.choice(len(xyz), sample, replace=False)] if len(xyz) > sample else xyz
+
+    triples = points[rng.integers(0, len(points), size=(iterations, 3))]
+    normals = np.cross(triples[:, 1] - triples[:, 0], triples[:, 2] - triples[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths > 1e-12
+    normals = normals[valid] / lengths[valid, None]
+    anchors = triples[valid, 0]
+    if up is not None:
+        normals *= np.where(normals @ up < 0, -1.0, 1.0)[:, None]
+        upright = normals @ up >= np.cos(np.radians(MAX_GROUND_TILT))
+        normals, anchors = normals[upright], anchors[upright]
+    if not len(normals):
+        return None
+    offsets = np.einsum('ij,ij->i', normals, anchors)
+
+    scores = np.zeros(len(normals), dtype=np.int64)
+    for start in range(0, len(normals), RANSAC_CANDIDATE_CHUNK):
+        block = slice(start, start + RANSAC_CANDIDATE_CHUNK)
+        signed = points @ normals[block].T - offsets[block]
+        inliers = (np.abs(signed) <= distance).sum(axis=0)
+        above = (signed > distance).sum(axis=0)
+        below = (signed < -distance).sum(axis=0)
+        off_plane = np.maximum(above + below, 1)
+        one_sided = (above if up is not None else np.maximum(above, below)) >= MIN_ONE_SIDED_FRACTION * off_plane
+        scores[block] = np.where(one_sided, inliers, 0)
+    best = int(np.argmax(scores))
+    if scores[best] < MIN_GROUND_FRACTION * len(points):
+        return None
+
+    # Least-squares refit: the plane through the inliers' centroid, normal to their least spread
+    inliers = points[np.abs(points @ normals[best] - offsets[best]) <= distance]
+    centroid = inliers.mean(axis=0)
+    normal = np.linalg.svd(inliers - centroid, full_matrices=False)[2][-1]
+    if normal @ normals[best] < 0:
+        normal = -normal
+    signed = points @ normal - normal @ centroid
+    if (signed < -distance).sum() > (signed > distance).sum():
+        normal = -normal  # Face the side the object is on
+    return {
+        'normal': normal.tolist(),
+        'offset': float(normal @ centroid),
+        'distance': distance,
+        'inlier_fraction': round(float(scores[best]) / len(points), 4),
+    }
+
+def ground_mask(xyz, plane):
+    """
+    True for the points on or below the ground plane (the floor and whatever is under it).
+    """
+    return xyz @ np.array(plane['normal']) - plane['offset'] <= plane['distance']
+
+def outlier_mask(xyz, std_ratio=OUTLIER_STD_RATIO, min_neighbours=MIN_NEIGHBOURS):
+    """
+    Statistical outlier removal on a voxel-grid neighbour index.
+
+    The cell size is tuned so occupied cells hold about TARGET_CELL_POINTS points; a
+    point's density is the number of points in its cell and the 26 cells around it,
+    looked up with sorted cell keys (no per-point neighbour search).
+
+    Returns:
+        numpy.ndarray: (N,) True for the outliers.
+    """
+    if len(xyz) < TARGET_CELL_POINTS:
+        return np.zeros(len(xyz), dtype=bool)
+    cell_size = robust_diagonal(xyz) / np.sqrt(len(xyz) / TARGET_CELL_POINTS)
+    for _ in range(3):
+        keys, strides = mesh_cleanup._grid_keys(xyz, cell_size)
+        cell_keys, cell_of_point, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        occupancy = len(xyz) / len(cell_keys)
+        if 0.5 * TARGET_CELL_POINTS <= occupancy <= 2 * TARGET_CELL_POINTS:
+            break
+        # Dense clouds sample surfaces, so the points per cell grow with the square of its size
+        cell_size *= np.sqrt(TARGET_CELL_POINTS / occupancy)
+
+    block_counts = np.zeros(len(cell_keys), dtype=np.int64)
+    for offset in _BLOCK_OFFSETS:
+        neighbour_keys = cell_keys + offset @ strides
+        slot = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+        block_counts += np.where(cell_keys[slot] == neighbour_keys, counts[slot], 0)
+    density = block_counts[cell_of_point.ravel()]
+    threshold = max(min_neighbours, density.mean() - std_ratio * density.std())
+    return density < threshold
+
+def filter_point_cloud(input_ply, output_ply, report_path, up=None, remove_ground=True, remove_outliers=True,
+                       std_ratio=OUTLIER_STD_RATIO):
+    """
+    Removes the floor and floating noise from a dense point cloud before meshing.
+
+    Args:
+        input_ply (str): Dense point cloud (OpenMVS scene_dense.ply).
+        output_ply (str): Path of the filtered cloud.
+        report_path (str): Path of the JSON report (points removed by each filter and timings).
+        up (list, optional): Up direction of the scene (e.g. ColmapModel.up_direction()).
+        remove_ground (bool, optional): Remove the ground plane and everything below it. Defaults to True.
+        remove_outliers (bool, optional): Remove statistical outliers. Defaults to True.
+        std_ratio (float, optional): See OUTLIER_STD_RATIO.
+
+    Returns:
+        dict: The report.
+
+    Raises:
+        FileNotFoundError: If input_ply does not exist.
+        ValueError: If the filters would leave too few points to mesh.
+    """
+    print(f"\n--- Part 3a: Dense Point Cloud Filtering ---")
+    steps = []
+    def timed(name, fn):
+        started = time.monotonic()
+        result = fn()
+        steps.append({'step': name, 'wall_seconds': round(time.monotonic() - started, 3)})
+        return result
+
+    try:
+        cloud = timed('read_ply', lambda: read_ply(input_ply))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Dense point cloud not found: {input_ply}")
+    xyz = cloud['xyz']
+    keep = np.ones(len(xyz), dtype=bool)
+    report = {'input_points': int(len(xyz)), 'ground_plane': None, 'removed': {}}
+
+    if remove_ground:
+        up_vector = np.array(up, dtype=np.float64) / np.linalg.norm(up) if up is not None else None
+        plane = timed('ground_plane', lambda: find_ground_plane(xyz, up=up_vector))
+        report['ground_plane'] = plane
+        removed = ground_mask(xyz, plane) if plane is not None else np.zeros(len(xyz), dtype=bool)
+        report['removed']['ground'] = int(removed.sum())
+        keep &= ~removed
+        if plane is None:
+            print("No ground plane found; the floor filter was skipped.")
+    if remove_outliers:
+        kept = np.flatnonzero(keep)
+        outliers = timed('outliers', lambda: outlier_mask(xyz[kept], std_ratio=std_ratio))
+        report['removed']['outliers'] = int(outliers.sum())
+        keep[kept[outliers]] = False
+
+    report['output_points'] = int(keep.sum())
+    if report['output_points'] < MIN_OUTPUT_POINTS and report['output_points'] < len(xyz):
+        raise ValueError(f"Point cloud filtering would leave only {report['output_points']} of {len(xyz)} points "
+                         f"(removed: {report['removed']}).")
+    timed('write_ply', lambda: write_ply(cloud, keep, output_ply))
+    report['steps'] = steps
+    report['wall_seconds'] = round(sum(step['wall_seconds'] for step in steps), 3)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Filtered the dense point cloud: kept {report['output_points']} of {report['input_points']} points "
+          f"(removed {report['removed']}) in {report['wall_seconds']:.1f}s")
+    return report
+
+def main():
+    """
+    Command-line entry point: python pointcloud.py scene_dense.ply filtered.ply [--up X Y Z] [--report path]
+    """
+    parser = argparse.ArgumentParser(description="Remove the floor and statistical outliers from a dense PLY point cloud.")
+    parser.add_argument('input_ply', help='Binary PLY point cloud (e.g. OpenMVS scene_dense.ply).')
+    parser.add_argument('output_ply', help='Path for the filtered point cloud.')
+    parser.add_argument('--up', type=float, nargs=3, help='Up direction of the scene (default: unknown, any floor orientation).')
+    parser.add_argument('--keep-ground', action='store_true', help='Do not remove the ground plane.')
+    parser.add_argument('--keep-outliers', action='store_true', help='Do not remove statistical outliers.')
+    parser.add_argument('--std-ratio', type=float, default=OUTLIER_STD_RATIO, help=f'Outlier density threshold in standard deviations below the mean (default: {OUTLIER_STD_RATIO}).')
+    parser.add_argument('--report', default='point_filter.json', help='Path of the JSON report (default: point_filter.json).')
+    args = parser.parse_args()
+
+    try:
+        filter_point_cloud(args.input_ply, args.output_ply, args.report, up=args.up, remove_ground=not args.keep_ground,
+                           remove_outliers=not args.keep_outliers, std_ratio=args.std_ratio)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
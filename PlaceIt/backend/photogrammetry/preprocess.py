@@ -0,0 +1,207 @@
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_MAX_DIMENSION = 2048
+DEFAULT_QUALITY = 90
+# Exposure is measured on a thumbnail this wide; it is a global statistic, so full resolution is not needed
+STATS_WIDTH = 256
+# Frames whose mean luma is below this are dropped as near-black
+MIN_MEAN_LUMA = 20.0
+# Frames with more than this fraction of clipped (>= CLIPPED_LUMA) pixels are dropped as overexposed
+MAX_CLIPPED_FRACTION = 0.4
+CLIPPED_LUMA = 250
+# Exposure normalization applies a gamma curve mapping each frame's mean luma towards the median
+# of the kept frames; the exponent is clamped so badly exposed frames are not pushed to extremes
+MIN_GAMMA = 0.6
+MAX_GAMMA = 1.6
+
+def frame_stats(path):
+    """
+    Measures a frame's size and exposure (mean luma and clipped-pixel fraction).
+    Runs in a worker process.
+    """
+    with Image.open(path) as image:
+        size = image.size
+        image.draft('L', (STATS_WIDTH, STATS_WIDTH))  # JPEG decoders can downscale while decoding
+        gray = image.convert('L')
+    gray.thumbnail((STATS_WIDTH, STATS_WIDTH))
+    luma = np.asarray(gray, dtype=np.float32)
+    return {
+        'size': size,
+        'mean_luma': float(luma.mean()),
+        'clipped_fraction': float((luma >= CLIPPED_LUMA).mean()),
+    }
+
+def exposure_gamma(mean_luma, target_luma):
+    """
+    Gamma exponent that maps mean_luma to roughly target_luma (1.0 when exposure is left alone).
+    """
+    if target_luma is None or not 0 < mean_luma < 255 or not 0 < target_luma < 255:
+        return 1.0
+    gamma = math.log(target_luma / 255.0) / math.log(mean_luma / 255.0)
+    return min(MAX_GAMMA, max(MIN_GAMMA, gamma))
+
+def process_frame(job):
+    """
+    Resizes, exposure-normalizes and re-encodes one frame. Runs in a worker process.
+
+    Args:
+        job (dict): {'input', 'output', 'scale', 'gamma', 'quality'}
+
+    Returns:
+        dict: The written size and the wall time.
+    """
+    started = time.monotonic()
+    with Image.open(job['input']) as image:
+        image = image.convert('RGB')
+    if job['scale'] < 1:
+        image = image.resize((max(1, round(image.width * job['scale'])), max(1, round(image.height * job['scale']))),
+                             Image.LANCZOS)
+    if job['gamma'] != 1.0:
+        lut = [round(255.0 * (value / 255.0) ** job['gamma']) for value in range(256)]
+        image = image.point(lut * 3)
+    image.save(job['output'], 'JPEG', quality=job['quality'], optimize=True)
+    return {'size': image.size, 'wall_seconds': round(time.monotonic() - started, 3)}
+
+def preprocess_frames(input_dir, output_dir, report_path, max_dimension=DEFAULT_MAX_DIMENSION, quality=DEFAULT_QUALITY,
+                      normalize_exposure=True, min_mean_luma=MIN_MEAN_LUMA, max_clipped_fraction=MAX_CLIPPED_FRACTION,
+                      workers=None):
+    """
+    Prepares extracted frames for SfM in parallel worker processes: drops near-black and
+    overexposed frames, downscales the rest to max_dimension, evens out their exposure and
+    writes them as JPEGs with the same names.
+
+    The report records the scale factor applied to every frame (one factor for all frames of
+    the same size), so image-space measurements such as camera intrinsics can be mapped back
+    to the original video resolution.
+
+    Args:
+        input_dir (str): Directory with the extracted frame_*.jpg files.
+        output_dir (str): Directory for the processed frames (emptied first).
+        report_path (str): Path of the JSON report.
+        max_dimension (int, optional): Longest side of the processed frames. Defaults to DEFAULT_MAX_DIMENSION.
+        quality (int, optional): JPEG quality (1-100). Defaults to DEFAULT_QUALITY.
+        normalize_exposure (bool, optional): Pull each frame's mean luma towards the median of the kept frames. Defaults to True.
+        min_mean_luma (float, optional): Drop frames darker than this mean luma (0-255). Defaults to MIN_MEAN_LUMA.
+        max_clipped_fraction (float, optional): Drop frames with more clipped pixels than this. Defaults to MAX_CLIPPED_FRACTION.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: The report.
+
+    Raises:
+        FileNotFoundError: If input_dir holds no frames.
+        ValueError: If fewer than 2 frames are kept.
+    """
+    print(f"\n--- Part 1b: Frame Preprocessing ---")
+    frames = sorted(glob.glob(os.path.join(input_dir, 'frame_*.jpg')))
+    if not frames:
+        raise FileNotFoundError(f"No frames (frame_*.jpg) found to preprocess in {input_dir}")
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        stats = list(executor.map(frame_stats, frames, chunksize=8))
+
+        entries = []
+        for path, frame in zip(frames, stats):
+            entry = {
+                'frame': os.path.basename(path),
+                'original_size': list(frame['size']),
+                'mean_luma': round(frame['mean_luma'], 2),
+                'clipped_fraction': round(frame['clipped_fraction'], 4),
+                'kept': True,
+            }
+            if frame['mean_luma'] < min_mean_luma:
+                entry.update(kept=False, reason='dark')
+            elif frame['clipped_fraction'] > max_clipped_fraction:
+                entry.update(kept=False, reason='overexposed')
+            entries.append(entry)
+
+        kept = [entry for entry in entries if entry['kept']]
+        if len(kept) < 2:
+            dark = sum(entry.get('reason') == 'dark' for entry in entries)
+            raise ValueError(f"Frame preprocessing kept only {len(kept)} of {len(entries)} frame(s); need at least 2 for "
+                             f"reconstruction ({dark} too dark, {len(entries) - len(kept) - dark} overexposed).")
+        target_luma = float(np.median([entry['mean_luma'] for entry in kept])) if normalize_exposure else None
+
+        jobs = []
+        for entry in kept:
+            width, height = entry['original_size']
+            entry['scale'] = min(1.0, max_dimension / max(width, height))
+            entry['gamma'] = round(exposure_gamma(entry['mean_luma'], target_luma), 4)
+            jobs.append({
+                'input': os.path.join(input_dir, entry['frame']),
+                'output': os.path.join(output_dir, entry['frame']),
+                'scale': entry['scale'],
+                'gamma': entry['gamma'],
+                'quality': quality,
+            })
+        for entry, result in zip(kept, executor.map(process_frame, jobs, chunksize=4)):
+            entry['size'] = list(result['size'])
+
+    scales = sorted({entry['scale'] for entry in kept})
+    dropped = {}
+    for entry in entries:
+        if not entry['kept']:
+            dropped[entry['reason']] = dropped.get(entry['reason'], 0) + 1
+    report = {
+        'params': {
+            'max_dimension': max_dimension,
+            'quality': quality,
+            'normalize_exposure': normalize_exposure,
+            'min_mean_luma': min_mean_luma,
+            'max_clipped_fraction': max_clipped_fraction,
+        },
+        'input_frames': len(entries),
+        'kept_frames': len(kept),
+        'dropped': dropped,
+        'target_luma': round(target_luma, 2) if target_luma is not None else None,
+        # Processed pixel size / original pixel size; a single value when all frames share a size
+        'scale': scales[0] if len(scales) == 1 else scales,
+        'wall_seconds': round(time.monotonic() - started, 3),
+        'frames': entries,
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Preprocessed {len(kept)} of {len(entries)} frames (dropped: {dropped}, scale {report['scale']}) "
+          f"in {report['wall_seconds']:.1f}s into {output_dir}")
+    return report
+
+def main():
+    """
+    Command-line entry point: python preprocess.py images/ preprocessed/ [--max-dimension 2048] [--quality 90] [--report path]
+    """
+    parser = argparse.ArgumentParser(description="Downscale, exposure-normalize and filter extracted video frames for SfM.")
+    parser.add_argument('input_dir', help='Directory with frame_*.jpg files.')
+    parser.add_argument('output_dir', help='Directory for the processed frames.')
+    parser.add_argument('--max-dimension', type=int, default=DEFAULT_MAX_DIMENSION, help=f'Longest side of the processed frames (default: {DEFAULT_MAX_DIMENSION}).')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'JPEG quality (default: {DEFAULT_QUALITY}).')
+    parser.add_argument('--no-normalize-exposure', action='store_true', help='Keep each frame\'s exposure as extracted.')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument('--report', help='Path of the JSON report (default: preprocess.json next to the output directory).')
+    args = parser.parse_args()
+
+    report_path = args.report or os.path.join(os.path.dirname(os.path.abspath(args.output_dir)), 'preprocess.json')
+    try:
+        preprocess_frames(args.input_dir, args.output_dir, report_path, max_dimension=args.max_dimension,
+                          quality=args.quality, normalize_exposure=not args.no_normalize_exposure, workers=args.workers)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import colmap_model
+import roi
+
+# Image files counted as SfM input when computing the registered-image ratio
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Limits a capture must meet before the OpenMVS chain runs on it:
+#   min_registered_ratio: fraction of the input frames COLMAP registered
+#   min_coverage_degrees: arc of viewing directions around the object that the cameras span
+#   min_median_track_length: median number of images observing a sparse point
+#   max_mean_reprojection_error: mean reprojection error of the sparse points, in pixels
+DEFAULT_THRESHOLDS = {
+    'min_registered_ratio': 0.6,
+    'min_coverage_degrees': 90.0,
+    'min_median_track_length': 3.0,
+    'max_mean_reprojection_error': 2.0,
+}
+
+# What a failed check does: 'reject' stops the pipeline, 'warn' only records it in the report
+GATE_MODES = ['reject', 'warn', 'off']
+
+class QualityGateError(ValueError):
+    """
+    Raised when a capture fails the quality gate. issues holds the failed checks
+    (dicts with 'check', 'value', 'limit' and 'message').
+    """
+
+    def __init__(self, issues):
+        self.issues = issues
+        super().__init__("Capture rejected before dense reconstruction: " + "; ".join(issue['message'] for issue in issues))
+
+def count_input_images(image_dir):
+    return sum(1 for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+def angular_coverage(model):
+    """
+    Measures the arc (in degrees) of camera positions around the object.
+
+    The object center is the point the cameras look at (see roi.look_at_point), or the
+    median sparse point when their axes do not converge. Camera positions are projected on
+    the plane perpendicular to the scene's up direction (ColmapModel.up_direction), and
+    the coverage is 360 degrees minus the largest gap between consecutive azimuths.
+
+    Returns:
+        float: The covered arc, 0 to 360.
+    """
+    if model.num_images < 2:
+        return 0.0
+    centers = model.camera_centers()
+    rotations = colmap_model.qvec_to_rotmat(model.images['qvec'])
+    center, spread = roi.look_at_point(centers, rotations[:, 2, :])
+    if spread < roi.MIN_AXIS_SPREAD and model.num_points3D:
+        center = np.median(model.points3D['xyz'], axis=0)
+
+    up = model.up_direction()
+    x_axis = np.linalg.svd(np.eye(3) - np.outer(up, up))[0][:, 0]
+    y_axis = np.cross(up, x_axis)
+
+    offsets = centers - center
+    azimuths = np.sort(np.degrees(np.arctan2(offsets @ y_axis, offsets @ x_axis)))
+    gaps = np.diff(np.concatenate([azimuths, [azimuths[0] + 360.0]]))
+    return float(360.0 - gaps.max())
+
+def assess_model(model, input_images, thresholds=None):
+    """
+    Computes the quality metrics of a sparse model and checks them against the thresholds.
+
+    Args:
+        model (colmap_model.ColmapModel): The sparse model.
+        input_images (int): Number of frames given to SfM.
+        thresholds (dict, optional): Overrides of DEFAULT_THRESHOLDS.
+
+    Returns:
+        dict: {'metrics': {...}, 'thresholds': {...}, 'issues': [...], 'passed': bool}
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    track_lengths = model.points3D['track_length']
+    errors = model.points3D['error'][model.points3D['error'] >= 0]
+    metrics = {
+        'input_images': int(input_images),
+        'registered_images': int(model.num_images),
+        'registered_ratio': round(model.num_images / input_images, 4) if input_images else 0.0,
+        'coverage_degrees': round(angular_coverage(model), 1),
+        'points3D': int(model.num_points3D),
+        'track_length_percentiles': {f'p{pct}': float(np.percentile(track_lengths, pct)) if len(track_lengths) else 0.0
+                                     for pct in (10, 50, 90)},
+        'two_view_point_fraction': round(float((track_lengths == 2).mean()), 4) if len(track_lengths) else 0.0,
+        'mean_reprojection_error': round(float(errors.mean()), 4) if len(errors) else 0.0,
+        'p90_reprojection_error': round(float(np.percentile(errors, 90)), 4) if len(errors) else 0.0,
+    }
+
+    issues = []
+    def check(name, value, limit, failed, message):
+        if failed:
+            issues.append({'check': name, 'value': value, 'limit': limit, 'message': message})
+    check('registered_images', metrics['registered_ratio'], thresholds['min_registered_ratio'],
+          metrics['registered_ratio'] < thresholds['min_registered_ratio'],
+          f"only {metrics['registered_images']} of {input_images} frames registered "
+          f"({metrics['registered_ratio']:.0%}, need {thresholds['min_registered_ratio']:.0%})")
+    check('coverage', metrics['coverage_degrees'], thresholds['min_coverage_degrees'],
+          metrics['coverage_degrees'] < thresholds['min_coverage_degrees'],
+          f"only {metrics['coverage_degrees']:.0f}° of coverage around the object (need {thresholds['min_coverage_degrees']:.0f}°)")
+    median_track = metrics['track_length_percentiles']['p50']
+    check('track_length', median_track, thresholds['min_median_track_length'],
+          median_track < thresholds['min_median_track_length'],
+          f"sparse points are seen by a median of {median_track:.1f} images (need {thresholds['min_median_track_length']:.1f})")
+    check('reprojection_error', metrics['mean_reprojection_error'], thresholds['max_mean_reprojection_error'],
+          metrics['mean_reprojection_error'] > thresholds['max_mean_reprojection_error'],
+          f"mean reprojection error is {metrics['mean_reprojection_error']:.2f} px "
+          f"(at most {thresholds['max_mean_reprojection_error']:.2f} px allowed)")
+    return {'metrics': metrics, 'thresholds': thresholds, 'issues': issues, 'passed': not issues}
+
+def check_capture(model_dir, image_dir, report_path, mode='reject', thresholds=None):
+    """
+    Quality gate between SfM and dense reconstruction: assesses the sparse model, writes
+    the report and, in 'reject' mode, stops a capture that fails any check.
+
+    Args:
+        model_dir (str): COLMAP sparse model directory (sparse/0).
+        image_dir (str): Directory with the frames given to SfM.
+        report_path (str): Path of the JSON report.
+        mode (str, optional): One of GATE_MODES (except 'off'). Defaults to 'reject'.
+        thresholds (dict, optional): Overrides of DEFAULT_THRESHOLDS.
+
+    Returns:
+        dict: The report.
+
+    Raises:
+        QualityGateError: In 'reject' mode, if a check fails.
+    """
+    print(f"\n--- Part 2a: Capture Quality Gate ---")
+    report = assess_model(colmap_model.read_model(model_dir), count_input_images(image_dir), thresholds)
+    report['mode'] = mode
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    metrics = report['metrics']
+    print(f"Capture quality: {metrics['registered_images']}/{metrics['input_images']} frames registered, "
+          f"{metrics['coverage_degrees']:.0f}° coverage, median track length "
+          f"{metrics['track_length_percentiles']['p50']:.1f}, mean reprojection error {metrics['mean_reprojection_error']:.3f} px")
+    if report['passed']:
+        print("Quality gate passed!")
+    elif mode == 'reject':
+        raise QualityGateError(report['issues'])
+    else:
+        for issue in report['issues']:
+            print(f"Warning: {issue['message']}", file=sys.stderr)
+    return report
+
+def main():
+    """
+    Command-line entry point: python quality.py sparse/0 images/ [--report quality.json]
+    """
+    parser = argparse.ArgumentParser(description="Check a COLMAP sparse model against the capture quality thresholds.")
+    parser.add_argument('model_dir', help='COLMAP sparse model directory (e.g. workspace/sparse/0).')
+    parser.add_argument('image_dir', help='Directory with the frames given to SfM.')
+    parser.add_argument('--report', default='quality.json', help='Path of the JSON report (default: quality.json).')
+    for name, value in DEFAULT_THRESHOLDS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=float, default=value, help=f'(default: {value})')
+    args = parser.parse_args()
+
+    thresholds = {name: getattr(args, name) for name in DEFAULT_THRESHOLDS}
+    try:
+        report = check_capture(args.model_dir, args.image_dir, args.report, mode='warn', thresholds=thresholds)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0 if report['passed'] else 2)
+
+if __name__ == '__main__':
+    main()
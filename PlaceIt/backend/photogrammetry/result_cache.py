@@ -0,0 +1,393 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+import storage
+from checkpoints import hash_file, hash_inputs, hash_params, hash_path, stat_signature
+
+# Layout of a cache directory: every stored file's contents once, under objects/ by their
+# SHA-256 (shared by all the entries that contain them); one JSON entry per stored stage
+# result under entries/, named after its key; hit/miss counters in stats.json; and the
+# lock file that serializes updates between the jobs sharing the cache
+OBJECTS_DIR_NAME = 'objects'
+ENTRIES_DIR_NAME = 'entries'
+STATS_FILE_NAME = 'stats.json'
+LOCK_FILE_NAME = 'lock'
+
+DEFAULT_MAX_SIZE = '20G'
+
+# Objects that no entry references yet are left alone this long by eviction: they may
+# belong to an entry another job is still storing
+ORPHAN_GRACE_SECONDS = 3600
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on a file, against other threads and processes, for the duration of the block.
+    """
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass # LK_LOCK gives up after 10 seconds; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+class ResultCache:
+    """
+    Content-addressed store of stage results, shared by the jobs of a machine, so a video
+    that was already reconstructed (a re-upload, or the same product listed twice) is not
+    reconstructed again.
+
+    A result is looked up by a key computed from what produced it: the stage, its
+    parameters, the contents of its input files, and the keys of the results it was
+    computed from. Keys chain like the checkpoint digests, but from inputs only, so every
+    key of a job is known before any of its stages runs. Stored files are copied in and
+    out, never linked, since later stages may rewrite their inputs in place.
+
+    The cache stays under its size cap by evicting the least recently used entries. It
+    never fails a job: errors reading or writing it are reported and treated as misses.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        """
+        Args:
+            cache_dir (str): The cache directory (created if needed).
+            max_bytes (int, optional): Size cap of the stored files. Defaults to None (no cap).
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, OBJECTS_DIR_NAME)
+        self.entries_dir = os.path.join(cache_dir, ENTRIES_DIR_NAME)
+        self.max_bytes = max_bytes
+        # Digests of the input files hashed so far, with the stat signature they were computed for
+        self._digests = {}
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def key(self, stage, inputs=(), params=None, deps=None):
+        """
+        Computes the key of a stage result.
+
+        Args:
+            stage (str): Stage name.
+            inputs (iterable, optional): External input files or directories whose contents feed the stage.
+            params (dict, optional): Parameters that affect the stage's outputs.
+            deps (dict, optional): {upstream stage: its key} of the results the stage reads.
+
+        Returns:
+            str: The key (a hex digest).
+        """
+        return hash_params({
+            'stage': stage,
+            'params': params or {},
+            'inputs': hash_inputs(list(inputs), hash_fn=self._hash),
+            'deps': deps or {},
+        })
+
+    def _hash(self, path):
+        signature = stat_signature(path)
+        known = self._digests.get(path)
+        if known is None or known[0] != signature:
+            known = self._digests[path] = (signature, hash_path(path))
+        return known[1]
+
+    def _lock(self):
+        return file_lock(os.path.join(self.cache_dir, LOCK_FILE_NAME))
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, f'{key}.json')
+
+    def _complete(self, entry):
+        return all(os.path.exists(self._object_path(digest)) for digest, _ in entry['files'].values())
+
+    def restore(self, key, root, stage):
+        """
+        Writes a stored result under a directory if the cache has it, replacing the files
+        and directories the result covers.
+
+        Args:
+            key (str): The result's key (see key).
+            root (str): Directory the result's paths are relative to.
+            stage (str): Stage name, for the hit/miss statistics.
+
+        Returns:
+            dict: The cache entry on a hit (its 'files', 'size_bytes', 'duration_seconds',
+                'created_at'), None on a miss.
+        """
+        entry = None
+        try:
+            with self._lock():
+                entry = _read_json(self._entry_path(key))
+                if entry is not None and not self._complete(entry):
+                    # Some of its files were evicted with another entry that shared them
+                    os.remove(self._entry_path(key))
+                    entry = None
+                if entry is not None:
+                    try:
+                        self._materialize(entry, root)
+                    except OSError:
+                        for rel_path in entry['outputs']:
+                            if os.path.lexists(os.path.join(root, rel_path)):
+                                storage.remove_path(os.path.join(root, rel_path))
+                        raise
+                    entry['last_used'] = time.time()
+                    entry['hits'] = entry.get('hits', 0) + 1
+                    _write_json(self._entry_path(key), entry)
+                self._count(stage, entry)
+        except OSError as e:
+            print(f"Warning: Result cache lookup failed for stage '{stage}': {e}", file=sys.stderr)
+            return None
+        if entry is not None:
+            print(f"Restored the result of stage '{stage}' from the cache ({storage.format_size(entry['size_bytes'])}, "
+                  f"stored {entry['created_at']}, saves about {entry['duration_seconds']:.0f}s).")
+        return entry
+
+    def _materialize(self, entry, root):
+        for rel_path in entry['outputs']:
+            path = os.path.join(root, rel_path)
+            if os.path.lexists(path):
+                storage.remove_path(path)
+        for rel_path in entry['dirs']:
+            os.makedirs(os.path.join(root, rel_path), exist_ok=True)
+        for rel_path, (digest, _) in entry['files'].items():
+            path = os.path.join(root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(self._object_path(digest), path)
+
+    def _count(self, stage, entry):
+        stats = self._read_stats()
+        outcome = 'hits' if entry is not None else 'misses'
+        stats[outcome][stage] = stats[outcome].get(stage, 0) + 1
+        if entry is not None:
+            stats['bytes_restored'] += entry['size_bytes']
+            stats['seconds_saved'] = round(stats['seconds_saved'] + entry['duration_seconds'], 3)
+        _write_json(os.path.join(self.cache_dir, STATS_FILE_NAME), stats)
+
+    def _read_stats(self):
+        stats = _read_json(os.path.join(self.cache_dir, STATS_FILE_NAME)) or {}
+        for name, default in (('hits', {}), ('misses', {}), ('bytes_restored', 0), ('seconds_saved', 0.0), ('evictions', 0)):
+            stats.setdefault(name, default)
+        return stats
+
+    def store(self, key, root, paths, stage, duration_seconds=0.0):
+        """
+        Stores files and directory trees as the result of a stage, then evicts the least
+        recently used entries if the cache is over its size cap.
+
+        Args:
+            key (str): The result's key (see key).
+            root (str): Directory the paths are stored relative to; restore writes them under another root.
+            paths (list): Files and directories under root that make up the result.
+            stage (str): Stage name, recorded in the entry.
+            duration_seconds (float, optional): How long producing the result took, reported as
+                the time saved by each hit. Defaults to 0.
+
+        Returns:
+            bool: True if the result was stored.
+        """
+        relative = lambda path: os.path.relpath(path, root).replace(os.sep, '/')
+        try:
+            file_paths = []
+            dirs = []
+            for path in paths:
+                if not os.path.isdir(path):
+                    file_paths.append(path)
+                    continue
+                for dir_path, _, file_names in os.walk(path):
+                    dirs.append(relative(dir_path))
+                    file_paths.extend(os.path.join(dir_path, name) for name in sorted(file_names))
+            size = storage.disk_usage(file_paths)
+            if self.max_bytes is not None and size > self.max_bytes:
+                print(f"Not caching the result of stage '{stage}': {storage.format_size(size)} is over the cache's "
+                      f"size cap of {storage.format_size(self.max_bytes)}.")
+                return False
+            files = {relative(path): self._add_object(path) for path in file_paths}
+            size = sum(dict(files.values()).values())
+            entry = {
+                'key': key,
+                'stage': stage,
+                'outputs': [relative(path) for path in paths],
+                'dirs': dirs,
+                'files': files,
+                'size_bytes': size,
+                'duration_seconds': round(duration_seconds, 3),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'last_used': time.time(),
+                'hits': 0,
+            }
+            with self._lock():
+                if not self._complete(entry):
+                    print(f"Warning: Not caching the result of stage '{stage}': the cache evicted some of its files "
+                          f"while it was being stored.", file=sys.stderr)
+                    return False
+                _write_json(self._entry_path(key), entry)
+                self._evict(self.max_bytes)
+        except OSError as e:
+            print(f"Warning: Could not store the result of stage '{stage}' in the cache: {e}", file=sys.stderr)
+            return False
+        print(f"Stored the result of stage '{stage}' in the cache ({storage.format_size(size)}).")
+        return True
+
+    def _add_object(self, path):
+        # Returns [digest, size]; the contents are copied in unless the cache already holds them
+        digest = hash_file(path)
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            # Marks the object as in use, so eviction does not take it for an orphan before the entry is written
+            os.utime(object_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f'{object_path}.{uuid.uuid4().hex}.tmp'
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        return [digest, os.path.getsize(object_path)]
+
+    def _entries(self):
+        entries = []
+        for name in sorted(os.listdir(self.entries_dir)):
+            if name.endswith('.json'):
+                entry = _read_json(os.path.join(self.entries_dir, name))
+                if entry is not None:
+                    entries.append(entry)
+        return entries
+
+    def _objects(self):
+        # {file name: (path, size, mtime)} of the stored objects, named by their digest (and of
+        # the copies in progress, under temporary names)
+        objects = {}
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                st = os.stat(os.path.join(prefix_dir, name))
+                objects[name] = (os.path.join(prefix_dir, name), st.st_size, st.st_mtime)
+        return objects
+
+    def _evict(self, max_bytes):
+        # Must be called with the lock held. Returns the number of entries evicted.
+        entries = sorted(self._entries(), key=lambda entry: entry['last_used'])
+        objects = self._objects()
+        references = {}
+        for entry in entries:
+            for digest, _ in entry['files'].values():
+                references[digest] = references.get(digest, 0) + 1
+        now = time.time()
+        for name, (path, _, mtime) in list(objects.items()):
+            if name not in references and now - mtime > ORPHAN_GRACE_SECONDS:
+                os.remove(path)
+                del objects[name]
+
+        # Only what the entries use counts: the orphans left are still being stored
+        total = sum(objects[digest][1] for digest in references if digest in objects)
+        evicted = 0
+        while max_bytes is not None and total > max_bytes and entries:
+            entry = entries.pop(0)
+            os.remove(self._entry_path(entry['key']))
+            evicted += 1
+            for digest, _ in entry['files'].values():
+                references[digest] -= 1
+                if references[digest] == 0 and digest in objects:
+                    path, size, _ = objects.pop(digest)
+                    os.remove(path)
+                    total -= size
+        if evicted:
+            stats = self._read_stats()
+            stats['evictions'] += evicted
+            _write_json(os.path.join(self.cache_dir, STATS_FILE_NAME), stats)
+            print(f"Evicted {evicted} least recently used cache entr{'y' if evicted == 1 else 'ies'} "
+                  f"to stay under {storage.format_size(max_bytes)}.")
+        return evicted
+
+    def evict(self, max_bytes):
+        """
+        Evicts the least recently used entries until the stored files fit in max_bytes,
+        and removes stored files no entry uses any more.
+
+        Returns:
+            int: The number of entries evicted.
+        """
+        with self._lock():
+            return self._evict(max_bytes)
+
+    def stats(self):
+        """
+        Returns the cache's hit/miss counters per stage and its current contents.
+
+        Returns:
+            dict: 'hits' and 'misses' ({stage: count}), 'hit_rate', 'bytes_restored',
+                'seconds_saved', 'evictions', 'entries' ({stage: count}) and 'size_bytes'.
+        """
+        with self._lock():
+            stats = self._read_stats()
+            entries = self._entries()
+            objects = self._objects()
+        lookups = sum(stats['hits'].values()) + sum(stats['misses'].values())
+        stats['hit_rate'] = round(sum(stats['hits'].values()) / lookups, 3) if lookups else None
+        stats['entries'] = {}
+        for entry in entries:
+            stats['entries'][entry['stage']] = stats['entries'].get(entry['stage'], 0) + 1
+        stats['size_bytes'] = sum(size for _, size, _ in objects.values())
+        return stats
+
+def main():
+    """
+    Command-line entry point: python result_cache.py stats <cache dir> | evict <cache dir> --max-size 10G
+    """
+    parser = argparse.ArgumentParser(description="Inspect or trim the photogrammetry result cache.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stats_parser = subparsers.add_parser('stats', help='Print the hit/miss statistics and the size of the cache.')
+    stats_parser.add_argument('cache_dir', help='The cache directory (--cache-dir of main.py).')
+    evict_parser = subparsers.add_parser('evict', help='Evict the least recently used entries down to a size.')
+    evict_parser.add_argument('cache_dir', help='The cache directory (--cache-dir of main.py).')
+    evict_parser.add_argument('--max-size', type=storage.parse_size, required=True, help='Size to trim the cache to, e.g. 10G (0 empties it).')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        parser.error(f"Cache directory not found: {args.cache_dir}")
+    cache = ResultCache(args.cache_dir)
+    if args.command == 'evict':
+        cache.evict(args.max_size)
+    stats = cache.stats()
+    stats['size'] = storage.format_size(stats['size_bytes'])
+    print(json.dumps(stats, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import colmap_model
+
+# The object is taken to lie within this fraction of the median camera distance from the
+# point the cameras look at; walls and background are further out than the cameras
+MAX_RADIUS_FRACTION = 0.75
+# Per-axis percentiles of the object's sparse points used as the box (drops stray points)
+BOX_PERCENTILE = 1.0
+# Margin added to every side of the box, as a fraction of its size
+BOX_MARGIN = 0.15
+# Cameras whose optical axes are nearly parallel (a straight sweep, not an orbit) do not
+# define a look-at point: the ratio of the smallest to the largest eigenvalue of the
+# least-squares system must be at least this
+MIN_AXIS_SPREAD = 0.02
+# Fewest sparse points an estimated region must keep
+MIN_POINTS = 100
+
+def look_at_point(centers, axes):
+    """
+    Least-squares point closest to every camera's optical axis.
+
+    Args:
+        centers (numpy.ndarray): (N, 3) camera centers.
+        axes (numpy.ndarray): (N, 3) unit viewing directions.
+
+    Returns:
+        tuple: (point, spread) where spread is the smallest/largest eigenvalue ratio of the
+            system (near 0 when the axes are nearly parallel and the point is ill-defined).
+    """
+    projectors = np.eye(3) - axes[:, :, None] * axes[:, None, :]
+    system = projectors.sum(axis=0)
+    rhs = np.einsum('nij,nj->i', projectors, centers)
+    eigenvalues = np.linalg.eigvalsh(system)
+    spread = float(eigenvalues[0] / eigenvalues[-1]) if eigenvalues[-1] > 0 else 0.0
+    return np.linalg.lstsq(system, rhs, rcond=None)[0], spread
+
+def estimate_roi(model, max_radius_fraction=MAX_RADIUS_FRACTION, margin=BOX_MARGIN, min_points=MIN_POINTS):
+    """
+    Estimates the bounding box of the object the cameras orbit around.
+
+    The cameras of an object capture all look at the object, so the point nearest to their
+    optical axes is its center. Sparse points within max_radius_fraction of the median
+    camera distance from it are taken as the object, and their robust extent (plus a
+    margin) is the region of interest.
+
+    Args:
+        model (colmap_model.ColmapModel): The sparse model.
+        max_radius_fraction (float, optional): See MAX_RADIUS_FRACTION.
+        margin (float, optional): See BOX_MARGIN.
+        min_points (int, optional): See MIN_POINTS.
+
+    Returns:
+        dict: {'min', 'max', 'center', 'radius', 'points_inside', 'points_total'}, or
+            {'skipped': reason} when the capture does not define an object region.
+    """
+    if model.num_images < 3 or model.num_points3D < min_points:
+        return {'skipped': f'too few images ({model.num_images}) or points ({model.num_points3D})'}
+    centers = model.camera_centers()
+    # The camera looks down its +z axis, which is the third row of the world-to-camera rotation
+    axes = colmap_model.qvec_to_rotmat(model.images['qvec'])[:, 2, :]
+    center, spread = look_at_point(centers, axes)
+    if spread < MIN_AXIS_SPREAD:
+        return {'skipped': f'camera axes do not converge (spread {spread:.4f} < {MIN_AXIS_SPREAD})'}
+    in_front = np.einsum('ni,ni->n', center - centers, axes) > 0
+    if in_front.mean() < 0.5:
+        return {'skipped': 'the estimated center is behind most cameras'}
+
+    radius = max_radius_fraction * float(np.median(np.linalg.norm(centers - center, axis=1)))
+    points = model.points3D['xyz']
+    near = np.linalg.norm(points - center, axis=1) < radius
+    if near.sum() < min_points:
+        return {'skipped': f'only {int(near.sum())} sparse points near the estimated center'}
+    lo, hi = np.percentile(points[near], [BOX_PERCENTILE, 100.0 - BOX_PERCENTILE], axis=0)
+    padding = margin * (hi - lo)
+    lo, hi = lo - padding, hi + padding
+    inside = np.all((points >= lo) & (points <= hi), axis=1)
+    return {
+        'min': lo.tolist(),
+        'max': hi.tolist(),
+        'center': center.tolist(),
+        'radius': radius,
+        'points_inside': int(inside.sum()),
+        'points_total': int(len(points)),
+    }
+
+def crop_model_to_roi(model_dir, report_path):
+    """
+    Estimates the object's region of interest from a sparse model and removes the sparse
+    points outside it, rewriting the model in place in its own format.
+
+    OpenMVS derives each view's neighbours and depth range from the sparse points it sees,
+    so without the background points densification concentrates on the object.
+
+    Args:
+        model_dir (str): COLMAP model directory (e.g. the undistorted model's sparse/).
+        report_path (str): Path of the JSON report with the region and the point counts.
+
+    Returns:
+        dict: The report (see estimate_roi).
+    """
+    ext = colmap_model.find_model_format(model_dir)
+    model = colmap_model.read_model(model_dir, include_tracks=True)
+    roi = estimate_roi(model)
+    if 'skipped' in roi:
+        print(f"Region of interest not applied: {roi['skipped']}")
+    else:
+        points = model.points3D['xyz']
+        inside = np.all((points >= roi['min']) & (points <= roi['max']), axis=1)
+        colmap_model.write_model(model.select_points3D(inside), model_dir, ext)
+        print(f"Cropped the sparse model to the object's region of interest: kept {roi['points_inside']} "
+              f"of {roi['points_total']} points")
+    with open(report_path, 'w') as f:
+        json.dump(roi, f, indent=2)
+    return roi
+
+def main():
+    """
+    Command-line entry point: python roi.py sparse_model_dir [--crop] [--report roi.json]
+    """
+    parser = argparse.ArgumentParser(description="Estimate the bounding box of the object a capture orbits around.")
+    parser.add_argument('model_dir', help='COLMAP sparse model directory.')
+    parser.add_argument('--crop', action='store_true', help='Remove the sparse points outside the region (rewrites the model).')
+    parser.add_argument('--report', default='roi.json', help='Path of the JSON report (default: roi.json).')
+    args = parser.parse_args()
+
+    try:
+        if args.crop:
+            roi = crop_model_to_roi(args.model_dir, args.report)
+        else:
+            roi = estimate_roi(colmap_model.read_model(args.model_dir))
+            with open(args.report, 'w') as f:
+                json.dump(roi, f, indent=2)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(roi, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tarfile
+
+# What happens to an intermediate once every stage that reads it has finished:
+#   delete: removed (re-created by re-running its stage if a later run needs it)
+#   compress: moved into a tar.gz in <workspace>/archive (extracted again if needed)
+#   keep: left in place, for debugging
+INTERMEDIATE_MODES = ['delete', 'compress', 'keep']
+
+# Directory (inside the workspace) for the archives of compressed intermediates
+ARCHIVE_DIR_NAME = 'archive'
+
+# gzip level of the archives: the bulk is JPEG images and binary scenes, which compress
+# little at any level, so the fastest one is used
+ARCHIVE_COMPRESS_LEVEL = 1
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+class DiskQuotaExceeded(RuntimeError):
+    """
+    Raised when a job's files take more space than its disk quota.
+    """
+
+def parse_size(text):
+    """
+    Parses a size such as '500M', '20G', '1.5T' or a plain number of bytes.
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{text}'. Expected bytes or a number with K, M, G or T.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024.0
+    return f'{size:.1f} TB'
+
+def disk_usage(paths):
+    """
+    Total size in bytes of the files under the given files or directories. Files reachable
+    from several of them (nested directories, hard links) are counted once.
+    """
+    seen = set()
+    total = 0
+    def add(path):
+        nonlocal total
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            return
+        if (st.st_dev, st.st_ino) not in seen:
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    for path in paths:
+        if os.path.isfile(path):
+            add(path)
+            continue
+        for root, _, files in os.walk(path):
+            for name in files:
+                add(os.path.join(root, name))
+    return total
+
+def job_scratch_dir(scratch_dir, workspace):
+    """
+    Returns a job's directory in a shared scratch directory (e.g. a tmpfs), named after the
+    workspace so a resumed job finds its intermediates again.
+    """
+    workspace = os.path.abspath(workspace)
+    key = hashlib.sha1(workspace.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(scratch_dir, f'{os.path.basename(workspace)}-{key}')
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+class StorageManager:
+    """
+    Releases a job's intermediate files as soon as the last stage that reads them has
+    finished, and enforces the job's disk quota between stages.
+
+    The pipeline tells it, for each intermediate, which stage writes it and which stages
+    read it (track), and which stages have finished (stage_finished). Released outputs are
+    recorded in their stage's checkpoint, so a later run can bring them back if a stage
+    that reads them has to run again (see CheckpointStore.restore).
+    """
+
+    def __init__(self, checkpoints, roots, mode='delete', quota_bytes=None, archive_dir=None):
+        """
+        Args:
+            checkpoints (checkpoints.CheckpointStore): The job's checkpoint store.
+            roots (list): Directories whose files count against the quota (workspace, outputs, scratch).
+            mode (str, optional): One of INTERMEDIATE_MODES. Defaults to 'delete'.
+            quota_bytes (int, optional): Disk quota of the job. Defaults to None (no quota).
+            archive_dir (str, optional): Where 'compress' puts the archives. Required in that mode.
+        """
+        if mode not in INTERMEDIATE_MODES:
+            raise ValueError(f"Unknown intermediate mode '{mode}'. Valid modes: {', '.join(INTERMEDIATE_MODES)}")
+        self.checkpoints = checkpoints
+        self.roots = [root for root in roots if root]
+        self.mode = mode
+        self.quota_bytes = quota_bytes
+        self.archive_dir = archive_dir
+        self.artifacts = []
+        self.finished = set()
+        self.released_bytes = 0
+
+    def track(self, stage, paths, consumers):
+        """
+        Registers intermediates written by a stage.
+
+        Args:
+            stage (str): The stage that writes them.
+            paths (list): Files, directories or glob patterns.
+            consumers (list): The stages of this run that read them. With none, the files are
+                scratch data of the stage itself (e.g. depth maps), released when it finishes
+                and not needed to resume.
+        """
+        self.artifacts.append({'stage': stage, 'paths': list(paths), 'consumers': set(consumers)})
+
+    def check_quota(self, when):
+        """
+        Measures the job's disk usage and fails the job if it is over its quota.
+
+        Returns:
+            int: The usage in bytes.
+
+        Raises:
+            DiskQuotaExceeded: If the usage is over the quota.
+        """
+        usage = disk_usage(self.roots)
+        if self.quota_bytes is not None and usage > self.quota_bytes:
+            raise DiskQuotaExceeded(f"The job uses {format_size(usage)} of disk {when}, over its quota of "
+                                    f"{format_size(self.quota_bytes)}.")
+        return usage
+
+    def stage_finished(self, stage):
+        """
+        Releases the intermediates no remaining stage reads, then checks the quota.
+
+        Returns:
+            int: The job's disk usage in bytes after the release.
+        """
+        self.finished.add(stage)
+        for artifact in self.artifacts:
+            # Checked again after every stage: a stage that had to run again may have brought released files back.
+            # Outputs of a stage skipped by its checkpoint were released (or kept) by the run that wrote them.
+            if (artifact['stage'] in self.finished and artifact['stage'] in self.checkpoints.produced
+                    and artifact['consumers'] <= self.finished):
+                self._release(artifact)
+        return self.check_quota(f"after stage '{stage}'")
+
+    def _archive_path(self, artifact, path):
+        return os.path.join(self.archive_dir, f"{artifact['stage']}-{os.path.basename(path)}.tar.gz")
+
+    def _release(self, artifact):
+        if self.mode == 'keep':
+            return
+        released = (self.checkpoints.load(artifact['stage']) or {}).get('released') or {}
+        paths = [path for pattern in artifact['paths'] for path in sorted(glob.glob(pattern)) if path not in released]
+        if self.mode == 'compress':
+            # An empty directory never replaces an archive: it is not the output the archive holds
+            paths = [path for path in paths
+                     if not (os.path.isdir(path) and not os.listdir(path) and os.path.exists(self._archive_path(artifact, path)))]
+        if not paths:
+            return
+        size = disk_usage(paths)
+        for path in paths:
+            archive = None
+            if self.mode == 'compress':
+                os.makedirs(self.archive_dir, exist_ok=True)
+                archive = self._archive_path(artifact, path)
+                with tarfile.open(archive, 'w:gz', compresslevel=ARCHIVE_COMPRESS_LEVEL) as tar:
+                    tar.add(path, arcname=os.path.basename(path))
+            remove_path(path)
+            if artifact['consumers']:
+                self.checkpoints.release(artifact['stage'], path, archive)
+        self.released_bytes += size
+        verb = 'Compressed' if self.mode == 'compress' else 'Deleted'
+        print(f"{verb} {len(paths)} intermediate(s) of stage '{artifact['stage']}' ({format_size(size)}) "
+              f"no longer needed by the remaining stages")
+
+def main():
+    """
+    Command-line entry point: python storage.py workspace [other job directories...] [--quota 20G]
+    """
+    parser = argparse.ArgumentParser(description="Report the disk usage of a job's directories.")
+    parser.add_argument('paths', nargs='+', help='The job\'s workspace, output directory and scratch directory.')
+    parser.add_argument('--quota', type=parse_size, help='Exit with status 2 if the usage is over this size (e.g. 20G).')
+    args = parser.parse_args()
+
+    entries = {path: disk_usage([path]) for path in args.paths}
+    total = disk_usage(args.paths)
+    print(json.dumps({'paths': entries, 'total_bytes': total, 'total': format_size(total)}, indent=2))
+    if args.quota is not None and total > args.quota:
+        print(f"Over the quota of {format_size(args.quota)}", file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# The synthetic scene, in meters with +Z up: a textured cabinet-sized box standing on a
+# checkered floor disc, filmed by a camera orbiting it once over the whole video (a
+# turntable capture). The stand-in tools (fake_tools.py) build their sparse models, dense
+# clouds and meshes from the same scene so every stage sees consistent data.
+BOX_HALF_SIZE = np.array([0.3, 0.25, 0.45])
+BOX_CENTER = np.array([0.0, 0.0, 0.45])
+FLOOR_RADIUS = 2.5
+FLOOR_SQUARE = 0.2
+
+ORBIT_RADIUS = 3.0
+ORBIT_HEIGHT = 1.5
+LOOK_AT = np.array([0.0, 0.0, 0.4])
+
+# Focal length as a multiple of the longest image side: COLMAP's default prior for
+# images without EXIF data, so the stand-in mapper reports the focal the frames were rendered with
+FOCAL_FACTOR = 1.2
+
+LIGHT_DIRECTION = np.array([0.4, -0.3, 0.87]) / np.linalg.norm([0.4, -0.3, 0.87])
+AMBIENT = 0.35
+SKY_COLOR = np.array([200.0, 210.0, 225.0])
+
+# Size of the cells of the hashed noise on the box, in meters: gives SIFT-like corners
+# on every face, as real furniture texture does
+NOISE_CELL = 0.025
+
+DEFAULT_SIZE = '960x540'
+DEFAULT_SECONDS = 10
+DEFAULT_FPS = 12
+
+def camera_intrinsics(width, height):
+    """
+    Returns (focal, cx, cy) of the rendering camera, in pixels.
+    """
+    return FOCAL_FACTOR * max(width, height), width / 2.0, height / 2.0
+
+def camera_pose(angle):
+    """
+    World-to-camera pose of the orbiting camera at an azimuth (radians), in COLMAP's
+    convention (x right, y down, z forward).
+
+    Returns:
+        tuple: (R, t) with x_camera = R @ x_world + t.
+    """
+    center = np.array([ORBIT_RADIUS * np.cos(angle), ORBIT_RADIUS * np.sin(angle), ORBIT_HEIGHT])
+    forward = LOOK_AT - center
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    right /= np.linalg.norm(right)
+    down = np.cross(forward, right)
+    rotation = np.stack([right, down, forward])
+    return rotation, -rotation @ center
+
+def _hash(cells):
+    """
+    Deterministic pseudo-random value in [0, 1) per integer cell ((N, 3) array).
+    """
+    value = np.sin(cells @ np.array([12.9898, 78.233, 37.719])) * 43758.5453
+    return value - np.floor(value)
+
+def surface_color(points, normals):
+    """
+    Albedo of the scene at surface points: wood-like stripes and hashed noise on the box,
+    a checkerboard with noise on the floor.
+
+    Args:
+        points (numpy.ndarray): (N, 3) points on the box or the floor.
+        normals (numpy.ndarray): (N, 3) surface normals (the floor's is +Z).
+
+    Returns:
+        numpy.ndarray: (N, 3) float colors in 0-255.
+    """
+    on_floor = points[:, 2] < 1e-6
+    noise = _hash(np.floor(points / NOISE_CELL))
+    stripes = 0.5 + 0.5 * np.sin(60.0 * (points[:, 0] + points[:, 1]) + 8.0 * np.sin(7.0 * points[:, 2]))
+    facing = np.abs(normals) @ np.array([0.9, 1.0, 1.1])
+    box = np.array([150.0, 96.0, 58.0]) * (0.55 + 0.25 * stripes + 0.3 * noise)[:, None] * facing[:, None]
+
+    squares = np.floor(points[:, 0] / FLOOR_SQUARE) + np.floor(points[:, 1] / FLOOR_SQUARE)
+    checker = np.where(squares % 2 == 0, 0.9, 0.45)
+    floor = np.array([170.0, 170.0, 165.0]) * (checker * (0.8 + 0.2 * noise))[:, None]
+    return np.clip(np.where(on_floor[:, None], floor, box), 0, 255)
+
+def _intersect_box(origin, directions):
+    """
+    Ray/box slab intersection. Returns the hit distance (inf on a miss) and the hit normal per ray.
+    """
+    lower = BOX_CENTER - BOX_HALF_SIZE - origin
+    upper = BOX_CENTER + BOX_HALF_SIZE - origin
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / directions
+        near = np.minimum(lower * inverse, upper * inverse)
+        far = np.maximum(lower * inverse, upper * inverse)
+    entry = near.max(axis=1)
+    exit_ = far.min(axis=1)
+    hit = (entry <= exit_) & (entry > 0)
+    axis = near.argmax(axis=1)
+    normals = np.zeros_like(directions)
+    normals[np.arange(len(directions)), axis] = -np.sign(directions[np.arange(len(directions)), axis])
+    return np.where(hit, entry, np.inf), normals
+
+def render_frame(angle, width, height):
+    """
+    Renders the scene from the orbit camera at an azimuth (radians).
+
+    Returns:
+        numpy.ndarray: (height, width, 3) uint8 RGB image.
+    """
+    rotation, translation = camera_pose(angle)
+    origin = -rotation.T @ translation
+    focal, cx, cy = camera_intrinsics(width, height)
+    u, v = np.meshgrid(np.arange(width) + 0.5, np.arange(height) + 0.5)
+    rays = np.stack([(u - cx) / focal, (v - cy) / focal, np.ones_like(u)], axis=-1).reshape(-1, 3)
+    directions = rays @ rotation
+
+    box_distance, box_normals = _intersect_box(origin, directions)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        floor_distance = np.where(directions[:, 2] < 0, -origin[2] / directions[:, 2], np.inf)
+    floor_points = origin + directions * np.where(np.isfinite(floor_distance), floor_distance, 0)[:, None]
+    floor_distance[np.hypot(floor_points[:, 0], floor_points[:, 1]) > FLOOR_RADIUS] = np.inf
+
+    on_box = box_distance < floor_distance
+    distance = np.where(on_box, box_distance, floor_distance)
+    hit = np.isfinite(distance)
+    points = origin + directions * np.where(hit, distance, 0)[:, None]
+    points[~on_box, 2] = 0.0
+    normals = np.where(on_box[:, None], box_normals, [0.0, 0.0, 1.0])
+
+    shading = AMBIENT + (1 - AMBIENT) * np.clip(normals @ LIGHT_DIRECTION, 0, 1)
+    colors = surface_color(points, normals) * shading[:, None]
+    colors[~hit] = SKY_COLOR
+    return colors.reshape(height, width, 3).round().astype(np.uint8)
+
+def sample_surface(count, seed=0, floor_fraction=0.4):
+    """
+    Samples points uniformly on the visible box faces (all but the bottom) and the floor disc.
+
+    Returns:
+        tuple: (points, normals, colors) arrays of shape (count, 3); colors are uint8.
+    """
+    rng = np.random.default_rng(seed)
+    floor_count = int(count * floor_fraction)
+    box_count = count - floor_count
+
+    sx, sy, sz = BOX_HALF_SIZE * 2
+    # Faces: -X, +X, -Y, +Y, +Z, weighted by area
+    areas = np.array([sy * sz, sy * sz, sx * sz, sx * sz, sx * sy])
+    faces = rng.choice(5, size=box_count, p=areas / areas.sum())
+    local = rng.uniform(-1.0, 1.0, size=(box_count, 3))
+    axis = np.array([0, 0, 1, 1, 2])[faces]
+    sign = np.array([-1.0, 1.0, -1.0, 1.0, 1.0])[faces]
+    local[np.arange(box_count), axis] = sign
+    box_points = BOX_CENTER + local * BOX_HALF_SIZE
+    box_normals = np.zeros((box_count, 3))
+    box_normals[np.arange(box_count), axis] = sign
+
+    radius = FLOOR_RADIUS * np.sqrt(rng.uniform(0, 1, floor_count))
+    theta = rng.uniform(0, 2 * np.pi, floor_count)
+    floor_points = np.stack([radius * np.cos(theta), radius * np.sin(theta), np.zeros(floor_count)], axis=1)
+    # The box stands on this part of the floor
+    under_box = np.all(np.abs(floor_points[:, :2] - BOX_CENTER[:2]) < BOX_HALF_SIZE[:2], axis=1)
+    floor_points[under_box, :2] += (BOX_HALF_SIZE[:2] * 2) * np.sign(floor_points[under_box, :2] + 1e-9)
+    floor_normals = np.tile([0.0, 0.0, 1.0], (floor_count, 1))
+
+    points = np.concatenate([box_points, floor_points])
+    normals = np.concatenate([box_normals, floor_normals])
+    return points, normals, surface_color(points, normals).round().astype(np.uint8)
+
+def write_video(path, size=DEFAULT_SIZE, seconds=DEFAULT_SECONDS, fps=DEFAULT_FPS):
+    """
+    Renders one orbit around the scene and encodes it as an H.264 video with FFmpeg.
+
+    Args:
+        path (str): Output video path.
+        size (str, optional): Frame size as WIDTHxHEIGHT. Defaults to DEFAULT_SIZE.
+        seconds (float, optional): Video duration. Defaults to DEFAULT_SECONDS.
+        fps (int, optional): Frame rate. Defaults to DEFAULT_FPS.
+
+    Returns:
+        int: Number of frames rendered.
+    """
+    width, height = parse_size(size)
+    frames = max(2, int(round(seconds * fps)))
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', '18', '-g', str(fps * 2),
+        path
+    ]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for index in range(frames):
+            proc.stdin.write(render_frame(2 * np.pi * index / frames, width, height).tobytes())
+    finally:
+        proc.stdin.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"FFmpeg failed to encode the synthetic capture {path} (exit code {returncode}).")
+    return frames
+
+def parse_size(text):
+    """
+    Parses a frame size such as '960x540' into (width, height).
+    """
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid frame size '{text}'. Expected WIDTHxHEIGHT, e.g. 960x540.")
+    if width < 16 or height < 16 or width % 2 or height % 2:
+        raise ValueError(f"Invalid frame size '{text}'. Both sides must be even and at least 16 pixels.")
+    return width, height
+
+def main():
+    """
+    Command-line entry point: python synthetic_capture.py capture.mp4 [--size 960x540] [--seconds 12] [--fps 15]
+    """
+    parser = argparse.ArgumentParser(description="Render a synthetic turntable capture of a textured box for benchmarking.")
+    parser.add_argument('output', help='Output video path (.mp4).')
+    parser.add_argument('--size', default=DEFAULT_SIZE, help=f'Frame size (default: {DEFAULT_SIZE}).')
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS, help=f'Duration of the orbit (default: {DEFAULT_SECONDS}).')
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help=f'Frame rate (default: {DEFAULT_FPS}).')
+    args = parser.parse_args()
+
+    try:
+        started = time.monotonic()
+        frames = write_video(args.output, args.size, args.seconds, args.fps)
+    except (ValueError, RuntimeError, FileNotFoundError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Rendered {frames} frames to {args.output} in {time.monotonic() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+def _read_proc_io(pid):
+    """
+    Reads the I/O counters of a process from /proc/<pid>/io (Linux only).
+    Returns an empty dict where the file is unavailable.
+    """
+    try:
+        with open(f'/proc/{pid}/io', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return {}
+    return {
+        'read_bytes': int(fields.get('read_bytes', 0)),
+        'write_bytes': int(fields.get('write_bytes', 0)),
+        'rchar': int(fields.get('rchar', 0)),
+        'wchar': int(fields.get('wchar', 0)),
+    }
+
+def _wait_for_exit(proc):
+    """
+    Waits for a process to exit and returns its resource usage.
+
+    On POSIX the child is first waited for without being reaped (waitid with WNOWAIT),
+    so its /proc I/O counters can still be read, then reaped with wait4 to collect
+    its rusage. Elsewhere only the exit code is collected.
+    """
+    usage = {}
+    if not hasattr(os, 'wait4'):
+        proc.wait()
+        return usage
+    if hasattr(os, 'waitid'):
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        usage.update(_read_proc_io(proc.pid))
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_scale = 1 if sys.platform == 'darwin' else 1024
+    usage.update({
+        'user_cpu_seconds': round(rusage.ru_utime, 3),
+        'system_cpu_seconds': round(rusage.ru_stime, 3),
+        'max_rss_bytes': rusage.ru_maxrss * rss_scale,
+    })
+    return usage
+
+def run_monitored(command, cwd=None, capture_output=False, text=True, timeout=None, on_output=None):
+    """
+    Runs a command like subprocess.run(check=False) and measures its resource usage.
+
+    Args:
+        command (list): The command and its arguments.
+        cwd (str, optional): Working directory for the command. Defaults to None.
+        capture_output (bool, optional): Capture stdout and stderr. Defaults to False.
+        text (bool, optional): Decode captured output as text. Defaults to True.
+        timeout (float, optional): Kill the command after this many seconds. Defaults to None.
+        on_output (callable, optional): Streams the output instead: stdout and stderr are merged and
+            passed to it chunk by chunk (as bytes) while the command runs. Defaults to None.
+
+    Returns:
+        tuple: (subprocess.CompletedProcess, dict of wall time, CPU time, peak RSS and I/O bytes)
+
+    Raises:
+        subprocess.TimeoutExpired: If the command was killed because it exceeded the timeout.
+    """
+    if on_output is not None:
+        stdout, stderr = subprocess.PIPE, subprocess.STDOUT
+    else:
+        stdout = stderr = subprocess.PIPE if capture_output else None
+    started = time.monotonic()
+    proc = subprocess.Popen(command, cwd=cwd, stdout=stdout, stderr=stderr, text=text and on_output is None)
+
+    captured = {}
+    readers = []
+    if on_output is not None:
+        def stream():
+            for chunk in iter(lambda: proc.stdout.read1(65536), b''):
+                on_output(chunk)
+        readers.append(threading.Thread(target=stream, daemon=True))
+        readers[-1].start()
+    elif capture_output:
+        for name, stream in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+            reader = threading.Thread(target=lambda n=name, s=stream: captured.__setitem__(n, s.read()), daemon=True)
+            reader.start()
+            readers.append(reader)
+
+    timed_out = threading.Event()
+    timer = None
+    if timeout is not None:
+        def kill():
+            timed_out.set()
+            if not hasattr(os, 'wait4'):
+                proc.kill()
+                return
+            # Signal the child directly: Popen.kill() polls it first, which could reap it between
+            # the waitid and the wait4 in _wait_for_exit. Only the waiting thread reaps.
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(proc.pid, signal.SIGKILL)
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    try:
+        usage = _wait_for_exit(proc)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        for reader in readers:
+            reader.join()
+        for stream in (proc.stdout, proc.stderr):
+            if stream is not None:
+                stream.close()
+
+    usage['wall_seconds'] = round(time.monotonic() - started, 3)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout, captured.get('stdout'), captured.get('stderr'))
+    result = subprocess.CompletedProcess(command, proc.returncode, captured.get('stdout'), captured.get('stderr'))
+    return result, usage
+
+async def run_monitored_async(command, cwd=None, capture_output=False, text=True, timeout=None, on_output=None):
+    """
+    Asyncio counterpart of run_monitored (same arguments): runs a command on the running event
+    loop, killing it when it exceeds the timeout or when the awaiting task is cancelled.
+
+    The event loop's child watcher reaps the process, so only the wall time is measured
+    (no rusage or /proc I/O counters).
+
+    Returns:
+        tuple: (subprocess.CompletedProcess, dict with the wall time)
+
+    Raises:
+        subprocess.TimeoutExpired: If the command was killed because it exceeded the timeout.
+    """
+    if on_output is not None:
+        stdout, stderr = asyncio.subprocess.PIPE, asyncio.subprocess.STDOUT
+    else:
+        stdout = stderr = asyncio.subprocess.PIPE if capture_output else None
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(*command, cwd=cwd, stdout=stdout, stderr=stderr)
+
+    async def stream():
+        while True:
+            chunk = await proc.stdout.read(65536)
+            if not chunk:
+                break
+            on_output(chunk)
+        await proc.wait()
+        return None, None
+
+    try:
+        stdout, stderr = await asyncio.wait_for(stream() if on_output is not None else proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        raise subprocess.TimeoutExpired(command, timeout)
+    if text:
+        stdout = stdout.decode(errors='replace') if stdout is not None else None
+        stderr = stderr.decode(errors='replace') if stderr is not None else None
+    usage = {'wall_seconds': round(time.monotonic() - started, 3)}
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr), usage
+
+class JobTrace:
+    """
+    Collects per-stage timings and per-command resource usage for one pipeline job
+    and writes them as a single JSON document.
+    """
+
+    def __init__(self, job_id, **metadata):
+        self.job = {'job_id': job_id, 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), **metadata}
+        self.stages = []
+        self._current = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Context manager that times a stage; commands recorded inside it are attributed to it.
+        """
+        record = {'stage': name, 'status': 'ran', 'commands': [], 'steps': []}
+        with self._lock:
+            self.stages.append(record)
+        previous, self._current = self._current, record
+        started = time.monotonic()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'failed'
+            raise
+        finally:
+            record['wall_seconds'] = round(time.monotonic() - started, 3)
+            self._current = previous
+
+    def record_command(self, command, returncode, usage):
+        """
+        Adds one subprocess's resource usage to the current stage.
+        """
+        entry = {'command': os.path.basename(command[0]), 'args': command[1:], 'returncode': returncode, **usage}
+        with self._lock:
+            if self._current is None:
+                self._current = {'stage': 'unstaged', 'status': 'ran', 'commands': [], 'steps': []}
+                self.stages.append(self._current)
+            self._current['commands'].append(entry)
+
+    def record_steps(self, steps):
+        """
+        Adds sub-step timings (e.g. from the Blender cleanup script) to the current stage.
+        """
+        if self._current is not None:
+            self._current['steps'].extend(steps)
+
+    def to_dict(self):
+        return {'job': self.job, 'stages': self.stages}
+
+    def save(self, path, status, error=None):
+        """
+        Writes the trace as JSON, recording the job's final status.
+        """
+        self.job.update({
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'status': status,
+            'error': error,
+        })
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+# --- Aggregation across jobs ---
+
+SUMMARY_METRICS = ['wall_seconds', 'cpu_seconds', 'max_rss_bytes', 'read_bytes', 'write_bytes']
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+def percentile(values, pct):
+    """
+    Linear-interpolated percentile of a non-empty list of numbers.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def _trace_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, '**', '*.json'), recursive=True))
+        else:
+            yield path
+
+def collect_stage_samples(paths):
+    """
+    Reads job traces and returns {stage or stage/step: {metric: [values]}} over the stages that ran.
+    """
+    samples = {}
+    def add(key, metric, value):
+        if value is not None:
+            samples.setdefault(key, {}).setdefault(metric, []).append(value)
+
+    for path in _trace_files(paths):
+        with open(path, 'r') as f:
+            trace = json.load(f)
+        for stage in trace.get('stages', []):
+            if stage.get('status') != 'ran':
+                continue
+            key = stage['stage']
+            commands = stage.get('commands', [])
+            add(key, 'runs', 1)
+            add(key, 'wall_seconds', stage.get('wall_seconds'))
+            if commands and all('user_cpu_seconds' in c for c in commands):
+                add(key, 'cpu_seconds', sum(c['user_cpu_seconds'] + c['system_cpu_seconds'] for c in commands))
+            if commands and all('max_rss_bytes' in c for c in commands):
+                add(key, 'max_rss_bytes', max(c['max_rss_bytes'] for c in commands))
+            for metric in ('read_bytes', 'write_bytes'):
+                if commands and all(metric in c for c in commands):
+                    add(key, metric, sum(c[metric] for c in commands))
+            for step in stage.get('steps', []):
+                add(f"{key}/{step['step']}", 'runs', 1)
+                add(f"{key}/{step['step']}", 'wall_seconds', step.get('wall_seconds'))
+    return samples
+
+def summarize(paths):
+    """
+    Aggregates job traces into per-stage percentiles.
+
+    Returns:
+        dict: {stage: {'runs': n, metric: {'p50': ..., 'p90': ..., 'p99': ..., 'max': ...}}}
+    """
+    summary = {}
+    for key, metrics in collect_stage_samples(paths).items():
+        entry = {'runs': len(metrics['runs'])}
+        for metric in SUMMARY_METRICS:
+            values = metrics.get(metric)
+            if values:
+                entry[metric] = {f'p{p}': round(percentile(values, p), 3) for p in SUMMARY_PERCENTILES}
+                entry[metric]['max'] = max(values)
+        summary[key] = entry
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<36}{'runs':>6}{'wall p50':>10}{'wall p90':>10}{'wall p99':>10}{'cpu p50':>10}{'rss p90 MB':>12}")
+    for key in sorted(summary, key=lambda k: -summary[k].get('wall_seconds', {}).get('p50', 0)):
+        entry = summary[key]
+        wall = entry.get('wall_seconds', {})
+        cpu = entry.get('cpu_seconds', {})
+        rss = entry.get('max_rss_bytes', {})
+        print(f"{key:<36}{entry['runs']:>6}"
+              f"{wall.get('p50', 0):>10.1f}{wall.get('p90', 0):>10.1f}{wall.get('p99', 0):>10.1f}"
+              f"{cpu.get('p50', 0):>10.1f}{rss.get('p90', 0) / 2 ** 20:>12.1f}")
+
+def main():
+    """
+    Command-line entry point: python telemetry.py summarize <trace files or directories>
+    """
+    parser = argparse.ArgumentParser(description="Aggregate photogrammetry job traces into per-stage percentiles.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summarize_parser = subparsers.add_parser('summarize', help='Summarize job traces.')
+    summarize_parser.add_argument('paths', nargs='+', help='Trace JSON files or directories containing them.')
+    summarize_parser.add_argument('--json', action='store_true', help='Print the summary as JSON.')
+    args = parser.parse_args()
+
+    summary = summarize(args.paths)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import os
+import tarfile
+import time
+
+import pytest
+
+from checkpoints import CheckpointStore
+
+STAGES = ['frames', 'sfm', 'mvs']
+
+
+class Pipeline:
+    """
+    Three chained stages that each write one file from their input and parameters, and record when they ran.
+    """
+
+    def __init__(self, workspace, video):
+        self.workspace = workspace
+        self.video = video
+        self.ran = []
+
+    def path(self, stage):
+        return os.path.join(self.workspace, f'{stage}.txt')
+
+    def stage(self, stage, source, params=None):
+        def run():
+            self.ran.append(stage)
+            with open(source, 'r') as f:
+                text = f.read()
+            with open(self.path(stage), 'w') as f:
+                f.write(f'{stage}{sorted((params or {}).values())}({text})')
+        return run
+
+    def run(self, params=None, **options):
+        params = params or {}
+        store = CheckpointStore(self.workspace, STAGES, **options)
+        self.ran = []
+        frames_params = {'fps': params.get('fps', 4)}
+        sfm_params = {'matcher': params.get('matcher', 'sequential')}
+        store.run('frames', self.stage('frames', self.video, frames_params), inputs=[self.video],
+                  params=frames_params, outputs=[self.path('frames')])
+        store.run('sfm', self.stage('sfm', self.path('frames'), sfm_params), params=sfm_params,
+                  deps=['frames'], outputs=[self.path('sfm')])
+        store.run('mvs', self.stage('mvs', self.path('sfm')), deps=['sfm'], outputs=[self.path('mvs')])
+        return store
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    video = tmp_path / 'video.mp4'
+    video.write_text('v1')
+    workspace = tmp_path / 'workspace'
+    workspace.mkdir()
+    pipeline = Pipeline(str(workspace), str(video))
+    pipeline.run()
+    assert pipeline.ran == STAGES
+    return pipeline
+
+
+def test_unchanged_run_skips_every_stage(pipeline):
+    pipeline.run()
+    assert pipeline.ran == []
+
+
+def test_changed_input_invalidates_everything_downstream(pipeline):
+    time.sleep(0.01)
+    with open(pipeline.video, 'w') as f:
+        f.write('v2')
+    pipeline.run()
+    assert pipeline.ran == STAGES
+    with open(pipeline.path('mvs')) as f:
+        assert f.read() == "mvs[](sfm['sequential'](frames[4](v2)))"
+
+
+def test_input_rewritten_with_the_same_contents_is_not_a_change(pipeline):
+    time.sleep(0.01)
+    with open(pipeline.video, 'w') as f:
+        f.write('v1')
+    pipeline.run()
+    assert pipeline.ran == []
+
+
+def test_changed_params_invalidate_the_stage_and_downstream(pipeline):
+    pipeline.run(params={'matcher': 'exhaustive'})
+    assert pipeline.ran == ['sfm', 'mvs']
+    pipeline.run(params={'matcher': 'exhaustive'})
+    assert pipeline.ran == []
+    pipeline.run(params={'matcher': 'exhaustive', 'fps': 2})
+    assert pipeline.ran == STAGES
+
+
+def test_upstream_output_with_the_same_contents_keeps_downstream(pipeline):
+    # A stage re-run by --force that writes the same output leaves later stages valid
+    pipeline.run(force=['frames'])
+    assert pipeline.ran == ['frames']
+
+
+def test_changed_or_missing_output_reruns_the_stage(pipeline):
+    time.sleep(0.01)
+    with open(pipeline.path('sfm'), 'w') as f:
+        f.write('edited')
+    pipeline.run()
+    assert pipeline.ran == ['sfm']
+    os.remove(pipeline.path('mvs'))
+    pipeline.run()
+    assert pipeline.ran == ['mvs']
+
+
+def test_resume_from(pipeline):
+    pipeline.run(resume_from='sfm')
+    assert pipeline.ran == ['sfm', 'mvs']
+    os.remove(pipeline.path('frames'))
+    with pytest.raises(RuntimeError, match='Cannot resume'):
+        pipeline.run(resume_from='sfm')
+    with pytest.raises(ValueError):
+        CheckpointStore(pipeline.workspace, STAGES, resume_from='textures')
+
+
+def test_missing_output_fails_the_stage(tmp_path):
+    store = CheckpointStore(str(tmp_path), STAGES)
+    with pytest.raises(FileNotFoundError):
+        store.run('frames', lambda: None, outputs=[str(tmp_path / 'frame_*.jpg')])
+    assert store.load('frames') is None
+
+
+def test_released_outputs(pipeline):
+    # A deleted output does not invalidate its stage until a stage that reads it runs
+    store = CheckpointStore(pipeline.workspace, STAGES)
+    os.remove(pipeline.path('frames'))
+    store.release('frames', pipeline.path('frames'))
+    pipeline.run()
+    assert pipeline.ran == []
+    pipeline.run(force=['sfm'])
+    assert pipeline.ran == ['frames', 'sfm']
+
+    # An archived output is extracted instead of re-running its stage
+    archive = os.path.join(pipeline.workspace, 'sfm.tar')
+    with tarfile.open(archive, 'w') as tar:
+        tar.add(pipeline.path('sfm'), arcname='sfm.txt')
+    os.remove(pipeline.path('sfm'))
+    store.release('sfm', pipeline.path('sfm'), archive=archive)
+    pipeline.run(force=['mvs'])
+    assert pipeline.ran == ['mvs']
+    assert os.path.exists(pipeline.path('sfm')) and not os.path.exists(archive)
@@ -0,0 +1,176 @@
+import struct
+
+import numpy as np
+import pytest
+
+import colmap_model
+
+# A record head as COLMAP writes it: point3D_id, xyz, rgb, error, track_length
+HEAD = struct.Struct('<Q3d3BdQ')
+
+
+def fake_records(length):
+    """
+    Returns length track elements' worth of bytes that read as a chain of valid records
+    (plausible error, track length 1), so segment starts guessed inside a track go wrong.
+    """
+    record = HEAD.pack(7, 0.5, -1.0, 2.0, 10, 20, 30, 0.25, 1) + struct.pack('<ii', 3, 4)
+    return (record * (8 * length // len(record) + 1))[:8 * length]
+
+
+def make_points(rng, count, max_length, mimic=False, long_tracks=()):
+    """
+    Returns random points as (point3D_id, xyz, rgb, error, track) tuples, track being a list
+    of (image_id, point2D_idx), or a bytes payload when mimic is set.
+    """
+    lengths = rng.integers(1, max_length + 1, count)
+    for index, length in long_tracks:
+        lengths[index] = length
+    errors = rng.gamma(2.0, 0.4, count)
+    errors[rng.random(count) < 0.1] = -1.0
+    errors[rng.random(count) < 0.02] = 0.0
+    points = []
+    for i, length in enumerate(lengths):
+        length = int(length)
+        if mimic:
+            track = fake_records(length)
+        else:
+            track = [tuple(element) for element in rng.integers(-5, 5000, (length, 2)).tolist()]
+        points.append((i + 1, tuple(rng.normal(size=3)), tuple(rng.integers(0, 256, 3).tolist()),
+                       float(errors[i]), track))
+    return points
+
+
+def write_reference(points, path):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(points)))
+        for point3D_id, xyz, rgb, error, track in points:
+            length = len(track) // 8 if isinstance(track, bytes) else len(track)
+            f.write(HEAD.pack(point3D_id, *xyz, *rgb, error, length))
+            if isinstance(track, bytes):
+                f.write(track)
+            else:
+                f.write(b''.join(struct.pack('<ii', *element) for element in track))
+
+
+def read_reference(path):
+    """
+    Parses points3D.bin record by record. Returns (offsets, points), tracks as (length, 2) arrays.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = struct.unpack_from('<Q', data, 0)[0]
+    offsets, points = [], []
+    offset = 8
+    for _ in range(count):
+        offsets.append(offset)
+        point3D_id, x, y, z, r, g, b, error, length = HEAD.unpack_from(data, offset)
+        offset += HEAD.size
+        track = np.frombuffer(data, '<i4', 2 * length, offset).reshape(-1, 2)
+        offset += 8 * length
+        points.append((point3D_id, (x, y, z), (r, g, b), error, track))
+    assert offset == len(data)
+    return np.array(offsets), points
+
+
+def assert_matches_reference(path):
+    offsets, reference = read_reference(path)
+    points3D, tracks, track_offsets = colmap_model.read_points3D_binary(path, include_tracks=True)
+    assert len(points3D) == len(reference)
+    np.testing.assert_array_equal(points3D['point3D_id'], [point[0] for point in reference])
+    np.testing.assert_array_equal(points3D['xyz'], [point[1] for point in reference])
+    np.testing.assert_array_equal(points3D['rgb'], [point[2] for point in reference])
+    np.testing.assert_array_equal(points3D['error'], [point[3] for point in reference])
+    np.testing.assert_array_equal(points3D['track_length'], [len(point[4]) for point in reference])
+    np.testing.assert_array_equal(np.diff(track_offsets), points3D['track_length'])
+    expected = np.concatenate([point[4] for point in reference])
+    np.testing.assert_array_equal(tracks['image_id'], expected[:, 0])
+    np.testing.assert_array_equal(tracks['point2D_idx'], expected[:, 1])
+    return offsets
+
+
+@pytest.mark.parametrize('count, max_length, mimic, long_tracks', [
+    (1, 5, False, ()),
+    (50, 30, False, ()),
+    (5000, 12, False, ()),
+    (5000, 40, True, ()),
+    # Records longer than a whole segment of ordinary ones
+    (5000, 8, False, [(10, 9000), (3000, 20000)]),
+    (5000, 20, True, [(2500, 12000)]),
+])
+def test_read_points3D_matches_reference(tmp_path, count, max_length, mimic, long_tracks):
+    path = str(tmp_path / 'points3D.bin')
+    write_reference(make_points(np.random.default_rng(count + max_length), count, max_length,
+                                mimic=mimic, long_tracks=long_tracks), path)
+    assert_matches_reference(path)
+
+
+@pytest.mark.parametrize('mimic', [False, True])
+@pytest.mark.parametrize('segment_records, window', [(1024, 512), (8, 64), (3, 16)])
+def test_record_offsets_match_reference(tmp_path, monkeypatch, mimic, segment_records, window):
+    monkeypatch.setattr(colmap_model, 'SCAN_SEGMENT_RECORDS', segment_records)
+    monkeypatch.setattr(colmap_model, 'SCAN_WINDOW', window)
+    path = str(tmp_path / 'points3D.bin')
+    write_reference(make_points(np.random.default_rng(segment_records), 4000, 25, mimic=mimic), path)
+    reference = assert_matches_reference(path)
+
+    buffer = colmap_model._map_file(path)
+    count, observations = colmap_model.points3D_binary_counts(buffer)
+    offsets = colmap_model._point3D_record_offsets(buffer, count, observations)
+    np.testing.assert_array_equal(offsets, reference)
+
+
+def test_payload_of_headers_alone(tmp_path, monkeypatch):
+    # Every segment start is guessed inside a track made of valid-looking records
+    monkeypatch.setattr(colmap_model, 'SCAN_SEGMENT_RECORDS', 4)
+    points = make_points(np.random.default_rng(1), 600, 1, mimic=True,
+                         long_tracks=[(i, 30 + i % 47) for i in range(0, 600, 2)])
+    path = str(tmp_path / 'points3D.bin')
+    write_reference(points, path)
+    reference = assert_matches_reference(path)
+
+    buffer = colmap_model._map_file(path)
+    offsets = colmap_model._point3D_record_offsets(buffer, *colmap_model.points3D_binary_counts(buffer))
+    np.testing.assert_array_equal(offsets, reference)
+
+
+def test_write_points3D_round_trip(tmp_path):
+    source = str(tmp_path / 'source.bin')
+    write_reference(make_points(np.random.default_rng(2), 3000, 15), source)
+    points3D, tracks, track_offsets = colmap_model.read_points3D_binary(source, include_tracks=True)
+    model = colmap_model.ColmapModel(None, None, None, None, None, points3D, tracks, track_offsets)
+    copy = str(tmp_path / 'copy.bin')
+    colmap_model.write_points3D_binary(model, copy)
+    with open(source, 'rb') as f, open(copy, 'rb') as g:
+        assert f.read() == g.read()
+
+
+def test_records_that_do_not_tile_the_file(tmp_path):
+    path = str(tmp_path / 'points3D.bin')
+    points = make_points(np.random.default_rng(3), 3000, 10)
+    write_reference(points, path)
+    # The file size still fits the point count, but the records after this one are misread
+    with open(path, 'r+b') as f:
+        f.seek(read_reference(path)[0][1500] + 43)
+        f.write(struct.pack('<Q', len(points[1500][4]) + 1))
+    with pytest.raises(ValueError):
+        colmap_model.read_points3D_binary(path)
+
+
+def test_counts_without_reading_points(tmp_path):
+    rng = np.random.default_rng(4)
+    points = make_points(rng, 2500, 9)
+    write_reference(points, str(tmp_path / 'points3D.bin'))
+    colmap_model.write_cameras_binary(np.zeros(0, dtype=colmap_model.CAMERA_DTYPE), str(tmp_path / 'cameras.bin'))
+    with open(tmp_path / 'images.bin', 'wb') as f:
+        f.write(struct.pack('<Q', 0))
+
+    model = colmap_model.read_model(str(tmp_path), include_points=False)
+    assert model.points3D is None
+    assert model.point_counts == (2500, sum(len(point[4]) for point in points))
+    assert model.point_counts == colmap_model.read_model(str(tmp_path)).point_counts
+
+    with open(tmp_path / 'points3D.bin', 'ab') as f:
+        f.write(b'\x00' * 3)
+    with pytest.raises(ValueError):
+        colmap_model.read_model(str(tmp_path), include_points=False)
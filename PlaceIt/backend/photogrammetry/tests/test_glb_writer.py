@@ -0,0 +1,283 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import glb_writer
+import obj_io
+
+
+def sphere_mesh(rings=12, segments=16, seams=True):
+    """
+    Returns a closed UV sphere. With seams, every face corner has its own UV (so positions
+    are shared between faces but UVs are not), and the faces alternate between two materials.
+    """
+    theta = np.linspace(0, np.pi, rings + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    ring = np.stack([np.outer(np.sin(theta), np.cos(phi)).ravel(), np.outer(np.sin(theta), np.sin(phi)).ravel(),
+                     np.repeat(np.cos(theta), segments)], axis=1)
+    positions = np.concatenate([[[0, 0, 1]], ring, [[0, 0, -1]]])
+    south = len(positions) - 1
+    index = lambda r, s: 1 + r * segments + s % segments
+    faces = [[0, index(0, s), index(0, s + 1)] for s in range(segments)]
+    for r in range(rings - 2):
+        for s in range(segments):
+            faces.append([index(r, s), index(r + 1, s), index(r + 1, s + 1)])
+            faces.append([index(r, s), index(r + 1, s + 1), index(r, s + 1)])
+    faces += [[south, index(rings - 2, s + 1), index(rings - 2, s)] for s in range(segments)]
+    faces = np.array(faces)
+    uvs = face_uvs = None
+    if seams:
+        uvs = np.random.default_rng(1).random((3 * len(faces), 2))
+        face_uvs = np.arange(3 * len(faces)).reshape(-1, 3)
+    return obj_io.Mesh(positions.astype(np.float32), faces.astype(np.uint32),
+                       uvs=None if uvs is None else uvs.astype(np.float32),
+                       face_uvs=None if face_uvs is None else face_uvs.astype(np.uint32),
+                       face_materials=(np.arange(len(faces)) % 2).astype(np.int32),
+                       material_names=['a', 'b'])
+
+
+MATERIALS = {'a': {'Kd': [1.0, 0.5, 0.25], 'd': 1.0, 'map_Kd': None},
+             'b': {'Kd': [0.2, 0.4, 0.6], 'd': 0.5, 'map_Kd': None}}
+
+
+def canonical_triangles(corners):
+    """
+    Sorts (F, 3, K) per-corner values into a comparable order, keeping each triangle's
+    winding by rotating its smallest corner first.
+    """
+    corners = np.round(np.asarray(corners, dtype=np.float64), 4)
+    rotated = []
+    for triangle in corners:
+        first = min(range(3), key=lambda i: tuple(triangle[i]))
+        rotated.append(np.roll(triangle, -first, axis=0))
+    rotated = np.array(rotated).reshape(len(corners), -1)
+    return rotated[np.lexsort(rotated.T[::-1])]
+
+
+def source_triangles(mesh, material=None):
+    keep = slice(None) if material is None else mesh.face_materials == material
+    values = [mesh.positions[mesh.faces[keep]] * glb_writer.UPRIGHT_AXES]
+    if mesh.face_uvs is not None:
+        uvs = mesh.uvs[mesh.face_uvs[keep]].copy()
+        uvs[..., 1] = 1.0 - uvs[..., 1]
+        values.append(uvs)
+    return canonical_triangles(np.concatenate(values, axis=2))
+
+
+def node_positions(document, binary, node):
+    # A node's mesh positions in the node's space (dequantized by its transform)
+    positions = glb_writer.read_accessor(document, binary, document['meshes'][node['mesh']]['primitives'][0]['attributes']['POSITION'])
+    return positions * node.get('scale', [1, 1, 1]) + node.get('translation', [0, 0, 0])
+
+
+def primitive_triangles(document, binary, primitive, positions):
+    indices = glb_writer.read_accessor(document, binary, primitive['indices']).reshape(-1, 3)
+    values = [positions[indices]]
+    if 'TEXCOORD_0' in primitive['attributes']:
+        values.append(glb_writer.read_accessor(document, binary, primitive['attributes']['TEXCOORD_0'])[indices])
+    return canonical_triangles(np.concatenate(values, axis=2))
+
+
+def check_structure(path):
+    """
+    Checks the GLB container and the glTF references, and returns (document, binary).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from('<III', data)
+    assert (magic, version, length) == (glb_writer.GLB_MAGIC, 2, len(data))
+    json_length, json_type = struct.unpack_from('<II', data, 12)
+    assert json_type == glb_writer.CHUNK_JSON and json_length % 4 == 0
+    assert json.loads(data[20:20 + json_length]) is not None
+    bin_length, bin_type = struct.unpack_from('<II', data, 20 + json_length)
+    assert bin_type == glb_writer.CHUNK_BIN and bin_length % 4 == 0
+    assert 28 + json_length + bin_length == len(data)
+
+    document, binary = glb_writer.read_glb(path)
+    assert document['asset']['version'] == '2.0'
+    assert document['buffers'] == [{'byteLength': len(binary)}]
+    for view in document['bufferViews']:
+        assert view.get('byteOffset', 0) % 4 == 0
+        assert view.get('byteOffset', 0) + view['byteLength'] <= len(binary)
+    for accessor in document['accessors']:
+        view = document['bufferViews'][accessor['bufferView']]
+        dtype = glb_writer.COMPONENT_DTYPES[accessor['componentType']]
+        components = glb_writer.ACCESSOR_COMPONENTS[accessor['type']]
+        stride = view.get('byteStride', dtype.itemsize * components)
+        assert accessor.get('byteOffset', 0) % dtype.itemsize == 0
+        assert accessor.get('byteOffset', 0) + stride * (accessor['count'] - 1) + dtype.itemsize * components <= view['byteLength']
+        if view.get('target') == glb_writer.ARRAY_BUFFER:
+            assert stride % 4 == 0
+    for mesh in document['meshes']:
+        for primitive in mesh['primitives']:
+            counts = {document['accessors'][index]['count'] for index in primitive['attributes'].values()}
+            assert len(counts) == 1
+            indices = glb_writer.read_accessor(document, binary, primitive['indices'])
+            assert indices.max() < counts.pop()
+            position = document['accessors'][primitive['attributes']['POSITION']]
+            assert 'min' in position and 'max' in position
+            assert primitive.get('material', 0) < len(document.get('materials', [None]))
+    for node in document['nodes']:
+        assert node.get('mesh', 0) < len(document['meshes'])
+    assert all(node < len(document['nodes']) for node in document['scenes'][0]['nodes'])
+    for name in document.get('extensionsRequired', []):
+        assert name in document['extensionsUsed']
+    return document, binary
+
+
+@pytest.mark.parametrize('optimize', [True, False])
+@pytest.mark.parametrize('seams', [True, False])
+def test_write_mesh_glb(tmp_path, optimize, seams):
+    mesh = sphere_mesh(seams=seams)
+    path = str(tmp_path / 'model.glb')
+    report = []
+    size = glb_writer.write_mesh_glb(mesh, path, materials=MATERIALS, optimize=optimize, report=report)
+    document, binary = check_structure(path)
+
+    assert size == len(open(path, 'rb').read())
+    assert 'extensionsUsed' not in document
+    [node] = [document['nodes'][index] for index in document['scenes'][0]['nodes']]
+    assert 'translation' not in node and 'scale' not in node
+    primitives = document['meshes'][node['mesh']]['primitives']
+    assert [document['materials'][primitive['material']]['name'] for primitive in primitives] == ['a', 'b']
+    assert document['materials'][primitives[1]['material']]['pbrMetallicRoughness']['baseColorFactor'] == [0.2, 0.4, 0.6, 0.5]
+    positions = node_positions(document, binary, node)
+    for material, primitive in enumerate(primitives):
+        np.testing.assert_allclose(primitive_triangles(document, binary, primitive, positions),
+                                   source_triangles(mesh, material), atol=1e-4)
+    assert report[0]['triangles'] == mesh.face_count
+
+
+def test_quantized_glb(tmp_path):
+    mesh = sphere_mesh()
+    mesh.uvs = mesh.uvs * 0.5 + 0.25
+    path = str(tmp_path / 'model.glb')
+    glb_writer.write_mesh_glb(mesh, path, materials=MATERIALS, quantize=True)
+    document, binary = check_structure(path)
+
+    assert document['extensionsRequired'] == ['KHR_mesh_quantization']
+    [node] = document['nodes']
+    attributes = document['meshes'][0]['primitives'][0]['attributes']
+    component = lambda name: document['accessors'][attributes[name]]['componentType']
+    assert component('POSITION') == 5123 and component('NORMAL') == 5120 and component('TEXCOORD_0') == 5123
+    assert document['accessors'][attributes['NORMAL']]['normalized']
+    assert len(node['scale']) == 3 and len(set(node['scale'])) == 1
+
+    # Dequantized positions are within half a quantization step, UVs within one 16-bit step
+    step = node['scale'][0]
+    positions = node_positions(document, binary, node)
+    for material, primitive in enumerate(document['meshes'][0]['primitives']):
+        triangles = primitive_triangles(document, binary, primitive, positions)
+        expected = source_triangles(mesh, material)
+        assert triangles.shape == expected.shape
+        np.testing.assert_allclose(triangles, expected, atol=max(step, 2 / 65535) + 1e-4)
+    normals = glb_writer.read_accessor(document, binary, attributes['NORMAL'])
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1.0, atol=0.02)
+
+
+def test_tiled_uvs_stay_float_when_quantized(tmp_path):
+    mesh = sphere_mesh()
+    mesh.uvs = mesh.uvs * 3.0
+    path = str(tmp_path / 'model.glb')
+    glb_writer.write_mesh_glb(mesh, path, quantize=True)
+    document, _ = check_structure(path)
+    attributes = document['meshes'][0]['primitives'][0]['attributes']
+    assert document['accessors'][attributes['TEXCOORD_0']]['componentType'] == 5126
+
+
+@pytest.mark.parametrize('quantize', [False, True])
+def test_msft_lod_glb(tmp_path, quantize):
+    levels = [sphere_mesh(rings=16, segments=24), sphere_mesh(rings=8, segments=12), sphere_mesh(rings=4, segments=6)]
+    levels[2].positions = levels[2].positions * 2.0
+    path = str(tmp_path / 'model.glb')
+    assert glb_writer.write_lod_glbs(levels, path, materials=MATERIALS, lod_format='msft_lod', quantize=quantize) == [path]
+    document, binary = check_structure(path)
+
+    assert sorted(document['extensionsUsed']) == (['KHR_mesh_quantization', 'MSFT_lod'] if quantize else ['MSFT_lod'])
+    assert 'MSFT_lod' not in document.get('extensionsRequired', [])
+    # Only the finest level is in the scene; it lists the coarser nodes, finest first
+    [root] = document['scenes'][0]['nodes']
+    node = document['nodes'][root]
+    lod_nodes = [node] + [document['nodes'][index] for index in node['extensions']['MSFT_lod']['ids']]
+    assert len(lod_nodes) == 3 and all(index != root for index in node['extensions']['MSFT_lod']['ids'])
+    for level, lod_node in zip(levels, lod_nodes):
+        primitives = document['meshes'][lod_node['mesh']]['primitives']
+        assert sum(document['accessors'][primitive['indices']]['count'] for primitive in primitives) == 3 * level.face_count
+        extent = np.ptp(node_positions(document, binary, lod_node), axis=0)
+        np.testing.assert_allclose(extent, np.ptp(level.positions, axis=0), atol=1e-3)
+
+
+def test_separate_lod_glbs(tmp_path):
+    levels = [sphere_mesh(rings=8), sphere_mesh(rings=4)]
+    path = str(tmp_path / 'model.glb')
+    paths = glb_writer.write_lod_glbs(levels, path, lod_format='separate')
+    assert paths == glb_writer.lod_glb_paths(path, 2) == [path, str(tmp_path / 'model_lod1.glb')]
+    for level, level_path in zip(levels, paths):
+        document, _ = check_structure(level_path)
+        assert 'extensionsUsed' not in document
+        primitives = document['meshes'][0]['primitives']
+        assert sum(document['accessors'][primitive['indices']]['count'] for primitive in primitives) == 3 * level.face_count
+    with pytest.raises(ValueError):
+        glb_writer.write_lod_glbs(levels, path, lod_format='gltf')
+
+
+@pytest.mark.parametrize('seams', [True, False])
+def test_deindex(seams):
+    mesh = sphere_mesh(seams=seams)
+    mesh.faces = mesh.faces[::-1]
+    if seams:
+        # Some corners share a UV as well as a position, so some pairs repeat
+        mesh.face_uvs = mesh.face_uvs[::-1] % 50
+    position_index, uv_index, indices = glb_writer.deindex(mesh)
+
+    assert indices.dtype == np.uint32 and indices.shape == mesh.faces.shape
+    np.testing.assert_array_equal(position_index[indices], mesh.faces)
+    if seams:
+        np.testing.assert_array_equal(uv_index[indices], mesh.face_uvs)
+        pairs = set(zip(mesh.faces.ravel().tolist(), mesh.face_uvs.ravel().tolist()))
+    else:
+        assert uv_index is None
+        pairs = set(mesh.faces.ravel().tolist())
+    # One vertex per distinct (position, UV) pair, each used
+    assert len(position_index) == len(pairs)
+    assert len(np.unique(indices)) == len(position_index)
+
+
+def test_vertex_normals(monkeypatch):
+    mesh = sphere_mesh()
+    positions = mesh.positions.astype(np.float64) * [1.0, 2.0, 0.5]
+    faces = mesh.faces.astype(np.int64)
+    expected = np.zeros((len(positions), 3))
+    for face in faces:
+        normal = np.cross(positions[face[1]] - positions[face[0]], positions[face[2]] - positions[face[0]])
+        for corner in face:
+            expected[corner] += normal
+    expected /= np.linalg.norm(expected, axis=1)[:, None]
+
+    normals = glb_writer.vertex_normals(positions, faces)
+    assert normals.dtype == np.float32
+    np.testing.assert_allclose(normals, expected, atol=1e-5)
+    # On a closed convex surface the normals point outwards
+    assert (np.einsum('ij,ij->i', normals, positions) > 0).all()
+    monkeypatch.setattr(glb_writer, 'NORMAL_BLOCK_FACES', 7)
+    np.testing.assert_allclose(glb_writer.vertex_normals(positions, faces), normals, atol=1e-6)
+
+
+def test_vertex_normals_of_unused_and_degenerate_vertices():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [5, 5, 5], [2, 0, 0]], dtype=np.float64)
+    faces = np.array([[0, 1, 2], [0, 1, 4]])
+    normals = glb_writer.vertex_normals(positions, faces)
+    np.testing.assert_allclose(normals[:3], [[0, 0, 1]] * 3)
+    # No face area: the default normal
+    np.testing.assert_allclose(normals[3:], [[0, 0, 1]] * 2)
+
+
+def test_read_glb_rejects_other_files(tmp_path):
+    path = tmp_path / 'model.glb'
+    path.write_bytes(b'glTF' + b'\x01\x00\x00\x00' + b'\x00' * 12)
+    with pytest.raises(ValueError):
+        glb_writer.read_glb(str(path))
+    with pytest.raises(FileNotFoundError):
+        glb_writer.read_glb(str(tmp_path / 'missing.glb'))
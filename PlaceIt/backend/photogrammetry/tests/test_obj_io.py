@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+import obj_io
+
+
+def grid_mesh(size=6, with_uvs=True, materials=('wood', 'fabric')):
+    """
+    Returns a size x size grid of quads (two triangles each) with its own UV per corner
+    and the faces spread over the given materials, out of material order.
+    """
+    xs, ys = np.meshgrid(np.arange(size + 1), np.arange(size + 1))
+    positions = np.stack([xs.ravel(), ys.ravel(), np.sin(xs.ravel() + ys.ravel())], axis=1) * 0.25
+    quads = np.array([[y * (size + 1) + x, y * (size + 1) + x + 1, (y + 1) * (size + 1) + x + 1, (y + 1) * (size + 1) + x]
+                      for y in range(size) for x in range(size)])
+    faces = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+    uvs = face_uvs = None
+    if with_uvs:
+        uvs = np.random.default_rng(0).random((3 * len(faces), 2))
+        face_uvs = np.arange(3 * len(faces)).reshape(-1, 3)
+    face_materials = np.arange(len(faces)) % len(materials)
+    return obj_io.Mesh(positions.astype(np.float32), faces.astype(np.uint32),
+                       uvs=None if uvs is None else uvs.astype(np.float32),
+                       face_uvs=None if face_uvs is None else face_uvs.astype(np.uint32),
+                       face_materials=face_materials.astype(np.int32), material_names=list(materials),
+                       mtllib='scene.mtl')
+
+
+def corners(mesh):
+    # Every face as its corners' (position, UV) values, in the order write_obj groups them
+    order = np.argsort(mesh.face_materials, kind='stable')
+    values = [mesh.positions[mesh.faces[order]]]
+    if mesh.face_uvs is not None:
+        values.append(mesh.uvs[mesh.face_uvs[order]])
+    return np.concatenate(values, axis=2), mesh.face_materials[order]
+
+
+@pytest.mark.parametrize('with_uvs', [True, False])
+def test_write_read_round_trip(tmp_path, with_uvs):
+    mesh = grid_mesh(with_uvs=with_uvs)
+    path = str(tmp_path / 'scene.obj')
+    obj_io.write_obj(mesh, path)
+    read = obj_io.read_obj(path)
+
+    assert read.positions.dtype == np.float32 and read.faces.dtype == np.uint32
+    assert read.mtllib == 'scene.mtl'
+    assert read.material_names == mesh.material_names
+    assert (read.face_uvs is None) == (not with_uvs)
+    expected, expected_materials = corners(mesh)
+    actual, actual_materials = corners(read)
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+    np.testing.assert_array_equal(actual_materials, expected_materials)
+
+
+def test_small_chunks_match_one_chunk(tmp_path, monkeypatch):
+    path = str(tmp_path / 'scene.obj')
+    obj_io.write_obj(grid_mesh(size=20), path)
+    whole = obj_io.read_obj(path)
+    # Chunks that end inside lines and inside runs of one record type
+    monkeypatch.setattr(obj_io, 'CHUNK_SIZE', 37)
+    chunked = obj_io.read_obj(path)
+    for name in ('positions', 'uvs', 'faces', 'face_uvs', 'face_materials'):
+        np.testing.assert_array_equal(getattr(chunked, name), getattr(whole, name))
+
+
+def test_polygons_relative_indices_and_extra_components(tmp_path):
+    path = tmp_path / 'poly.obj'
+    path.write_text('\n'.join([
+        '# written by hand',
+        'mtllib poly.mtl',
+        'v 0 0 0 1.0',
+        'v 1 0 0 1.0',
+        'v 1 1 0 1.0',
+        'v 0 1 0 1.0',
+        'vt 0 0',
+        'vt 1 0',
+        'vt 1 1',
+        'vt 0 1',
+        'vn 0 0 1',
+        'usemtl a',
+        'f 1/1/1 2/2/1 3/3/1 4/4/1',
+        'usemtl b',
+        'f -4/-4 -2/-2 -1/-1',
+        'usemtl a',
+        'f 2/2 3/3 4/4',
+    ]))
+    mesh = obj_io.read_obj(str(path))
+    np.testing.assert_array_equal(mesh.positions, [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    # Polygons are triangulated as fans
+    np.testing.assert_array_equal(mesh.faces, [[0, 1, 2], [0, 2, 3], [0, 2, 3], [1, 2, 3]])
+    np.testing.assert_array_equal(mesh.face_uvs, mesh.faces)
+    np.testing.assert_array_equal(mesh.face_materials, [0, 0, 1, 0])
+    assert mesh.material_names == ['a', 'b']
+
+
+@pytest.mark.parametrize('text, error', [
+    ('v 0 0 0\nv 1 0 0\n', 'no faces'),
+    ('v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 4\n', 'out of range'),
+    ('v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nf 1/1 2/1 3/1\nusemtl a\nf 1 2 3\n', 'with and without texture'),
+    # Within one run of face lines
+    ('v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nf 1/1 2/1 3/1\nf 1 2 3\n', 'with and without texture'),
+    ('v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nf 1/1 2 3/1\n', 'with and without texture'),
+])
+def test_invalid_files(tmp_path, text, error):
+    path = tmp_path / 'bad.obj'
+    path.write_text(text)
+    with pytest.raises(ValueError, match=error):
+        obj_io.read_obj(str(path))
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        obj_io.read_obj(str(tmp_path / 'missing.obj'))
+
+
+def test_read_mtl(tmp_path):
+    (tmp_path / 'scene.mtl').write_text('newmtl wood\nKd 0.5 0.25 1\nd 0.75\nmap_Kd -s 1 1 1 wood.png\nnewmtl plain\n')
+    materials = obj_io.read_mtl(str(tmp_path / 'scene.mtl'))
+    assert materials['wood'] == {'Kd': [0.5, 0.25, 1.0], 'd': 0.75, 'map_Kd': str(tmp_path / 'wood.png')}
+    assert materials['plain'] == {'Kd': [1.0, 1.0, 1.0], 'd': 1.0, 'map_Kd': None}
@@ -0,0 +1,129 @@
+import os
+import time
+
+import pytest
+
+import result_cache
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return result_cache.ResultCache(str(tmp_path / 'cache'))
+
+
+def make_result(root, name, size=1000):
+    # A stage result: one file and a directory tree, with a file shared by every result
+    write(os.path.join(root, f'{name}.bin'), name.encode() * size)
+    write(os.path.join(root, 'images', 'a.jpg'), f'{name}-a'.encode() * size)
+    write(os.path.join(root, 'images', 'nested', 'shared.txt'), b'shared' * size)
+    return [os.path.join(root, f'{name}.bin'), os.path.join(root, 'images')]
+
+
+def test_miss_store_hit(tmp_path, cache):
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'frames')
+    key = cache.key('frames', inputs=[str(video)], params={'fps': 4})
+    job = str(tmp_path / 'job1')
+    assert cache.restore(key, job, 'frames') is None
+
+    paths = make_result(job, 'frames')
+    assert cache.store(key, job, paths, 'frames', duration_seconds=12.5)
+
+    # Another job writes the result under its own workspace, replacing what was there
+    other = str(tmp_path / 'job2')
+    write(os.path.join(other, 'images', 'stale.jpg'), b'old')
+    entry = cache.restore(key, other, 'frames')
+    assert entry is not None and entry['duration_seconds'] == 12.5
+    for rel_path in ('frames.bin', 'images/a.jpg', 'images/nested/shared.txt'):
+        assert read(os.path.join(other, rel_path)) == read(os.path.join(job, rel_path))
+    assert not os.path.exists(os.path.join(other, 'images', 'stale.jpg'))
+
+    stats = cache.stats()
+    assert stats['hits'] == {'frames': 1} and stats['misses'] == {'frames': 1}
+    assert stats['hit_rate'] == 0.5 and stats['seconds_saved'] == 12.5
+    assert stats['entries'] == {'frames': 1}
+
+
+def test_key_follows_contents_params_and_deps(tmp_path, cache):
+    first = tmp_path / 'a' / 'video.mp4'
+    second = tmp_path / 'b' / 'video.mp4'
+    write(str(first), b'same contents')
+    write(str(second), b'same contents')
+    key = cache.key('sfm', inputs=[str(first)], params={'threads': 1}, deps={'frames': 'abc'})
+
+    # The same contents under another path give the same key
+    assert cache.key('sfm', inputs=[str(second)], params={'threads': 1}, deps={'frames': 'abc'}) == key
+    assert cache.key('sfm', inputs=[str(first)], params={'threads': 2}, deps={'frames': 'abc'}) != key
+    assert cache.key('sfm', inputs=[str(first)], params={'threads': 1}, deps={'frames': 'abd'}) != key
+    assert cache.key('mvs', inputs=[str(first)], params={'threads': 1}, deps={'frames': 'abc'}) != key
+
+    # Rewriting the file (new size and modification time) is noticed despite the digest memo
+    time.sleep(0.01)
+    write(str(first), b'other contents')
+    assert cache.key('sfm', inputs=[str(first)], params={'threads': 1}, deps={'frames': 'abc'}) != key
+
+
+def test_evicts_least_recently_used(tmp_path, cache):
+    keys = {}
+    for name in ('first', 'second', 'third'):
+        job = str(tmp_path / name)
+        keys[name] = cache.key('frames', params={'job': name})
+        assert cache.store(keys[name], job, make_result(job, name), 'frames')
+        time.sleep(0.01)
+    # Using the first result makes the second the least recently used
+    assert cache.restore(keys['first'], str(tmp_path / 'reuse'), 'frames') is not None
+    size = cache.stats()['size_bytes']
+    # Each result adds two files of its own (len(name) + len(name + '-a') kB); the shared file is stored once
+    assert size == sum(2 * len(name) + 2 for name in keys) * 1000 + 6000
+
+    assert cache.evict(size - 1) == 1
+    assert cache.restore(keys['second'], str(tmp_path / 'again'), 'frames') is None
+    assert cache.restore(keys['third'], str(tmp_path / 'again'), 'frames') is not None
+    assert cache.restore(keys['first'], str(tmp_path / 'again'), 'frames') is not None
+    assert read(str(tmp_path / 'again' / 'images' / 'nested' / 'shared.txt')) == b'shared' * 1000
+    assert cache.stats()['size_bytes'] == size - (2 * len('second') + 2) * 1000
+
+    assert cache.evict(0) == 2
+    stats = cache.stats()
+    assert stats['entries'] == {} and stats['size_bytes'] == 0 and stats['evictions'] == 3
+
+
+def test_store_over_the_cap(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'), max_bytes=10000)
+    job = str(tmp_path / 'job')
+    key = cache.key('frames')
+    # The result alone is bigger than the cache
+    assert not cache.store(key, job, make_result(job, 'big', size=2000), 'frames')
+    assert cache.restore(key, job, 'frames') is None
+
+    # Storing results (7 kB, then 4 kB more) evicts older ones to stay under the cap
+    for name in ('one', 'two'):
+        job = str(tmp_path / name)
+        assert cache.store(cache.key('frames', params={'job': name}), job, make_result(job, name, size=500), 'frames')
+        time.sleep(0.01)
+    assert cache.stats()['entries'] == {'frames': 1}
+    assert cache.restore(cache.key('frames', params={'job': 'two'}), job, 'frames') is not None
+
+
+def test_entry_missing_files_is_a_miss(tmp_path, cache):
+    job = str(tmp_path / 'job')
+    key = cache.key('frames')
+    cache.store(key, job, make_result(job, 'frames'), 'frames')
+    objects = os.path.join(cache.cache_dir, result_cache.OBJECTS_DIR_NAME)
+    prefix = sorted(os.listdir(objects))[0]
+    for name in os.listdir(os.path.join(objects, prefix)):
+        os.remove(os.path.join(objects, prefix, name))
+
+    assert cache.restore(key, str(tmp_path / 'other'), 'frames') is None
+    assert cache.stats()['entries'] == {}
@@ -0,0 +1,286 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import glb_writer
+
+TEXTURE_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'png': ('PNG', 'image/png', '.png'),
+}
+DEFAULT_QUALITY = 85
+# Maximum texture width/height per level of detail, finest first; coarser levels reuse the last value
+DEFAULT_MAX_SIZES = [4096, 2048, 1024]
+# Texel usage is tracked in blocks of this many pixels; one block of margin is kept
+# around every triangle so bilinear filtering and mipmaps do not bleed in the fill colour
+USAGE_BLOCK_PIXELS = 16
+
+def _ragged_cells(lo, hi):
+    """
+    Enumerates the integer cells of inclusive ranges [lo, hi] (one pair per row),
+    returning (row index, cell) arrays.
+    """
+    counts = hi - lo + 1
+    rows = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, lo[rows] + offsets
+
+def texel_usage_mask(uvs, triangles, width, height, block=USAGE_BLOCK_PIXELS):
+    """
+    Marks the blocks of a texture that triangles map onto (conservatively, by their bounding boxes).
+
+    Args:
+        uvs (numpy.ndarray): (N, 2) glTF texture coordinates (origin at the top left).
+        triangles (numpy.ndarray): (F, 3) indices into uvs.
+        width (int): Texture width in pixels.
+        height (int): Texture height in pixels.
+        block (int, optional): Block size in pixels. Defaults to USAGE_BLOCK_PIXELS.
+
+    Returns:
+        numpy.ndarray: (rows, columns) boolean mask of used blocks, dilated by one block.
+    """
+    columns, rows = -(-width // block), -(-height // block)
+    mask = np.zeros((rows, columns), dtype=bool)
+    if len(triangles) == 0:
+        return mask
+    # Coordinates outside [0, 1] wrap around (the samplers repeat)
+    corners = np.mod(uvs[triangles], 1.0) * [width / block, height / block]
+    lo = np.floor(corners.min(axis=1)).astype(np.int64)
+    hi = np.floor(corners.max(axis=1)).astype(np.int64)
+    lo = np.clip(lo, 0, [columns - 1, rows - 1])
+    hi = np.clip(hi, 0, [columns - 1, rows - 1])
+    # Rows of blocks first, then the blocks along each row
+    triangle_rows, y = _ragged_cells(lo[:, 1], hi[:, 1])
+    spans, x = _ragged_cells(lo[triangle_rows, 0], hi[triangle_rows, 0])
+    mask[y[spans], x] = True
+
+    dilated = mask.copy()
+    dilated[1:] |= mask[:-1]
+    dilated[:-1] |= mask[1:]
+    vertical = dilated.copy()
+    dilated[:, 1:] |= vertical[:, :-1]
+    dilated[:, :-1] |= vertical[:, 1:]
+    return dilated
+
+def encode_texture(job):
+    """
+    Blanks unused regions of one texture, downscales it and re-encodes it.
+    Runs in a worker process; the job and its result are plain dicts.
+
+    Args:
+        job (dict): 'data' (encoded image bytes), 'max_size', 'format' (a TEXTURE_FORMATS key),
+            'quality', and optionally 'usage' (block mask from texel_usage_mask) and 'block'.
+
+    Returns:
+        dict: 'data' (new bytes), 'mime_type', 'size' (new width, height), 'original_size',
+        'unused_fraction' (share of blocks blanked) and 'wall_seconds'.
+    """
+    started = time.monotonic()
+    image = Image.open(io.BytesIO(job['data']))
+    image.load()
+    original_size = image.size
+    pil_format, mime_type, _ = TEXTURE_FORMATS[job['format']]
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha and pil_format != 'JPEG' else 'RGB')
+
+    unused_fraction = 0.0
+    usage = job.get('usage')
+    if usage is not None and usage.any() and not usage.all():
+        # Fill unused blocks with the mean colour of the used ones: flat areas cost almost nothing to encode
+        block = job['block']
+        mask = Image.fromarray(usage.astype(np.uint8) * 255).resize(
+            (usage.shape[1] * block, usage.shape[0] * block), Image.NEAREST).crop((0, 0) + image.size)
+        pixels = np.asarray(image)
+        fill = tuple(int(c) for c in pixels[np.asarray(mask) > 0].mean(axis=0).round())
+        image = Image.composite(image, Image.new(image.mode, image.size, fill), mask)
+        unused_fraction = float(1.0 - usage.mean())
+
+    scale = job['max_size'] / max(image.size)
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+    output = io.BytesIO()
+    if pil_format == 'PNG':
+        image.save(output, pil_format, optimize=True)
+    elif pil_format == 'WEBP':
+        image.save(output, pil_format, quality=job['quality'], method=4)
+    else:
+        image.save(output, pil_format, quality=job['quality'], optimize=True, progressive=True)
+    return {
+        'data': output.getvalue(),
+        'mime_type': mime_type,
+        'size': image.size,
+        'original_size': original_size,
+        'unused_fraction': round(unused_fraction, 3),
+        'wall_seconds': round(time.monotonic() - started, 3),
+    }
+
+def _texture_images(document):
+    """
+    Returns {material index: image index} for the base color textures of a glTF document.
+    """
+    textures = document.get('textures', [])
+    images = {}
+    for index, material in enumerate(document.get('materials', [])):
+        texture_info = material.get('pbrMetallicRoughness', {}).get('baseColorTexture')
+        if texture_info is None:
+            continue
+        texture = textures[texture_info['index']]
+        source = texture.get('source', texture.get('extensions', {}).get('EXT_texture_webp', {}).get('source'))
+        if source is not None:
+            images[index] = source
+    return images
+
+def _image_usage(document, binary, image, width, height):
+    """
+    Block usage mask of an image over every primitive whose material samples it.
+    """
+    material_images = _texture_images(document)
+    usage = None
+    for mesh in document.get('meshes', []):
+        for primitive in mesh['primitives']:
+            if material_images.get(primitive.get('material')) != image or 'TEXCOORD_0' not in primitive['attributes']:
+                continue
+            uvs = glb_writer.read_accessor(document, binary, primitive['attributes']['TEXCOORD_0'])
+            if 'indices' in primitive:
+                triangles = glb_writer.read_accessor(document, binary, primitive['indices']).reshape(-1, 3).astype(np.int64)
+            else:
+                triangles = np.arange(len(uvs) - len(uvs) % 3).reshape(-1, 3)
+            mask = texel_usage_mask(uvs, triangles, width, height)
+            usage = mask if usage is None else usage | mask
+    return usage
+
+def optimize_textures(glb_files, image_format='jpeg', quality=DEFAULT_QUALITY, max_sizes=DEFAULT_MAX_SIZES,
+                      strip_unused=True, workers=None):
+    """
+    Re-encodes the textures embedded in GLB files, encoding all images in parallel worker processes.
+
+    Args:
+        glb_files (list): (input GLB, output GLB) pairs, one per level of detail, finest first.
+        image_format (str, optional): 'jpeg', 'webp' (stored with EXT_texture_webp) or 'png'. Defaults to 'jpeg'.
+        quality (int, optional): JPEG/WebP quality (1-100). Defaults to DEFAULT_QUALITY.
+        max_sizes (list, optional): Maximum width/height per level; the last value applies to
+            any further levels. Defaults to DEFAULT_MAX_SIZES.
+        strip_unused (bool, optional): Blank the texture regions no triangle maps onto. Defaults to True.
+        workers (int, optional): Number of encoding processes. Defaults to the number of CPUs.
+
+    Returns:
+        list: One report per texture (file, image, sizes and bytes before and after, time taken).
+    """
+    if image_format not in TEXTURE_FORMATS:
+        raise ValueError(f"Unknown texture format '{image_format}'. Expected one of {', '.join(TEXTURE_FORMATS)}.")
+    print(f"\n--- Re-encoding textures ({image_format}, quality {quality}, max sizes {max_sizes}) ---")
+
+    files = []
+    jobs = []
+    for level, (input_glb, output_glb) in enumerate(glb_files):
+        document, binary = glb_writer.read_glb(input_glb)
+        max_size = max_sizes[min(level, len(max_sizes) - 1)]
+        for image_index, image in enumerate(document.get('images', [])):
+            if 'bufferView' not in image:
+                continue  # External images are left alone
+            view = document['bufferViews'][image['bufferView']]
+            start = view.get('byteOffset', 0)
+            data = binary[start:start + view['byteLength']]
+            job = {'data': data, 'max_size': max_size, 'format': image_format, 'quality': quality}
+            if strip_unused:
+                width, height = Image.open(io.BytesIO(data)).size
+                job['usage'] = _image_usage(document, binary, image_index, width, height)
+                job['block'] = USAGE_BLOCK_PIXELS
+            jobs.append((len(files), image_index, job))
+        files.append((input_glb, output_glb, document, binary))
+
+    # Spawned rather than forked workers: the pipeline may be running in one of several worker threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = list(executor.map(encode_texture, [job for _, _, job in jobs]))
+
+    report = []
+    replaced = [{} for _ in files]
+    for (file_index, image_index, job), result in zip(jobs, results):
+        input_glb, output_glb, document, _ = files[file_index]
+        image = document['images'][image_index]
+        bytes_before = len(job['data'])
+        if len(result['data']) >= bytes_before and result['size'] == result['original_size'] and result['mime_type'] == image['mimeType']:
+            result = dict(result, data=job['data'])  # Re-encoding did not help; keep the original
+        replaced[file_index][image['bufferView']] = result['data']
+        image['mimeType'] = result['mime_type']
+        if 'name' in image:
+            image['name'] = os.path.splitext(image['name'])[0] + TEXTURE_FORMATS[image_format][2]
+        entry = {
+            'file': os.path.basename(output_glb),
+            'image': image.get('name', str(image_index)),
+            'original_size': list(result['original_size']),
+            'size': list(result['size']),
+            'unused_fraction': result['unused_fraction'],
+            'bytes_before': bytes_before,
+            'bytes_after': len(result['data']),
+            'wall_seconds': result['wall_seconds'],
+        }
+        report.append(entry)
+        print(f"{entry['file']}: {entry['image']} {entry['original_size'][0]}x{entry['original_size'][1]} -> "
+              f"{entry['size'][0]}x{entry['size'][1]}, {bytes_before / 2 ** 20:.1f} MB -> {entry['bytes_after'] / 2 ** 20:.1f} MB "
+              f"({entry['unused_fraction']:.0%} unused)")
+
+    for (input_glb, output_glb, document, binary), views in zip(files, replaced):
+        webp_images = {index for index, image in enumerate(document.get('images', [])) if image.get('mimeType') == 'image/webp'}
+        for texture in document.get('textures', []):
+            source = texture.get('source', texture.get('extensions', {}).get('EXT_texture_webp', {}).get('source'))
+            if source is None:
+                continue
+            if source in webp_images:
+                texture.pop('source', None)
+                texture.setdefault('extensions', {})['EXT_texture_webp'] = {'source': source}
+            else:
+                texture['source'] = source
+                extensions = texture.get('extensions', {})
+                extensions.pop('EXT_texture_webp', None)
+                if not extensions:
+                    texture.pop('extensions', None)
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            names = [name for name in document.get(key, []) if name != 'EXT_texture_webp']
+            if webp_images:
+                names.append('EXT_texture_webp')
+            if names:
+                document[key] = names
+            else:
+                document.pop(key, None)
+        glb_writer.rewrite_glb(document, binary, output_glb, replaced_views=views)
+        print(f"Wrote {output_glb} ({os.path.getsize(input_glb) / 2 ** 20:.1f} MB -> {os.path.getsize(output_glb) / 2 ** 20:.1f} MB)")
+    return report
+
+def main():
+    """
+    Command-line entry point: python textures.py input.glb output.glb [--format webp] [--quality 85] [--max-size 2048]
+    """
+    parser = argparse.ArgumentParser(description="Downscale and re-encode the textures embedded in a GLB file.")
+    parser.add_argument('input_glb', help='GLB file to read.')
+    parser.add_argument('output_glb', help='Path for the re-encoded GLB file.')
+    parser.add_argument('--format', choices=list(TEXTURE_FORMATS), default='jpeg', help='Texture format (default: jpeg).')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'JPEG/WebP quality (default: {DEFAULT_QUALITY}).')
+    parser.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZES[0], help=f'Maximum texture width/height (default: {DEFAULT_MAX_SIZES[0]}).')
+    parser.add_argument('--keep-unused', action='store_true', help='Do not blank texture regions that no triangle uses.')
+    parser.add_argument('--workers', type=int, help='Number of encoding processes (default: number of CPUs).')
+    parser.add_argument('--report', help='Write the per-texture report as JSON to this path.')
+    args = parser.parse_args()
+
+    try:
+        report = optimize_textures([(args.input_glb, args.output_glb)], image_format=args.format, quality=args.quality,
+                                   max_sizes=[args.max_size], strip_unused=not args.keep_unused, workers=args.workers)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
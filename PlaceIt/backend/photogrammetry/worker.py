@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import blender_server
+import main as pipeline
+import quality
+
+# Sub-directories of the queue directory. A job file moves pending -> running -> done/failed;
+# the moves are atomic renames, so several workers may share one queue directory.
+QUEUE_STATES = ['pending', 'running', 'done', 'failed']
+
+# Default number of stages of each class (see main.STAGE_CLASSES) that may run at once.
+# Frame extraction is light enough to overlap; COLMAP, OpenMVS and Blender each use
+# most of the machine on their own, as does texture encoding with its process pool.
+DEFAULT_STAGE_LIMITS = {
+    'frames': 2,
+    'sfm': 1,
+    'mvs': 1,
+    'blender': 1,
+    'textures': 1,
+}
+
+def queue_paths(queue_dir):
+    """
+    Returns {state: directory} for a queue directory, creating the directories if needed.
+    """
+    paths = {state: os.path.join(queue_dir, state) for state in QUEUE_STATES}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    return paths
+
+def write_json_atomic(path, data):
+    """
+    Writes JSON to a temporary file and renames it into place, so readers never see a partial file.
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def submit_job(queue_dir, pipeline_args, job_id=None):
+    """
+    Adds a job to the queue.
+
+    Args:
+        queue_dir (str): The queue directory watched by the worker.
+        pipeline_args (list): Command-line arguments for main.py (e.g. ['--workspace', ..., '--openmvs', ...]).
+        job_id (str, optional): Job identifier, also the job file's name. Defaults to a random id.
+
+    Returns:
+        str: The job id.
+    """
+    # Validate the arguments now rather than when the worker picks the job up
+    args = pipeline.parse_args(pipeline_args)
+    for option in ('workspace', 'video_input', 'output_dir', 'openmvs'):
+        if not os.path.isabs(getattr(args, option)):
+            raise ValueError(f"--{option} must be an absolute path; the worker does not share the submitter's working directory.")
+    job_id = job_id or uuid.uuid4().hex
+    paths = queue_paths(queue_dir)
+    job = {
+        'job_id': job_id,
+        'args': pipeline_args,
+        'submitted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    write_json_atomic(os.path.join(paths['pending'], f'{job_id}.json'), job)
+    print(f"Submitted job {job_id} to {paths['pending']}")
+    return job_id
+
+class StageLimiter:
+    """
+    Caps how many stages of each class run at the same time across all jobs of a worker.
+    """
+
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self.semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in limits.items()}
+
+    def slot(self, stage):
+        """
+        Returns the semaphore (usable as a context manager) that guards a stage's class.
+        """
+        stage_class = pipeline.STAGE_CLASSES.get(stage, stage)
+        if stage_class not in self.semaphores:
+            raise ValueError(f"No concurrency limit configured for stage class '{stage_class}'.")
+        return self.semaphores[stage_class]
+
+class Worker:
+    """
+    Long-running process that takes jobs from a queue directory and runs up to
+    max_jobs of them concurrently, each in its own thread.
+
+    Jobs overlap stage by stage: a job only holds a slot of its current stage's class,
+    so one job can extract frames or run SfM while another one densifies.
+    """
+
+    def __init__(self, queue_dir, max_jobs=3, stage_limits=None, poll_interval=2.0, persistent_blender=True):
+        """
+        Args:
+            queue_dir (str): Directory holding the pending/running/done/failed job files.
+            max_jobs (int, optional): Maximum number of jobs in progress at once. Defaults to 3.
+            stage_limits (dict, optional): {stage class: concurrent stages}. Defaults to DEFAULT_STAGE_LIMITS.
+            poll_interval (float, optional): Seconds between scans of the pending directory. Defaults to 2.0.
+            persistent_blender (bool, optional): Keep one Blender process up for every job's GLB export
+                instead of starting Blender per export. Defaults to True.
+        """
+        self.paths = queue_paths(queue_dir)
+        self.max_jobs = max_jobs
+        self.limiter = StageLimiter(stage_limits or DEFAULT_STAGE_LIMITS)
+        self.poll_interval = poll_interval
+        self.active = set()
+        self.active_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.blender = blender_server.BlenderServer() if persistent_blender else None
+
+    def claim_next(self):
+        """
+        Moves the oldest pending job file to running/ and returns the job, or None if the queue is empty.
+        """
+        pending = []
+        for name in os.listdir(self.paths['pending']):
+            if name.endswith('.json'):
+                try:
+                    pending.append((os.path.getmtime(os.path.join(self.paths['pending'], name)), name))
+                except FileNotFoundError:
+                    continue  # Claimed by another worker
+        for _, name in sorted(pending):
+            running_path = os.path.join(self.paths['running'], name)
+            try:
+                os.rename(os.path.join(self.paths['pending'], name), running_path)
+            except FileNotFoundError:
+                continue  # Claimed by another worker
+            with open(running_path, 'r') as f:
+                job = json.load(f)
+            job['started_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            write_json_atomic(running_path, job)
+            return job
+        return None
+
+    def run_job(self, job):
+        """
+        Runs one job through the pipeline and files its result under done/ or failed/.
+        """
+        name = f"{job['job_id']}.json"
+        print(f"[worker] Starting job {job['job_id']}")
+        try:
+            try:
+                args = pipeline.parse_args(job['args'])
+            except SystemExit:
+                raise ValueError(f"Invalid pipeline arguments: {job['args']}")
+            # Status readers follow the job through its progress events (see command_log.read_progress)
+            job['log_dir'] = os.path.abspath(pipeline.job_log_dir(args, job['job_id']))
+            job['progress_path'] = os.path.join(job['log_dir'], 'progress.jsonl')
+            write_json_atomic(os.path.join(self.paths['running'], name), job)
+            job['glb_path'] = os.path.abspath(pipeline.run_pipeline(args, job_id=job['job_id'], stage_slot=self.limiter.slot,
+                                                                          blender=self.blender))
+            job['status'] = 'succeeded'
+        except Exception as e:
+            traceback.print_exc()
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            if isinstance(e, quality.QualityGateError):
+                job['quality_issues'] = e.issues
+        job['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        state = 'done' if job['status'] == 'succeeded' else 'failed'
+        write_json_atomic(os.path.join(self.paths[state], name), job)
+        os.remove(os.path.join(self.paths['running'], name))
+        print(f"[worker] Job {job['job_id']} {job['status']}")
+
+    def _run_and_release(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            with self.active_lock:
+                self.active.discard(job['job_id'])
+
+    def recover_interrupted(self):
+        """
+        Puts jobs left in running/ by a worker that died back into pending/.
+        Their checkpoints let them continue from the last completed stage.
+        Only safe when this is the only worker using the queue directory.
+        """
+        for name in os.listdir(self.paths['running']):
+            if name.endswith('.json'):
+                os.rename(os.path.join(self.paths['running'], name), os.path.join(self.paths['pending'], name))
+                print(f"[worker] Re-queued interrupted job {name[:-len('.json')]}")
+
+    def serve(self):
+        """
+        Claims and runs jobs until stop() is called, then waits for the running jobs to finish.
+        """
+        print(f"[worker] Watching {self.paths['pending']} (max {self.max_jobs} jobs, stage limits {self.limiter_summary()})")
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as executor:
+            while not self.stopping.is_set():
+                with self.active_lock:
+                    has_capacity = len(self.active) < self.max_jobs
+                job = self.claim_next() if has_capacity else None
+                if job is None:
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                with self.active_lock:
+                    self.active.add(job['job_id'])
+                executor.submit(self._run_and_release, job)
+            print("[worker] Stopping; waiting for running jobs to finish...")
+        if self.blender is not None:
+            self.blender.close()
+        print("[worker] Stopped.")
+
+    def limiter_summary(self):
+        return ', '.join(f'{name}={limit}' for name, limit in self.limiter.limits.items())
+
+    def stop(self, *_):
+        self.stopping.set()
+
+def parse_stage_limits(values):
+    """
+    Parses repeated --limit CLASS=N options on top of DEFAULT_STAGE_LIMITS.
+    """
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    for value in values:
+        name, _, count = value.partition('=')
+        if name not in limits or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid --limit '{value}'. Expected CLASS=N with CLASS one of {', '.join(limits)}.")
+        limits[name] = int(count)
+    return limits
+
+def main():
+    """
+    Command-line entry point.
+
+        python worker.py serve --queue-dir DIR [--max-jobs N] [--limit mvs=1 ...]
+        python worker.py submit --queue-dir DIR [--job-id ID] -- <main.py arguments>
+    """
+    parser = argparse.ArgumentParser(description="Run photogrammetry jobs from a queue directory.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run jobs from the queue until interrupted.')
+    serve_parser.add_argument('--queue-dir', required=True, help='Queue directory (pending/running/done/failed job files).')
+    serve_parser.add_argument('--max-jobs', type=int, default=3, help='Maximum number of jobs in progress at once (default: 3).')
+    serve_parser.add_argument('--limit', action='append', default=[], help='Concurrent stages per class, e.g. mvs=1 (may be repeated). Classes: ' + ', '.join(DEFAULT_STAGE_LIMITS) + '.')
+    serve_parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between scans of the queue (default: 2).')
+    serve_parser.add_argument('--no-persistent-blender', action='store_true', help='Start Blender for every GLB export instead of keeping one Blender process up.')
+    serve_parser.add_argument('--no-recover', action='store_true', help='Leave jobs found in running/ alone (use when several workers share the queue).')
+
+    submit_parser = subparsers.add_parser('submit', help='Add a job to the queue.')
+    submit_parser.add_argument('--queue-dir', required=True, help='Queue directory watched by the worker.')
+    submit_parser.add_argument('--job-id', help='Job identifier (default: random).')
+    submit_parser.add_argument('pipeline_args', nargs=argparse.REMAINDER, help='Arguments for main.py, after --.')
+
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        pipeline_args = args.pipeline_args[1:] if args.pipeline_args[:1] == ['--'] else args.pipeline_args
+        submit_job(args.queue_dir, pipeline_args, job_id=args.job_id)
+        return
+
+    try:
+        limits = parse_stage_limits(args.limit)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    worker = Worker(args.queue_dir, max_jobs=args.max_jobs, stage_limits=limits, poll_interval=args.poll_interval,
+                    persistent_blender=not args.no_persistent_blender)
+    if not args.no_recover:
+        worker.recover_interrupted()
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.serve()
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,14 @@ const supabaseUrl = process.env.SUPABASE_URL;
 const supabaseKey = process.env.SUPABASE_SERVICE_ROLE_KEY || process.env.SUPABASE_ANON_KEY;
 const supabase = createClient(supabaseUrl, supabaseKey);
 
+// A failed job keeps its workspace so that a retry resumes from the pipeline's stage
+// checkpoints. The workspace is removed once the job has failed this many times in a row,
+// and the workspaces of failed jobs that are not retried are removed after this many hours.
+const MAX_FAILED_ATTEMPTS = parseInt(process.env.PHOTOGRAMMETRY_MAX_ATTEMPTS || '3', 10);
+const FAILED_WORKSPACE_MAX_AGE_HOURS = parseFloat(process.env.PHOTOGRAMMETRY_FAILED_WORKSPACE_MAX_AGE_HOURS || '72');
+// File in a kept workspace recording its failed attempts: { attempts, failedAt, resumedAt }
+const FAILURE_MARKER = 'failed_attempts.json';
+
 /**
  * Downloads a video asset related to a furniture item from Supabase Storage or an external URL.
  *
@@ -115,6 +123,126 @@ function runPython(args, cwd) {
   });
 }
 
+/**
+ * Hands a pipeline run to a long-running photogrammetry worker (photogrammetry/worker.py)
+ * through its queue directory and waits for the job to finish.
+ * @param {string} queueDir The queue directory the worker watches.
+ * @param {string} jobId Identifier for the job (also its file name in the queue).
+ * @param {string[]} args Arguments for main.py (absolute paths).
+ * @param {number} pollIntervalMs How often to check for the job's result.
+ * @returns {Promise<object>} The finished job record written by the worker.
+ * @throws {Error} If the worker reports the job as failed.
+ */
+async function runPipelineInWorker(queueDir, jobId, args, pollIntervalMs = 5000) {
+  const pendingDir = path.join(queueDir, 'pending');
+  await fs.mkdir(pendingDir, { recursive: true });
+
+  // Write then rename, so the worker never picks up a partially written job file
+  const jobFile = path.join(pendingDir, `${jobId}.json`);
+  const job = { job_id: jobId, args, submitted_at: new Date().toISOString() };
+  await fs.writeFile(`${jobFile}.tmp`, JSON.stringify(job, null, 2));
+  await fs.rename(`${jobFile}.tmp`, jobFile);
+  console.log(`Queued photogrammetry job ${jobId} in ${queueDir}`);
+
+  while (true) {
+    for (const state of ['done', 'failed']) {
+      const resultFile = path.join(queueDir, state, `${jobId}.json`);
+      let result;
+      try {
+        result = JSON.parse(await fs.readFile(resultFile, 'utf8'));
+      } catch (e) {
+        if (e.code === 'ENOENT') continue;
+        throw e;
+      }
+      await fs.rm(resultFile, { force: true });
+      if (state === 'failed') {
+        throw new Error(`Photogrammetry worker job ${jobId} failed: ${result.error}`);
+      }
+      console.log(`Photogrammetry worker job ${jobId} finished.`);
+      return result;
+    }
+    await new Promise(resolve => setTimeout(resolve, pollIntervalMs));
+  }
+}
+
+/**
+ * Uploads a GLB model to Supabase Storage as the furniture item's model and returns its public URL.
+ * @param {string} furnitureId The ID of the furniture item.
+ * @param {string} glbPath Path to the GLB file.
+ * @returns {Promise<object>} { publicGlbUrl, size }
+ * @throws {Error} If the file cannot be read or the upload fails.
+ */
+async function uploadModel(furnitureId, glbPath) {
+  const glbBytes = await fs.readFile(glbPath);
+  const glbStoragePath = `${furnitureId}/model.glb`;
+  console.log(`Uploading GLB model for furnitureId: ${furnitureId}`);
+
+  const { error: uploadErr } = await supabase.storage
+    .from('furniture-models')
+    .upload(glbStoragePath, glbBytes, {
+      contentType: 'model/gltf-binary',
+      upsert: true
+    });
+
+  if (uploadErr) {
+    throw new Error(`Failed to upload GLB: ${uploadErr.message}`);
+  }
+
+  // Get public URL
+  const { data: publicUrlData } = supabase.storage
+    .from('furniture-models')
+    .getPublicUrl(glbStoragePath);
+
+  return { publicGlbUrl: publicUrlData.publicUrl, size: glbBytes.length };
+}
+
+/**
+ * Watches for the preview model of a two-phase pipeline run (main.py --two-phase) and publishes
+ * it as soon as it appears, so the item has a model while the full-quality run continues.
+ * The pipeline renames the preview into place, so a file that exists is complete.
+ * @param {string} furnitureId The ID of the furniture item.
+ * @param {string} previewPath Path the pipeline publishes the preview GLB at.
+ * @param {number} pollIntervalMs How often to check for the preview.
+ * @returns {object} { stop } - await stop() once the pipeline has finished, before uploading the
+ *   final model, so an in-flight preview upload cannot overwrite it.
+ */
+function watchForPreview(furnitureId, previewPath, pollIntervalMs = 5000) {
+  let stopped = false;
+  let timer = null;
+  let publishing = null;
+
+  const publish = async () => {
+    if (stopped) return;
+    try {
+      await fs.access(previewPath);
+    } catch (e) {
+      timer = setTimeout(() => { publishing = publish(); }, pollIntervalMs);
+      return;
+    }
+    try {
+      const { publicGlbUrl, size } = await uploadModel(furnitureId, previewPath);
+      // The pipeline finished while this upload was in flight; the final model supersedes it
+      if (stopped) return;
+      await supabase
+        .from('furniture')
+        .update({ has_3d_model: true, has_ar_support: true, updated_at: new Date().toISOString() })
+        .eq('id', furnitureId);
+      await upsertModelMediaAsset(furnitureId, publicGlbUrl, path.basename(previewPath), size);
+      console.log(`Preview model published for furnitureId: ${furnitureId}`);
+    } catch (err) {
+      console.warn(`Could not publish preview model for ${furnitureId}: ${err.message}`);
+    }
+  };
+
+  timer = setTimeout(() => { publishing = publish(); }, pollIntervalMs);
+  return {
+    async stop() {
+      stopped = true;
+      clearTimeout(timer);
+      await publishing;
+    }
+  };
+}
 
 /**
  * Aggressively cleans up workspace directories and OpenMVS temporary files
@@ -164,6 +292,59 @@ async function cleanupWorkspace(workRoot, furnitureId) {
   }
 }
 
+/**
+ * Reads the failure record of a kept workspace (see FAILURE_MARKER).
+ * @param {string} workRoot The workspace root directory.
+ * @returns {Promise<object|null>} The record, or null if the workspace has none.
+ */
+async function readFailureMarker(workRoot) {
+  try {
+    return JSON.parse(await fs.readFile(path.join(workRoot, FAILURE_MARKER), 'utf8'));
+  } catch (err) {
+    return null;
+  }
+}
+
+/**
+ * Counts a failed attempt of the job in a workspace.
+ * @param {string} workRoot The workspace root directory.
+ * @returns {Promise<number>} The number of failed attempts in a row, this one included.
+ */
+async function recordFailedAttempt(workRoot) {
+  const marker = await readFailureMarker(workRoot);
+  const attempts = (marker ? marker.attempts : 0) + 1;
+  await fs.writeFile(path.join(workRoot, FAILURE_MARKER),
+    JSON.stringify({ attempts, failedAt: new Date().toISOString() }));
+  return attempts;
+}
+
+/**
+ * Removes the workspaces of failed jobs that have not been retried for
+ * FAILED_WORKSPACE_MAX_AGE_HOURS (workspaces without a failure record are left alone).
+ * @param {string} photogrammetryRoot The directory holding the per-furniture workspaces.
+ */
+async function removeExpiredWorkspaces(photogrammetryRoot) {
+  const maxAgeMs = FAILED_WORKSPACE_MAX_AGE_HOURS * 3600 * 1000;
+  let entries;
+  try {
+    entries = await fs.readdir(photogrammetryRoot, { withFileTypes: true });
+  } catch (err) {
+    console.warn(`Could not list workspaces in ${photogrammetryRoot}: ${err.message}`);
+    return;
+  }
+  for (const entry of entries.filter(e => e.isDirectory())) {
+    const workRoot = path.join(photogrammetryRoot, entry.name);
+    const marker = await readFailureMarker(workRoot);
+    if (!marker) continue;
+    // A retry in progress marks the workspace as resumed, so it is not removed under it
+    const lastUsed = Math.max(Date.parse(marker.failedAt) || 0, Date.parse(marker.resumedAt) || 0);
+    if (Date.now() - lastUsed > maxAgeMs) {
+      await fs.rm(workRoot, { recursive: true, force: true });
+      console.log(`Removed workspace of a failed job not retried for ${FAILED_WORKSPACE_MAX_AGE_HOURS}h: ${workRoot}`);
+    }
+  }
+}
+
 /**
  * Public API: Creates or refreshes a 3D mesh for a furniture item using photogrammetry.
  * The process involves downloading a video, running a Python photogrammetry pipeline,
@@ -181,12 +362,16 @@ async function reconstructFurniture(furnitureId) {
   console.log(`Starting 3D reconstruction for furnitureId: ${furnitureId}`);
   console.log(`Dedicated workspace: ${workRoot}`);
 
+  await removeExpiredWorkspaces(photogrammetryRoot);
+
   // Create the dedicated workspace directory
   await fs.mkdir(workRoot, { recursive: true });
 
   let videoAssetId = null;
   let videoUrl = null;
   let jobId = null;
+  let succeeded = false;
+  let failed = false;
 
   try {
     // 1. Download 360-video into <workRoot>/video/video.mp4
@@ -301,26 +486,58 @@ async function reconstructFurniture(furnitureId) {
       throw new Error(`Failed to create or claim job after ${maxAttempts} attempts`);
     }
 
+    // Retrying a failed job in its kept workspace
+    const failure = await readFailureMarker(workRoot);
+    if (failure) {
+      console.log(`Resuming after ${failure.attempts} failed attempt(s) in: ${workRoot}`);
+      await fs.writeFile(path.join(workRoot, FAILURE_MARKER),
+        JSON.stringify({ ...failure, resumedAt: new Date().toISOString() }));
+    }
+
     // 3. Run photogrammetry pipeline
     const pythonScriptPath = path.join(photogrammetryRoot, 'main.py');
     console.log(`Running photogrammetry pipeline: ${pythonScriptPath}`);
 
-    await runPython(
-      [
-        pythonScriptPath,
-        '--workspace', workRoot,
-        '--video_input', videoDestPath,
-        '--output_dir', path.join(workRoot, 'output'),
-        '--openmvs', process.env.OPENMVS_LOCAL_PATH
-      ],
-      photogrammetryRoot
-    );
+    const pipelineArgs = [
+      '--workspace', workRoot,
+      '--video_input', videoDestPath,
+      '--output_dir', path.join(workRoot, 'output'),
+      '--openmvs', process.env.OPENMVS_LOCAL_PATH,
+      // Keep job traces outside the workspace, which is removed after a successful run
+      '--trace-dir', path.join(photogrammetryRoot, 'traces'),
+      // Results of earlier jobs, so a re-uploaded video is not reconstructed again
+      '--cache-dir', process.env.PHOTOGRAMMETRY_CACHE_DIR || path.join(photogrammetryRoot, 'cache')
+    ];
+    if (process.env.PHOTOGRAMMETRY_CACHE_MAX_SIZE) {
+      pipelineArgs.push('--cache-max-size', process.env.PHOTOGRAMMETRY_CACHE_MAX_SIZE);
+    }
+    if (process.env.PHOTOGRAMMETRY_PROFILE) {
+      // preview, standard or high (see PROFILES in main.py)
+      pipelineArgs.push('--profile', process.env.PHOTOGRAMMETRY_PROFILE);
+    }
 
-    // 4. Upload GLB to Supabase Storage
+    // With two phases, a quick preview model is published while the full-quality run continues
     const glbOutputFolder = path.join(workRoot, 'output');
+    let previewWatcher = null;
+    if (process.env.PHOTOGRAMMETRY_TWO_PHASE === 'true') {
+      pipelineArgs.push('--two-phase');
+      previewWatcher = watchForPreview(furnitureId, path.join(glbOutputFolder, 'scene_textured_mesh_preview.glb'));
+    }
+
+    try {
+      if (process.env.PHOTOGRAMMETRY_QUEUE_DIR) {
+        // A worker (python worker.py serve) runs several jobs concurrently, overlapping their stages
+        await runPipelineInWorker(process.env.PHOTOGRAMMETRY_QUEUE_DIR, jobId.toString(), pipelineArgs);
+      } else {
+        await runPython([pythonScriptPath, ...pipelineArgs], photogrammetryRoot);
+      }
+    } finally {
+      if (previewWatcher) await previewWatcher.stop();
+    }
+
+    // 4. Upload GLB to Supabase Storage
     const glbFilename = 'scene_textured_mesh.glb';
     const glbPath = path.join(glbOutputFolder, glbFilename);
-    const glbStoragePath = `${furnitureId}/model.glb`;
 
     // Verify GLB file exists
     try {
@@ -330,27 +547,14 @@ async function reconstructFurniture(furnitureId) {
       throw new Error(`GLB output file not found at ${glbPath}`);
     }
 
-    const glbBytes = await fs.readFile(glbPath);
-    console.log(`Uploading GLB model for furnitureId: ${furnitureId}`);
-
-    const { error: uploadErr } = await supabase.storage
-      .from('furniture-models')
-      .upload(glbStoragePath, glbBytes, {
-        contentType: 'model/gltf-binary',
-        upsert: true
-      });
-
-    if (uploadErr) {
+    let uploaded;
+    try {
+      uploaded = await uploadModel(furnitureId, glbPath);
+    } catch (uploadErr) {
       await updateJobStatus(jobId, 'failed', `GLB upload failed: ${uploadErr.message}`);
-      throw new Error(`Failed to upload GLB: ${uploadErr.message}`);
+      throw uploadErr;
     }
-
-    // Get public URL
-    const { data: publicUrlData } = supabase.storage
-      .from('furniture-models')
-      .getPublicUrl(glbStoragePath);
-
-    const publicGlbUrl = publicUrlData.publicUrl;
+    const { publicGlbUrl } = uploaded;
 
     // 5. Update all database tables
     console.log(`Updating database for furnitureId: ${furnitureId}`);
@@ -366,16 +570,18 @@ async function reconstructFurniture(furnitureId) {
       .eq('id', furnitureId);
 
     // Handle media_assets for 3D model
-    await upsertModelMediaAsset(furnitureId, publicGlbUrl, glbFilename, glbBytes.length);
+    await upsertModelMediaAsset(furnitureId, publicGlbUrl, glbFilename, uploaded.size);
 
     // Mark job as completed
     await updateJobStatus(jobId, 'completed', null, publicGlbUrl);
 
     console.log(`3D reconstruction completed successfully for furnitureId: ${furnitureId}`);
+    succeeded = true;
 
   } catch (overallError) {
     console.error(`Error during reconstruction for ${furnitureId}:`, overallError.message);
-    
+    failed = true;
+
     // Update job status to failed if we have a job ID
     if (jobId) {
       await updateJobStatus(jobId, 'failed', overallError.message);
@@ -383,9 +589,27 @@ async function reconstructFurniture(furnitureId) {
     
     throw overallError;
   } finally {
-    // Cleanup workspace
-    console.log(`Cleaning up workspace: ${workRoot}`);
-    await cleanupWorkspace(workRoot, furnitureId);
+    // Cleanup workspace. After a failure the workspace is kept so that a retry
+    // resumes from the pipeline's stage checkpoints instead of starting over, up to
+    // MAX_FAILED_ATTEMPTS failures in a row. An early exit (the job is already completed
+    // or another process is running it) leaves the workspace alone.
+    if (succeeded) {
+      console.log(`Cleaning up workspace: ${workRoot}`);
+      await cleanupWorkspace(workRoot, furnitureId);
+    } else if (failed) {
+      let attempts = MAX_FAILED_ATTEMPTS;
+      try {
+        attempts = await recordFailedAttempt(workRoot);
+      } catch (err) {
+        console.warn(`Could not record the failed attempt in ${workRoot}: ${err.message}`);
+      }
+      if (attempts >= MAX_FAILED_ATTEMPTS) {
+        console.log(`Job failed ${attempts} time(s); cleaning up workspace: ${workRoot}`);
+        await cleanupWorkspace(workRoot, furnitureId);
+      } else {
+        console.log(`Keeping workspace for retry (failed attempt ${attempts}/${MAX_FAILED_ATTEMPTS}): ${workRoot}`);
+      }
+    }
   }
 }
 